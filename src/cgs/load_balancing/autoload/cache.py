@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+import uuid
+
+from cgs.load_balancing.autoload.state import LAST_CHANGE_PROBES
+from cgs.load_balancing.autoload.state import UP_TIME_PROBE
+from cgs.load_balancing.helpers.cache import TtlLruCache
+from cgs.load_balancing.snmp.bulk import get_bulk_rows
+from cgs.load_balancing.snmp.bulk import resolve_column_oid
+
+DESCRIPTION_PROBE = ("SNMPv2-MIB", "sysDescr")
+INTERFACES_COUNT_PROBE = ("IF-MIB", "ifNumber")
+LB_GROUPS_PROBE = ("NPB-LB", "lbGroupName")
+# LB group rows read by the one GETBULK request of the fingerprint, the rest of the table isn't checked
+LB_GROUPS_PROBE_MAX_REPETITIONS = 64
+# boot time is calculated from sysUpTime, round it to absorb the request latency
+BOOT_TIME_PRECISION = 10
+
+
+def get_lb_groups_indicator(snmp_service):
+    """Suffixes and names of the first LB group rows, read with one GETBULK request
+
+    :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service:
+    :rtype: tuple
+    """
+    column_oid = resolve_column_oid(snmp_service, *LB_GROUPS_PROBE)
+    rows = []
+
+    for var_bind_row in get_bulk_rows(snmp_service, [column_oid], LB_GROUPS_PROBE_MAX_REPETITIONS):
+        oid, value = var_bind_row[0]
+        oid = tuple(oid)
+        if oid[:len(column_oid)] != column_oid or value is None:
+            break
+        rows.append((".".join(str(sub_id) for sub_id in oid[len(column_oid):]), value))
+
+    return (len(rows),) + tuple(rows)
+
+
+def get_device_fingerprint(snmp_service, timer=time.time):
+    """Cheap indicators of the device structure change, read with a few scalar GET and one GETBULK requests
+
+    Boot time changes on reboot (firmware upgrade, new modules), sysDescr changes with
+    the software version, the last change times and the number of interfaces change when
+    chassis or ports are added or removed. LB groups are added, removed or renamed within
+    the first LB_GROUPS_PROBE_MAX_REPETITIONS rows of the LB group table, changes of
+    the group outputs and algorithms are picked up when the cache entry expires.
+    :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service:
+    :param timer: callable that returns the current time in seconds
+    :rtype: tuple
+    """
+    up_time = int(snmp_service.get_property(UP_TIME_PROBE[0], UP_TIME_PROBE[1], 0))
+    boot_time = int(round((timer() - up_time / 100.0) / BOOT_TIME_PRECISION)) * BOOT_TIME_PRECISION
+    description = snmp_service.get_property(DESCRIPTION_PROBE[0], DESCRIPTION_PROBE[1], 0)
+    last_changes = tuple(snmp_service.get_property(mib, name, 0) for mib, name in LAST_CHANGE_PROBES)
+    interfaces_count = snmp_service.get_property(INTERFACES_COUNT_PROBE[0], INTERFACES_COUNT_PROBE[1], 0)
+
+    return (boot_time, description) + last_changes + (interfaces_count,) + get_lb_groups_indicator(snmp_service)
+
+
+def get_autoload_details_data(details):
+    """Convert AutoLoadDetails to the JSON serializable form
+
+    :param cloudshell.shell.core.driver_context.AutoLoadDetails details:
+    :rtype: dict
+    """
+    return {"resources": [[resource.model, resource.name, resource.relative_address, resource.unique_identifier]
+                          for resource in details.resources],
+            "attributes": [[attribute.relative_address, attribute.attribute_name, attribute.attribute_value]
+                           for attribute in details.attributes]}
+
+
+def build_autoload_details(data):
+    """Build AutoLoadDetails from the result of get_autoload_details_data
+
+    :param dict data:
+    :rtype: cloudshell.shell.core.driver_context.AutoLoadDetails
+    """
+    from cloudshell.shell.core.driver_context import AutoLoadAttribute
+    from cloudshell.shell.core.driver_context import AutoLoadDetails
+    from cloudshell.shell.core.driver_context import AutoLoadResource
+
+    return AutoLoadDetails(resources=[AutoLoadResource(*resource) for resource in data["resources"]],
+                           attributes=[AutoLoadAttribute(*attribute) for attribute in data["attributes"]])
+
+
+class AutoloadDetailsCache(object):
+    """In-memory LRU cache of Autoload results backed by JSON files on disk
+
+    Values must be JSON serializable, see get_autoload_details_data. The disk cache keeps
+    results between driver restarts, it is bounded by the same number of entries as the
+    memory cache, the oldest files are removed first. The cache folder is created
+    accessible to the owner only, the disk cache isn't used if the folder is writable
+    by other users.
+    """
+
+    FILE_EXTENSION = ".json"
+    FOLDER_MODE = 0o700
+    FILE_MODE = 0o600
+
+    def __init__(self, max_size, ttl, cache_path=None, timer=time.time):
+        """
+
+        :param int max_size: maximum number of cached results
+        :param float ttl: result time to live in seconds
+        :param str cache_path: folder for the disk cache, None disables it
+        :param timer: callable that returns the current time in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self._timer = timer
+        self._memory_cache = TtlLruCache(max_size=max_size, ttl=ttl, timer=timer)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_resource_prefix(resource_name):
+        return hashlib.sha1(resource_name.encode("utf-8")).hexdigest()[:16] + "-"
+
+    @classmethod
+    def get_key(cls, resource_name, *parts):
+        """Key starts with the resource name hash, so entries of the resource can be removed
+
+        :param str resource_name:
+        :param parts: address, shell version, device fingerprint, etc.
+        :rtype: str
+        """
+        return cls._get_resource_prefix(resource_name) + hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+    def _get_file_path(self, key):
+        return os.path.join(self.cache_path, key + self.FILE_EXTENSION)
+
+    def _is_folder_safe(self):
+        """Check that the cache folder exists and other users can't plant entries there
+
+        :rtype: bool
+        """
+        try:
+            folder_stat = os.stat(self.cache_path)
+        except OSError:
+            return False
+
+        if not stat.S_ISDIR(folder_stat.st_mode):
+            return False
+
+        # ownership and mode bits are meaningful only on POSIX systems
+        if hasattr(os, "getuid"):
+            if folder_stat.st_uid != os.getuid() or folder_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                return False
+
+        return True
+
+    def _read_file(self, key):
+        """
+
+        :param str key:
+        :return: cached value or None if there is no valid entry on disk
+        """
+        if not self._is_folder_safe():
+            return None
+
+        file_path = self._get_file_path(key)
+
+        try:
+            with open(file_path, "r") as cache_file:
+                entry = json.load(cache_file)
+            created, value = entry["created"], entry["value"]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+        if self._timer() - created > self.ttl:
+            self._remove_file(file_path)
+            return None
+
+        return value
+
+    @staticmethod
+    def _remove_file(file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def _write_file(self, key, value):
+        """Write entry via temporary file and remove the oldest entries above the size limit
+
+        :param str key:
+        :param value:
+        :return:
+        """
+        if not os.path.isdir(self.cache_path):
+            os.makedirs(self.cache_path, self.FOLDER_MODE)
+
+        if not self._is_folder_safe():
+            return
+
+        file_path = self._get_file_path(key)
+        tmp_path = "{}.{}.tmp".format(file_path, uuid.uuid4().hex)
+        tmp_file = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, self.FILE_MODE)
+
+        with os.fdopen(tmp_file, "w") as cache_file:
+            json.dump({"created": self._timer(), "value": value}, cache_file)
+
+        if os.path.exists(file_path):
+            self._remove_file(file_path)
+        os.rename(tmp_path, file_path)
+
+        file_paths = [os.path.join(self.cache_path, file_name) for file_name in os.listdir(self.cache_path)
+                      if file_name.endswith(self.FILE_EXTENSION)]
+
+        if len(file_paths) > self.max_size:
+            file_paths.sort(key=os.path.getmtime)
+            for old_file_path in file_paths[:len(file_paths) - self.max_size]:
+                self._remove_file(old_file_path)
+
+    def get(self, key):
+        """
+
+        :param str key:
+        :return: cached value or None on a miss
+        """
+        value = self._memory_cache.get(key)
+        if value is not None or not self.cache_path:
+            return value
+
+        with self._lock:
+            value = self._read_file(key)
+
+        if value is not None:
+            self._memory_cache.set(key, value)
+
+        return value
+
+    def set(self, key, value):
+        """
+
+        :param str key:
+        :param value: JSON serializable value, see get_autoload_details_data
+        :return:
+        """
+        self._memory_cache.set(key, value)
+
+        if self.cache_path:
+            with self._lock:
+                self._write_file(key, value)
+
+    def clear(self, resource_name=None):
+        """Remove entries from memory and disk
+
+        :param str resource_name: remove only entries of the resource, all entries if None
+        :return:
+        """
+        prefix = "" if resource_name is None else self._get_resource_prefix(resource_name)
+
+        for key in self._memory_cache.keys():
+            if key.startswith(prefix):
+                self._memory_cache.pop(key)
+
+        if self.cache_path and os.path.isdir(self.cache_path):
+            with self._lock:
+                for file_name in os.listdir(self.cache_path):
+                    if file_name.startswith(prefix) and file_name.endswith(self.FILE_EXTENSION):
+                        self._remove_file(os.path.join(self.cache_path, file_name))
+
+    @property
+    def stats(self):
+        """
+
+        :rtype: dict
+        """
+        return self._memory_cache.stats
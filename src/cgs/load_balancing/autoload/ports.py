@@ -0,0 +1,355 @@
+import re
+from collections import OrderedDict
+
+from cgs.load_balancing.snmp.bulk import SnmpBulkTableReader
+
+ENTITY_MIB = "ENTITY-MIB"
+IF_MIB = "IF-MIB"
+ENT_PHYSICAL_COLUMNS = ["entPhysicalDescr", "entPhysicalContainedIn", "entPhysicalClass", "entPhysicalParentRelPos",
+                        "entPhysicalName", "entPhysicalSerialNum", "entPhysicalModelName"]
+ENT_ALIAS_MAPPING_COLUMNS = ["entAliasMappingIdentifier"]
+IF_COLUMNS = ["ifDescr", "ifType", "ifMtu", "ifPhysAddress"]
+IF_X_COLUMNS = ["ifName", "ifHighSpeed", "ifAlias"]
+
+ENT_PHYSICAL_CLASS_NAMES = {"1": "other", "2": "unknown", "3": "chassis", "4": "backplane", "5": "container",
+                            "6": "powerSupply", "7": "fan", "8": "sensor", "9": "module", "10": "port",
+                            "11": "stack", "12": "cpu"}
+IF_INDEX_OID_PATTERN = re.compile(r"(?:ifIndex|1\.3\.6\.1\.2\.1\.2\.2\.1\.1)\.(\d+)$")
+
+
+class PortDiscoveryMode(object):
+    STANDARD = "standard"
+    INDEXED = "indexed"
+    # indexed discovery is compared with the standard one, the standard result is used
+    VERIFY = "verify"
+
+
+def _strip_value(value):
+    """Values of the enumerations are pretty printed as 'name' by some SNMP services"""
+    return (value or "").strip().strip("'\"")
+
+
+def get_entity_class(value):
+    """
+
+    :param str value: entPhysicalClass value, name or number
+    :rtype: str
+    """
+    value = _strip_value(value)
+    return ENT_PHYSICAL_CLASS_NAMES.get(value, value)
+
+
+def format_mac_address(value):
+    """
+
+    :param str value: ifPhysAddress value, 0x prefixed hex string or already formatted address
+    :rtype: str
+    """
+    value = _strip_value(value)
+
+    if value.lower().startswith("0x"):
+        hex_digits = value[2:].upper()
+        return ":".join(hex_digits[position:position + 2] for position in range(0, len(hex_digits), 2))
+
+    return value
+
+
+def get_relative_addresses(sub_resources):
+    """Relative addresses of the sub resources, they are assigned the same way AutoloadDetailsBuilder does it
+
+    Relative ID is prefixed with the RELATIVE_PATH_TEMPLATE of the resource model; resources
+    without the ID (empty or -1) and the duplicates of an ID get the next free index, the
+    one after the highest numeric ID.
+    :param dict sub_resources: {relative path template: {relative_id: [resource]}}, see add_sub_resource
+        of the autoload structure resources
+    :return: [(relative address, resource)]
+    :rtype: list[tuple]
+    """
+    addresses = []
+
+    for template, resources in sub_resources.items():
+        numeric_ids = [int(relative_id) for relative_id in resources
+                       if str(relative_id).isdigit() and int(relative_id) > 0]
+        free_index = max(numeric_ids) + 1 if numeric_ids else 1
+
+        for relative_id, id_resources in resources.items():
+            if not relative_id or str(relative_id) == "-1":
+                relative_id = free_index
+                free_index += 1
+
+            addresses.append(("{}{}".format(template, relative_id), id_resources[0]))
+            for resource in id_resources[1:]:
+                addresses.append(("{}{}".format(template, free_index), resource))
+                free_index += 1
+
+    return addresses
+
+
+def group_sub_resources(resources):
+    """
+
+    :param list[tuple] resources: [(relative_id, resource)] in the order they are added to the parent
+    :return: {relative path template: {relative_id: [resource]}}
+    :rtype: dict
+    """
+    sub_resources = OrderedDict()
+
+    for relative_id, resource in resources:
+        template = getattr(resource, "RELATIVE_PATH_TEMPLATE", "")
+        sub_resources.setdefault(template, OrderedDict()).setdefault(relative_id, []).append(resource)
+
+    return sub_resources
+
+
+def get_resource_tree(resources, path=""):
+    """Flatten the discovered resources for the comparison
+
+    :param list[tuple] resources: [(relative_id, resource)]
+    :param str path: relative address of the parent resource
+    :return: {relative address: (model class name, name, unique ID, attributes)}
+    :rtype: dict
+    """
+    tree = {}
+
+    for relative_address, resource in get_relative_addresses(group_sub_resources(resources)):
+        resource_path = "{}/{}".format(path, relative_address) if path else relative_address
+        tree[resource_path] = (type(resource).__name__,
+                               resource.name,
+                               getattr(resource, "unique_id", None),
+                               sorted((getattr(resource, "attributes", None) or {}).items()))
+
+        sub_resources = [(relative_id, sub_resource)
+                         for template_resources in (getattr(resource, "resources", None) or {}).values()
+                         for relative_id, id_resources in template_resources.items()
+                         for sub_resource in id_resources]
+        tree.update(get_resource_tree(sub_resources, resource_path))
+
+    return tree
+
+
+def get_resource_differences(expected, actual):
+    """
+
+    :param list[tuple] expected: [(relative_id, resource)]
+    :param list[tuple] actual: [(relative_id, resource)]
+    :return: description of every resource that is missing, unexpected or different
+    :rtype: list[str]
+    """
+    expected_tree = get_resource_tree(expected)
+    actual_tree = get_resource_tree(actual)
+    differences = []
+
+    for path in sorted(set(expected_tree) | set(actual_tree)):
+        expected_resource = expected_tree.get(path)
+        actual_resource = actual_tree.get(path)
+
+        if actual_resource is None:
+            differences.append("{}: missing {}".format(path, expected_resource))
+        elif expected_resource is None:
+            differences.append("{}: unexpected {}".format(path, actual_resource))
+        elif expected_resource != actual_resource:
+            differences.append("{}: expected {}, got {}".format(path, expected_resource, actual_resource))
+
+    return differences
+
+
+class IndexedPortDiscovery(object):
+    """Discover chassis and ports from the ENTITY-MIB and IF-MIB columns read once
+
+    Each table is walked once with GETBULK requests for the needed columns only.
+    Interface rows are joined by ifIndex, entities are mapped to interfaces with
+    entAliasMappingTable or, if the device doesn't implement it, by the entity name
+    matching ifName/ifDescr. Chassis and ports are then created in one pass over the
+    entities, the chassis of the port is found through the memoized containment chain.
+
+    Names, unique IDs and relative IDs are the same as the ones of the standard discovery
+    of AbstractCgsSNMPAutoload: relative IDs are the entity positions in the parent
+    (entPhysicalParentRelPos), the model classes add the CH/P prefixes.
+    """
+
+    def __init__(self, snmp_service, logger, resource_name, shell_name, chassis_model_class, port_model_class,
+                 bulk_max_repetitions=None):
+        """
+
+        :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service:
+        :param logging.Logger logger:
+        :param str resource_name:
+        :param str shell_name:
+        :param chassis_model_class: e.g. GenericChassis
+        :param port_model_class: e.g. GenericPort
+        :param int bulk_max_repetitions: max-repetitions for the GETBULK table walks
+        """
+        self._logger = logger
+        self._resource_name = resource_name
+        self._shell_name = shell_name
+        self._chassis_model_class = chassis_model_class
+        self._port_model_class = port_model_class
+        self._bulk_reader = SnmpBulkTableReader(snmp_service=snmp_service,
+                                                logger=logger,
+                                                max_repetitions=bulk_max_repetitions)
+
+    def _read_table(self, mib, columns, table=None):
+        """
+
+        :param str mib:
+        :param list[str] columns:
+        :param collections.OrderedDict table: rows of the table with the same index, e.g. ifTable for ifXTable
+        :return: {index: {column: value}}
+        :rtype: collections.OrderedDict
+        """
+        table = OrderedDict() if table is None else table
+
+        for suffix, values in self._bulk_reader.iter_table_rows(mib, columns):
+            row = table.setdefault(suffix, {})
+            for column, value in zip(columns, values):
+                if value is not None:
+                    row[column] = value
+
+        return table
+
+    def _get_if_indexes(self, entities, interfaces):
+        """Map entities to interfaces
+
+        :param collections.OrderedDict entities: {entity index: row}
+        :param collections.OrderedDict interfaces: {ifIndex: row}
+        :return: {entity index: ifIndex}
+        :rtype: dict
+        """
+        if_indexes = {}
+
+        # entAliasMappingTable index is entPhysicalIndex.entAliasLogicalIndexOrZero
+        for suffix, row in self._read_table(ENTITY_MIB, ENT_ALIAS_MAPPING_COLUMNS).items():
+            match = IF_INDEX_OID_PATTERN.search(_strip_value(row.get("entAliasMappingIdentifier")))
+            if match and match.group(1) in interfaces:
+                if_indexes.setdefault(suffix.split(".")[0], match.group(1))
+
+        if if_indexes:
+            return if_indexes
+
+        if_index_by_name = {}
+        for if_index, row in interfaces.items():
+            for column in ("ifDescr", "ifName"):
+                name = _strip_value(row.get(column))
+                if name:
+                    if_index_by_name[name] = if_index
+
+        for entity_index, row in entities.items():
+            if_index = if_index_by_name.get(_strip_value(row.get("entPhysicalName")))
+            if if_index is not None:
+                if_indexes[entity_index] = if_index
+
+        return if_indexes
+
+    def _get_chassis_index(self, entity_index, entities, chassis_indexes):
+        """Find the chassis that contains the entity
+
+        :param str entity_index:
+        :param collections.OrderedDict entities:
+        :param dict chassis_indexes: {entity index: chassis entity index or None}, results of the previous lookups
+        :rtype: str
+        """
+        path = []
+
+        while entity_index not in chassis_indexes:
+            row = entities.get(entity_index)
+            if row is None or entity_index in path:
+                chassis_indexes[entity_index] = None
+                break
+
+            path.append(entity_index)
+            if get_entity_class(row.get("entPhysicalClass")) == "chassis":
+                chassis_indexes[entity_index] = entity_index
+                break
+
+            entity_index = _strip_value(row.get("entPhysicalContainedIn"))
+
+        chassis_index = chassis_indexes[entity_index]
+        for index in path:
+            chassis_indexes[index] = chassis_index
+
+        return chassis_index
+
+    def _get_position(self, row, default):
+        position = _strip_value(row.get("entPhysicalParentRelPos"))
+        return position if position.isdigit() and int(position) > 0 else default
+
+    def _build_chassis(self, entity_index, row, position):
+        """
+
+        :param str entity_index:
+        :param dict row: entPhysicalTable row
+        :param str position:
+        :rtype: GenericChassis
+        """
+        chassis = self._chassis_model_class(shell_name=self._shell_name,
+                                            name="Chassis {}".format(position),
+                                            unique_id="{}.chassis.{}".format(self._resource_name, entity_index))
+
+        chassis.model = _strip_value(row.get("entPhysicalModelName") or row.get("entPhysicalDescr"))
+        chassis.serial_number = _strip_value(row.get("entPhysicalSerialNum"))
+        return chassis
+
+    def _build_port(self, entity_index, row, interface):
+        """
+
+        :param str entity_index:
+        :param dict row: entPhysicalTable row
+        :param dict interface: joined ifTable and ifXTable row
+        :rtype: GenericPort
+        """
+        name = _strip_value(interface.get("ifName") or interface.get("ifDescr") or row.get("entPhysicalName"))
+        port = self._port_model_class(shell_name=self._shell_name,
+                                      name=name.replace("/", "-"),
+                                      unique_id="{}.port.{}".format(self._resource_name, entity_index))
+
+        port.port_description = _strip_value(interface.get("ifAlias"))
+        port.l2_protocol_type = _strip_value(interface.get("ifType"))
+        port.mac_address = format_mac_address(interface.get("ifPhysAddress"))
+        port.mtu = _strip_value(interface.get("ifMtu"))
+        port.bandwidth = _strip_value(interface.get("ifHighSpeed"))
+        return port
+
+    def discover(self):
+        """
+
+        :return: [(relative_id, chassis)] with the ports added to the chassis, relative IDs are numbers
+            without the CH prefix, the same as for the add_sub_resource of the root resource
+        :rtype: list[tuple]
+        """
+        entities = self._read_table(ENTITY_MIB, ENT_PHYSICAL_COLUMNS)
+        interfaces = self._read_table(IF_MIB, IF_COLUMNS)
+        self._read_table(IF_MIB, IF_X_COLUMNS, interfaces)
+        if_indexes = self._get_if_indexes(entities, interfaces)
+
+        chassis_resources = []
+        chassis_by_index = {}
+        chassis_indexes = {}
+        ports_count = 0
+
+        for entity_index, row in entities.items():
+            if get_entity_class(row.get("entPhysicalClass")) == "chassis":
+                position = self._get_position(row, str(len(chassis_resources) + 1))
+                chassis = self._build_chassis(entity_index, row, position)
+                chassis_by_index[entity_index] = chassis
+                chassis_resources.append((position, chassis))
+
+        for entity_index, row in entities.items():
+            if get_entity_class(row.get("entPhysicalClass")) != "port":
+                continue
+
+            if_index = if_indexes.get(entity_index)
+            chassis = chassis_by_index.get(self._get_chassis_index(entity_index, entities, chassis_indexes))
+            if if_index is None or chassis is None:
+                self._logger.debug("Port entity {} is skipped, interface: {}, chassis: {}".format(
+                    entity_index, if_index, chassis is not None))
+                continue
+
+            port = self._build_port(entity_index, row, interfaces[if_index])
+            chassis.add_sub_resource(self._get_position(row, if_index), port)
+            ports_count += 1
+
+        self._logger.info("Discovered {} chassis and {} ports from {} entities and {} interfaces in {} "
+                          "GETBULK requests".format(len(chassis_resources), ports_count, len(entities),
+                                                    len(interfaces), self._bulk_reader.pdu_count))
+
+        return chassis_resources
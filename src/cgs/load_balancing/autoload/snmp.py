@@ -1,13 +1,71 @@
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
 from cloudshell.cgs.autoload.snmp import AbstractCgsSNMPAutoload
 from cloudshell.devices.standards.load_balancing.autoload_structure import GenericChassis
 from cloudshell.devices.standards.load_balancing.autoload_structure import GenericPort
 from cloudshell.devices.standards.load_balancing.autoload_structure import GenericResource
 from cloudshell.devices.standards.load_balancing.autoload_structure import GenericServerFarm
 
+from cgs.load_balancing.autoload.ports import IndexedPortDiscovery
+from cgs.load_balancing.autoload.ports import PortDiscoveryMode
+from cgs.load_balancing.autoload.ports import get_resource_differences
+from cgs.load_balancing.autoload.state import AutoloadState
+from cgs.load_balancing.autoload.state import LAST_CHANGE_PROBES
+from cgs.load_balancing.autoload.state import UP_TIME_PROBE
+from cgs.load_balancing.helpers.tracing import bind_span
+from cgs.load_balancing.helpers.tracing import trace_count
+from cgs.load_balancing.helpers.tracing import trace_span
+from cgs.load_balancing.snmp.bulk import SnmpBulkTableReader
+
+LB_GROUP_COLUMNS = ["lbGroupName", "lbGroupOutputs", "lbGroupAlgo"]
+LbGroupRow = namedtuple("LbGroupRow", ["suffix"] + LB_GROUP_COLUMNS)
+# pretty printed noSuchObject/noSuchInstance values of GET responses
+NO_SUCH_VALUE_PREFIXES = ("No Such Object", "No Such Instance")
+
 
 class CgsLoadBalancerSNMPAutoload(AbstractCgsSNMPAutoload):
     LB_MIB_TABLE = "NPB-LB"
     LB_GROUP_TABLE = "lbGroupTable"
+    LB_GROUP_COLUMNS = LB_GROUP_COLUMNS
+    # the only LB group table column walked by the incremental Autoload, see _iter_changed_lb_groups
+    LB_GROUP_PROBE_COLUMN = "lbGroupName"
+    UP_TIME_PROBE = UP_TIME_PROBE
+    LAST_CHANGE_PROBES = LAST_CHANGE_PROBES
+
+    def __init__(self, snmp_handler, shell_name, shell_type, resource_name, logger, bulk_max_repetitions=None,
+                 state_store=None, state_key=None, incremental=False, snmp_session_factory=None, workers=1,
+                 port_discovery_mode=PortDiscoveryMode.STANDARD):
+        """
+
+        :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_handler:
+        :param str shell_name:
+        :param str shell_type:
+        :param str resource_name:
+        :param logging.Logger logger:
+        :param int bulk_max_repetitions: max-repetitions for the GETBULK walk of the LB group table
+        :param cgs.load_balancing.autoload.state.AutoloadStateStore state_store: previous Autoload results
+        :param state_key: key of the resource in the state store
+        :param bool incremental: re-discover only changed parts of the previously discovered structure
+        :param cgs.load_balancing.snmp.session.SnmpSessionFactory snmp_session_factory: creates additional SNMP
+            sessions for the concurrent discovery phases
+        :param int workers: size of the thread pool for the discovery phases, 1 means serial discovery
+        :param str port_discovery_mode: one of PortDiscoveryMode, discovery of chassis and ports inherited from
+            AbstractCgsSNMPAutoload, the indexed one or both with the comparison of their results
+        """
+        super(CgsLoadBalancerSNMPAutoload, self).__init__(snmp_handler=snmp_handler,
+                                                          shell_name=shell_name,
+                                                          shell_type=shell_type,
+                                                          resource_name=resource_name,
+                                                          logger=logger)
+        self.bulk_max_repetitions = bulk_max_repetitions
+        self.state_store = state_store
+        self.state_key = state_key
+        self.incremental = incremental and state_store is not None
+        self.snmp_session_factory = snmp_session_factory
+        self.workers = workers or 1
+        self.port_discovery_mode = port_discovery_mode
+        self._server_farm_id_prefix = "{}.{}.".format(self.resource_name, "group")
 
     @property
     def root_model_class(self):
@@ -21,27 +79,374 @@ class CgsLoadBalancerSNMPAutoload(AbstractCgsSNMPAutoload):
     def port_model_class(self):
         return GenericPort
 
+    @property
+    def concurrent(self):
+        """
+
+        :rtype: bool
+        """
+        return self.workers > 1 and self.snmp_session_factory is not None
+
     def _build_resources(self):
         """Discover and create all needed resources.
 
         :return:
         """
-        super(CgsLoadBalancerSNMPAutoload, self)._build_resources()
-        self._build_server_farms()
+        previous_state = None
+        change_probe = None
+
+        if self.incremental:
+            previous_state = self.state_store.get(self.state_key)
+            with trace_span("change_probe"):
+                change_probe = self._get_change_probe()
 
-    def _build_server_farms(self):
+        previous_farms = self._get_previous_server_farms(change_probe, previous_state)
+
+        if self.concurrent:
+            base_resources, lb_groups = self._run_discovery_phases(change_probe, previous_state, previous_farms)
+            with trace_span("server_farms"):
+                server_farms = self._build_server_farms(lb_groups, previous_state)
+        else:
+            with trace_span("base_resources"):
+                base_resources = self._build_base_resources(change_probe, previous_state)
+            # server farms are built while the LB group table is being read
+            with trace_span("lb_groups"):
+                server_farms = self._build_server_farms(self._iter_lb_groups(previous_farms=previous_farms),
+                                                        previous_state)
+
+        if self.incremental:
+            self.state_store.set(self.state_key, AutoloadState(change_probe=change_probe,
+                                                               base_resources=base_resources,
+                                                               server_farms=server_farms))
+
+    def _run_discovery_phases(self, change_probe, previous_state, previous_farms=None):
+        """Run chassis/ports discovery and the LB group table walk concurrently
+
+        Chassis/ports are discovered over the main SNMP session, the LB group table
+        is read over its own session. Server farms are added to the root resource
+        only after both phases are finished, so the resulting tree is the same as
+        for the serial discovery.
+        :param dict change_probe:
+        :param AutoloadState previous_state:
+        :param dict previous_farms: server farms that can be reused, see _get_previous_server_farms
+        :return: base resources and rows of the LB group table
+        :rtype: tuple
         """
+        self.logger.info("Running discovery phases concurrently in {} threads".format(self.workers))
+        pool = ThreadPool(processes=min(self.workers, 2))
 
-        :return:
+        try:
+            base_result = pool.apply_async(bind_span(self._build_base_resources_phase),
+                                           (change_probe, previous_state))
+            lb_groups_result = pool.apply_async(bind_span(self._get_lb_groups_phase),
+                                                (self.snmp_session_factory.create(), previous_farms))
+
+            return base_result.get(), lb_groups_result.get()
+        finally:
+            pool.close()
+            pool.join()
+
+    def _build_base_resources_phase(self, change_probe, previous_state):
+        with trace_span("base_resources"):
+            return self._build_base_resources(change_probe, previous_state)
+
+    def _get_lb_groups_phase(self, snmp_service, previous_farms=None):
+        with trace_span("lb_groups"):
+            return self._get_lb_groups(snmp_service, previous_farms)
+
+    def _get_change_probe(self):
+        """Get cheap device change indicators
+
+        :rtype: dict
+        """
+        mib, name = self.UP_TIME_PROBE
+        try:
+            up_time = int(self.snmp_handler.get_property(mib, name, 0))
+        except (TypeError, ValueError):
+            up_time = None
+
+        change_probe = {name: up_time}
+
+        for mib, name in self.LAST_CHANGE_PROBES:
+            change_probe[name] = self.snmp_handler.get_property(mib, name, 0)
+
+        trace_count("snmp_pdus", len(self.LAST_CHANGE_PROBES) + 1)
+
+        self.logger.debug("Device change probe: {}".format(change_probe))
+        return change_probe
+
+    def _discover_standard_base_resources(self):
+        """Run the chassis/ports discovery of AbstractCgsSNMPAutoload and collect resources it adds to the root
+
+        :rtype: list[tuple]
         """
-        lb_groups = self.snmp_handler.get_table(self.LB_MIB_TABLE, self.LB_GROUP_TABLE)
-        for lb_group in lb_groups.itervalues():
-            server_farm = GenericServerFarm(shell_name=self.shell_name,
-                                            name=lb_group["lbGroupName"],
-                                            unique_id="{}.{}.{}".format(self.resource_name,
-                                                                        "group",
-                                                                        lb_group['suffix']))
-
-            server_farm.virtual_server_port = lb_group["lbGroupOutputs"]
-            server_farm.algorithm = lb_group["lbGroupAlgo"].replace("'", "")
-            self.resource.add_sub_resource(lb_group['suffix'], server_farm)
+        base_resources = []
+        add_sub_resource = self.resource.add_sub_resource
+
+        def _add_sub_resource(relative_id, sub_resource):
+            base_resources.append((relative_id, sub_resource))
+            add_sub_resource(relative_id, sub_resource)
+
+        self.resource.add_sub_resource = _add_sub_resource
+        try:
+            super(CgsLoadBalancerSNMPAutoload, self)._build_resources()
+        finally:
+            del self.resource.add_sub_resource
+
+        return base_resources
+
+    def _discover_indexed_base_resources(self):
+        """
+
+        :rtype: list[tuple]
+        """
+        port_discovery = IndexedPortDiscovery(snmp_service=self.snmp_handler,
+                                              logger=self.logger,
+                                              resource_name=self.resource_name,
+                                              shell_name=self.shell_name,
+                                              chassis_model_class=self.chassis_model_class,
+                                              port_model_class=self.port_model_class,
+                                              bulk_max_repetitions=self.bulk_max_repetitions)
+        with trace_span("indexed_ports"):
+            return port_discovery.discover()
+
+    def _verify_indexed_base_resources(self):
+        """Run both discoveries and compare their results, the standard result is used
+
+        :rtype: list[tuple]
+        """
+        with trace_span("standard_ports"):
+            base_resources = self._discover_standard_base_resources()
+
+        try:
+            differences = get_resource_differences(base_resources, self._discover_indexed_base_resources())
+        except Exception:
+            self.logger.warning("Indexed port discovery failed", exc_info=True)
+            return base_resources
+
+        if differences:
+            self.logger.warning("Indexed port discovery result differs from the standard one in {} "
+                                "resources:\n{}".format(len(differences), "\n".join(differences)))
+        else:
+            self.logger.info("Indexed port discovery result matches the standard one")
+
+        return base_resources
+
+    def _discover_base_resources(self):
+        """Discover chassis and ports with the configured port discovery mode and add them to the root resource
+
+        :rtype: list[tuple]
+        """
+        if self.port_discovery_mode == PortDiscoveryMode.VERIFY:
+            return self._verify_indexed_base_resources()
+
+        if self.port_discovery_mode != PortDiscoveryMode.INDEXED:
+            return self._discover_standard_base_resources()
+
+        base_resources = self._discover_indexed_base_resources()
+        for relative_id, sub_resource in base_resources:
+            self.resource.add_sub_resource(relative_id, sub_resource)
+
+        return base_resources
+
+    def _build_base_resources(self, change_probe=None, previous_state=None):
+        """Reuse chassis and ports of the previous Autoload if the device reports no changes
+
+        :param dict change_probe:
+        :param AutoloadState previous_state:
+        :rtype: list[tuple]
+        """
+        if not self.incremental:
+            return self._discover_base_resources()
+
+        last_change_keys = [name for _, name in self.LAST_CHANGE_PROBES]
+
+        if previous_state is None or not previous_state.is_base_unchanged(change_probe,
+                                                                          self.UP_TIME_PROBE[1],
+                                                                          last_change_keys):
+            self.logger.info("Discovering chassis and ports")
+            return self._discover_base_resources()
+
+        self.logger.info("Chassis and ports were not changed since the previous Autoload, reusing them")
+        for relative_id, sub_resource in previous_state.base_resources:
+            self.resource.add_sub_resource(relative_id, sub_resource)
+
+        return previous_state.base_resources
+
+    def _get_previous_server_farms(self, change_probe, previous_state):
+        """Server farms of the previous Autoload that can be reused without walking the whole LB group table
+
+        :param dict change_probe:
+        :param AutoloadState previous_state:
+        :return: {suffix: (lb_group_key, GenericServerFarm)} or None if the whole table must be walked
+        :rtype: dict
+        """
+        if previous_state is None or previous_state.server_farms is None:
+            return None
+
+        if not previous_state.is_same_uptime(change_probe, self.UP_TIME_PROBE[1]):
+            self.logger.info("Device was rebooted since the previous Autoload, walking the whole LB group table")
+            return None
+
+        return previous_state.server_farms
+
+    def _read_lb_group(self, snmp_service, suffix):
+        """Read one row of the LB group table with a single GET request
+
+        :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service:
+        :param str suffix: row index
+        :rtype: LbGroupRow
+        """
+        trace_count("snmp_pdus")
+        index = tuple(suffix.split("."))
+        values = snmp_service.get_table_field(*[(self.LB_MIB_TABLE, column) + index
+                                                for column in self.LB_GROUP_COLUMNS])
+
+        row_values = []
+        for column in self.LB_GROUP_COLUMNS:
+            value = values.get(column)
+            row_values.append(None if value is None or value.startswith(NO_SUCH_VALUE_PREFIXES) else value)
+
+        return LbGroupRow(suffix, *row_values)
+
+    def _iter_changed_lb_groups(self, snmp_service, previous_farms):
+        """Walk only the probe column of the LB group table, read the whole row only if it was added or changed
+
+        The LB group table has no last change indicator, so the probe column (the group name)
+        is walked with GETBULK. Rows with the same suffix and name as in the previous Autoload
+        are taken from the previous state, other rows are read with GET, removed rows are not
+        returned. Changes of the other columns of an existing group are discovered by the full
+        Autoload, e.g. after Clear Autoload Cache.
+        :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service:
+        :param dict previous_farms: {suffix: (lb_group_key, GenericServerFarm)}
+        :return: generator of LbGroupRow
+        """
+        bulk_reader = SnmpBulkTableReader(snmp_service=snmp_service,
+                                          logger=self.logger,
+                                          max_repetitions=self.bulk_max_repetitions)
+        probe_position = self.LB_GROUP_COLUMNS.index(self.LB_GROUP_PROBE_COLUMN)
+        rows_count = 0
+        read_count = 0
+
+        for suffix, (probe_value,) in bulk_reader.iter_table_rows(self.LB_MIB_TABLE, [self.LB_GROUP_PROBE_COLUMN]):
+            rows_count += 1
+            previous_farm = previous_farms.get(suffix)
+
+            if previous_farm is not None and previous_farm[0][probe_position] == probe_value:
+                yield LbGroupRow(suffix, *previous_farm[0])
+            else:
+                read_count += 1
+                yield self._read_lb_group(snmp_service, suffix)
+
+        self.logger.info("Probed {} LB groups in {} GETBULK requests, read {} added or changed groups".format(
+            rows_count, bulk_reader.pdu_count, read_count))
+
+    def _iter_lb_groups(self, snmp_service=None, previous_farms=None):
+        """Read only needed columns of the LB group table, fall back to the full table walk if GETBULK fails
+
+        :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service: SNMP session to use instead of the main one
+        :param dict previous_farms: server farms of the previous Autoload, only the rows that were added
+            or changed since then are read, see _iter_changed_lb_groups
+        :return: generator of LbGroupRow, rows are yielded while the table is being read
+        """
+        snmp_service = snmp_service or self.snmp_handler
+        rows_count = 0
+
+        if previous_farms is not None:
+            try:
+                for lb_group in self._iter_changed_lb_groups(snmp_service, previous_farms):
+                    rows_count += 1
+                    yield lb_group
+                return
+            except Exception:
+                if rows_count:
+                    raise
+
+                self.logger.warning("Unable to probe {}::{}, reading the whole table".format(
+                    self.LB_MIB_TABLE, self.LB_GROUP_TABLE), exc_info=True)
+
+        bulk_reader = SnmpBulkTableReader(snmp_service=snmp_service,
+                                          logger=self.logger,
+                                          max_repetitions=self.bulk_max_repetitions)
+
+        try:
+            for suffix, values in bulk_reader.iter_table_rows(self.LB_MIB_TABLE, self.LB_GROUP_COLUMNS):
+                rows_count += 1
+                yield LbGroupRow(suffix, *values)
+            return
+        except Exception:
+            # rows that were already yielded can't be taken back
+            if rows_count:
+                raise
+
+            self.logger.warning("Unable to bulk walk {}::{}, falling back to the full table walk".format(
+                self.LB_MIB_TABLE, self.LB_GROUP_TABLE), exc_info=True)
+
+        trace_count("snmp_table_walks")
+        lb_groups = snmp_service.get_table(self.LB_MIB_TABLE, self.LB_GROUP_TABLE)
+
+        # rows are released one by one as they are converted
+        for suffix in list(lb_groups.keys()):
+            lb_group = lb_groups.pop(suffix)
+            yield LbGroupRow(lb_group["suffix"], *[lb_group.get(column) for column in self.LB_GROUP_COLUMNS])
+
+    def _get_lb_groups(self, snmp_service=None, previous_farms=None):
+        """Read the LB group table for the concurrent discovery phase
+
+        :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service: SNMP session to use instead of the main one
+        :param dict previous_farms: server farms of the previous Autoload, see _iter_lb_groups
+        :rtype: list[LbGroupRow]
+        """
+        return list(self._iter_lb_groups(snmp_service, previous_farms))
+
+    def _build_server_farm(self, lb_group):
+        """
+
+        :param LbGroupRow lb_group: row of the LB group table
+        :rtype: GenericServerFarm
+        """
+        server_farm = GenericServerFarm(shell_name=self.shell_name,
+                                        name=lb_group.lbGroupName,
+                                        unique_id=self._server_farm_id_prefix + lb_group.suffix)
+
+        server_farm.virtual_server_port = lb_group.lbGroupOutputs
+        server_farm.algorithm = (lb_group.lbGroupAlgo or "").replace("'", "")
+        return server_farm
+
+    def _build_server_farms(self, lb_groups, previous_state=None):
+        """Create server farms, reuse unchanged ones from the previous Autoload state
+
+        Rows are consumed one by one, so a generator of rows is converted to server farms
+        while the table is being read.
+        :param lb_groups: iterable of LbGroupRow
+        :param AutoloadState previous_state:
+        :return: {suffix: (lb_group_key, GenericServerFarm)} for the incremental Autoload, otherwise None
+        :rtype: dict
+        """
+        previous_farms = previous_state.server_farms if previous_state is not None else {}
+        server_farms = {} if self.incremental else None
+        lb_groups_count = 0
+        changed_count = 0
+
+        for lb_group in lb_groups:
+            lb_groups_count += 1
+            lb_group_key = lb_group[1:]
+            previous_farm = previous_farms.get(lb_group.suffix)
+
+            if previous_farm is not None and previous_farm[0] == lb_group_key:
+                server_farm = previous_farm[1]
+            else:
+                server_farm = self._build_server_farm(lb_group)
+                changed_count += 1
+
+            if server_farms is not None:
+                server_farms[lb_group.suffix] = (lb_group_key, server_farm)
+
+            self.resource.add_sub_resource(lb_group.suffix, server_farm)
+
+        if previous_state is not None:
+            removed_count = len(set(previous_farms) - set(server_farms))
+            self.logger.info("LB groups added or changed: {}, removed: {}, unchanged: {}".format(
+                changed_count, removed_count, lb_groups_count - changed_count))
+
+        return server_farms
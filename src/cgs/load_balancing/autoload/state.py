@@ -0,0 +1,88 @@
+from cgs.load_balancing.helpers.cache import TtlLruCache
+
+UP_TIME_PROBE = ("SNMPv2-MIB", "sysUpTime")
+LAST_CHANGE_PROBES = [("IF-MIB", "ifTableLastChange"),
+                      ("ENTITY-MIB", "entLastChangeTime")]
+
+
+class AutoloadState(object):
+    """Structure discovered by the previous Autoload of the resource"""
+
+    def __init__(self, change_probe, base_resources, server_farms):
+        """
+
+        :param dict change_probe: device change indicators, e.g. {"sysUpTime": 100, "ifTableLastChange": "0"}
+        :param list[tuple] base_resources: (relative_id, resource) of chassis/ports added to the root resource
+        :param dict server_farms: {suffix: (lb_group_key, GenericServerFarm)}
+        """
+        self.change_probe = change_probe
+        self.base_resources = base_resources
+        self.server_farms = server_farms
+
+    def is_same_uptime(self, change_probe, up_time_key):
+        """Check that the device was not rebooted since the previous Autoload (sysUpTime didn't go backwards)
+
+        :param dict change_probe:
+        :param str up_time_key:
+        :rtype: bool
+        """
+        previous_up_time = self.change_probe.get(up_time_key)
+        up_time = change_probe.get(up_time_key)
+
+        return previous_up_time is not None and up_time is not None and up_time >= previous_up_time
+
+    def is_base_unchanged(self, change_probe, up_time_key, last_change_keys):
+        """Check that chassis and ports were not changed since the previous Autoload
+
+        Device reboot (sysUpTime went backwards) or any difference in the last change
+        indicators means that the base structure must be discovered again.
+        :param dict change_probe:
+        :param str up_time_key:
+        :param list[str] last_change_keys:
+        :rtype: bool
+        """
+        if not self.is_same_uptime(change_probe, up_time_key):
+            return False
+
+        for key in last_change_keys:
+            if not change_probe.get(key) or change_probe.get(key) != self.change_probe.get(key):
+                return False
+
+        return True
+
+
+class AutoloadStateStore(object):
+    """Keeps the last discovered structure for each resource"""
+
+    def __init__(self, max_size=256, ttl=None):
+        """
+
+        :param int max_size:
+        :param float ttl: state time to live in seconds, None means no expiration
+        """
+        self._cache = TtlLruCache(max_size=max_size, ttl=ttl)
+
+    def get(self, key):
+        """
+
+        :param key:
+        :rtype: AutoloadState
+        """
+        return self._cache.get(key)
+
+    def set(self, key, state):
+        """
+
+        :param key:
+        :param AutoloadState state:
+        :return:
+        """
+        self._cache.set(key, state)
+
+    def invalidate(self, key):
+        """
+
+        :param key:
+        :return:
+        """
+        self._cache.pop(key)
@@ -0,0 +1,300 @@
+import time
+from contextlib import contextmanager
+
+from cgs.load_balancing.capture.transcript import CLI_CHANNEL
+from cgs.load_balancing.capture.transcript import SNMP_CHANNEL
+from cgs.load_balancing.capture.transcript import decode_value
+from cgs.load_balancing.capture.transcript import get_request_key
+
+# QualiSnmp methods that send requests to the device
+SNMP_REQUEST_METHODS = ("get", "get_next", "get_property", "get_table", "get_table_field", "next", "walk", "set")
+# QualiSnmp methods that only change the local MIB configuration
+SNMP_LOCAL_METHODS = ("load_mib", "update_mib_sources")
+
+
+def get_snmp_request_key(method, args, kwargs):
+    """
+
+    :param str method: QualiSnmp method name
+    :param tuple args:
+    :param dict kwargs:
+    :rtype: str
+    """
+    return get_request_key(SNMP_CHANNEL, method, list(args), sorted(kwargs.items()))
+
+
+class Recorder(object):
+    """Send requests to the device and write them to the transcript"""
+
+    def __init__(self, transcript_writer, timer=time.time):
+        """
+
+        :param cgs.load_balancing.capture.transcript.TranscriptWriter transcript_writer:
+        :param timer: callable that returns the current time in seconds
+        """
+        self._transcript_writer = transcript_writer
+        self._timer = timer
+
+    def call(self, key, func, *args, **kwargs):
+        """
+
+        :param str key: see get_request_key
+        :param func: function that sends the request
+        :return: response
+        """
+        start_time = self._timer()
+
+        try:
+            output = func(*args, **kwargs)
+        except Exception as e:
+            self._transcript_writer.record(key, start_time, self._timer() - start_time, error=str(e))
+            raise
+
+        self._transcript_writer.record(key, start_time, self._timer() - start_time, output=output)
+        return output
+
+
+class Replayer(object):
+    """Serve responses from the transcript instead of the device"""
+
+    def __init__(self, transcript_reader, realtime=False, sleep=time.sleep):
+        """
+
+        :param cgs.load_balancing.capture.transcript.TranscriptReader transcript_reader:
+        :param bool realtime: delay every response by the recorded device latency
+        :param sleep: callable that waits for the given number of seconds
+        """
+        self._transcript_reader = transcript_reader
+        self._realtime = realtime
+        self._sleep = sleep
+
+    def call(self, key):
+        """
+
+        :param str key: see get_request_key
+        :return: recorded response
+        """
+        record = self._transcript_reader.next_record(key)
+        if record is None:
+            raise Exception(self.__class__.__name__,
+                            "Request {} is not found in the transcript {}".format(key, self._transcript_reader.path))
+
+        if self._realtime:
+            self._sleep(record["l"])
+
+        if "e" in record:
+            raise Exception(self.__class__.__name__, "Recorded error: {}".format(record["e"]))
+
+        return decode_value(record.get("o"))
+
+
+class RecordingCliService(object):
+    """CLI service that records the sent commands and their outputs"""
+
+    def __init__(self, cli_service, recorder):
+        """
+
+        :param cloudshell.cli.cli_service.CliService cli_service:
+        :param Recorder recorder:
+        """
+        self._cli_service = cli_service
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._cli_service, name)
+
+    def send_command(self, command, *args, **kwargs):
+        return self._recorder.call(get_request_key(CLI_CHANNEL, command),
+                                   self._cli_service.send_command, command, *args, **kwargs)
+
+    @contextmanager
+    def enter_mode(self, command_mode):
+        with self._cli_service.enter_mode(command_mode) as cli_service:
+            yield RecordingCliService(cli_service, self._recorder)
+
+
+class RecordingCliHandler(object):
+    """CLI handler that returns recording CLI services, the rest is delegated to the CLI handler"""
+
+    def __init__(self, cli_handler, recorder):
+        """
+
+        :param cloudshell.cgs.cli.handler.CgsCliHandler cli_handler:
+        :param Recorder recorder:
+        """
+        self._cli_handler = cli_handler
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._cli_handler, name)
+
+    @contextmanager
+    def get_cli_service(self, command_mode):
+        with self._cli_handler.get_cli_service(command_mode) as cli_service:
+            yield RecordingCliService(cli_service, self._recorder)
+
+
+class ReplayCliService(object):
+    """CLI service that returns the recorded outputs"""
+
+    def __init__(self, replayer):
+        """
+
+        :param Replayer replayer:
+        """
+        self._replayer = replayer
+
+    def send_command(self, command, *args, **kwargs):
+        return self._replayer.call(get_request_key(CLI_CHANNEL, command))
+
+    @contextmanager
+    def enter_mode(self, command_mode):
+        yield self
+
+
+class ReplayCliHandler(object):
+    """CLI handler that doesn't connect to the device, command modes are only placeholders"""
+
+    enable_mode = "enable"
+    config_mode = "config"
+
+    def __init__(self, replayer):
+        """
+
+        :param Replayer replayer:
+        """
+        self._replayer = replayer
+
+    @contextmanager
+    def get_cli_service(self, command_mode):
+        yield ReplayCliService(self._replayer)
+
+
+class RecordingSnmpService(object):
+    """SNMP service that records the requests and their responses"""
+
+    def __init__(self, snmp_service, recorder):
+        """
+
+        :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service:
+        :param Recorder recorder:
+        """
+        self._snmp_service = snmp_service
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attribute = getattr(self._snmp_service, name)
+
+        if name not in SNMP_REQUEST_METHODS:
+            return attribute
+
+        return lambda *args, **kwargs: self._recorder.call(get_snmp_request_key(name, args, kwargs),
+                                                           attribute, *args, **kwargs)
+
+    def resolve_column_oid(self, mib, column):
+        from cgs.load_balancing.snmp.bulk import resolve_column_oid
+
+        return self._recorder.call(get_snmp_request_key("resolve_column_oid", [mib, column], {}),
+                                   resolve_column_oid, self._snmp_service, mib, column)
+
+    def get_bulk_rows(self, oids, max_repetitions):
+        from cgs.load_balancing.snmp.bulk import get_bulk_rows
+
+        return self._recorder.call(get_snmp_request_key("get_bulk_rows", [oids, max_repetitions], {}),
+                                   get_bulk_rows, self._snmp_service, oids, max_repetitions)
+
+
+class RecordingSnmpHandler(object):
+    """SNMP handler that returns recording SNMP services, the rest is delegated to the SNMP handler"""
+
+    def __init__(self, snmp_handler, recorder):
+        """
+
+        :param cloudshell.cgs.snmp.handler.CgsSnmpHandler snmp_handler:
+        :param Recorder recorder:
+        """
+        self._snmp_handler = snmp_handler
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._snmp_handler, name)
+
+    @contextmanager
+    def get_snmp_service(self):
+        with self._snmp_handler.get_snmp_service() as snmp_service:
+            yield RecordingSnmpService(snmp_service, self._recorder)
+
+
+class RecordingSnmpSessionFactory(object):
+    """Create recording SNMP services over the sessions of the SNMP session factory"""
+
+    def __init__(self, snmp_session_factory, recorder):
+        """
+
+        :param cgs.load_balancing.snmp.session.SnmpSessionFactory snmp_session_factory:
+        :param Recorder recorder:
+        """
+        self._snmp_session_factory = snmp_session_factory
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._snmp_session_factory, name)
+
+    def create(self):
+        return RecordingSnmpService(self._snmp_session_factory.create(), self._recorder)
+
+
+class ReplaySnmpService(object):
+    """SNMP service that returns the recorded responses"""
+
+    def __init__(self, replayer):
+        """
+
+        :param Replayer replayer:
+        """
+        self._replayer = replayer
+
+    def __getattr__(self, name):
+        if name in SNMP_REQUEST_METHODS:
+            return lambda *args, **kwargs: self._replayer.call(get_snmp_request_key(name, args, kwargs))
+
+        if name in SNMP_LOCAL_METHODS:
+            return lambda *args, **kwargs: None
+
+        raise AttributeError(name)
+
+    def resolve_column_oid(self, mib, column):
+        return tuple(self._replayer.call(get_snmp_request_key("resolve_column_oid", [mib, column], {})))
+
+    def get_bulk_rows(self, oids, max_repetitions):
+        rows = self._replayer.call(get_snmp_request_key("get_bulk_rows", [oids, max_repetitions], {}))
+        return [[(tuple(oid), value) for oid, value in row] for row in rows]
+
+
+class ReplaySnmpHandler(object):
+    """SNMP handler that doesn't connect to the device and doesn't run the enable/disable SNMP flows"""
+
+    def __init__(self, replayer):
+        """
+
+        :param Replayer replayer:
+        """
+        self._replayer = replayer
+
+    @contextmanager
+    def get_snmp_service(self):
+        yield ReplaySnmpService(self._replayer)
+
+
+class ReplaySnmpSessionFactory(object):
+    """Create replay SNMP services instead of the device sessions"""
+
+    def __init__(self, replayer):
+        """
+
+        :param Replayer replayer:
+        """
+        self._replayer = replayer
+
+    def create(self):
+        return ReplaySnmpService(self._replayer)
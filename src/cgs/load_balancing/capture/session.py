@@ -0,0 +1,168 @@
+import logging
+import threading
+from functools import wraps
+
+from cgs.load_balancing.capture.proxies import Recorder
+from cgs.load_balancing.capture.proxies import RecordingCliHandler
+from cgs.load_balancing.capture.proxies import RecordingSnmpHandler
+from cgs.load_balancing.capture.proxies import RecordingSnmpSessionFactory
+from cgs.load_balancing.capture.proxies import ReplayCliHandler
+from cgs.load_balancing.capture.proxies import ReplaySnmpHandler
+from cgs.load_balancing.capture.proxies import ReplaySnmpSessionFactory
+from cgs.load_balancing.capture.proxies import Replayer
+from cgs.load_balancing.capture.transcript import TranscriptReader
+from cgs.load_balancing.capture.transcript import TranscriptWriter
+
+_local = threading.local()
+# replay doesn't contact the device, responses and logs of the replayed commands are marked so
+# they are not taken for a real save or restore
+REPLAYED_MARKER = "[replayed]"
+
+
+class CaptureMode(object):
+    OFF = "off"
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class RecordCaptureSession(object):
+    """Record CLI and SNMP traffic of the command to the transcript"""
+
+    mode = CaptureMode.RECORD
+
+    def __init__(self, transcript_path, header=None):
+        """
+
+        :param str transcript_path:
+        :param dict header: additional transcript header values
+        """
+        self.transcript_path = transcript_path
+        self._transcript_writer = TranscriptWriter(transcript_path, header)
+        self._recorder = Recorder(self._transcript_writer)
+
+    def wrap_cli_handler(self, cli_handler):
+        return RecordingCliHandler(cli_handler, self._recorder)
+
+    def wrap_snmp_handler(self, snmp_handler):
+        return RecordingSnmpHandler(snmp_handler, self._recorder)
+
+    def wrap_snmp_session_factory(self, snmp_session_factory):
+        return RecordingSnmpSessionFactory(snmp_session_factory, self._recorder)
+
+    def close(self):
+        self._transcript_writer.close()
+
+
+class ReplayCaptureSession(object):
+    """Serve CLI and SNMP traffic of the command from the transcript, the device is never contacted"""
+
+    mode = CaptureMode.REPLAY
+
+    def __init__(self, transcript_path, realtime=False):
+        """
+
+        :param str transcript_path:
+        :param bool realtime: delay the responses by the recorded device latencies
+        """
+        self.transcript_path = transcript_path
+        self._transcript_reader = TranscriptReader(transcript_path)
+        self._replayer = Replayer(self._transcript_reader, realtime=realtime)
+
+    def wrap_cli_handler(self, cli_handler):
+        return ReplayCliHandler(self._replayer)
+
+    def wrap_snmp_handler(self, snmp_handler):
+        return ReplaySnmpHandler(self._replayer)
+
+    def wrap_snmp_session_factory(self, snmp_session_factory):
+        return ReplaySnmpSessionFactory(self._replayer)
+
+    def close(self):
+        self._transcript_reader.close()
+
+
+def get_current_capture():
+    """
+
+    :return: capture session of the command running in the current thread or None
+    :rtype: RecordCaptureSession | ReplayCaptureSession
+    """
+    return getattr(_local, "capture", None)
+
+
+def mark_replayed_response(command_name, response, transcript_path):
+    """
+
+    :param str command_name:
+    :param response: response of the replayed command
+    :param str transcript_path:
+    :return: response marked as replayed, the commands without the text response get one
+    """
+    if response is None:
+        return "{} {} command is served from the transcript {}, the device is not changed".format(
+            REPLAYED_MARKER, command_name, transcript_path)
+
+    if isinstance(response, (bytes, type(u""))):
+        return "%s %s" % (REPLAYED_MARKER, response)
+
+    return response
+
+
+class ReplayLogFilter(logging.Filter):
+    """Mark the records logged by the commands that run in the replay capture session"""
+
+    def filter(self, record):
+        capture_session = get_current_capture()
+
+        if (capture_session is not None and capture_session.mode == CaptureMode.REPLAY and
+                not getattr(record, "replayed", False)):
+            record.msg = "%s %s" % (REPLAYED_MARKER, record.msg)
+            record.replayed = True
+
+        return True
+
+
+REPLAY_LOG_FILTER = ReplayLogFilter()
+
+
+def mark_replayed_logs(logger):
+    """Mark the records of the logger that are logged by the replayed commands
+
+    Filter runs in the logging thread, so only the records of the current command are marked
+    when the logger is shared by the concurrent commands.
+    :param logging.Logger logger:
+    """
+    if REPLAY_LOG_FILTER not in logger.filters:
+        logger.addFilter(REPLAY_LOG_FILTER)
+
+
+def captured_command(func):
+    """Decorator for the driver commands whose CLI and SNMP traffic can be recorded or replayed
+
+    Driver must implement _create_capture_session(context, command_name) method that
+    returns the capture session or None if the capture is off, and wrap the handlers
+    with the session returned by get_current_capture. Put it below traced_command,
+    so the replay is traced the same way as the device traffic. Responses of the replayed
+    commands are marked with REPLAYED_MARKER.
+    """
+    @wraps(func)
+    def wrapper(driver, context, *args, **kwargs):
+        capture_session = driver._create_capture_session(context, func.__name__)
+        if capture_session is None:
+            return func(driver, context, *args, **kwargs)
+
+        previous_capture = get_current_capture()
+        _local.capture = capture_session
+
+        try:
+            response = func(driver, context, *args, **kwargs)
+        finally:
+            _local.capture = previous_capture
+            capture_session.close()
+
+        if capture_session.mode == CaptureMode.REPLAY:
+            return mark_replayed_response(func.__name__, response, capture_session.transcript_path)
+
+        return response
+
+    return wrapper
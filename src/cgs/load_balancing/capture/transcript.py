@@ -0,0 +1,313 @@
+import datetime
+import glob
+import json
+import numbers
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+TRANSCRIPT_FORMAT_VERSION = 1
+TRANSCRIPT_EXTENSION = ".transcript"
+INDEX_TAIL_SIZE = 256
+CLI_CHANNEL = "cli"
+SNMP_CHANNEL = "snmp"
+# channels whose requests can be served by the records of the requests that differ only in numbers
+FUZZY_MATCH_CHANNELS = (CLI_CHANNEL,)
+
+
+def encode_value(value):
+    """Convert the response to the JSON compatible value, mappings keep their key types and order
+
+    :param value:
+    :return:
+    """
+    if isinstance(value, dict):
+        return {"__items__": [[encode_value(key), encode_value(item)] for key, item in value.items()]}
+
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+
+    if value is None or isinstance(value, numbers.Number) or isinstance(value, type(u"")):
+        return value
+
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+
+    return str(value)
+
+
+def decode_value(value):
+    """
+
+    :param value: value created by encode_value
+    :return:
+    """
+    if isinstance(value, dict) and "__items__" in value:
+        return OrderedDict((_to_key(decode_value(key)), decode_value(item)) for key, item in value["__items__"])
+
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+
+    return value
+
+
+def _to_key(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+def get_request_key(channel, *request):
+    """
+
+    :param str channel: "cli" or "snmp"
+    :param request: command or method name and its arguments
+    :rtype: str
+    """
+    return json.dumps([channel] + [encode_value(item) for item in request], separators=(",", ":"), sort_keys=True)
+
+
+def get_request_channel(key):
+    """
+
+    :param str key: see get_request_key
+    :return: "cli" or "snmp"
+    :rtype: str
+    """
+    return json.loads(key)[0]
+
+
+def get_fuzzy_key(key):
+    """Request key without numbers, used when the exact CLI request is not recorded
+
+    Commands of the replayed command can differ from the recorded ones in timestamps,
+    e.g. in the names of the saved configuration files. SNMP requests are never matched
+    this way, numbers in them are OIDs and indexes.
+    :param str key: see get_request_key
+    :rtype: str
+    """
+    return re.sub(r"\d+", "#", key)
+
+
+def get_transcript_path(capture_path, resource_name, command_name, start_time=None):
+    """
+
+    :param str capture_path: transcripts folder
+    :param str resource_name:
+    :param str command_name:
+    :param float start_time:
+    :rtype: str
+    """
+    created = datetime.datetime.utcfromtimestamp(start_time or time.time()).strftime("%Y%m%d%H%M%S%f")
+    file_name = "{}_{}_{}_{}{}".format(re.sub(r"[^\w.-]", "_", resource_name),
+                                       command_name,
+                                       created,
+                                       threading.current_thread().ident,
+                                       TRANSCRIPT_EXTENSION)
+
+    return os.path.join(capture_path, file_name)
+
+
+def find_transcript(capture_path, resource_name, command_name):
+    """Find the transcript to replay
+
+    :param str capture_path: transcript file or transcripts folder
+    :param str resource_name:
+    :param str command_name:
+    :return: the given file or the latest transcript of the resource command in the folder
+    :rtype: str
+    """
+    if os.path.isfile(capture_path):
+        return capture_path
+
+    pattern = "{}_{}_*{}".format(re.sub(r"[^\w.-]", "_", resource_name), command_name, TRANSCRIPT_EXTENSION)
+    paths = sorted(glob.glob(os.path.join(capture_path, pattern)))
+
+    if not paths:
+        raise Exception("find_transcript",
+                        "There is no transcript of the {} command of {} in {}".format(command_name,
+                                                                                      resource_name,
+                                                                                      capture_path))
+
+    return paths[-1]
+
+
+class TranscriptWriter(object):
+    """Write requests, responses and device latencies as JSON lines
+
+    The file starts with the header line and ends with the index of the record
+    offsets by the request key and the line with the index offset, so the reader
+    doesn't have to parse the whole transcript.
+    """
+
+    def __init__(self, path, header=None, timer=time.time):
+        """
+
+        :param str path:
+        :param dict header: additional header values, e.g. resource and command names
+        :param timer: callable that returns the current time in seconds
+        """
+        folder_path = os.path.dirname(path)
+        if folder_path and not os.path.isdir(folder_path):
+            os.makedirs(folder_path)
+
+        self.path = path
+        self._timer = timer
+        self._start_time = timer()
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+
+        header = dict(header or {}, version=TRANSCRIPT_FORMAT_VERSION, start_time=self._start_time)
+        self._write_line(header)
+
+    def _write_line(self, data):
+        line = json.dumps(data, separators=(",", ":"), sort_keys=True) + "\n"
+        self._file.write(line.encode("utf-8"))
+
+    def record(self, key, start_time, latency, output=None, error=None):
+        """
+
+        :param str key: see get_request_key
+        :param float start_time: time the request was sent
+        :param float latency: seconds the device took to respond
+        :param output: response
+        :param str error: error message if the request failed
+        :return:
+        """
+        data = {"k": key,
+                "t": round(start_time - self._start_time, 6),
+                "l": round(latency, 6)}
+
+        if error is not None:
+            data["e"] = error
+        else:
+            data["o"] = encode_value(output)
+
+        with self._lock:
+            self._index.setdefault(key, []).append(self._file.tell())
+            self._write_line(data)
+
+    def close(self):
+        """Write the index and close the file
+
+        :return:
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+
+            index_offset = self._file.tell()
+            self._write_line({"index": self._index})
+            self._write_line({"index_offset": index_offset})
+            self._file.close()
+
+
+class TranscriptReader(object):
+    """Serve recorded responses in the order they were recorded for each request"""
+
+    def __init__(self, path):
+        """
+
+        :param str path:
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        self._file = open(path, "rb")
+        self.header = json.loads(self._file.readline().decode("utf-8"))
+
+        if self.header.get("version") != TRANSCRIPT_FORMAT_VERSION:
+            raise Exception(self.__class__.__name__,
+                            "Unsupported transcript version {} of {}".format(self.header.get("version"), path))
+
+        self._index = self._read_index()
+        if self._index is None:
+            self._index = self._build_index()
+
+        self._fuzzy_index = {}
+        for key, offsets in self._index.items():
+            if get_request_channel(key) in FUZZY_MATCH_CHANNELS:
+                self._fuzzy_index.setdefault(get_fuzzy_key(key), []).extend(offsets)
+        for offsets in self._fuzzy_index.values():
+            offsets.sort()
+
+    def _read_index(self):
+        """
+
+        :return: index written by the writer or None if the transcript wasn't closed
+        :rtype: dict
+        """
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell()
+        self._file.seek(max(0, size - INDEX_TAIL_SIZE))
+
+        try:
+            tail_lines = self._file.read().decode("utf-8", "replace").splitlines()
+            index_offset = json.loads(tail_lines[-1])["index_offset"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+
+        self._file.seek(index_offset)
+        return json.loads(self._file.readline().decode("utf-8"))["index"]
+
+    def _build_index(self):
+        """Scan the whole transcript, the last line can be incomplete
+
+        :rtype: dict
+        """
+        index = {}
+        self._file.seek(0)
+        self._file.readline()
+
+        while True:
+            offset = self._file.tell()
+            line = self._file.readline()
+            if not line:
+                break
+
+            try:
+                index.setdefault(json.loads(line.decode("utf-8"))["k"], []).append(offset)
+            except (ValueError, KeyError, TypeError):
+                break
+
+        return index
+
+    @property
+    def requests_count(self):
+        """
+
+        :rtype: int
+        """
+        return sum(len(offsets) for offsets in self._index.values())
+
+    def next_record(self, key):
+        """Get the next record of the request, the last one is repeated when all of them were served
+
+        Records of the CLI requests that differ only in numbers are used if the CLI request
+        is not recorded, other requests must match exactly.
+        :param str key: see get_request_key
+        :return: {"t": offset from the start, "l": latency, "o": encoded output or "e": error} or None
+        :rtype: dict
+        """
+        with self._lock:
+            offsets = self._index.get(key)
+            if not offsets and get_request_channel(key) in FUZZY_MATCH_CHANNELS:
+                key = get_fuzzy_key(key)
+                offsets = self._fuzzy_index.get(key)
+
+            if not offsets:
+                return None
+
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+
+            self._file.seek(offsets[min(position, len(offsets) - 1)])
+            return json.loads(self._file.readline().decode("utf-8"))
+
+    def close(self):
+        """
+
+        :return:
+        """
+        self._file.close()
@@ -0,0 +1,124 @@
+import time
+from contextlib import contextmanager
+
+from cgs.load_balancing.helpers.concurrency import format_concurrency_stats
+
+# errors reported by the device for the command itself, they don't mean the device is overloaded
+COMMAND_ERROR_CLASS_NAMES = frozenset(["CommandExecutionException"])
+# seconds, shorter waits for the CLI session slot are not logged
+SLOT_WAIT_LOG_THRESHOLD = 0.01
+
+
+def is_session_error(error):
+    """
+
+    :param Exception error:
+    :return: whether the error is a timeout or a session failure
+    :rtype: bool
+    """
+    return type(error).__name__ not in COMMAND_ERROR_CLASS_NAMES
+
+
+def record_latency(concurrency_limit, resource_name, logger, start_time, error=False):
+    """Report the command to the concurrency limit and log the limit change
+
+    :param cgs.load_balancing.helpers.concurrency.AdaptiveConcurrencyLimit concurrency_limit:
+    :param str resource_name:
+    :param logging.Logger logger:
+    :param float start_time:
+    :param bool error: the command failed because of the error or timeout of the session
+    :return:
+    """
+    previous_limit = concurrency_limit.record(time.time() - start_time, error)
+
+    if previous_limit is not None:
+        logger.info("Adaptive concurrency limit of {} changed from {} to {}, {}".format(
+            resource_name, previous_limit, concurrency_limit.limit, format_concurrency_stats(concurrency_limit.stats)))
+
+
+class LatencyMeasuringCliService(object):
+    """CLI service that reports duration and session errors of every command to the concurrency limit"""
+
+    def __init__(self, cli_service, concurrency_limit, resource_name, logger):
+        """
+
+        :param cloudshell.cli.cli_service.CliService cli_service:
+        :param cgs.load_balancing.helpers.concurrency.AdaptiveConcurrencyLimit concurrency_limit:
+        :param str resource_name:
+        :param logging.Logger logger:
+        """
+        self._cli_service = cli_service
+        self._concurrency_limit = concurrency_limit
+        self._resource_name = resource_name
+        self._logger = logger
+
+    def __getattr__(self, name):
+        return getattr(self._cli_service, name)
+
+    def _record(self, start_time, error=False):
+        record_latency(self._concurrency_limit, self._resource_name, self._logger, start_time, error)
+
+    def send_command(self, command, *args, **kwargs):
+        start_time = time.time()
+
+        try:
+            output = self._cli_service.send_command(command, *args, **kwargs)
+        except Exception as e:
+            self._record(start_time, is_session_error(e))
+            raise
+
+        self._record(start_time)
+        return output
+
+    @contextmanager
+    def enter_mode(self, command_mode):
+        with self._cli_service.enter_mode(command_mode) as cli_service:
+            yield LatencyMeasuringCliService(cli_service, self._concurrency_limit, self._resource_name, self._logger)
+
+
+class LatencyMeasuringCliHandler(object):
+    """CLI handler that measures the commands of its CLI services, the rest is delegated to the CLI handler
+
+    CLI services are checked out within the session slots of the concurrency limit, so
+    the number of sessions used at the same time follows the adaptive limit and not the
+    size of the CLI session pool. Time spent waiting for the slot is not counted as latency.
+    """
+
+    def __init__(self, cli_handler, concurrency_limit, resource_name, logger):
+        """
+
+        :param cloudshell.cgs.cli.handler.CgsCliHandler cli_handler:
+        :param cgs.load_balancing.helpers.concurrency.AdaptiveConcurrencyLimit concurrency_limit:
+        :param str resource_name:
+        :param logging.Logger logger:
+        """
+        self._cli_handler = cli_handler
+        self._concurrency_limit = concurrency_limit
+        self._resource_name = resource_name
+        self._logger = logger
+
+    def __getattr__(self, name):
+        return getattr(self._cli_handler, name)
+
+    @contextmanager
+    def get_cli_service(self, command_mode):
+        with self._concurrency_limit.session_slot() as wait_time:
+            if wait_time >= SLOT_WAIT_LOG_THRESHOLD:
+                self._logger.info("Waited {:.3f} sec for a CLI session of {}, adaptive concurrency limit {}".format(
+                    wait_time, self._resource_name, self._concurrency_limit.limit))
+
+            start_time = time.time()
+            entered = False
+
+            try:
+                with self._cli_handler.get_cli_service(command_mode) as cli_service:
+                    entered = True
+                    yield LatencyMeasuringCliService(cli_service, self._concurrency_limit, self._resource_name,
+                                                     self._logger)
+            except Exception:
+                if not entered:
+                    # login failed or timed out
+                    record_latency(self._concurrency_limit, self._resource_name, self._logger, start_time,
+                                   error=True)
+                raise
+
@@ -0,0 +1,194 @@
+import threading
+
+from cloudshell.cli.command_mode_helper import CommandModeHelper
+from cloudshell.cli.session_pool_manager import SessionPoolManager
+
+
+class CliSessionPool(SessionPoolManager):
+    """Session pool of the driver CLI that gives access to its idle sessions
+
+    Idle sessions are taken under the pool condition, so they never race with
+    the commands that get sessions from the pool at the same time.
+    """
+
+    def get_idle_session(self):
+        """Take an idle session out of the pool, a new session is never opened
+
+        :return: session or None if all sessions are in use
+        :rtype: cloudshell.cli.session.session.Session
+        """
+        with self._session_condition:
+            if self._pool.empty():
+                return None
+
+            return self._pool.get(False)
+
+    def can_open_session(self):
+        """
+
+        :return: whether the pool has room for one more session
+        :rtype: bool
+        """
+        with self._session_condition:
+            return self._session_manager.existing_sessions_count() < self._max_pool_size
+
+    def close_idle_sessions(self, logger):
+        """Disconnect and remove all idle sessions, sessions in use are left to the commands
+
+        :param logging.Logger logger:
+        :return:
+        """
+        session = self.get_idle_session()
+
+        while session is not None:
+            try:
+                self.remove_session(session, logger)
+                session.disconnect()
+            except Exception:
+                logger.debug("Unable to close CLI session", exc_info=True)
+
+            session = self.get_idle_session()
+
+
+class CliSessionWarmPool(object):
+    """Keep a number of logged in CLI sessions in the driver session pool
+
+    Sessions are opened in the background right after the driver initialization and
+    kept alive by sending an empty line to the idle ones. Sessions in use are skipped,
+    so the keepalive never waits for the pool or opens sessions on its own. Dead
+    sessions are removed from the pool and replaced while the pool has room.
+    """
+
+    WARM_UP_TIMEOUT = 120
+    STOP_TIMEOUT = 10
+
+    def __init__(self, session_pool, cli_handler, size, logger, keepalive_interval=60):
+        """
+
+        :param CliSessionPool session_pool: session pool of the CLI used by the CLI handler
+        :param cloudshell.cgs.cli.handler.CgsCliHandler cli_handler:
+        :param int size: number of sessions to keep, should not exceed the session pool size
+        :param logging.Logger logger:
+        :param float keepalive_interval: seconds between keepalive rounds
+        """
+        self._session_pool = session_pool
+        self._cli_handler = cli_handler
+        self._size = size
+        self._logger = logger
+        self._keepalive_interval = keepalive_interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Open sessions and start keepalive loop in the background thread
+
+        :return:
+        """
+        self._thread = threading.Thread(target=self._run, name="CliSessionWarmPool")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop keepalive loop and close idle sessions
+
+        Waits for the background thread at most STOP_TIMEOUT seconds, the daemon
+        thread is left to finish the current login or keepalive on its own.
+        :return:
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(self.STOP_TIMEOUT)
+
+        self._session_pool.close_idle_sessions(self._logger)
+
+    def _run(self):
+        self._warm_up()
+        while not self._stopped.wait(self._keepalive_interval):
+            self._keepalive()
+
+    def _open_sessions(self, count):
+        """Check out sessions at the same time so the pool has to open each of them
+
+        :param int count:
+        :return:
+        """
+        checked_out = threading.Semaphore(0)
+        release = threading.Event()
+        threads = []
+
+        def _open_session():
+            try:
+                with self._cli_handler.get_cli_service(self._cli_handler.enable_mode):
+                    checked_out.release()
+                    release.wait(self.WARM_UP_TIMEOUT)
+            except Exception:
+                checked_out.release()
+                self._logger.warning("Unable to open CLI session", exc_info=True)
+
+        for _ in range(count):
+            thread = threading.Thread(target=_open_session)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        for _ in threads:
+            checked_out.acquire()
+
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    def _warm_up(self):
+        self._logger.info("Opening {} CLI sessions".format(self._size))
+        self._open_sessions(self._size)
+        self._logger.info("CLI sessions are opened")
+
+    def _get_prompt(self):
+        """Prompts of the enable mode and the modes around it, the same as the CLI expects on a session checkout
+
+        :rtype: str
+        """
+        return r"|".join(CommandModeHelper.defined_modes_by_prompt(self._cli_handler.enable_mode).keys())
+
+    def _keepalive(self):
+        """Send keepalive to the idle sessions, replace the dead ones
+
+        Sessions are taken from the pool one by one and returned right after the
+        keepalive, a command that needs a session meanwhile gets another idle one.
+        Pool keeps idle sessions in the FIFO order, the round ends when it gets
+        a session it has already touched.
+        :return:
+        """
+        prompt = self._get_prompt()
+        touched_sessions = set()
+        dead_count = 0
+
+        for _ in range(self._size):
+            if self._stopped.is_set():
+                break
+
+            session = self._session_pool.get_idle_session()
+            if session is None:
+                break
+
+            if session in touched_sessions:
+                self._session_pool.return_session(session, self._logger)
+                break
+
+            touched_sessions.add(session)
+            try:
+                session.probe_for_prompt(prompt, self._logger)
+            except Exception:
+                self._logger.warning("CLI session keepalive failed, closing the session", exc_info=True)
+                dead_count += 1
+                self._session_pool.remove_session(session, self._logger)
+                try:
+                    session.disconnect()
+                except Exception:
+                    self._logger.debug("Unable to close CLI session", exc_info=True)
+            else:
+                self._session_pool.return_session(session, self._logger)
+
+        if dead_count and not self._stopped.is_set() and self._session_pool.can_open_session():
+            self._logger.info("Replacing {} dead CLI sessions".format(dead_count))
+            self._open_sessions(dead_count)
@@ -1,9 +1,64 @@
 from cloudshell.cgs.flows.autoload import AbstractCgsSnmpAutoloadFlow
 
+from cgs.load_balancing.autoload.ports import PortDiscoveryMode
 from cgs.load_balancing.autoload.snmp import CgsLoadBalancerSNMPAutoload
+from cgs.load_balancing.helpers.tracing import trace_context_manager
+from cgs.load_balancing.helpers.tracing import trace_span
 
 
 class CgsLoadBalancerSnmpAutoloadFlow(AbstractCgsSnmpAutoloadFlow):
+    def __init__(self, snmp_handler, logger, bulk_max_repetitions=None, state_store=None, state_key=None,
+                 incremental=False, snmp_session_factory=None, workers=1,
+                 port_discovery_mode=PortDiscoveryMode.STANDARD):
+        """
+
+        :param cloudshell.cgs.snmp.handler.CgsSnmpHandler snmp_handler:
+        :param logging.Logger logger:
+        :param int bulk_max_repetitions: max-repetitions for the GETBULK table walks
+        :param cgs.load_balancing.autoload.state.AutoloadStateStore state_store:
+        :param state_key: key of the resource in the state store
+        :param bool incremental: whether to re-discover only changed parts of the device structure
+        :param cgs.load_balancing.snmp.session.SnmpSessionFactory snmp_session_factory:
+        :param int workers: size of the thread pool for the discovery phases
+        :param str port_discovery_mode: one of PortDiscoveryMode
+        """
+        super(CgsLoadBalancerSnmpAutoloadFlow, self).__init__(snmp_handler, logger)
+        self._bulk_max_repetitions = bulk_max_repetitions
+        self._state_store = state_store
+        self._state_key = state_key
+        self._incremental = incremental
+        self._snmp_session_factory = snmp_session_factory
+        self._workers = workers
+        self._port_discovery_mode = port_discovery_mode
+
     @property
     def snmp_autoload_class(self):
         return CgsLoadBalancerSNMPAutoload
+
+    def execute_flow(self, supported_os, shell_name, shell_type, resource_name):
+        """
+
+        :param supported_os:
+        :param shell_name:
+        :param shell_type:
+        :param resource_name:
+        :return:
+        """
+        snmp_service_manager = self._snmp_handler.get_snmp_service()
+
+        with trace_context_manager(snmp_service_manager, "snmp_enable", "snmp_disable") as snmp_service:
+            snmp_autoload = self.snmp_autoload_class(snmp_handler=snmp_service,
+                                                     shell_name=shell_name,
+                                                     shell_type=shell_type,
+                                                     resource_name=resource_name,
+                                                     logger=self._logger,
+                                                     bulk_max_repetitions=self._bulk_max_repetitions,
+                                                     state_store=self._state_store,
+                                                     state_key=self._state_key,
+                                                     incremental=self._incremental,
+                                                     snmp_session_factory=self._snmp_session_factory,
+                                                     workers=self._workers,
+                                                     port_discovery_mode=self._port_discovery_mode)
+
+            with trace_span("snmp_discovery"):
+                return snmp_autoload.discover(supported_os)
@@ -0,0 +1,340 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class AsyncLogHandler(logging.Handler):
+    """Write log records to the target handlers in the background thread
+
+    The command thread only puts the record to the bounded queue. When the queue is
+    full the record is dropped (error records wait for a short time first) and the
+    number of the dropped records is logged as soon as the queue has room again.
+    Messages longer than payload_max_length are truncated by the command thread, so
+    the queue holds at most queue_size truncated messages. The full text is written
+    to a separate file in payload_path by the background thread if it is set, while
+    the full texts waiting in the queue don't exceed payload_queue_size chars.
+    """
+
+    ERROR_PUT_TIMEOUT = 0.5
+    PAYLOAD_QUEUE_SIZE = 16 * 1024 * 1024
+    CLOSE_TIMEOUT = 10
+    _STOP = object()
+
+    def __init__(self, target_handlers, queue_size=10000, payload_max_length=0, payload_path=None,
+                 payload_queue_size=PAYLOAD_QUEUE_SIZE):
+        """
+
+        :param list[logging.Handler] target_handlers: e.g. the file handler of the resource log
+        :param int queue_size: max number of records waiting to be written
+        :param int payload_max_length: max message length written to the log, 0 means no limit
+        :param str payload_path: folder for the full text of the long messages, they are only truncated if not set
+        :param int payload_queue_size: max number of chars of the full texts waiting to be written,
+            long messages above it are only truncated
+        """
+        super(AsyncLogHandler, self).__init__()
+        self.target_handlers = list(target_handlers)
+        self.payload_max_length = payload_max_length
+        self.payload_path = payload_path
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._payload_ids = itertools.count(1)
+        self.payload_queue_size = payload_queue_size
+        self._queued_payload_size = 0
+        self.dropped_count = 0
+        self.handled_count = 0
+        self._reported_dropped_count = 0
+        self.closed = False
+
+        self._thread = threading.Thread(target=self._run, name="AsyncLogHandler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        try:
+            # arguments can be changed by the command thread before the record is written
+            record.msg = record.getMessage()
+            record.args = None
+            self._limit_payload(record)
+
+            if self.closed:
+                self._handle_record(record)
+            elif record.levelno >= logging.ERROR:
+                self._queue.put(record, timeout=self.ERROR_PUT_TIMEOUT)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self._release_payload(record)
+            with self._lock:
+                self.dropped_count += 1
+        except Exception:
+            self._release_payload(record)
+            self.handleError(record)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                if record is self._STOP:
+                    break
+
+                self._report_dropped(record)
+                self._handle_record(record)
+            except Exception:
+                self.handleError(record)
+            finally:
+                self._queue.task_done()
+
+    def _handle_record(self, record):
+        """Write the full text of the truncated message and the record
+
+        :param logging.LogRecord record: record prepared by _limit_payload
+        """
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            try:
+                self._write_payload(record.payload_file_path, payload)
+            except (IOError, OSError):
+                record.msg = self._get_truncated_message(payload)
+            finally:
+                self._release_payload(record)
+
+        self._handle(record)
+
+    def _handle(self, record):
+        self.handled_count += 1
+        for handler in self.target_handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _report_dropped(self, record):
+        """
+
+        :param logging.LogRecord record: the next record, the report uses its logger name
+        :return:
+        """
+        with self._lock:
+            dropped_count = self.dropped_count - self._reported_dropped_count
+            self._reported_dropped_count = self.dropped_count
+
+        if dropped_count:
+            self._handle(logging.LogRecord(name=record.name,
+                                           level=logging.WARNING,
+                                           pathname=__file__,
+                                           lineno=0,
+                                           msg="{} log records were dropped, the log queue is full".format(
+                                               dropped_count),
+                                           args=None,
+                                           exc_info=None))
+
+    @staticmethod
+    def _write_payload(path, payload):
+        """
+
+        :param str path: file for the full message
+        :param str payload: full message
+        :return:
+        """
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        with open(path, "wb") as payload_file:
+            payload_file.write(payload.encode("utf-8") if not isinstance(payload, bytes) else payload)
+
+    def _get_truncated_message(self, message):
+        """
+
+        :param str message:
+        :rtype: str
+        """
+        return "{}... [truncated {} of {} chars]".format(message[:self.payload_max_length],
+                                                        len(message) - self.payload_max_length,
+                                                        len(message))
+
+    def _limit_payload(self, record):
+        """Truncate the long message in the command thread
+
+        The full text is attached to the record as payload if it is written to the file,
+        the file is written by the background thread.
+        :param logging.LogRecord record:
+        :return:
+        """
+        message = record.msg
+        payload_max_length = self.payload_max_length
+        if not payload_max_length or len(message) <= payload_max_length:
+            return
+
+        payload_path = self.payload_path
+        if payload_path:
+            with self._lock:
+                reserved = self._queued_payload_size + len(message) <= self.payload_queue_size
+                if reserved:
+                    self._queued_payload_size += len(message)
+
+            if reserved:
+                file_name = "{}_{}_{}.log".format(time.strftime("%Y%m%d%H%M%S", time.localtime(record.created)),
+                                                  record.thread,
+                                                  next(self._payload_ids))
+                record.payload = message
+                record.payload_file_path = os.path.join(payload_path, file_name)
+                record.msg = "{}... [{} chars, full text in {}]".format(message[:payload_max_length],
+                                                                       len(message),
+                                                                       record.payload_file_path)
+                return
+
+        record.msg = self._get_truncated_message(message)
+
+    def _release_payload(self, record):
+        """Release the queue size reserved for the full text of the record
+
+        :param logging.LogRecord record:
+        :return:
+        """
+        payload = getattr(record, "payload", None)
+        if payload is None:
+            return
+
+        record.payload = None
+        with self._lock:
+            self._queued_payload_size -= len(payload)
+
+    def flush(self):
+        """Wait until the queued records are written
+
+        :return:
+        """
+        if self._thread.is_alive():
+            self._queue.join()
+
+        for handler in self.target_handlers:
+            handler.flush()
+
+    def close(self):
+        """Write the queued records and stop the background thread, target handlers are not closed
+
+        Records emitted after the handler is closed are written synchronously.
+        :return:
+        """
+        self.closed = True
+
+        if self._thread.is_alive():
+            try:
+                self._queue.put(self._STOP, timeout=self.CLOSE_TIMEOUT)
+            except queue.Full:
+                pass
+            self._thread.join(self.CLOSE_TIMEOUT)
+
+        for handler in self.target_handlers:
+            handler.flush()
+
+        super(AsyncLogHandler, self).close()
+
+    @property
+    def stats(self):
+        """
+
+        :rtype: dict
+        """
+        return {"queued": self._queue.qsize(),
+                "queued_payload_size": self._queued_payload_size,
+                "handled": self.handled_count,
+                "dropped": self.dropped_count}
+
+
+class AsyncLogHandlers(object):
+    """Keeps one AsyncLogHandler for every set of log handlers, e.g. for the log file of every resource"""
+
+    def __init__(self):
+        self._handlers = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _iter_loggers(logger):
+        """Logger and its ancestors its records are propagated to, except the root logger
+
+        :param logging.Logger logger:
+        """
+        while logger is not None and logger is not logging.root:
+            yield logger
+            if not logger.propagate:
+                break
+            logger = logger.parent
+
+    def install(self, logger, queue_size, payload_max_length, payload_path):
+        """Replace the handlers of the logger with the async handler that writes to them
+
+        Handlers that were added again after the previous call are replaced as well.
+        Queue size is applied when the async handler is created.
+        :param logging.Logger logger:
+        :param int queue_size:
+        :param int payload_max_length:
+        :param str payload_path:
+        :return:
+        """
+        for current_logger in self._iter_loggers(logger):
+            # async handlers closed with the previous driver instance
+            for handler in list(current_logger.handlers):
+                if isinstance(handler, AsyncLogHandler) and handler.closed:
+                    self._replace_with_targets(current_logger, handler)
+
+            target_handlers = [handler for handler in current_logger.handlers
+                               if not isinstance(handler, AsyncLogHandler)]
+            if not target_handlers:
+                continue
+
+            key = tuple(sorted(id(handler) for handler in target_handlers))
+
+            with self._lock:
+                async_handler = self._handlers.get(key)
+                if async_handler is None:
+                    async_handler = self._handlers[key] = AsyncLogHandler(target_handlers, queue_size=queue_size)
+
+            async_handler.payload_max_length = payload_max_length
+            async_handler.payload_path = payload_path
+
+            for handler in target_handlers:
+                current_logger.removeHandler(handler)
+            current_logger.addHandler(async_handler)
+
+    def uninstall(self, logger):
+        """Put the target handlers back instead of the async handlers
+
+        :param logging.Logger logger:
+        :return:
+        """
+        for current_logger in self._iter_loggers(logger):
+            for handler in list(current_logger.handlers):
+                if isinstance(handler, AsyncLogHandler):
+                    handler.flush()
+                    self._replace_with_targets(current_logger, handler)
+
+    @staticmethod
+    def _replace_with_targets(logger, async_handler):
+        """
+
+        :param logging.Logger logger:
+        :param AsyncLogHandler async_handler:
+        :return:
+        """
+        logger.removeHandler(async_handler)
+        for handler in async_handler.target_handlers:
+            logger.addHandler(handler)
+
+    def close_all(self):
+        """
+
+        :return:
+        """
+        with self._lock:
+            handlers = list(self._handlers.values())
+            self._handlers.clear()
+
+        for handler in handlers:
+            handler.close()
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TtlLruCache(object):
+    """Thread-safe mapping with LRU eviction and per-entry time to live"""
+
+    def __init__(self, max_size, ttl, timer=time.time):
+        """
+
+        :param int max_size: maximum number of entries, the least recently used one is evicted first
+        :param float ttl: entry time to live in seconds, 0 or None means entries never expire
+        :param timer: callable that returns the current time in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _is_expired(self, created):
+        return bool(self.ttl) and self._timer() - created > self.ttl
+
+    def get(self, key, default=None):
+        """Get value and mark it as recently used
+
+        :param key:
+        :param default: value returned on a miss
+        :return:
+        """
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None or self._is_expired(entry[1]):
+                if entry is not None:
+                    self.evictions += 1
+                self.misses += 1
+                return default
+
+            self._data[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key, default=None):
+        """Get value without updating the LRU order and the hit/miss counters
+
+        :param key:
+        :param default:
+        :return:
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._is_expired(entry[1]):
+                return default
+
+            return entry[0]
+
+    def set(self, key, value):
+        """
+
+        :param key:
+        :param value:
+        :return:
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, self._timer())
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """
+
+        :param key:
+        :param default:
+        :return:
+        """
+        with self._lock:
+            entry = self._data.pop(key, None)
+
+        return default if entry is None else entry[0]
+
+    def keys(self):
+        """Snapshot of the keys, including the expired ones
+
+        :rtype: list
+        """
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def stats(self):
+        """Cache counters, useful to check whether the cache is actually used
+
+        :rtype: dict
+        """
+        return {"size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions}
@@ -0,0 +1,249 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def get_percentile(sorted_values, fraction):
+    """Nearest-rank percentile
+
+    :param list[float] sorted_values:
+    :param float fraction: e.g. 0.9 for the 90th percentile
+    :return: percentile or None if there are no values
+    :rtype: float
+    """
+    if not sorted_values:
+        return None
+
+    position = int(math.ceil(fraction * len(sorted_values))) - 1
+    return sorted_values[min(max(position, 0), len(sorted_values) - 1)]
+
+
+def format_concurrency_stats(stats):
+    """
+
+    :param dict stats: see AdaptiveConcurrencyLimit.stats
+    :rtype: str
+    """
+    latencies = " ".join("{} {:.3f}s".format(name, stats[name]) for name in ("p50", "p90", "p99")
+                         if stats[name] is not None)
+
+    template = ("limit {limit} ({floor}..{ceiling}), {sessions} CLI sessions in use, CLI latency {latencies}, "
+                "{errors} errors in {commands} commands")
+    return template.format(latencies=latencies or "n/a", **stats)
+
+
+class AdaptiveConcurrencyLimit(object):
+    """Limit of the concurrent operations on one resource adjusted by the observed CLI latency (AIMD)
+
+    Latencies are evaluated in windows of window_size commands. The limit grows by one
+    after a window without errors whose 90th percentile latency stays within
+    latency_tolerance times the baseline latency (the lowest median latency seen, it
+    drifts up slowly so a permanently slower device is learned again). The limit is
+    multiplied by decrease_factor on the first error or timeout of the window or when
+    the window latency is above the tolerance. It never leaves the floor..ceiling range.
+
+    CLI sessions are checked out with session_slot, so no more than limit sessions are
+    used at the same time; when the limit shrinks new checkouts wait until enough
+    sessions are returned.
+    """
+
+    WINDOW_SIZE = 20
+    HISTORY_SIZE = 200
+    LATENCY_TOLERANCE = 2.0
+    DECREASE_FACTOR = 0.5
+    BASELINE_DRIFT = 1.05
+    MIN_BASELINE_LATENCY = 0.01
+
+    def __init__(self, floor, ceiling, on_change=None, window_size=WINDOW_SIZE, history_size=HISTORY_SIZE,
+                 latency_tolerance=LATENCY_TOLERANCE, decrease_factor=DECREASE_FACTOR):
+        """
+
+        :param int floor: minimal limit
+        :param int ceiling: maximal limit, e.g. the configured Sessions Concurrency Limit
+        :param on_change: callable that takes the new limit
+        :param int window_size: number of commands in the evaluation window
+        :param int history_size: number of the last commands used for the latency percentiles
+        :param float latency_tolerance:
+        :param float decrease_factor:
+        """
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self._on_change = on_change
+        self._window_size = window_size
+        self._latency_tolerance = latency_tolerance
+        self._decrease_factor = decrease_factor
+        self._limit = self.floor
+        self._baseline_latency = None
+        self._history = deque(maxlen=history_size)
+        self._window = []
+        self._window_errors = 0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._sessions_count = 0
+        self._thread_slots = threading.local()
+        self.commands_count = 0
+        self.errors_count = 0
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def sessions_count(self):
+        """Number of CLI sessions checked out with session_slot"""
+        return self._sessions_count
+
+    @contextmanager
+    def session_slot(self):
+        """Hold a slot for one CLI session, wait while limit sessions are in use
+
+        A thread that already holds a slot doesn't take another one, so a nested
+        session checkout never waits for the session of its own thread.
+        :return: context manager that yields the number of seconds spent waiting for the slot
+        """
+        if getattr(self._thread_slots, "depth", 0):
+            self._thread_slots.depth += 1
+            try:
+                yield 0.0
+            finally:
+                self._thread_slots.depth -= 1
+            return
+
+        start_time = time.time()
+        with self._condition:
+            while self._sessions_count >= self._limit:
+                self._condition.wait()
+            self._sessions_count += 1
+
+        self._thread_slots.depth = 1
+        try:
+            yield time.time() - start_time
+        finally:
+            self._thread_slots.depth = 0
+            with self._condition:
+                self._sessions_count -= 1
+                self._condition.notify_all()
+
+    def _set_limit(self, limit):
+        """
+
+        :param int limit:
+        :return: previous limit if the limit was changed, None otherwise
+        :rtype: int
+        """
+        limit = min(max(limit, self.floor), self.ceiling)
+        if limit == self._limit:
+            return None
+
+        previous_limit, self._limit = self._limit, limit
+        self._condition.notify_all()
+        return previous_limit
+
+    def _evaluate_window(self):
+        """
+
+        :return: previous limit if the limit was changed, None otherwise
+        :rtype: int
+        """
+        latencies = sorted(self._window)
+        median_latency = get_percentile(latencies, 0.5)
+
+        if self._baseline_latency is None:
+            self._baseline_latency = median_latency
+        else:
+            self._baseline_latency = min(median_latency, self._baseline_latency * self.BASELINE_DRIFT)
+
+        allowed_latency = max(self._baseline_latency, self.MIN_BASELINE_LATENCY) * self._latency_tolerance
+
+        if self._window_errors:
+            # the limit was already decreased on the first error of the window
+            return None
+
+        if get_percentile(latencies, 0.9) > allowed_latency:
+            return self._set_limit(int(self._limit * self._decrease_factor))
+
+        return self._set_limit(self._limit + 1)
+
+    def record(self, latency, error=False):
+        """Record the command result and adjust the limit
+
+        :param float latency: seconds the command took
+        :param bool error: the command failed because of the error or timeout of the session
+        :return: previous limit if the limit was changed, None otherwise
+        :rtype: int
+        """
+        with self._lock:
+            self.commands_count += 1
+            self._history.append(latency)
+            self._window.append(latency)
+            previous_limit = None
+
+            if error:
+                self.errors_count += 1
+                self._window_errors += 1
+                if self._window_errors == 1:
+                    previous_limit = self._set_limit(int(self._limit * self._decrease_factor))
+
+            if len(self._window) >= self._window_size:
+                previous_limit = self._evaluate_window() or previous_limit
+                self._window = []
+                self._window_errors = 0
+
+            limit = self._limit
+
+        if previous_limit is not None and self._on_change is not None:
+            self._on_change(limit)
+
+        return previous_limit
+
+    @property
+    def stats(self):
+        """
+
+        :return: limit, range, latency percentiles in seconds of the last commands and counters
+        :rtype: dict
+        """
+        with self._lock:
+            latencies = sorted(self._history)
+
+        return {"limit": self._limit,
+                "floor": self.floor,
+                "ceiling": self.ceiling,
+                "sessions": self._sessions_count,
+                "p50": get_percentile(latencies, 0.5),
+                "p90": get_percentile(latencies, 0.9),
+                "p99": get_percentile(latencies, 0.99),
+                "commands": self.commands_count,
+                "errors": self.errors_count}
+
+
+class AdaptiveConcurrencyLimits(object):
+    """Keeps AdaptiveConcurrencyLimit for every resource"""
+
+    def __init__(self):
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def get_limit(self, resource_name, floor, ceiling, on_change=None):
+        """Get limit of the resource, it is created again if its range was changed
+
+        :param str resource_name:
+        :param int floor:
+        :param int ceiling:
+        :param on_change: callable that takes the new limit
+        :rtype: AdaptiveConcurrencyLimit
+        """
+        floor = max(1, floor)
+        ceiling = max(floor, ceiling)
+
+        with self._lock:
+            concurrency_limit = self._limits.get(resource_name)
+
+            if concurrency_limit is None or (concurrency_limit.floor, concurrency_limit.ceiling) != (floor, ceiling):
+                concurrency_limit = self._limits[resource_name] = AdaptiveConcurrencyLimit(floor=floor,
+                                                                                           ceiling=ceiling,
+                                                                                           on_change=on_change)
+
+        return concurrency_limit
@@ -0,0 +1,123 @@
+from difflib import SequenceMatcher
+
+COMMENT_PREFIXES = ("!", "#")
+NEGATION_PREFIX = "no "
+EXIT_BLOCK_COMMAND = "exit"
+
+
+def parse_config(config):
+    """Parse configuration into the tree of lines, nesting is defined by the indentation
+
+    :param str config: configuration text
+    :return: [(line, children), ...], lines are stripped, children have the same structure,
+        order and duplicates of the lines are kept, comments and empty lines are skipped
+    :rtype: list[tuple]
+    """
+    root = []
+    # (indentation, children of the block)
+    blocks = [(-1, root)]
+
+    for line in config.splitlines():
+        stripped_line = line.strip()
+
+        if not stripped_line or stripped_line.startswith(COMMENT_PREFIXES):
+            continue
+
+        indentation = len(line) - len(line.lstrip())
+        while blocks[-1][0] >= indentation:
+            blocks.pop()
+
+        children = []
+        blocks[-1][1].append((stripped_line, children))
+        blocks.append((indentation, children))
+
+    return root
+
+
+def configs_match(config, other_config):
+    """Compare configurations line by line, ignoring comments, empty lines and the indentation width
+
+    :param str config:
+    :param str other_config:
+    :rtype: bool
+    """
+    return parse_config(config) == parse_config(other_config)
+
+
+def negate_command(command):
+    """
+
+    :param str command:
+    :rtype: str
+    """
+    if command.startswith(NEGATION_PREFIX):
+        return command[len(NEGATION_PREFIX):]
+
+    return NEGATION_PREFIX + command
+
+
+def _build_add_commands(line, children):
+    """Commands that create the line with all its sub-lines, every nested block ends with its own exit
+
+    :param str line:
+    :param list[tuple] children:
+    :rtype: list[str]
+    """
+    commands = [line]
+
+    if children:
+        for child_line, child_children in children:
+            commands.extend(_build_add_commands(child_line, child_children))
+        commands.append(EXIT_BLOCK_COMMAND)
+
+    return commands
+
+
+def _build_block_diff_commands(running_lines, target_lines):
+    """Commands that turn the lines of one block (or the top level) into the target ones
+
+    Lines are matched in order, with duplicates, so a reordered or repeated line is removed
+    and added again. Removals go before additions so that resources released by removed
+    lines (e.g. ports of the deleted LB group) can be reused by added ones.
+    :param list[tuple] running_lines:
+    :param list[tuple] target_lines:
+    :rtype: list[str]
+    """
+    remove_commands = []
+    add_commands = []
+    matcher = SequenceMatcher(None,
+                              [line for line, _ in running_lines],
+                              [line for line, _ in target_lines],
+                              autojunk=False)
+
+    for tag, running_start, running_end, target_start, target_end in matcher.get_opcodes():
+        if tag == "equal":
+            for (line, running_children), (_, target_children) in zip(running_lines[running_start:running_end],
+                                                                       target_lines[target_start:target_end]):
+                block_commands = _build_block_diff_commands(running_children, target_children)
+                if block_commands:
+                    add_commands.append(line)
+                    add_commands.extend(block_commands)
+                    add_commands.append(EXIT_BLOCK_COMMAND)
+            continue
+
+        for line, _ in running_lines[running_start:running_end]:
+            remove_commands.append(negate_command(line))
+
+        for line, children in target_lines[target_start:target_end]:
+            add_commands.extend(_build_add_commands(line, children))
+
+    return remove_commands + add_commands
+
+
+def build_diff_commands(running_config, target_config):
+    """Build configuration commands that turn the running configuration into the target one
+
+    The block hierarchy is kept, changed sub-lines are sent inside their block and every
+    block is left with its own exit. Removed lines and blocks are negated with the "no"
+    prefix, so the result must be verified against the target configuration.
+    :param str running_config:
+    :param str target_config:
+    :rtype: list[str]
+    """
+    return _build_block_diff_commands(parse_config(running_config), parse_config(target_config))
@@ -0,0 +1,350 @@
+import hashlib
+import os
+import posixpath
+import re
+import socket
+import struct
+import threading
+import uuid
+
+try:
+    from urllib2 import urlopen
+    from urlparse import urlparse
+except ImportError:
+    from urllib.request import urlopen
+    from urllib.parse import urlparse
+
+# digest length in hex characters for the checksums without the algorithm prefix
+CHECKSUM_ALGORITHMS = {32: "md5", 40: "sha1", 64: "sha256"}
+DEFAULT_CHECKSUM_ALGORITHM = "sha256"
+URL_SCHEMES = ("http", "https", "ftp", "file")
+TFTP_SCHEME = "tftp"
+# seconds to wait for each TFTP packet before it is requested again
+TFTP_PACKET_TIMEOUT = 5
+
+
+def parse_checksum(checksum):
+    """Parse "sha256:<hex>" or the plain hex digest, the algorithm is guessed by the digest length
+
+    :param str checksum:
+    :return: algorithm name and lower case hex digest
+    :rtype: tuple[str, str]
+    """
+    algorithm, _, digest = checksum.strip().rpartition(":")
+    digest = digest.lower()
+
+    if not algorithm:
+        algorithm = CHECKSUM_ALGORITHMS.get(len(digest))
+        if algorithm is None:
+            raise ValueError("Unknown checksum format: {}".format(checksum))
+
+    algorithm = algorithm.lower()
+    try:
+        hashlib.new(algorithm)
+    except ValueError:
+        raise ValueError("Unsupported checksum algorithm: {}".format(algorithm))
+
+    return algorithm, digest
+
+
+def get_file_digest(path, algorithm, chunk_size=1024 * 1024):
+    """
+
+    :param str path:
+    :param str algorithm: hashlib algorithm name
+    :param int chunk_size:
+    :rtype: str
+    """
+    file_hash = hashlib.new(algorithm)
+
+    with open(path, "rb") as image_file:
+        for chunk in iter(lambda: image_file.read(chunk_size), b""):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+class TftpResponse(object):
+    """File-like response of the TFTP read request (RFC 1350, octet mode)
+
+    Each DATA block is acknowledged as soon as it is read, the last packet is sent
+    again if the server doesn't answer within the timeout.
+    """
+
+    DEFAULT_PORT = 69
+    OPCODE_RRQ = 1
+    OPCODE_DATA = 3
+    OPCODE_ACK = 4
+    OPCODE_ERROR = 5
+    BLOCK_SIZE = 512
+    RETRIES = 5
+
+    def __init__(self, url, timeout):
+        """
+
+        :param str url: tftp://host[:port]/path
+        :param float timeout: seconds to wait for each packet of the server
+        """
+        parsed_url = urlparse(url)
+        file_name = parsed_url.path.lstrip("/")
+        if not parsed_url.hostname or not file_name:
+            raise ValueError("Invalid TFTP URL {}".format(url))
+
+        self._url = url
+        self._address = (parsed_url.hostname, parsed_url.port or self.DEFAULT_PORT)
+        self._server_address = None
+        self._block = 0
+        self._buffer = b""
+        self._finished = False
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.settimeout(timeout)
+        self._send(struct.pack("!H", self.OPCODE_RRQ) + file_name.encode("utf-8") + b"\0octet\0", self._address)
+
+    def _send(self, packet, address):
+        self._last_packet = packet
+        self._last_address = address
+        self._socket.sendto(packet, address)
+
+    def _receive_block(self):
+        """
+
+        :return: data of the next block
+        :rtype: bytes
+        """
+        for _ in range(self.RETRIES):
+            try:
+                packet, address = self._socket.recvfrom(self.BLOCK_SIZE + 4)
+            except socket.timeout:
+                self._socket.sendto(self._last_packet, self._last_address)
+                continue
+
+            opcode, = struct.unpack("!H", packet[:2])
+            if opcode == self.OPCODE_ERROR:
+                raise IOError("TFTP server error for {}: {}".format(
+                    self._url, packet[4:].rstrip(b"\0").decode("utf-8", "replace")))
+
+            # the server answers from its own port, packets from other ports are ignored
+            if opcode != self.OPCODE_DATA or (self._server_address and address != self._server_address):
+                continue
+
+            block, = struct.unpack("!H", packet[2:4])
+            if block != (self._block + 1) % 65536:
+                # our ACK was lost, the server sent the previous block again
+                self._socket.sendto(self._last_packet, self._last_address)
+                continue
+
+            self._server_address = address
+            self._block = block
+            self._send(struct.pack("!HH", self.OPCODE_ACK, block), address)
+
+            data = packet[4:]
+            self._finished = len(data) < self.BLOCK_SIZE
+            return data
+
+        raise IOError("TFTP transfer of {} timed out".format(self._url))
+
+    def read(self, size=-1):
+        """
+
+        :param int size: max number of bytes, all remaining bytes if negative
+        :rtype: bytes
+        """
+        while not self._finished and (size < 0 or len(self._buffer) < size):
+            self._buffer += self._receive_block()
+
+        if size < 0:
+            size = len(self._buffer)
+
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._socket.close()
+
+
+def open_image_url(url, timeout):
+    """Open the image URL, TFTP is read with TftpResponse, the other schemes with urlopen
+
+    :param str url:
+    :param float timeout:
+    :return: file-like response
+    :raises ValueError: if the URL scheme is not supported
+    """
+    scheme = urlparse(url).scheme.lower()
+
+    if scheme == TFTP_SCHEME:
+        return TftpResponse(url, timeout=min(timeout, TFTP_PACKET_TIMEOUT))
+
+    if scheme not in URL_SCHEMES:
+        raise ValueError("Unsupported firmware image URL scheme '{}', supported are {}".format(
+            scheme, ", ".join((TFTP_SCHEME,) + URL_SCHEMES)))
+
+    return urlopen(url, timeout=timeout)
+
+
+class FirmwareImageCache(object):
+    """Local cache of the firmware images shared by the devices of the rollout
+
+    The image is fetched from its URL once and stored under the hash of the URL, its
+    checksum is verified after the download and every time the cached image is used.
+    The cache folder can be served to the devices by a local TFTP/FTP/HTTP server,
+    mirror_url is the URL of the cache folder on that server, so the devices pull the
+    verified copy instead of the original image.
+    """
+
+    DIGEST_FILE_EXTENSION = ".sha256"
+    CHUNK_SIZE = 1024 * 1024
+    DOWNLOAD_TIMEOUT = 600
+
+    def __init__(self, cache_path, mirror_url=None, open_url=open_image_url):
+        """
+
+        :param str cache_path: folder for the cached images
+        :param str mirror_url: URL of the cache folder for the devices, e.g. tftp://10.1.1.1/firmware
+        :param open_url: callable that takes the URL and timeout and returns the file-like response
+        """
+        self.cache_path = cache_path
+        self.mirror_url = mirror_url
+        self._open_url = open_url
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_url_key(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+    def _get_url_lock(self, url):
+        with self._lock:
+            return self._locks.setdefault(url, threading.Lock())
+
+    def get_relative_path(self, url):
+        """Path of the cached image relative to the cache folder, "/" separated
+
+        :param str url:
+        :rtype: str
+        """
+        file_name = re.split(r"[\\/]", urlparse(url).path.rstrip("\\/"))[-1]
+        if not file_name:
+            raise ValueError("Firmware image URL {} doesn't contain the file name".format(url))
+
+        return posixpath.join(self._get_url_key(url), file_name)
+
+    def _download(self, url, path):
+        """Download to a temporary file first, so the interrupted download is never used
+
+        :param str url:
+        :param str path:
+        :return: SHA-256 digest of the downloaded file
+        :rtype: str
+        """
+        folder_path = os.path.dirname(path)
+        if not os.path.isdir(folder_path):
+            os.makedirs(folder_path)
+
+        temp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        file_hash = hashlib.new(DEFAULT_CHECKSUM_ALGORITHM)
+
+        try:
+            if os.path.isfile(url):
+                response = open(url, "rb")
+            else:
+                response = self._open_url(url, timeout=self.DOWNLOAD_TIMEOUT)
+            try:
+                with open(temp_path, "wb") as image_file:
+                    for chunk in iter(lambda: response.read(self.CHUNK_SIZE), b""):
+                        file_hash.update(chunk)
+                        image_file.write(chunk)
+            finally:
+                response.close()
+
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return file_hash.hexdigest()
+
+    def _matches_checksum(self, path, sha256_digest, checksum):
+        """
+
+        :param str path:
+        :param str sha256_digest: SHA-256 digest of the file
+        :param str checksum: expected checksum, any checksum matches if not set
+        :rtype: bool
+        """
+        if not checksum:
+            return True
+
+        algorithm, digest = parse_checksum(checksum)
+        if algorithm == DEFAULT_CHECKSUM_ALGORITHM:
+            return sha256_digest == digest
+
+        return get_file_digest(path, algorithm, self.CHUNK_SIZE) == digest
+
+    def _verify(self, path, checksum):
+        """
+
+        :param str path:
+        :param str checksum: expected checksum, only the integrity of the cached file is checked if not set
+        :return: whether the cached file is intact and matches the checksum
+        :rtype: bool
+        """
+        digest_path = path + self.DIGEST_FILE_EXTENSION
+        if not os.path.isfile(path) or not os.path.isfile(digest_path):
+            return False
+
+        with open(digest_path) as digest_file:
+            cached_digest = digest_file.read().strip()
+
+        if get_file_digest(path, DEFAULT_CHECKSUM_ALGORITHM, self.CHUNK_SIZE) != cached_digest:
+            return False
+
+        return self._matches_checksum(path, cached_digest, checksum)
+
+    def get_image(self, url, checksum=None, logger=None):
+        """Get the local path of the cached image, download it if it isn't cached or is corrupted
+
+        :param str url: URL of the firmware image, tftp, http(s), ftp, file or the local path
+        :param str checksum: expected checksum, "sha256:<hex>", "md5:<hex>" or the plain hex digest
+        :param logging.Logger logger:
+        :return: local path of the verified image
+        :rtype: str
+        """
+        path = os.path.join(self.cache_path, *self.get_relative_path(url).split("/"))
+
+        with self._get_url_lock(url):
+            if self._verify(path, checksum):
+                if logger:
+                    logger.info("Firmware image {} is found in the cache {}".format(url, path))
+                return path
+
+            if logger:
+                logger.info("Downloading the firmware image {} to the cache {}".format(url, path))
+
+            digest = self._download(url, path)
+            if not self._matches_checksum(path, digest, checksum):
+                os.remove(path)
+                raise Exception(self.__class__.__name__,
+                                "Checksum of the firmware image {} doesn't match {}".format(url, checksum))
+
+            with open(path + self.DIGEST_FILE_EXTENSION, "w") as digest_file:
+                digest_file.write(digest)
+
+            if logger:
+                logger.info("Firmware image {} is cached, sha256 {}".format(url, digest))
+
+        return path
+
+    def get_device_url(self, url):
+        """URL the devices use to transfer the cached image
+
+        :param str url: original URL of the image
+        :return: URL of the image on the mirror or the original URL if the mirror is not set
+        :rtype: str
+        """
+        if not self.mirror_url:
+            return url
+
+        return "{}/{}".format(self.mirror_url.rstrip("/"), self.get_relative_path(url))
@@ -0,0 +1,213 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class JobStatus(object):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = frozenset([COMPLETED, FAILED, CANCELLED])
+
+
+class JobCancelledError(Exception):
+    pass
+
+
+class Job(object):
+    """State of the long running operation, updated by the worker and read by the status command"""
+
+    def __init__(self, resource_name, name, cancellation_context=None):
+        """
+
+        :param str resource_name:
+        :param str name: operation name, e.g. "load_firmware"
+        :param CancellationContext cancellation_context: cancellation of the command that runs the job
+            synchronously, the job is also cancelled with cancel()
+        """
+        self.id = uuid.uuid4().hex
+        self.resource_name = resource_name
+        self.name = name
+        self.status = JobStatus.QUEUED
+        self.stage = None
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancellation_context = cancellation_context
+        self._cancel_requested = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def is_cancelled(self):
+        return self._cancel_requested.is_set() or bool(getattr(self._cancellation_context, "is_cancelled", False))
+
+    @property
+    def is_finished(self):
+        return self.status in JobStatus.FINISHED
+
+    def cancel(self):
+        """Request cancellation, the worker stops at the next cancellation point
+
+        :return:
+        """
+        self._cancel_requested.set()
+
+    def check_cancelled(self):
+        """Cancellation point of the worker
+
+        :raises JobCancelledError: if cancellation was requested
+        """
+        if self.is_cancelled:
+            raise JobCancelledError("{} job {} is cancelled".format(self.name, self.id))
+
+    def set_stage(self, stage, **progress):
+        """
+
+        :param str stage:
+        :param progress: stage specific progress values
+        :return:
+        """
+        with self._lock:
+            self.stage = stage
+            self.progress = dict(progress, stage_started=time.time())
+
+    def update_progress(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+
+    def run(self, func):
+        """Run the job function in the current thread and record its result
+
+        :param func: callable that takes the job
+        :return: function result
+        """
+        self.status = JobStatus.RUNNING
+        self.started = time.time()
+
+        try:
+            self.result = func(self)
+        except JobCancelledError as e:
+            self.status = JobStatus.CANCELLED
+            self.error = str(e)
+            raise
+        except Exception as e:
+            self.status = JobStatus.FAILED
+            self.error = str(e)
+            raise
+        else:
+            self.status = JobStatus.COMPLETED
+        finally:
+            self.finished = time.time()
+
+        return self.result
+
+    def to_dict(self):
+        """
+
+        :rtype: dict
+        """
+        with self._lock:
+            progress = dict(self.progress)
+
+        now = time.time()
+        if "stage_started" in progress:
+            progress["stage_duration"] = round((self.finished or now) - progress.pop("stage_started"), 3)
+
+        return {"id": self.id,
+                "resource_name": self.resource_name,
+                "name": self.name,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": progress,
+                "result": self.result,
+                "error": self.error,
+                "cancel_requested": self._cancel_requested.is_set(),
+                "duration": round((self.finished or now) - (self.started or now), 3)}
+
+
+class JobManager(object):
+    """Runs jobs in background threads and keeps the latest finished jobs for the status requests"""
+
+    def __init__(self, logger=None, max_finished=256):
+        """
+
+        :param logging.Logger logger:
+        :param int max_finished: number of finished jobs kept for the status requests
+        """
+        self._logger = logger
+        self._max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cleanup(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+
+        for job_id in finished[:max(len(finished) - self._max_finished, 0)]:
+            del self._jobs[job_id]
+
+    def _run(self, job, func, logger):
+        try:
+            job.run(func)
+        except JobCancelledError:
+            logger.info("{} job {} of the resource {} is cancelled".format(job.name, job.id, job.resource_name))
+        except Exception:
+            logger.exception("{} job {} of the resource {} failed".format(job.name, job.id, job.resource_name))
+        else:
+            logger.info("{} job {} of the resource {} completed".format(job.name, job.id, job.resource_name))
+
+    def submit(self, resource_name, name, func, logger):
+        """Start the job in a background thread
+
+        :param str resource_name:
+        :param str name: operation name
+        :param func: callable that takes the Job, it should call job.check_cancelled() at cancellation points
+        :param logging.Logger logger:
+        :rtype: Job
+        """
+        job = Job(resource_name=resource_name, name=name)
+
+        with self._lock:
+            self._cleanup()
+            self._jobs[job.id] = job
+
+        thread = threading.Thread(target=self._run, args=(job, func, logger),
+                                  name="{}-{}".format(name, job.id[:8]))
+        thread.daemon = True
+        thread.start()
+
+        return job
+
+    def get(self, job_id):
+        """
+
+        :param str job_id:
+        :return: job or None if there is no such job
+        :rtype: Job
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_jobs(self, resource_name=None):
+        """
+
+        :param str resource_name: return only jobs of the resource
+        :rtype: list[Job]
+        """
+        with self._lock:
+            return [job for job in self._jobs.values() if resource_name is None or job.resource_name == resource_name]
+
+    def cancel_all(self):
+        """Request cancellation of all running jobs
+
+        :return:
+        """
+        for job in self.get_jobs():
+            if not job.is_finished:
+                job.cancel()
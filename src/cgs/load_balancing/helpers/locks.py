@@ -0,0 +1,161 @@
+import itertools
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from cgs.load_balancing.helpers.tracing import trace_span
+
+
+class OperationClass(object):
+    DISCOVERY = "discovery"
+    READ_ONLY = "read-only"
+    CONFIG = "config"
+    FIRMWARE = "firmware"
+
+    CONFLICTS = {
+        DISCOVERY: frozenset([CONFIG, FIRMWARE]),
+        # e.g. save must not snapshot the half applied configuration of the restore
+        READ_ONLY: frozenset([CONFIG, FIRMWARE]),
+        CONFIG: frozenset([DISCOVERY, READ_ONLY, CONFIG, FIRMWARE]),
+        FIRMWARE: frozenset([DISCOVERY, READ_ONLY, CONFIG, FIRMWARE]),
+    }
+
+
+class ResourceOperationLock(object):
+    """Lock that lets non-conflicting operations on one resource run concurrently
+
+    Number of concurrently running operations is limited by the lock limit, operations
+    acquired with limited=False (the ones that don't use CLI sessions) are not counted.
+    Waiting operations are served in the arrival order: an operation can't overtake an
+    earlier waiting operation it conflicts with, so e.g. firmware load is not starved by
+    a stream of discoveries.
+    """
+
+    def __init__(self, limit=1):
+        """
+
+        :param int limit: maximum number of concurrently running operations
+        """
+        self._limit = max(limit, 1)
+        self._condition = threading.Condition()
+        self._running = defaultdict(int)
+        self._running_count = 0
+        self._waiting = {}
+        self._tickets = itertools.count()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    def set_limit(self, limit):
+        """
+
+        :param int limit:
+        :return:
+        """
+        with self._condition:
+            self._limit = max(limit, 1)
+            self._condition.notify_all()
+
+    @property
+    def running_count(self):
+        """Number of running operations that count against the limit"""
+        return self._running_count
+
+    def _can_acquire(self, ticket, operation_class, limited):
+        if limited and self._running_count >= self._limit:
+            return False
+
+        conflicts = OperationClass.CONFLICTS[operation_class]
+
+        if any(self._running[conflict] for conflict in conflicts):
+            return False
+
+        return not any(waiting_ticket < ticket and (waiting_class in conflicts or
+                                                    limited and waiting_limited and
+                                                    self._running_count + 1 >= self._limit)
+                       for waiting_ticket, (waiting_class, waiting_limited) in self._waiting.items())
+
+    def acquire(self, operation_class, limited=True):
+        """
+
+        :param str operation_class: one of the OperationClass values
+        :param bool limited: whether the operation counts against the limit
+        :return:
+        """
+        with self._condition:
+            ticket = next(self._tickets)
+            self._waiting[ticket] = (operation_class, limited)
+
+            try:
+                while not self._can_acquire(ticket, operation_class, limited):
+                    self._condition.wait()
+            finally:
+                del self._waiting[ticket]
+
+            self._running[operation_class] += 1
+            if limited:
+                self._running_count += 1
+
+    def release(self, operation_class, limited=True):
+        """
+
+        :param str operation_class:
+        :param bool limited: the same value the operation was acquired with
+        :return:
+        """
+        with self._condition:
+            self._running[operation_class] -= 1
+            if limited:
+                self._running_count -= 1
+            self._condition.notify_all()
+
+
+class OperationLockManager(object):
+    """Keeps ResourceOperationLock for every resource"""
+
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get_lock(self, resource_name, limit):
+        """
+
+        :param str resource_name:
+        :param int limit: maximum number of concurrently running operations on the resource
+        :rtype: ResourceOperationLock
+        """
+        with self._lock:
+            resource_lock = self._locks.get(resource_name)
+
+            if resource_lock is None:
+                resource_lock = self._locks[resource_name] = ResourceOperationLock(limit)
+
+        if resource_lock.limit != limit:
+            resource_lock.set_limit(limit)
+
+        return resource_lock
+
+    @contextmanager
+    def lock(self, resource_name, operation_class, limit, logger, limited=True):
+        """Hold the operation lock of the resource, log how long the operation waited for it
+
+        :param str resource_name:
+        :param str operation_class: one of the OperationClass values
+        :param int limit: maximum number of concurrently running operations on the resource
+        :param logging.Logger logger:
+        :param bool limited: whether the operation counts against the limit
+        """
+        resource_lock = self.get_lock(resource_name, limit)
+        start_time = time.time()
+        with trace_span("lock_wait"):
+            resource_lock.acquire(operation_class, limited)
+        logger.info("Acquired {} lock on resource {} in {:.3f} sec".format(operation_class,
+                                                                            resource_name,
+                                                                            time.time() - start_time))
+        try:
+            yield resource_lock
+        finally:
+            resource_lock.release(operation_class, limited)
+
@@ -0,0 +1,73 @@
+def get_attribute_value(resource_config, attribute_name, default=None):
+    """Get value of the shell specific attribute that is not a part of the standard resource config
+
+    :param resource_config: resource configuration created from the command context
+    :param str attribute_name: attribute name without the shell name prefix
+    :param default: value returned when attribute is missing or empty
+    :return:
+    """
+    attributes = getattr(resource_config, "attributes", None) or {}
+    shell_name = getattr(resource_config, "shell_name", None)
+    value = None
+
+    if shell_name:
+        value = attributes.get("{}.{}".format(shell_name, attribute_name))
+
+    if value is None:
+        value = attributes.get(attribute_name)
+
+    if value is None or value == "":
+        return default
+
+    return value
+
+
+def get_context_attribute_value(context, shell_name, attribute_name, default=None):
+    """Get value of the shell specific attribute directly from the command context
+
+    Used before the resource config is created, e.g. to decide whether the command is traced.
+    :param ResourceCommandContext context:
+    :param str shell_name:
+    :param str attribute_name: attribute name without the shell name prefix
+    :param default: value returned when attribute is missing or empty
+    :return:
+    """
+    attributes = getattr(context.resource, "attributes", None) or {}
+    value = attributes.get("{}.{}".format(shell_name, attribute_name), attributes.get(attribute_name))
+
+    if value is None or value == "":
+        return default
+
+    return value
+
+
+def get_int_attribute(resource_config, attribute_name, default=None):
+    """
+
+    :param resource_config:
+    :param str attribute_name:
+    :param default:
+    :rtype: int
+    """
+    value = get_attribute_value(resource_config, attribute_name, default)
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def get_bool_attribute(resource_config, attribute_name, default=False):
+    """
+
+    :param resource_config:
+    :param str attribute_name:
+    :param bool default:
+    :rtype: bool
+    """
+    value = get_attribute_value(resource_config, attribute_name)
+
+    if value is None:
+        return default
+
+    return str(value).lower() == "true"
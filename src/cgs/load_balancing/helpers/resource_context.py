@@ -0,0 +1,130 @@
+import hashlib
+import threading
+
+from cgs.load_balancing.helpers.cache import TtlLruCache
+
+
+def get_context_fingerprint(context):
+    """Build fingerprint of everything the cached API session and resource config depend on
+
+    The API session is created with the admin token of the context, so a new token creates
+    a new session. The token is hashed with the other items, it is not kept in plain text.
+    :param ResourceCommandContext context:
+    :rtype: str
+    """
+    resource = context.resource
+    reservation = getattr(context, "reservation", None)
+    connectivity = getattr(context, "connectivity", None)
+
+    items = [("address", resource.address),
+             ("family", resource.family),
+             ("fullname", resource.fullname),
+             ("server_address", getattr(connectivity, "server_address", None)),
+             ("admin_auth_token", getattr(connectivity, "admin_auth_token", None)),
+             ("reservation_id", getattr(reservation, "reservation_id", None)),
+             ("domain", getattr(reservation, "domain", None))]
+
+    items.extend(sorted((resource.attributes or {}).items()))
+
+    return hashlib.sha1(repr(items).encode("utf-8")).hexdigest()
+
+
+class ResourceContext(object):
+    """API session, resource config and handlers cached for one resource"""
+
+    HANDLERS_CACHE_SIZE = 16
+
+    def __init__(self, api, resource_config, fingerprint):
+        """
+
+        :param cloudshell.api.cloudshell_api.CloudShellAPISession api:
+        :param resource_config:
+        :param str fingerprint:
+        """
+        self.api = api
+        self.resource_config = resource_config
+        self.fingerprint = fingerprint
+        self._handlers = TtlLruCache(max_size=self.HANDLERS_CACHE_SIZE, ttl=None)
+        self._lock = threading.Lock()
+
+    def get_handler(self, handler_type, logger, factory):
+        """Get handler of the given type bound to the logger, create it on the first call
+
+        Handlers keep the logger they were created with, so they are cached per logger
+        to keep the thread id in the log records of concurrent commands correct.
+        :param str handler_type: handler name, e.g. "cli" or "snmp"
+        :param logging.Logger logger: None for handlers shared between all commands
+        :param factory: callable without arguments that creates a new handler
+        :return:
+        """
+        key = (handler_type, logger.name if logger is not None else None)
+
+        with self._lock:
+            handler = self._handlers.get(key)
+            if handler is None:
+                handler = factory()
+                self._handlers.set(key, handler)
+
+        return handler
+
+
+class ResourceContextCache(object):
+    """Per-resource LRU/TTL cache of ResourceContext objects
+
+    Entry is invalidated as soon as the resource attributes (or any other value
+    used in the fingerprint) change.
+    """
+
+    def __init__(self, max_size=64, ttl=600):
+        """
+
+        :param int max_size:
+        :param float ttl: entry time to live in seconds
+        """
+        self._cache = TtlLruCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    def get(self, context, factory):
+        """Get cached resource context or create a new one via factory
+
+        :param ResourceCommandContext context:
+        :param factory: callable that takes command context and fingerprint and returns ResourceContext
+        :rtype: ResourceContext
+        """
+        resource_name = context.resource.name
+        fingerprint = get_context_fingerprint(context)
+
+        with self._lock:
+            resource_context = self._cache.get(resource_name)
+
+            if resource_context is not None and resource_context.fingerprint != fingerprint:
+                self.invalidations += 1
+                resource_context = None
+
+            if resource_context is None:
+                resource_context = factory(context, fingerprint)
+                self._cache.set(resource_name, resource_context)
+
+        return resource_context
+
+    def invalidate(self, resource_name):
+        """
+
+        :param str resource_name:
+        :return:
+        """
+        self._cache.pop(resource_name)
+
+    def clear(self):
+        self._cache.clear()
+
+    @property
+    def stats(self):
+        """
+
+        :rtype: dict
+        """
+        stats = self._cache.stats
+        stats["invalidations"] = self.invalidations
+        return stats
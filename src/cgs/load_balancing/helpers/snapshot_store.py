@@ -0,0 +1,256 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+import uuid
+import zlib
+
+
+class SnapshotStore(object):
+    """Local content-addressed store of device configurations
+
+    Configuration is split into content-defined chunks (chunk boundaries depend on
+    the lines, not on offsets), so configurations that differ by a few lines share
+    most of their chunks. Chunks are zlib compressed and stored once under their
+    SHA-256 hash; a snapshot is a JSON manifest with the list of chunk hashes.
+    """
+
+    OBJECTS_DIR = "objects"
+    SNAPSHOTS_DIR = "snapshots"
+    LATEST_DIR = "latest"
+    SAVES_DIR = "saves"
+    CHUNK_BOUNDARY_MASK = 0x1F
+    MIN_CHUNK_SIZE = 512
+    MAX_CHUNK_SIZE = 16384
+    COMPRESSION_LEVEL = 6
+    # lines that change without configuration changes, they are not used for the config hash
+    VOLATILE_LINE_PATTERNS = [re.compile(r"^\s*[!#].*\d{1,2}:\d{2}:\d{2}")]
+
+    def __init__(self, root_path):
+        """
+
+        :param str root_path: store directory, it is created on the first write
+        """
+        self.root_path = root_path
+
+    @classmethod
+    def get_config_hash(cls, config):
+        """Hash of the configuration without volatile lines (timestamps in comments, etc.)
+
+        :param str config:
+        :rtype: str
+        """
+        config_hash = hashlib.sha256()
+
+        for line in config.splitlines():
+            if not any(pattern.match(line) for pattern in cls.VOLATILE_LINE_PATTERNS):
+                config_hash.update(line.rstrip().encode("utf-8"))
+                config_hash.update(b"\n")
+
+        return config_hash.hexdigest()
+
+    @classmethod
+    def split_chunks(cls, data):
+        """Split data into content-defined chunks on line boundaries
+
+        :param bytes data:
+        :rtype: list[bytes]
+        """
+        chunks = []
+        chunk = []
+        chunk_size = 0
+
+        for line in data.splitlines(True):
+            chunk.append(line)
+            chunk_size += len(line)
+
+            if chunk_size >= cls.MAX_CHUNK_SIZE or (
+                    chunk_size >= cls.MIN_CHUNK_SIZE and
+                    zlib.crc32(line) & cls.CHUNK_BOUNDARY_MASK == 0):
+                chunks.append(b"".join(chunk))
+                chunk = []
+                chunk_size = 0
+
+        if chunk:
+            chunks.append(b"".join(chunk))
+
+        return chunks
+
+    @staticmethod
+    def _get_key(*parts):
+        return hashlib.sha1("/".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _write_file(path, data):
+        """Write file via temporary file so readers never see partially written file
+
+        :param str path:
+        :param bytes data:
+        :return:
+        """
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+        tmp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        with open(tmp_path, "wb") as tmp_file:
+            tmp_file.write(data)
+
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # os.rename doesn't replace existing file on Windows
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+
+    def _get_object_path(self, chunk_hash):
+        return os.path.join(self.root_path, self.OBJECTS_DIR, chunk_hash[:2], chunk_hash[2:])
+
+    def _get_snapshot_path(self, snapshot_id):
+        return os.path.join(self.root_path, self.SNAPSHOTS_DIR, "{}.json".format(snapshot_id))
+
+    def _get_latest_path(self, resource_name, configuration_type, destination, mode):
+        key = self._get_key(resource_name, configuration_type.lower(), destination, mode.lower())
+        return os.path.join(self.root_path, self.LATEST_DIR, key)
+
+    def _get_save_path(self, resource_name, configuration_type, destination):
+        key = self._get_key(resource_name, configuration_type.lower(), destination)
+        return os.path.join(self.root_path, self.SAVES_DIR, "{}.json".format(key))
+
+    def _put_chunk(self, chunk):
+        """
+
+        :param bytes chunk:
+        :return: chunk hash and True if the chunk was not in the store yet
+        :rtype: tuple
+        """
+        chunk_hash = hashlib.sha256(chunk).hexdigest()
+        object_path = self._get_object_path(chunk_hash)
+
+        if os.path.exists(object_path):
+            return chunk_hash, False
+
+        self._write_file(object_path, zlib.compress(chunk, self.COMPRESSION_LEVEL))
+        return chunk_hash, True
+
+    def put(self, resource_name, configuration_type, config, artifact, destination="", mode=""):
+        """Store configuration and make it the latest snapshot of the resource for the destination and mode
+
+        :param str resource_name:
+        :param str configuration_type: "running" or "startup"
+        :param str config: configuration text
+        :param dict artifact: {"artifact_type": ..., "identifier": ...} of the configuration file saved by the device
+        :param str destination: folder or URL the configuration file was saved to
+        :param str mode: save mode, e.g. "shallow" or "deep"
+        :return: snapshot manifest
+        :rtype: dict
+        """
+        data = config.encode("utf-8")
+        chunk_hashes = []
+        new_chunks_count = 0
+
+        for chunk in self.split_chunks(data):
+            chunk_hash, is_new = self._put_chunk(chunk)
+            chunk_hashes.append(chunk_hash)
+            new_chunks_count += is_new
+
+        manifest = {
+            "id": uuid.uuid4().hex,
+            "resource_name": resource_name,
+            "configuration_type": configuration_type.lower(),
+            "destination": destination,
+            "mode": mode.lower(),
+            "config_hash": self.get_config_hash(config),
+            "size": len(data),
+            "chunks": chunk_hashes,
+            "new_chunks": new_chunks_count,
+            "created_date": datetime.datetime.utcnow().isoformat(),
+            "artifact": artifact,
+        }
+
+        self._write_file(self._get_snapshot_path(manifest["id"]), json.dumps(manifest).encode("utf-8"))
+        self._write_file(self._get_latest_path(resource_name, configuration_type, destination, mode),
+                         manifest["id"].encode("utf-8"))
+        return manifest
+
+    def get_manifest(self, snapshot_id):
+        """
+
+        :param str snapshot_id:
+        :return: snapshot manifest or None if there is no such snapshot
+        :rtype: dict
+        """
+        try:
+            with open(self._get_snapshot_path(snapshot_id), "rb") as manifest_file:
+                return json.loads(manifest_file.read().decode("utf-8"))
+        except (IOError, OSError):
+            return None
+
+    def get_latest(self, resource_name, configuration_type, destination="", mode=""):
+        """
+
+        :param str resource_name:
+        :param str configuration_type:
+        :param str destination: folder or URL the configuration file was saved to
+        :param str mode: save mode, e.g. "shallow" or "deep"
+        :return: manifest of the latest snapshot of the resource for the destination and mode or None
+        :rtype: dict
+        """
+        try:
+            with open(self._get_latest_path(resource_name, configuration_type, destination, mode),
+                      "rb") as latest_file:
+                snapshot_id = latest_file.read().decode("utf-8")
+        except (IOError, OSError):
+            return None
+
+        return self.get_manifest(snapshot_id)
+
+    def get_last_save(self, resource_name, configuration_type, destination):
+        """
+
+        :param str resource_name:
+        :param str configuration_type:
+        :param str destination: folder or URL the configuration was saved to
+        :return: record of the latest configuration file saved to the destination or None
+        :rtype: dict
+        """
+        try:
+            with open(self._get_save_path(resource_name, configuration_type, destination), "rb") as save_file:
+                return json.loads(save_file.read().decode("utf-8"))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set_last_save(self, resource_name, configuration_type, destination, record):
+        """Remember the configuration file saved to the destination, see get_last_save
+
+        :param str resource_name:
+        :param str configuration_type:
+        :param str destination:
+        :param dict record: path, config_hash, size, etc. of the saved file
+        :return:
+        """
+        self._write_file(self._get_save_path(resource_name, configuration_type, destination),
+                         json.dumps(record).encode("utf-8"))
+
+    def read(self, snapshot_id):
+        """Get configuration text of the snapshot
+
+        :param str snapshot_id:
+        :rtype: str
+        """
+        manifest = self.get_manifest(snapshot_id)
+        if manifest is None:
+            raise KeyError("Snapshot {} not found".format(snapshot_id))
+
+        chunks = []
+        for chunk_hash in manifest["chunks"]:
+            with open(self._get_object_path(chunk_hash), "rb") as object_file:
+                chunks.append(zlib.decompress(object_file.read()))
+
+        return b"".join(chunks).decode("utf-8")
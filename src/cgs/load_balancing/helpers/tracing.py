@@ -0,0 +1,243 @@
+import datetime
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+_local = threading.local()
+_counters_lock = threading.Lock()
+
+
+class Span(object):
+    """Timed phase of the command with its counters (SNMP PDUs, CLI commands, ...) and nested phases"""
+
+    __slots__ = ("name", "start_time", "duration", "counters", "children")
+
+    def __init__(self, name):
+        """
+
+        :param str name:
+        """
+        self.name = name
+        self.start_time = time.time()
+        self.duration = None
+        self.counters = {}
+        self.children = []
+
+    def finish(self):
+        self.duration = time.time() - self.start_time
+
+    def get_totals(self):
+        """Counters of the span summed with the counters of all nested spans
+
+        :rtype: dict
+        """
+        totals = dict(self.counters)
+        for child in self.children:
+            for name, value in child.get_totals().items():
+                totals[name] = totals.get(name, 0) + value
+
+        return totals
+
+    def to_dict(self):
+        """
+
+        :rtype: dict
+        """
+        span = {"name": self.name,
+                "duration": round(self.duration, 4) if self.duration is not None else None}
+
+        if self.counters:
+            span["counters"] = self.counters
+        if self.children:
+            span["children"] = [child.to_dict() for child in self.children]
+
+        return span
+
+
+class _NullSpan(object):
+    """Span used when tracing is disabled, it does nothing"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _SpanContext(object):
+    __slots__ = ("_span", "_parent")
+
+    def __init__(self, name, parent):
+        self._span = Span(name)
+        self._parent = parent
+
+    def __enter__(self):
+        self._parent.children.append(self._span)
+        _local.span = self._span
+        return self._span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._span.finish()
+        _local.span = self._parent
+        return False
+
+
+def get_current_span():
+    """
+
+    :return: span of the current thread or None if tracing is disabled
+    :rtype: Span
+    """
+    return getattr(_local, "span", None)
+
+
+def trace_span(name):
+    """Context manager that records the nested span, does nothing if the command is not traced
+
+    :param str name:
+    """
+    parent = getattr(_local, "span", None)
+    if parent is None:
+        return NULL_SPAN
+
+    return _SpanContext(name, parent)
+
+
+def trace_count(name, value=1):
+    """Increase the counter of the current span
+
+    :param str name: e.g. "snmp_pdus" or "cli_commands"
+    :param int value:
+    :return:
+    """
+    span = getattr(_local, "span", None)
+    if span is not None:
+        # the same span can be shared by the threads of bind_span
+        with _counters_lock:
+            span.counters[name] = span.counters.get(name, 0) + value
+
+
+def bind_span(func):
+    """Make spans recorded by the function in another thread nested into the current span
+
+    :param func:
+    :return: the function itself if tracing is disabled
+    """
+    parent = getattr(_local, "span", None)
+    if parent is None:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        previous_span = getattr(_local, "span", None)
+        _local.span = parent
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.span = previous_span
+
+    return wrapper
+
+
+@contextmanager
+def trace_context_manager(context_manager, enter_span_name, exit_span_name):
+    """Record entering and exiting of the context manager as separate spans
+
+    Used for handlers that connect on enter and clean up on exit, e.g. SNMP service that
+    enables SNMP over CLI or CLI service that logs in to the device.
+    :param context_manager:
+    :param str enter_span_name:
+    :param str exit_span_name:
+    """
+    with trace_span(enter_span_name):
+        value = context_manager.__enter__()
+
+    try:
+        yield value
+    except BaseException:
+        with trace_span(exit_span_name):
+            if not context_manager.__exit__(*sys.exc_info()):
+                raise
+    else:
+        with trace_span(exit_span_name):
+            context_manager.__exit__(None, None, None)
+
+
+@contextmanager
+def command_trace(command_name, resource_name, logger, output_path=None):
+    """Trace the driver command and write its spans as one JSON log line and optionally to the JSON file
+
+    :param str command_name:
+    :param str resource_name:
+    :param logging.Logger logger:
+    :param str output_path: folder for the JSON trace files, the trace is only logged if not set
+    """
+    previous_span = getattr(_local, "span", None)
+    root_span = Span(command_name)
+    _local.span = root_span
+
+    try:
+        yield root_span
+    finally:
+        root_span.finish()
+        _local.span = previous_span
+
+        trace = {"command": command_name,
+                 "resource_name": resource_name,
+                 "start_time": datetime.datetime.utcfromtimestamp(root_span.start_time).isoformat(),
+                 "totals": root_span.get_totals(),
+                 "span": root_span.to_dict()}
+
+        try:
+            trace_data = json.dumps(trace)
+            logger.info("Command trace: {}".format(trace_data))
+
+            if output_path:
+                _write_trace(output_path, resource_name, command_name, root_span.start_time, trace_data)
+        except Exception:
+            logger.warning("Unable to write the command trace", exc_info=True)
+
+
+def _write_trace(output_path, resource_name, command_name, start_time, trace_data):
+    """
+
+    :param str output_path:
+    :param str resource_name:
+    :param str command_name:
+    :param float start_time:
+    :param str trace_data:
+    :return:
+    """
+    if not os.path.isdir(output_path):
+        os.makedirs(output_path)
+
+    file_name = "{}_{}_{}_{}.json".format(re.sub(r"[^\w.-]", "_", resource_name),
+                                          command_name,
+                                          datetime.datetime.utcfromtimestamp(start_time).strftime("%Y%m%d%H%M%S%f"),
+                                          threading.current_thread().ident)
+
+    with open(os.path.join(output_path, file_name), "w") as trace_file:
+        trace_file.write(trace_data)
+
+
+def traced_command(func):
+    """Decorator for the driver commands that traces the command
+
+    Driver must implement _trace_command(context, command_name) method that returns
+    context manager, see command_trace. The lock wait time of the command is included
+    into the trace.
+    """
+    @wraps(func)
+    def wrapper(driver, context, *args, **kwargs):
+        with driver._trace_command(context, func.__name__):
+            return func(driver, context, *args, **kwargs)
+
+    return wrapper
@@ -1,9 +1,139 @@
 from cloudshell.cgs.runners.autoload import AbstractCgsAutoloadRunner
 
+from cgs.load_balancing.autoload.cache import AutoloadDetailsCache
+from cgs.load_balancing.autoload.cache import build_autoload_details
+from cgs.load_balancing.autoload.cache import get_autoload_details_data
+from cgs.load_balancing.autoload.cache import get_device_fingerprint
+from cgs.load_balancing.autoload.ports import PortDiscoveryMode
 from cgs.load_balancing.flows.autoload import CgsLoadBalancerSnmpAutoloadFlow
+from cgs.load_balancing.helpers.resource_attributes import get_attribute_value
+from cgs.load_balancing.helpers.resource_attributes import get_int_attribute
+from cgs.load_balancing.helpers.tracing import trace_span
 
 
 class CgsLoadBalancerAutoloadRunner(AbstractCgsAutoloadRunner):
+    BULK_MAX_REPETITIONS_ATTRIBUTE = "SNMP Bulk Max Repetitions"
+    AUTOLOAD_MODE_ATTRIBUTE = "Autoload Mode"
+    INCREMENTAL_AUTOLOAD_MODE = "incremental"
+    WORKERS_ATTRIBUTE = "Autoload Worker Threads"
+    PORT_DISCOVERY_MODE_ATTRIBUTE = "Port Discovery Mode"
+
+    def __init__(self, resource_config, logger, snmp_handler, autoload_state_store=None, force_full=False,
+                 snmp_session_factory=None, autoload_cache=None, shell_version=None):
+        """
+
+        :param resource_config:
+        :param logging.Logger logger:
+        :param cloudshell.cgs.snmp.handler.CgsSnmpHandler snmp_handler:
+        :param cgs.load_balancing.autoload.state.AutoloadStateStore autoload_state_store: results of the previous
+            Autoload runs, required for the incremental Autoload mode
+        :param bool force_full: discover the whole device even if the incremental mode is enabled
+            or the cached result is valid
+        :param cgs.load_balancing.snmp.session.SnmpSessionFactory snmp_session_factory: creates SNMP sessions
+            for the concurrent discovery phases
+        :param cgs.load_balancing.autoload.cache.AutoloadDetailsCache autoload_cache: results of the previous
+            Autoload runs, the cached result is returned while the device fingerprint doesn't change
+        :param str shell_version: part of the cache key, results of the other shell versions are not used
+        """
+        super(CgsLoadBalancerAutoloadRunner, self).__init__(resource_config=resource_config,
+                                                            logger=logger,
+                                                            snmp_handler=snmp_handler)
+        self._autoload_state_store = autoload_state_store
+        self._force_full = force_full
+        self._snmp_session_factory = snmp_session_factory
+        self._autoload_cache = autoload_cache
+        self._shell_version = shell_version
+
+    @property
+    def incremental(self):
+        """
+
+        :rtype: bool
+        """
+        autoload_mode = get_attribute_value(self.resource_config, self.AUTOLOAD_MODE_ATTRIBUTE, "")
+
+        return self._autoload_state_store is not None and autoload_mode.lower() == self.INCREMENTAL_AUTOLOAD_MODE
+
+    @property
+    def state_key(self):
+        return self.resource_config.name, self.resource_config.address
+
+    @property
+    def port_discovery_mode(self):
+        """
+
+        :return: one of PortDiscoveryMode
+        :rtype: str
+        """
+        port_discovery_mode = get_attribute_value(self.resource_config, self.PORT_DISCOVERY_MODE_ATTRIBUTE, "")
+        return port_discovery_mode.lower() or PortDiscoveryMode.STANDARD
+
+    @property
+    def bulk_max_repetitions(self):
+        return get_int_attribute(self.resource_config, self.BULK_MAX_REPETITIONS_ATTRIBUTE)
+
+    def _get_cache_key(self):
+        """Read the device fingerprint and build the Autoload cache key
+
+        The fingerprint is read over the SNMP service of the handler, so SNMP is enabled
+        on the device first if needed.
+        :return: cache key or None if the fingerprint can't be read
+        :rtype: str
+        """
+        try:
+            with trace_span("device_fingerprint"):
+                with self.snmp_handler.get_snmp_service() as snmp_service:
+                    fingerprint = get_device_fingerprint(snmp_service)
+        except Exception:
+            self._logger.warning("Failed to read the device fingerprint, Autoload cache is not used", exc_info=True)
+            return None
+
+        self._logger.debug("Device fingerprint: {}".format(fingerprint))
+        return AutoloadDetailsCache.get_key(self.resource_config.name,
+                                            self.resource_config.address,
+                                            self._shell_version,
+                                            self.port_discovery_mode,
+                                            fingerprint)
+
+    def discover(self):
+        """Return the cached result if the device didn't change, run the Autoload flow otherwise
+
+        :rtype: cloudshell.shell.core.driver_context.AutoLoadDetails
+        """
+        if self._force_full and self.incremental:
+            # the forced Autoload discovers the whole device and its result is the state of the next incremental one
+            self._autoload_state_store.invalidate(self.state_key)
+
+        if self._autoload_cache is None:
+            return super(CgsLoadBalancerAutoloadRunner, self).discover()
+
+        cache_key = self._get_cache_key()
+        if cache_key is None:
+            return super(CgsLoadBalancerAutoloadRunner, self).discover()
+
+        if not self._force_full:
+            details_data = self._autoload_cache.get(cache_key)
+            if details_data is not None:
+                self._logger.info("Device didn't change, returning the cached Autoload result")
+                self._logger.debug("Autoload cache stats: {}".format(self._autoload_cache.stats))
+                return build_autoload_details(details_data)
+
+        details = super(CgsLoadBalancerAutoloadRunner, self).discover()
+        self._autoload_cache.set(cache_key, get_autoload_details_data(details))
+
+        return details
+
     @property
     def autoload_flow(self):
-        return CgsLoadBalancerSnmpAutoloadFlow(self.snmp_handler, self._logger)
+        bulk_max_repetitions = self.bulk_max_repetitions
+        workers = get_int_attribute(self.resource_config, self.WORKERS_ATTRIBUTE, 1)
+
+        return CgsLoadBalancerSnmpAutoloadFlow(self.snmp_handler,
+                                               self._logger,
+                                               bulk_max_repetitions=bulk_max_repetitions,
+                                               state_store=self._autoload_state_store,
+                                               state_key=self.state_key,
+                                               incremental=self.incremental,
+                                               snmp_session_factory=self._snmp_session_factory,
+                                               workers=workers,
+                                               port_discovery_mode=self.port_discovery_mode)
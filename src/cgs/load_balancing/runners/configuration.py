@@ -0,0 +1,444 @@
+import datetime
+import ftplib
+import json
+import os
+import time
+import zlib
+
+try:
+    from urllib import unquote
+    from urllib2 import urlopen
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import unquote
+    from urllib.parse import urlparse
+    from urllib.request import urlopen
+
+from cloudshell.cgs.runners.configuration import CgsConfigurationRunner
+
+from cgs.load_balancing.helpers.config_diff import build_diff_commands
+from cgs.load_balancing.helpers.config_diff import configs_match
+from cgs.load_balancing.helpers.tracing import trace_context_manager
+from cgs.load_balancing.helpers.tracing import trace_count
+from cgs.load_balancing.helpers.tracing import trace_span
+
+
+class ChunksReader(object):
+    """File-like object over the generator of chunks, used to stream data with ftplib"""
+
+    def __init__(self, chunks):
+        """
+
+        :param chunks: iterable of bytes
+        """
+        self._chunks = iter(chunks)
+
+    def read(self, size=-1):
+        return next(self._chunks, b"")
+
+
+class CgsLoadBalancerConfigurationRunner(CgsConfigurationRunner):
+    SHOW_CONFIGURATION_COMMANDS = {"running": "show running-config",
+                                   "startup": "show startup-config"}
+    DIFF_RESTORE_METHOD = "diff"
+    DIFF_RESTORE_URL_SCHEMES = ("ftp", "http", "https", "file")
+    # the same as the save command, local paths and file URLs are saved to the device file system,
+    # only FTP destinations are written by the driver
+    STREAMING_SAVE_URL_SCHEMES = ("ftp",)
+    STREAMING_SAVE_CHUNK_SIZE = 64 * 1024
+    GZIP_COMPRESSION_LEVEL = 6
+    GZIP_EXTENSION = ".gz"
+
+    def __init__(self, cli_handler, logger, resource_config, api, snapshot_store=None):
+        """
+
+        :param cloudshell.cgs.cli.handler.CgsCliHandler cli_handler:
+        :param logging.Logger logger:
+        :param resource_config:
+        :param cloudshell.api.cloudshell_api.CloudShellAPISession api:
+        :param cgs.load_balancing.helpers.snapshot_store.SnapshotStore snapshot_store: local store of the saved
+            configurations used by the orchestration save/restore
+        """
+        super(CgsLoadBalancerConfigurationRunner, self).__init__(cli_handler=cli_handler,
+                                                                 logger=logger,
+                                                                 resource_config=resource_config,
+                                                                 api=api)
+        self._cli_handler = cli_handler
+        self._logger = logger
+        self._snapshot_store = snapshot_store
+        self.resource_config = resource_config
+
+    def get_configuration(self, configuration_type):
+        """Read configuration from the device over CLI
+
+        :param str configuration_type: "running" or "startup"
+        :rtype: str
+        """
+        command = self.SHOW_CONFIGURATION_COMMANDS[configuration_type.lower()]
+
+        cli_service_manager = self._cli_handler.get_cli_service(self._cli_handler.enable_mode)
+
+        with trace_context_manager(cli_service_manager, "cli_connect", "cli_release") as cli_service:
+            trace_count("cli_commands")
+            return cli_service.send_command(command, remove_prompt=True)
+
+    def _read_configuration_file(self, path):
+        """Download configuration file to the driver
+
+        :param str path: local path or URL of the configuration file
+        :return: file content or None if the file can't be read by the driver (e.g. TFTP or SCP URL)
+        :rtype: str
+        """
+        if os.path.isfile(path):
+            with open(path) as config_file:
+                return config_file.read()
+
+        scheme = path.split(":", 1)[0].lower()
+        if scheme not in self.DIFF_RESTORE_URL_SCHEMES:
+            return None
+
+        config_file = urlopen(path)
+        try:
+            return config_file.read().decode("utf-8")
+        finally:
+            config_file.close()
+
+    def restore(self, path, configuration_type="running", restore_method="override", vrf_management_name=None):
+        """Restore configuration, 'diff' restore method applies only changed lines of the running configuration
+
+        If the diff can't be applied or the running configuration doesn't match the file
+        afterwards, the file is restored with the override method.
+        :param str path: path to the configuration file
+        :param str configuration_type: "running" or "startup"
+        :param str restore_method: "override", "append" or "diff"
+        :param str vrf_management_name:
+        :return:
+        """
+        if restore_method.lower() == self.DIFF_RESTORE_METHOD:
+            config = None
+            if configuration_type.lower() == "running":
+                config = self._read_configuration_file(self.get_path(path))
+
+            if config is None:
+                self._logger.warning("Diff restore is supported only for the running configuration loaded over "
+                                     "{}, falling back to the override restore".format(
+                                         ", ".join(self.DIFF_RESTORE_URL_SCHEMES)))
+            elif self._restore_diff(config):
+                return
+            else:
+                self._logger.warning("Diff restore didn't produce the target configuration, "
+                                     "falling back to the override restore")
+
+            restore_method = "override"
+
+        return super(CgsLoadBalancerConfigurationRunner, self).restore(path=path,
+                                                                       configuration_type=configuration_type,
+                                                                       restore_method=restore_method,
+                                                                       vrf_management_name=vrf_management_name)
+
+    def _restore_diff(self, target_config):
+        """Apply commands that turn the running configuration into the target one in one config session
+
+        The running configuration is read again afterwards and compared with the target one.
+        :param str target_config:
+        :return: whether the running configuration matches the target configuration
+        :rtype: bool
+        """
+        running_config = self.get_configuration("running")
+        commands = build_diff_commands(running_config, target_config)
+
+        if not commands:
+            self._logger.info("Running configuration already matches the target configuration")
+            return True
+
+        self._logger.info("Applying {} configuration commands".format(len(commands)))
+
+        try:
+            cli_service_manager = self._cli_handler.get_cli_service(self._cli_handler.config_mode)
+
+            with trace_context_manager(cli_service_manager, "cli_connect", "cli_release") as config_session:
+                for command in commands:
+                    trace_count("cli_commands")
+                    config_session.send_command(command)
+        except Exception:
+            self._logger.warning("Failed to apply the configuration commands", exc_info=True)
+            return False
+
+        with trace_span("config_verify"):
+            if configs_match(self.get_configuration("running"), target_config):
+                return True
+
+        self._logger.warning("Running configuration doesn't match the target configuration after the diff restore")
+        return False
+
+    def _get_config_file_name(self, configuration_type):
+        """File name in the same format as the one of the files saved by the device
+
+        :param str configuration_type:
+        :rtype: str
+        """
+        return "{}-{}-{}".format(self.resource_config.name.replace(" ", "_")[:23],
+                                 configuration_type,
+                                 time.strftime("%d%m%y-%H%M%S", time.localtime()))
+
+    @staticmethod
+    def _remove_password(path):
+        """
+
+        :param str path: URL that may contain the user password
+        :rtype: str
+        """
+        url = urlparse(path)
+        if not url.password:
+            return path
+
+        netloc = url.netloc.rsplit("@", 1)[1]
+        return url._replace(netloc="{}@{}".format(url.username, netloc)).geturl()
+
+    @classmethod
+    def _iter_chunks(cls, data, compress):
+        """
+
+        :param bytes data:
+        :param bool compress: gzip the data
+        :return: generator of bytes chunks
+        """
+        compressor = None
+        if compress:
+            # 16 + MAX_WBITS produces the gzip header and trailer
+            compressor = zlib.compressobj(cls.GZIP_COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+        for offset in range(0, len(data), cls.STREAMING_SAVE_CHUNK_SIZE):
+            chunk = data[offset:offset + cls.STREAMING_SAVE_CHUNK_SIZE]
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+        if compressor is not None:
+            yield compressor.flush()
+
+    def _upload_ftp_file(self, url, file_name, chunks):
+        """
+
+        :param urlparse url: parsed URL of the destination folder
+        :param str file_name:
+        :param chunks: iterable of bytes
+        :return: number of uploaded bytes
+        :rtype: int
+        """
+        sizes = []
+
+        def _count(chunk_iter):
+            for chunk in chunk_iter:
+                sizes.append(len(chunk))
+                yield chunk
+
+        ftp = ftplib.FTP()
+        try:
+            ftp.connect(url.hostname, url.port or ftplib.FTP_PORT)
+            ftp.login(unquote(url.username or "anonymous"), unquote(url.password or ""))
+            if url.path.strip("/"):
+                ftp.cwd(unquote(url.path))
+            ftp.storbinary("STOR {}".format(file_name), ChunksReader(_count(chunks)))
+        finally:
+            try:
+                ftp.quit()
+            except Exception:
+                ftp.close()
+
+        return sum(sizes)
+
+    def save_if_changed(self, folder_path, configuration_type="running", compress=False,
+                        vrf_management_name=None):
+        """Save configuration only if it was changed since the last save of the resource to the folder
+
+        The configuration is read over CLI and hashed (volatile lines are ignored, see
+        SnapshotStore.get_config_hash); if the hash matches the last saved file, nothing
+        is transferred. Otherwise it is streamed by chunks, optionally gzipped, to the FTP server.
+        Other destinations, including local paths, are saved by the device without compression.
+        :param str folder_path: destination folder, Backup Location is used if empty
+        :param str configuration_type: "running" or "startup"
+        :param bool compress: gzip the configuration file
+        :param str vrf_management_name:
+        :return: path, config_hash, size (configuration bytes), transferred_size, compressed and skipped
+        :rtype: dict
+        """
+        configuration_type = configuration_type.lower()
+        destination = self.get_path(folder_path)
+        url = urlparse(destination)
+        scheme = url.scheme.lower()
+
+        streaming = scheme in self.STREAMING_SAVE_URL_SCHEMES
+        if compress and not streaming:
+            self._logger.warning("Compression is supported only for the FTP destinations, "
+                                 "saving configuration to {} without compression".format(scheme))
+            compress = False
+
+        config = self.get_configuration(configuration_type)
+        data = config.encode("utf-8")
+
+        with trace_span("config_hash"):
+            config_hash = self._snapshot_store.get_config_hash(config)
+
+        last_save = self._snapshot_store.get_last_save(self.resource_config.name, configuration_type, destination)
+        if (last_save is not None and last_save["config_hash"] == config_hash and
+                last_save["compressed"] == compress):
+            self._logger.info("Configuration was not changed since it was saved to {}, skipping transfer".format(
+                last_save["path"]))
+            return dict(last_save, transferred_size=0, skipped=True)
+
+        file_name = self._get_config_file_name(configuration_type)
+
+        with trace_span("config_transfer"):
+            if streaming:
+                if compress:
+                    file_name += self.GZIP_EXTENSION
+                transferred_size = self._upload_ftp_file(url, file_name, self._iter_chunks(data, compress))
+                path = "{}/{}".format(destination.rstrip("/"), file_name)
+            else:
+                file_name = self.save(folder_path=folder_path,
+                                      configuration_type=configuration_type,
+                                      vrf_management_name=vrf_management_name)
+                path = "{}/{}".format(destination.rstrip("/"), file_name)
+                transferred_size = len(data)
+
+        record = {"path": self._remove_password(path),
+                  "config_hash": config_hash,
+                  "size": len(data),
+                  "compressed": compress,
+                  "created_date": datetime.datetime.utcnow().isoformat()}
+        self._snapshot_store.set_last_save(self.resource_config.name, configuration_type, destination, record)
+
+        self._logger.info("Saved {} configuration to {} ({} bytes, {} transferred)".format(
+            configuration_type, record["path"], len(data), transferred_size))
+
+        return dict(record, transferred_size=transferred_size, skipped=False)
+
+    @staticmethod
+    def _parse_custom_params(custom_params):
+        """
+
+        :param str custom_params: JSON in the {"custom_params": {...}} format
+        :rtype: dict
+        """
+        if not custom_params:
+            return {}
+
+        return json.loads(custom_params).get("custom_params", {})
+
+    def orchestration_save(self, mode="shallow", custom_params=None):
+        """Save configuration to the backup location and to the local snapshot store
+
+        Upload is skipped when the device configuration is the same as in the latest
+        snapshot saved by the resource to the same folder with the same mode, the artifact
+        of that snapshot is returned instead.
+        :param str mode: 'shallow' or 'deep'
+        :param str custom_params: JSON with folder_path, configuration_type and vrf_management_name
+        :return: saved artifact info serialized as JSON
+        :rtype: str
+        """
+        params = self._parse_custom_params(custom_params)
+        configuration_type = (params.get("configuration_type") or "running").lower()
+        destination = self.get_path(params.get("folder_path") or "")
+        mode = mode.lower()
+        vrf_management_name = params.get("vrf_management_name") or self.resource_config.vrf_management_name
+
+        config = self.get_configuration(configuration_type)
+        config_hash = self._snapshot_store.get_config_hash(config)
+        latest_snapshot = self._snapshot_store.get_latest(self.resource_config.name, configuration_type,
+                                                          destination, mode)
+
+        if latest_snapshot is not None and latest_snapshot["config_hash"] == config_hash:
+            self._logger.info("Configuration was not changed since the snapshot {}, skipping upload".format(
+                latest_snapshot["id"]))
+            snapshot = latest_snapshot
+        else:
+            saved_artifact = self.save(folder_path=destination,
+                                       configuration_type=configuration_type,
+                                       vrf_management_name=vrf_management_name,
+                                       return_artifact=True)
+
+            snapshot = self._snapshot_store.put(resource_name=self.resource_config.name,
+                                                configuration_type=configuration_type,
+                                                config=config,
+                                                artifact={"artifact_type": saved_artifact.artifact_type,
+                                                          "identifier": saved_artifact.identifier},
+                                                destination=destination,
+                                                mode=mode)
+
+            self._logger.info("Saved snapshot {} ({} bytes, {} of {} chunks are new)".format(
+                snapshot["id"], snapshot["size"], snapshot["new_chunks"], len(snapshot["chunks"])))
+
+        saved_artifact = dict(snapshot["artifact"])
+        saved_artifact["snapshot_id"] = snapshot["id"]
+        saved_artifact["config_hash"] = snapshot["config_hash"]
+
+        return json.dumps({"saved_artifacts_info": {
+            "resource_name": self.resource_config.name,
+            "created_date": datetime.datetime.utcnow().isoformat(),
+            "restore_rules": {"requires_same_resource": True},
+            "saved_artifact": saved_artifact}})
+
+    def orchestration_restore(self, saved_artifact_info, custom_params=None):
+        """Restore configuration saved by the orchestration_save
+
+        Restore is skipped when the device configuration already matches the snapshot.
+        If the saved configuration file can't be restored (e.g. it was removed from the
+        backup location), the running configuration is restored from the local snapshot.
+        :param str saved_artifact_info: JSON returned by the orchestration_save
+        :param str custom_params: JSON with configuration_type, restore_method and vrf_management_name
+        :return:
+        """
+        artifacts_info = json.loads(saved_artifact_info)["saved_artifacts_info"]
+        saved_artifact = artifacts_info["saved_artifact"]
+        params = self._parse_custom_params(custom_params)
+
+        if (artifacts_info.get("restore_rules", {}).get("requires_same_resource") and
+                artifacts_info["resource_name"].lower() != self.resource_config.name.lower()):
+            raise Exception(self.__class__.__name__,
+                            "Saved artifact of the resource {} can't be restored on the resource {}".format(
+                                artifacts_info["resource_name"], self.resource_config.name))
+
+        configuration_type = (params.get("configuration_type") or "running").lower()
+        # the same as ConfigurationRunner, startup configuration files are always restored to the startup config
+        if "startup" in saved_artifact["identifier"].split("/")[-1]:
+            configuration_type = "startup"
+        restore_method = (params.get("restore_method") or "override").lower()
+        vrf_management_name = params.get("vrf_management_name") or self.resource_config.vrf_management_name
+
+        config_hash = saved_artifact.get("config_hash")
+        if config_hash and restore_method == "override":
+            if self._snapshot_store.get_config_hash(self.get_configuration(configuration_type)) == config_hash:
+                self._logger.info("Device configuration already matches the saved artifact, skipping restore")
+                return
+
+        path = "{}:{}".format(saved_artifact["artifact_type"], saved_artifact["identifier"])
+        try:
+            self.restore(path=path,
+                         configuration_type=configuration_type,
+                         restore_method=restore_method,
+                         vrf_management_name=vrf_management_name)
+        except Exception:
+            snapshot_id = saved_artifact.get("snapshot_id")
+            if (configuration_type != "running" or not snapshot_id or
+                    self._snapshot_store.get_manifest(snapshot_id) is None):
+                raise
+
+            self._logger.warning("Failed to restore {}, restoring the local snapshot {}".format(path, snapshot_id),
+                                 exc_info=True)
+            self._restore_snapshot(snapshot_id)
+
+    def _restore_snapshot(self, snapshot_id):
+        """Restore the running configuration from the local snapshot store
+
+        :param str snapshot_id:
+        :return:
+        """
+        with trace_span("snapshot_read"):
+            config = self._snapshot_store.read(snapshot_id)
+
+        if not self._restore_diff(config):
+            raise Exception(self.__class__.__name__,
+                            "Running configuration doesn't match the snapshot {} after the restore".format(
+                                snapshot_id))
@@ -0,0 +1,103 @@
+import time
+
+from cloudshell.cgs.runners.firmware import CgsFirmwareRunner
+
+from cgs.load_balancing.helpers.tracing import trace_context_manager
+from cgs.load_balancing.helpers.tracing import trace_count
+from cgs.load_balancing.helpers.tracing import trace_span
+
+
+class CgsLoadBalancerFirmwareRunner(CgsFirmwareRunner):
+    """Run the firmware load flow of CgsFirmwareRunner as a job, so the progress can be reported
+
+    The image transfer, install and reboot are done by the inherited load_firmware flow.
+    Cancellation is honored until the flow starts. When the flow is finished the device
+    is polled over CLI until it accepts sessions again, no session is held in between.
+    """
+
+    STAGE_LOAD = "load"
+    STAGE_VERIFY = "verify"
+
+    VERSION_COMMAND = "show version"
+
+    VERIFY_TIMEOUT = 1800
+    VERIFY_POLL_INTERVAL = 30
+
+    def __init__(self, cli_handler, logger, verify_timeout=VERIFY_TIMEOUT, verify_poll_interval=VERIFY_POLL_INTERVAL,
+                 sleep=time.sleep):
+        """
+
+        :param cloudshell.cgs.cli.handler.CgsCliHandler cli_handler:
+        :param logging.Logger logger:
+        :param int verify_timeout: max time in seconds to wait for the device after the firmware load flow
+        :param int verify_poll_interval: interval in seconds between the CLI connection attempts
+        :param sleep: callable that takes the number of seconds to sleep
+        """
+        super(CgsLoadBalancerFirmwareRunner, self).__init__(cli_handler=cli_handler, logger=logger)
+        self._cli_handler = cli_handler
+        self._logger = logger
+        self._verify_timeout = verify_timeout
+        self._verify_poll_interval = verify_poll_interval
+        self._sleep = sleep
+
+    def _get_version(self):
+        """Send the version command in a new CLI session, the session is released right after the command
+
+        :rtype: str
+        """
+        cli_service_manager = self._cli_handler.get_cli_service(self._cli_handler.enable_mode)
+
+        with trace_context_manager(cli_service_manager, "cli_connect", "cli_release") as cli_service:
+            trace_count("cli_commands")
+            return cli_service.send_command(self.VERSION_COMMAND)
+
+    def _wait_for_device(self, job):
+        """Poll the device over CLI until it accepts sessions
+
+        :param cgs.load_balancing.helpers.jobs.Job job:
+        :return: "show version" output
+        :rtype: str
+        """
+        job.set_stage(self.STAGE_VERIFY, attempts=0, timeout=self._verify_timeout)
+        waited = 0
+        attempts = 0
+
+        while True:
+            attempts += 1
+            job.update_progress(attempts=attempts)
+
+            try:
+                return self._get_version()
+            except Exception:
+                self._logger.debug("Device is not available yet", exc_info=True)
+
+            if waited + self._verify_poll_interval > self._verify_timeout:
+                raise Exception(self.__class__.__name__,
+                                "Device is not available {} seconds after the firmware load".format(
+                                    self._verify_timeout))
+
+            self._sleep(self._verify_poll_interval)
+            waited += self._verify_poll_interval
+
+    def load_firmware_staged(self, path, vrf_management_name, job):
+        """Run the firmware load flow and wait for the device, the job is updated with the progress
+
+        :param str path: URL of the firmware image, e.g. tftp://10.1.1.1/both.tim
+        :param str vrf_management_name:
+        :param cgs.load_balancing.helpers.jobs.Job job:
+        :return: result message
+        :rtype: str
+        """
+        job.check_cancelled()
+        job.set_stage(self.STAGE_LOAD, path=path)
+
+        with trace_span("firmware_load"):
+            response = self.load_firmware(path=path, vrf_management_name=vrf_management_name)
+
+        self._logger.info("Firmware load flow ended with response: {}".format(response))
+
+        with trace_span("firmware_verify"):
+            version = self._wait_for_device(job)
+
+        version = version.strip().splitlines()
+        return "Firmware {} is loaded, device is up: {}".format(path, version[0] if version else "")
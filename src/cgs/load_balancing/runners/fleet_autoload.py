@@ -0,0 +1,144 @@
+import socket
+import struct
+import time
+from collections import deque
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+FleetDiscoveryResult = namedtuple("FleetDiscoveryResult", ["resource_name", "address", "details", "error",
+                                                           "duration", "wait_time"])
+
+
+def get_subnet_key(address, prefix_length):
+    """Get the subnet of the IPv4 address, any other address (hostname, IPv6) is a subnet by itself
+
+    :param str address:
+    :param int prefix_length:
+    :rtype: str
+    """
+    try:
+        packed_address = socket.inet_aton(address)
+    except (socket.error, TypeError, ValueError):
+        return address
+
+    mask = (0xFFFFFFFF << (32 - prefix_length)) & 0xFFFFFFFF
+    network = struct.unpack("!I", packed_address)[0] & mask
+
+    return "{}/{}".format(socket.inet_ntoa(struct.pack("!I", network)), prefix_length)
+
+
+def get_fleet_summary(results):
+    """Timings summary of the fleet discovery
+
+    :param list[FleetDiscoveryResult] results:
+    :rtype: dict
+    """
+    durations = sorted(result.duration for result in results)
+    failed = [result.resource_name for result in results if result.error is not None]
+
+    return {"total": len(results),
+            "succeeded": len(results) - len(failed),
+            "failed": failed,
+            "min_duration": durations[0] if durations else 0.0,
+            "max_duration": durations[-1] if durations else 0.0,
+            "avg_duration": round(sum(durations) / len(durations), 3) if durations else 0.0,
+            "max_wait_time": max(result.wait_time for result in results) if results else 0.0}
+
+
+class CgsLoadBalancerFleetAutoloadRunner(object):
+    """Discover many devices concurrently
+
+    Discoveries are scheduled so that no more than max_workers run in total and no
+    more than max_per_subnet run against devices of the same subnet (devices behind
+    the same management switch/terminal server share the bandwidth and the CPU of
+    the SNMP agents). Results are yielded as soon as each device is discovered.
+    """
+
+    def __init__(self, discover, logger, max_workers=16, max_per_subnet=4, subnet_prefix_length=24):
+        """
+
+        :param discover: callable that takes the resource command context and returns AutoLoadDetails
+        :param logging.Logger logger:
+        :param int max_workers: max number of discoveries running at the same time
+        :param int max_per_subnet: max number of discoveries running at the same time in one subnet
+        :param int subnet_prefix_length: prefix length of the IPv4 subnets
+        """
+        self._discover = discover
+        self._logger = logger
+        self._max_workers = max(1, max_workers)
+        self._max_per_subnet = max(1, max_per_subnet)
+        self._subnet_prefix_length = subnet_prefix_length
+
+    def _discover_device(self, context, queued_time):
+        """
+
+        :param ResourceCommandContext context:
+        :param float queued_time: time when the discovery was queued
+        :rtype: FleetDiscoveryResult
+        """
+        start_time = time.time()
+        details = error = None
+
+        try:
+            details = self._discover(context)
+        except Exception as e:
+            self._logger.exception("Failed to discover the resource {}".format(context.resource.name))
+            error = str(e)
+
+        return FleetDiscoveryResult(resource_name=context.resource.name,
+                                    address=context.resource.address,
+                                    details=details,
+                                    error=error,
+                                    duration=round(time.time() - start_time, 3),
+                                    wait_time=round(start_time - queued_time, 3))
+
+    def discover(self, contexts):
+        """Discover devices, failure of one device doesn't affect the others
+
+        :param list[ResourceCommandContext] contexts:
+        :return: generator of the FleetDiscoveryResult in the order of completion
+        """
+        queued_time = time.time()
+        pending = deque((context, get_subnet_key(context.resource.address, self._subnet_prefix_length))
+                        for context in contexts)
+        running_per_subnet = {}
+        running_count = 0
+        done = Queue()
+        results = []
+
+        self._logger.info("Fleet discovery of {} resources started".format(len(pending)))
+
+        pool = ThreadPool(min(self._max_workers, len(pending)) or 1)
+        try:
+            while pending or running_count:
+                # start everything that fits into the limits, skip devices of the busy subnets
+                for _ in range(len(pending)):
+                    if running_count >= self._max_workers:
+                        break
+
+                    context, subnet = pending.popleft()
+                    if running_per_subnet.get(subnet, 0) >= self._max_per_subnet:
+                        pending.append((context, subnet))
+                        continue
+
+                    running_per_subnet[subnet] = running_per_subnet.get(subnet, 0) + 1
+                    running_count += 1
+                    pool.apply_async(self._discover_device,
+                                     (context, queued_time),
+                                     callback=lambda result, subnet=subnet: done.put((subnet, result)))
+
+                subnet, result = done.get()
+                running_per_subnet[subnet] -= 1
+                running_count -= 1
+                results.append(result)
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+        self._logger.info("Fleet discovery completed: {}".format(get_fleet_summary(results)))
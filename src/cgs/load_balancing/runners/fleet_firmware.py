@@ -0,0 +1,176 @@
+import time
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from cgs.load_balancing.helpers.jobs import Job
+from cgs.load_balancing.helpers.jobs import JobCancelledError
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+FirmwareRolloutResult = namedtuple("FirmwareRolloutResult", ["resource_name", "wave", "status", "response",
+                                                             "error", "duration"])
+
+
+class RolloutStatus(object):
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    # cancelled before the firmware load started because the failure threshold was crossed
+    CANCELLED = "cancelled"
+    # not started because the rollout was stopped
+    SKIPPED = "skipped"
+
+
+def get_rollout_waves(contexts, canary_size, batch_size):
+    """Split resources into the canary wave and the waves of batch_size resources
+
+    :param list contexts:
+    :param int canary_size: number of resources in the first wave, 0 means no canary wave
+    :param int batch_size: number of resources in the next waves
+    :rtype: list[list]
+    """
+    contexts = list(contexts)
+    batch_size = max(1, batch_size)
+    waves = [contexts[:canary_size]] if canary_size > 0 else []
+
+    for position in range(max(canary_size, 0), len(contexts), batch_size):
+        waves.append(contexts[position:position + batch_size])
+
+    return [wave for wave in waves if wave]
+
+
+def get_rollout_summary(results):
+    """
+
+    :param list[FirmwareRolloutResult] results:
+    :rtype: dict
+    """
+    summary = {"total": len(results)}
+
+    for status in (RolloutStatus.SUCCEEDED, RolloutStatus.FAILED, RolloutStatus.CANCELLED, RolloutStatus.SKIPPED):
+        summary[status] = sorted(result.resource_name for result in results if result.status == status)
+
+    summary["waves"] = max(result.wave for result in results) + 1 if results else 0
+    summary["max_duration"] = max(result.duration for result in results) if results else 0.0
+
+    return summary
+
+
+class CgsLoadBalancerFirmwareRolloutRunner(object):
+    """Load firmware on many devices in waves
+
+    The first wave is the canary, the next waves contain batch_size devices, devices
+    of the wave are upgraded in parallel and the next wave starts when the whole wave
+    is finished. The rollout stops as soon as the share of the failed devices exceeds
+    failure_threshold: devices of the current wave that haven't started the firmware load
+    are cancelled and the remaining waves are skipped.
+    """
+
+    JOB_NAME = "rollout_firmware"
+
+    def __init__(self, load_firmware, logger, canary_size=1, batch_size=8, failure_threshold=0.0):
+        """
+
+        :param load_firmware: callable that takes the resource command context and the Job and returns the response
+        :param logging.Logger logger:
+        :param int canary_size: number of devices in the first wave
+        :param int batch_size: number of devices in the next waves
+        :param float failure_threshold: share of the failed devices (0..1) that stops the rollout
+        """
+        self._load_firmware = load_firmware
+        self._logger = logger
+        self._canary_size = max(0, canary_size)
+        self._batch_size = max(1, batch_size)
+        self._failure_threshold = failure_threshold
+
+    def _load_device_firmware(self, context, job, wave_number):
+        """
+
+        :param ResourceCommandContext context:
+        :param Job job:
+        :param int wave_number:
+        :rtype: FirmwareRolloutResult
+        """
+        start_time = time.time()
+        response = error = None
+        status = RolloutStatus.SUCCEEDED
+
+        try:
+            response = job.run(lambda job: self._load_firmware(context, job))
+        except JobCancelledError as e:
+            status = RolloutStatus.CANCELLED
+            error = str(e)
+        except Exception as e:
+            self._logger.exception("Failed to load firmware on the resource {}".format(context.resource.name))
+            status = RolloutStatus.FAILED
+            error = str(e)
+
+        return FirmwareRolloutResult(resource_name=context.resource.name,
+                                     wave=wave_number,
+                                     status=status,
+                                     response=response,
+                                     error=error,
+                                     duration=round(time.time() - start_time, 3))
+
+    def _is_threshold_crossed(self, failed_count, started_count):
+        return bool(failed_count) and float(failed_count) / started_count > self._failure_threshold
+
+    def rollout(self, contexts):
+        """Load firmware wave by wave
+
+        :param list[ResourceCommandContext] contexts:
+        :return: generator of FirmwareRolloutResult in the order of completion, skipped devices are the last
+        """
+        waves = get_rollout_waves(contexts, self._canary_size, self._batch_size)
+        started_count = failed_count = 0
+        stopped = False
+
+        self._logger.info("Firmware rollout of {} resources in {} waves started".format(
+            sum(len(wave) for wave in waves), len(waves)))
+
+        pool = ThreadPool(max([len(wave) for wave in waves] or [1]))
+        try:
+            for wave_number, wave in enumerate(waves):
+                if stopped:
+                    for context in wave:
+                        yield FirmwareRolloutResult(resource_name=context.resource.name,
+                                                    wave=wave_number,
+                                                    status=RolloutStatus.SKIPPED,
+                                                    response=None,
+                                                    error=None,
+                                                    duration=0.0)
+                    continue
+
+                self._logger.info("Firmware rollout wave {} started: {}".format(
+                    wave_number, ", ".join(context.resource.name for context in wave)))
+
+                done = Queue()
+                jobs = []
+                for context in wave:
+                    job = Job(resource_name=context.resource.name, name=self.JOB_NAME)
+                    jobs.append(job)
+                    pool.apply_async(self._load_device_firmware, (context, job, wave_number), callback=done.put)
+
+                started_count += len(wave)
+
+                for _ in wave:
+                    result = done.get()
+                    if result.status == RolloutStatus.FAILED:
+                        failed_count += 1
+
+                    if not stopped and self._is_threshold_crossed(failed_count, started_count):
+                        stopped = True
+                        self._logger.warning("Firmware rollout is stopped, {} of {} devices failed".format(
+                            failed_count, started_count))
+                        for job in jobs:
+                            job.cancel()
+
+                    yield result
+
+                self._logger.info("Firmware rollout wave {} completed, {} of {} devices failed so far".format(
+                    wave_number, failed_count, started_count))
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,107 @@
+import time
+from multiprocessing.pool import ThreadPool
+
+from cloudshell.devices.runners.run_command_runner import RunCommandRunner
+
+from cgs.load_balancing.helpers.tracing import bind_span
+from cgs.load_balancing.helpers.tracing import trace_context_manager
+from cgs.load_balancing.helpers.tracing import trace_count
+
+
+class CgsLoadBalancerRunCommandRunner(RunCommandRunner):
+    STATUS_OK = "ok"
+    STATUS_ERROR = "error"
+    STATUS_SKIPPED = "skipped"
+
+    def __init__(self, cli_handler, logger, max_sessions=1):
+        """
+
+        :param cloudshell.cgs.cli.handler.CgsCliHandler cli_handler:
+        :param logging.Logger logger:
+        :param int max_sessions: max number of CLI sessions used by the parallel batch
+        """
+        super(CgsLoadBalancerRunCommandRunner, self).__init__(logger=logger, cli_handler=cli_handler)
+        self._cli_handler = cli_handler
+        self._logger = logger
+        self._max_sessions = max(1, max_sessions)
+
+    def _run_commands(self, commands, command_mode, stop_on_error):
+        """Run commands one by one in the single CLI session
+
+        :param list[tuple[int, str]] commands: (command index, command) pairs
+        :param command_mode: CLI command mode of the session
+        :param bool stop_on_error: skip the rest of the commands after the first failed one
+        :return: result per command, in the same order as the commands
+        :rtype: list[dict]
+        """
+        results = []
+        failed = False
+
+        cli_service_manager = self._cli_handler.get_cli_service(command_mode)
+
+        with trace_context_manager(cli_service_manager, "cli_connect", "cli_release") as cli_service:
+            for index, command in commands:
+                result = {"index": index, "command": command, "output": "", "error": None, "duration": 0.0}
+
+                if failed and stop_on_error:
+                    result["status"] = self.STATUS_SKIPPED
+                    results.append(result)
+                    continue
+
+                start_time = time.time()
+                trace_count("cli_commands")
+                try:
+                    result["output"] = cli_service.send_command(command)
+                    result["status"] = self.STATUS_OK
+                except Exception as e:
+                    self._logger.exception("Failed to run command '{}'".format(command))
+                    result["status"] = self.STATUS_ERROR
+                    result["error"] = str(e)
+                    failed = True
+
+                result["duration"] = round(time.time() - start_time, 3)
+                results.append(result)
+
+        return results
+
+    def run_custom_command_batch(self, commands, config_mode=False, parallel=False):
+        """Run list of commands and return structured result of each command
+
+        All commands of the batch are sent in one checked out CLI session, so the session
+        is taken from the pool and the command mode is switched only once. Read-only
+        commands can be spread across several sessions of the pool with parallel=True.
+        Config commands always run sequentially and stop on the first failed command.
+        :param list[str] commands:
+        :param bool config_mode: run commands in the config mode
+        :param bool parallel: spread read-only commands across several CLI sessions
+        :return: {"results": [...], "duration": ..., "failed": ...}
+        :rtype: dict
+        """
+        start_time = time.time()
+        indexed_commands = list(enumerate(commands))
+
+        if config_mode:
+            results = self._run_commands(indexed_commands, self._cli_handler.config_mode, stop_on_error=True)
+        elif parallel and self._max_sessions > 1 and len(indexed_commands) > 1:
+            sessions_count = min(self._max_sessions, len(indexed_commands))
+            command_groups = [indexed_commands[i::sessions_count] for i in range(sessions_count)]
+            self._logger.info("Running {} commands in {} CLI sessions".format(len(commands), sessions_count))
+
+            pool = ThreadPool(sessions_count)
+            try:
+                group_results = pool.map(
+                    bind_span(lambda group: self._run_commands(group, self._cli_handler.enable_mode,
+                                                               stop_on_error=False)),
+                    command_groups)
+            finally:
+                pool.close()
+                pool.join()
+
+            results = sorted((result for group in group_results for result in group),
+                             key=lambda result: result["index"])
+        else:
+            results = self._run_commands(indexed_commands, self._cli_handler.enable_mode, stop_on_error=False)
+
+        return {"results": results,
+                "duration": round(time.time() - start_time, 3),
+                "failed": sum(1 for result in results if result["status"] != self.STATUS_OK)}
@@ -0,0 +1,61 @@
+from cloudshell.cgs.runners.state import CgsStateRunner
+
+from cgs.load_balancing.helpers.tracing import trace_count
+
+
+class CgsLoadBalancerStateRunner(CgsStateRunner):
+    SNMP_HEALTH_CHECK_PROPERTIES = [("SNMPv2-MIB", "sysUpTime"),
+                                    ("SNMPv2-MIB", "sysDescr")]
+
+    def __init__(self, logger, api, resource_config, cli_handler):
+        """
+
+        :param logging.Logger logger:
+        :param cloudshell.api.cloudshell_api.CloudShellAPISession api:
+        :param resource_config:
+        :param cloudshell.cgs.cli.handler.CgsCliHandler cli_handler:
+        """
+        super(CgsLoadBalancerStateRunner, self).__init__(logger=logger,
+                                                         api=api,
+                                                         resource_config=resource_config,
+                                                         cli_handler=cli_handler)
+        self._logger = logger
+        self._api = api
+        self._resource_name = resource_config.name
+
+    def _get_passed_result(self):
+        return 'Health check on resource {} passed.'.format(self._resource_name)
+
+    def is_passed(self, result):
+        """
+
+        :param str result: health check result
+        :rtype: bool
+        """
+        return result == self._get_passed_result()
+
+    def snmp_health_check(self, snmp_handler):
+        """Check device with a single SNMP request, fall back to the CLI health check on failure
+
+        :param cgs.load_balancing.snmp.handler.CgsLoadBalancerSnmpHandler snmp_handler:
+        :return: health check result
+        :rtype: str
+        """
+        try:
+            with snmp_handler.get_snmp_service() as snmp_service:
+                for mib, name in self.SNMP_HEALTH_CHECK_PROPERTIES:
+                    trace_count("snmp_pdus")
+                    if not snmp_service.get_property(mib, name, 0):
+                        raise Exception("Unable to get {}::{} value".format(mib, name))
+        except Exception:
+            self._logger.warning("SNMP health check failed, falling back to the CLI health check", exc_info=True)
+            return self.health_check()
+
+        result = self._get_passed_result()
+
+        try:
+            self._api.SetResourceLiveStatus(self._resource_name, 'Online', result)
+        except Exception:
+            self._logger.error('Cannot update {} resource status on portal'.format(self._resource_name))
+
+        return result
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+
+from cgs.load_balancing.helpers.tracing import trace_context_manager
+from cgs.load_balancing.helpers.tracing import trace_span
+from cgs.load_balancing.snmp.bulk import SnmpBulkTableReader
+from cgs.load_balancing.statistics.counters import COUNTER32_MODULUS
+from cgs.load_balancing.statistics.counters import COUNTER64_MODULUS
+from cgs.load_balancing.statistics.counters import CounterSample
+from cgs.load_balancing.statistics.counters import compute_rates
+from cgs.load_balancing.statistics.counters import diff_samples
+from cgs.load_balancing.statistics.counters import get_shared_rows
+from cgs.load_balancing.statistics.counters import sum_groups
+
+
+class CgsLoadBalancerStatisticsRunner(object):
+    """Collect interface and LB group traffic counters, rates are calculated against the previous sample
+
+    LB group counters are the sums of the egress counters of the group output ports, the
+    result says so in "counter_source" and lists the output ports shared with other groups,
+    their traffic is counted in every group they belong to.
+    """
+
+    IF_MIB = "IF-MIB"
+    LB_MIB = "NPB-LB"
+    INTERFACE_NAME_COLUMN = "ifName"
+    INTERFACE_COUNTERS = OrderedDict([("ifHCInOctets", COUNTER64_MODULUS),
+                                      ("ifHCOutOctets", COUNTER64_MODULUS),
+                                      ("ifHCInUcastPkts", COUNTER64_MODULUS),
+                                      ("ifHCOutUcastPkts", COUNTER64_MODULUS),
+                                      ("ifInDiscards", COUNTER32_MODULUS),
+                                      ("ifOutDiscards", COUNTER32_MODULUS),
+                                      ("ifInErrors", COUNTER32_MODULUS),
+                                      ("ifOutErrors", COUNTER32_MODULUS)])
+    LB_GROUP_COUNTERS = ["ifHCOutOctets", "ifHCOutUcastPkts", "ifOutDiscards", "ifOutErrors"]
+    LB_GROUP_COLUMNS = ["lbGroupName", "lbGroupOutputs"]
+    LB_GROUP_COUNTER_SOURCE = "output_port_sum"
+
+    def __init__(self, snmp_handler, logger, resource_name, sample_store, bulk_max_repetitions=None):
+        """
+
+        :param cloudshell.cgs.snmp.handler.CgsSnmpHandler snmp_handler:
+        :param logging.Logger logger:
+        :param str resource_name:
+        :param cgs.load_balancing.statistics.counters.CounterSampleStore sample_store: previous samples
+        :param int bulk_max_repetitions: max-repetitions for the GETBULK table walks
+        """
+        self._snmp_handler = snmp_handler
+        self._logger = logger
+        self._resource_name = resource_name
+        self._sample_store = sample_store
+        self._bulk_max_repetitions = bulk_max_repetitions
+
+    @staticmethod
+    def _to_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _read_interfaces(self, bulk_reader):
+        """
+
+        :param SnmpBulkTableReader bulk_reader:
+        :return: interface names and {counter name: values}
+        :rtype: tuple
+        """
+        names = []
+        columns = OrderedDict((name, []) for name in self.INTERFACE_COUNTERS)
+
+        for suffix, values in bulk_reader.iter_table_rows(self.IF_MIB,
+                                                          [self.INTERFACE_NAME_COLUMN] + list(self.INTERFACE_COUNTERS)):
+            names.append(values[0] or suffix)
+            for counter_values, value in zip(columns.values(), values[1:]):
+                counter_values.append(self._to_int(value))
+
+        return names, columns
+
+    def _read_lb_groups(self, bulk_reader, interface_names):
+        """
+
+        :param SnmpBulkTableReader bulk_reader:
+        :param list[str] interface_names:
+        :return: LB group names and positions of the output interfaces of each group
+        :rtype: tuple
+        """
+        interface_positions = dict((name, position) for position, name in enumerate(interface_names))
+        names = []
+        groups = []
+
+        for suffix, (name, outputs) in bulk_reader.iter_table_rows(self.LB_MIB, self.LB_GROUP_COLUMNS):
+            names.append(name or suffix)
+            groups.append([interface_positions[output.strip()] for output in (outputs or "").split(",")
+                           if output.strip() in interface_positions])
+
+        return names, groups
+
+    def get_statistics(self):
+        """Read counters in one SNMP session and calculate deltas and rates since the previous call
+
+        :return: {"up_time", "interval", "interfaces": {...}, "lb_groups": {...}}, each table has names
+            and counters, deltas and rates as {counter name: [value for each name]}, deltas and
+            rates are None for the first sample and after the device reboot; LB groups also have
+            "counter_source", "outputs" and "shared_outputs" (outputs that are in other groups too)
+        :rtype: dict
+        """
+        snmp_service_manager = self._snmp_handler.get_snmp_service()
+
+        with trace_context_manager(snmp_service_manager, "snmp_enable", "snmp_disable") as snmp_service:
+            up_time = int(snmp_service.get_property("SNMPv2-MIB", "sysUpTime", 0))
+            bulk_reader = SnmpBulkTableReader(snmp_service=snmp_service,
+                                              logger=self._logger,
+                                              max_repetitions=self._bulk_max_repetitions)
+
+            with trace_span("interface_counters"):
+                interface_names, interface_counters = self._read_interfaces(bulk_reader)
+
+            with trace_span("lb_groups"):
+                lb_group_names, lb_group_outputs = self._read_lb_groups(bulk_reader, interface_names)
+
+        with trace_span("counter_rates"):
+            sample = CounterSample(up_time=up_time, keys=interface_names, columns=interface_counters)
+            previous_sample = self._sample_store.get(self._resource_name)
+            self._sample_store.set(self._resource_name, sample)
+
+            interval, interface_deltas, interface_rates = diff_samples(previous_sample, sample,
+                                                                       self.INTERFACE_COUNTERS)
+
+            lb_group_counters = OrderedDict((name, sum_groups(interface_counters[name], lb_group_outputs))
+                                            for name in self.LB_GROUP_COUNTERS)
+            lb_group_deltas = lb_group_rates = None
+
+            if interval is not None:
+                lb_group_deltas = OrderedDict((name, sum_groups(interface_deltas[name], lb_group_outputs))
+                                              for name in self.LB_GROUP_COUNTERS if name in interface_deltas)
+                lb_group_rates = OrderedDict((name, compute_rates(deltas, interval))
+                                             for name, deltas in lb_group_deltas.items())
+
+        self._logger.info("Read counters of {} interfaces and {} LB groups in {} GETBULK requests{}".format(
+            len(interface_names), len(lb_group_names), bulk_reader.pdu_count,
+            "" if interval is None else ", {:.1f}s since the previous sample".format(interval)))
+
+        return {"up_time": up_time,
+                "interval": interval,
+                "interfaces": {"names": interface_names,
+                               "counters": interface_counters,
+                               "deltas": interface_deltas,
+                               "rates": interface_rates},
+                "lb_groups": {"names": lb_group_names,
+                              "counter_source": self.LB_GROUP_COUNTER_SOURCE,
+                              "outputs": [[interface_names[position] for position in positions]
+                                          for positions in lb_group_outputs],
+                              "shared_outputs": [[interface_names[position] for position in positions]
+                                                 for positions in get_shared_rows(lb_group_outputs)],
+                              "counters": lb_group_counters,
+                              "deltas": lb_group_deltas,
+                              "rates": lb_group_rates}}
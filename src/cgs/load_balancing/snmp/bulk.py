@@ -0,0 +1,193 @@
+from collections import OrderedDict
+
+from cgs.load_balancing.helpers.tracing import trace_count
+
+
+class SnmpBulkWalkError(Exception):
+    pass
+
+
+def _oid_as_tuple(oid):
+    if hasattr(oid, "asTuple"):
+        return tuple(oid.asTuple())
+
+    return tuple(oid)
+
+
+def resolve_column_oid(snmp_service, mib, column):
+    """Resolve the MIB object name to OID
+
+    SNMP services that don't have a MIB viewer, e.g. the capture proxies, implement resolve_column_oid.
+    :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service:
+    :param str mib:
+    :param str column:
+    :rtype: tuple
+    """
+    if hasattr(snmp_service, "resolve_column_oid"):
+        return tuple(snmp_service.resolve_column_oid(mib, column))
+
+    from pysnmp.entity.rfc3413.oneliner import cmdgen
+
+    mib_variable = cmdgen.MibVariable(mib, column)
+    mib_variable.resolveWithMib(snmp_service.mib_viewer)
+    return tuple(mib_variable.asTuple())
+
+
+def get_bulk_rows(snmp_service, oids, max_repetitions):
+    """Send one GETBULK request starting after the given OIDs
+
+    SNMP services that don't send requests themselves, e.g. the capture proxies, implement get_bulk_rows.
+    :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service:
+    :param list[tuple] oids:
+    :param int max_repetitions:
+    :return: rows of (OID, value) for each requested OID, value is None at the end of the MIB view
+    :rtype: list[list[tuple]]
+    """
+    if hasattr(snmp_service, "get_bulk_rows"):
+        return snmp_service.get_bulk_rows(oids, max_repetitions)
+
+    from pysnmp.proto import rfc1905
+
+    error_indication, error_status, error_index, var_bind_table = snmp_service.cmd_gen.bulkCmd(
+        snmp_service.security,
+        snmp_service.target,
+        0,
+        max_repetitions,
+        *oids,
+        lookupNames=False,
+        lookupValues=True,
+        lexicographicMode=True,
+        maxRows=max_repetitions)
+
+    if error_indication:
+        raise SnmpBulkWalkError(str(error_indication))
+
+    if error_status:
+        raise SnmpBulkWalkError("{} at {}".format(error_status.prettyPrint(), error_index))
+
+    return [[(_oid_as_tuple(oid), None if isinstance(value, rfc1905.EndOfMibView) else value.prettyPrint())
+             for oid, value in var_bind_row]
+            for var_bind_row in var_bind_table]
+
+
+class SnmpBulkTableReader(object):
+    """Read selected columns of the SNMP table with GETBULK requests
+
+    Every request asks for the next max_repetitions rows of all still unfinished
+    columns at once, so the number of round trips depends on the number of rows
+    divided by max_repetitions instead of rows multiplied by columns.
+    """
+
+    DEFAULT_MAX_REPETITIONS = 25
+
+    def __init__(self, snmp_service, logger, max_repetitions=None):
+        """
+
+        :param cloudshell.snmp.quali_snmp.QualiSnmp snmp_service:
+        :param logging.Logger logger:
+        :param int max_repetitions: GETBULK max-repetitions value
+        """
+        self._snmp_service = snmp_service
+        self._logger = logger
+        self.max_repetitions = max_repetitions or self.DEFAULT_MAX_REPETITIONS
+        self.pdu_count = 0
+
+    def _resolve_column_oid(self, mib, column):
+        """
+
+        :param str mib:
+        :param str column:
+        :rtype: tuple
+        """
+        return resolve_column_oid(self._snmp_service, mib, column)
+
+    def _get_bulk(self, oids):
+        """Send one GETBULK request starting after the given OIDs
+
+        :param list[tuple] oids:
+        :rtype: list[list[tuple]]
+        """
+        self.pdu_count += 1
+        trace_count("snmp_pdus")
+
+        return get_bulk_rows(self._snmp_service, oids, self.max_repetitions)
+
+    def iter_table_rows(self, mib, columns):
+        """Walk the given table columns and yield rows as soon as all their columns are read
+
+        Columns are read in parallel, so a row is complete when every still unfinished
+        column has advanced past its index. Only rows that are not complete yet are kept,
+        the whole table is never held in memory.
+        :param str mib: MIB name, e.g. "NPB-LB"
+        :param list[str] columns: column names, e.g. ["lbGroupName", "lbGroupAlgo"]
+        :return: generator of (suffix, [value of each column or None]) in the table order
+        """
+        column_oids = [self._resolve_column_oid(mib, column) for column in columns]
+        next_oids = list(column_oids)
+        active_columns = list(range(len(columns)))
+        # {row index: [value of each column]}
+        pending_rows = {}
+        rows_count = 0
+
+        while active_columns:
+            var_bind_table = self._get_bulk([next_oids[column_id] for column_id in active_columns])
+            unfinished_columns = []
+            read_up_to = None
+
+            for position, column_id in enumerate(active_columns):
+                column_oid = column_oids[column_id]
+                last_oid = None
+                finished = not var_bind_table
+
+                for var_bind_row in var_bind_table:
+                    oid, value = var_bind_row[position]
+                    oid = tuple(oid)
+
+                    if oid[:len(column_oid)] != column_oid or value is None:
+                        finished = True
+                        break
+
+                    index = oid[len(column_oid):]
+                    row = pending_rows.get(index)
+                    if row is None:
+                        row = pending_rows[index] = [None] * len(columns)
+                    row[column_id] = value
+                    last_oid = oid
+
+                if not finished and last_oid is not None:
+                    next_oids[column_id] = last_oid
+                    unfinished_columns.append(column_id)
+
+                    column_index = last_oid[len(column_oid):]
+                    if read_up_to is None or column_index < read_up_to:
+                        read_up_to = column_index
+
+            active_columns = unfinished_columns
+
+            complete_indexes = sorted(index for index in pending_rows
+                                      if read_up_to is None or index <= read_up_to)
+
+            for index in complete_indexes:
+                rows_count += 1
+                yield ".".join(str(sub_id) for sub_id in index), pending_rows.pop(index)
+
+        self._logger.debug("Read {} rows of {}::{} in {} GETBULK requests".format(rows_count, mib, columns,
+                                                                                self.pdu_count))
+
+    def get_table_columns(self, mib, columns):
+        """Walk the given table columns and join values by the row suffix
+
+        :param str mib: MIB name, e.g. "NPB-LB"
+        :param list[str] columns: column names, e.g. ["lbGroupName", "lbGroupAlgo"]
+        :return: {suffix: {"suffix": suffix, column: value}} in the same format as QualiSnmp.get_table
+        :rtype: collections.OrderedDict
+        """
+        table = OrderedDict()
+
+        for suffix, values in self.iter_table_rows(mib, columns):
+            row = table[suffix] = {"suffix": suffix}
+            for column, value in zip(columns, values):
+                if value is not None:
+                    row[column] = value
+
+        return table
@@ -0,0 +1,116 @@
+from contextlib import contextmanager
+
+from cloudshell.cgs.snmp.handler import CgsSnmpHandler
+from cloudshell.devices.driver_helper import get_snmp_parameters_from_command_context
+from cloudshell.snmp.quali_snmp import QualiSnmp
+
+from cgs.load_balancing.helpers.tracing import trace_count
+from cgs.load_balancing.helpers.tracing import trace_span
+from cgs.load_balancing.snmp.session_cache import get_snmp_credentials_key
+
+
+class CgsLoadBalancerSnmpHandler(CgsSnmpHandler):
+    """SNMP handler that reuses sessions of the resource between the commands
+
+    The enable SNMP flow is skipped while SNMP is known to be enabled, it is checked
+    with a single GET request over the reused session. New sessions are created only after
+    the enable SNMP flow, as the session sends a request to the agent. The disable SNMP flow runs as
+    usual and resets the state, so the next command enables SNMP again.
+    """
+
+    PROBE_MIB = "SNMPv2-MIB"
+    PROBE_PROPERTY = "sysObjectID"
+
+    def __init__(self, resource_config, logger, api, cli_handler, session_cache):
+        """
+
+        :param resource_config:
+        :param logging.Logger logger:
+        :param cloudshell.api.cloudshell_api.CloudShellAPISession api:
+        :param cloudshell.cgs.cli.handler.CgsCliHandler cli_handler:
+        :param cgs.load_balancing.snmp.session_cache.SnmpSessionCache session_cache:
+        """
+        super(CgsLoadBalancerSnmpHandler, self).__init__(resource_config, logger, api, cli_handler)
+        self._resource_config = resource_config
+        self._logger = logger
+        self._api = api
+        self._session_cache = session_cache
+
+    @staticmethod
+    def _is_enabled(value):
+        return str(value).lower() == str(True).lower()
+
+    def _create_session(self, snmp_parameters):
+        """
+
+        :param snmp_parameters:
+        :rtype: QualiSnmp
+        """
+        with trace_span("snmp_session_create"):
+            return QualiSnmp(snmp_parameters, self._logger)
+
+    def _is_reachable(self, snmp_service):
+        """
+
+        :param QualiSnmp snmp_service:
+        :rtype: bool
+        """
+        try:
+            with trace_span("snmp_probe"):
+                return bool(snmp_service.get_property(self.PROBE_MIB, self.PROBE_PROPERTY, 0))
+        except Exception:
+            self._logger.debug("SNMP probe failed", exc_info=True)
+            return False
+
+    def _run_enable_flow(self, entry):
+        """
+
+        :param cgs.load_balancing.snmp.session_cache.SnmpSessionEntry entry:
+        :return:
+        """
+        with trace_span("snmp_enable_flow"):
+            self.enable_flow.execute_flow(entry.snmp_parameters)
+
+    def get_snmp_service(self):
+        """Enable SNMP if needed and return a session of the resource
+
+        :rtype: QualiSnmp
+        """
+        return self._get_snmp_service()
+
+    @contextmanager
+    def _get_snmp_service(self):
+        entry = self._session_cache.get_entry(
+            resource_name=self._resource_config.name,
+            credentials_key=get_snmp_credentials_key(self._resource_config),
+            snmp_parameters_factory=lambda: get_snmp_parameters_from_command_context(self._resource_config, self._api))
+
+        enable_snmp = self._is_enabled(self._resource_config.enable_snmp)
+        disable_snmp = self._is_enabled(self._resource_config.disable_snmp)
+
+        try:
+            if enable_snmp:
+                snmp_service, enable_skipped = self._session_cache.acquire_enabled(
+                    entry=entry,
+                    session_factory=self._create_session,
+                    enable_snmp=lambda: self._run_enable_flow(entry),
+                    is_reachable=self._is_reachable)
+
+                if enable_skipped:
+                    trace_count("snmp_enable_skipped")
+                    self._logger.debug("SNMP is already enabled on the device, enable SNMP flow is skipped")
+            else:
+                snmp_service = self._session_cache.acquire(entry, self._create_session)
+
+            self._session_cache.set_snmp_enabled(entry, True)
+            yield snmp_service
+        except Exception:
+            self._session_cache.set_snmp_enabled(entry, False)
+            raise
+        else:
+            self._session_cache.release(entry, snmp_service)
+        finally:
+            if disable_snmp:
+                self._session_cache.set_snmp_enabled(entry, False)
+                with trace_span("snmp_disable_flow"):
+                    self.disable_flow.execute_flow(entry.snmp_parameters)
@@ -0,0 +1,37 @@
+from cloudshell.devices.driver_helper import get_snmp_parameters_from_command_context
+from cloudshell.snmp.quali_snmp import QualiSnmp
+
+
+class SnmpSessionFactory(object):
+    """Create additional SNMP sessions to the device
+
+    Sessions are created directly, without the enable/disable SNMP flows, so they
+    must be used only while the main SNMP service (that enables SNMP) is open.
+    """
+
+    def __init__(self, resource_config, api, logger):
+        """
+
+        :param resource_config:
+        :param cloudshell.api.cloudshell_api.CloudShellAPISession api:
+        :param logging.Logger logger:
+        """
+        self._resource_config = resource_config
+        self._api = api
+        self._logger = logger
+        self._snmp_parameters = None
+
+    @property
+    def snmp_parameters(self):
+        if self._snmp_parameters is None:
+            self._snmp_parameters = get_snmp_parameters_from_command_context(self._resource_config, self._api)
+
+        return self._snmp_parameters
+
+    def create(self):
+        """
+
+        :rtype: QualiSnmp
+        """
+        return QualiSnmp(self.snmp_parameters, self._logger)
+
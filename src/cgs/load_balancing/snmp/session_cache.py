@@ -0,0 +1,187 @@
+import hashlib
+import threading
+import time
+
+from cgs.load_balancing.helpers.cache import TtlLruCache
+
+SNMP_CREDENTIALS_ATTRIBUTES = ["address",
+                               "snmp_version",
+                               "snmp_read_community",
+                               "snmp_write_community",
+                               "snmp_v3_user",
+                               "snmp_v3_password",
+                               "snmp_v3_private_key",
+                               "snmp_v3_auth_protocol",
+                               "snmp_v3_priv_protocol"]
+
+
+def get_snmp_credentials_key(resource_config):
+    """Hash of the SNMP address and credentials, passwords are hashed in the encrypted form
+
+    :param resource_config:
+    :rtype: str
+    """
+    items = [(name, getattr(resource_config, name, None)) for name in SNMP_CREDENTIALS_ATTRIBUTES]
+    return hashlib.sha1(repr(items).encode("utf-8")).hexdigest()
+
+
+class SnmpSessionEntry(object):
+    """SNMP parameters, idle sessions and the SNMP state of one resource"""
+
+    def __init__(self, credentials_key, snmp_parameters):
+        """
+
+        :param str credentials_key:
+        :param cloudshell.snmp.snmp_parameters.SNMPParameters snmp_parameters: decrypted SNMP parameters
+        """
+        self.credentials_key = credentials_key
+        self.snmp_parameters = snmp_parameters
+        self.idle_sessions = []
+        self.snmp_enabled_at = None
+        self.lock = threading.Lock()
+
+
+class SnmpSessionCache(object):
+    """Per-resource pool of SNMP sessions reused by the subsequent commands
+
+    A session keeps its SNMP engine, so the discovered SNMPv3 engine ID and the
+    localized authentication and privacy keys are not computed again. The entry of
+    the resource is replaced as soon as its SNMP address or credentials change.
+    """
+
+    def __init__(self, max_size=64, max_idle_sessions=4, enabled_ttl=300, timer=time.time):
+        """
+
+        :param int max_size: max number of resources
+        :param int max_idle_sessions: max number of idle sessions kept for one resource
+        :param float enabled_ttl: seconds SNMP is considered enabled after the enable flow or a successful request
+        :param timer: callable that returns the current time in seconds
+        """
+        self._entries = TtlLruCache(max_size=max_size, ttl=None)
+        self._max_idle_sessions = max_idle_sessions
+        self._enabled_ttl = enabled_ttl
+        self._timer = timer
+        self._lock = threading.Lock()
+        self.created_sessions = 0
+        self.reused_sessions = 0
+
+    def get_entry(self, resource_name, credentials_key, snmp_parameters_factory):
+        """
+
+        :param str resource_name:
+        :param str credentials_key: see get_snmp_credentials_key
+        :param snmp_parameters_factory: callable without arguments that returns the SNMP parameters
+        :rtype: SnmpSessionEntry
+        """
+        with self._lock:
+            entry = self._entries.get(resource_name)
+
+            if entry is None or entry.credentials_key != credentials_key:
+                entry = SnmpSessionEntry(credentials_key, snmp_parameters_factory())
+                self._entries.set(resource_name, entry)
+
+        return entry
+
+    def invalidate(self, resource_name):
+        """
+
+        :param str resource_name:
+        :return:
+        """
+        self._entries.pop(resource_name)
+
+    def clear(self):
+        """
+
+        :return:
+        """
+        self._entries.clear()
+
+    def acquire(self, entry, session_factory):
+        """Take an idle session of the resource or create a new one, sessions are never shared
+
+        :param SnmpSessionEntry entry:
+        :param session_factory: callable that takes SNMP parameters and returns a new session
+        :rtype: cloudshell.snmp.quali_snmp.QualiSnmp
+        """
+        session = self._take_idle_session(entry)
+        if session is not None:
+            return session
+
+        self.created_sessions += 1
+        return session_factory(entry.snmp_parameters)
+
+    def acquire_enabled(self, entry, session_factory, enable_snmp, is_reachable):
+        """Take a session of the resource, SNMP is enabled on the device before a new session is created
+
+        A new QualiSnmp session sends a request to the agent, so the enable SNMP flow runs first.
+        The flow is skipped only if SNMP was enabled recently and an idle session is reachable.
+        :param SnmpSessionEntry entry:
+        :param session_factory: callable that takes SNMP parameters and returns a new session
+        :param enable_snmp: callable without arguments that runs the enable SNMP flow
+        :param is_reachable: callable that takes a session and returns whether the agent answers
+        :return: session and whether the enable SNMP flow was skipped
+        :rtype: tuple
+        """
+        if self.is_snmp_enabled(entry):
+            session = self._take_idle_session(entry)
+            if session is not None and is_reachable(session):
+                return session, True
+
+        self.set_snmp_enabled(entry, False)
+        enable_snmp()
+        self.set_snmp_enabled(entry, True)
+
+        return self.acquire(entry, session_factory), False
+
+    def _take_idle_session(self, entry):
+        """
+
+        :param SnmpSessionEntry entry:
+        :return: idle session or None
+        """
+        with entry.lock:
+            if entry.idle_sessions:
+                self.reused_sessions += 1
+                return entry.idle_sessions.pop()
+
+        return None
+
+    def release(self, entry, session):
+        """Return the session to the pool
+
+        :param SnmpSessionEntry entry:
+        :param session:
+        :return:
+        """
+        with entry.lock:
+            if len(entry.idle_sessions) < self._max_idle_sessions:
+                entry.idle_sessions.append(session)
+
+    def is_snmp_enabled(self, entry):
+        """
+
+        :param SnmpSessionEntry entry:
+        :return: whether SNMP was enabled or used recently
+        :rtype: bool
+        """
+        return entry.snmp_enabled_at is not None and self._timer() - entry.snmp_enabled_at <= self._enabled_ttl
+
+    def set_snmp_enabled(self, entry, enabled):
+        """
+
+        :param SnmpSessionEntry entry:
+        :param bool enabled:
+        :return:
+        """
+        entry.snmp_enabled_at = self._timer() if enabled else None
+
+    @property
+    def stats(self):
+        """
+
+        :rtype: dict
+        """
+        return {"resources": len(self._entries),
+                "created_sessions": self.created_sessions,
+                "reused_sessions": self.reused_sessions}
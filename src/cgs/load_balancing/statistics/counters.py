@@ -0,0 +1,153 @@
+from collections import OrderedDict
+
+from cgs.load_balancing.helpers.cache import TtlLruCache
+
+COUNTER32_MODULUS = 2 ** 32
+COUNTER64_MODULUS = 2 ** 64
+RATE_PRECISION = 3
+
+
+class CounterSample(object):
+    """Counters of the table rows read at one moment, stored column by column"""
+
+    def __init__(self, up_time, keys, columns):
+        """
+
+        :param int up_time: sysUpTime of the sample in hundredths of a second
+        :param list[str] keys: row keys, e.g. interface names
+        :param collections.OrderedDict columns: {counter name: [counter value or None for each row]}
+        """
+        self.up_time = up_time
+        self.keys = keys
+        self.columns = columns
+
+
+def align_rows(previous_keys, keys):
+    """Positions of the current rows in the previous sample
+
+    :param list[str] previous_keys:
+    :param list[str] keys:
+    :return: index of the row in the previous sample or None for the new rows
+    :rtype: list
+    """
+    previous_positions = dict((key, position) for position, key in enumerate(previous_keys))
+    return [previous_positions.get(key) for key in keys]
+
+
+def compute_deltas(values, previous_values, positions, modulus):
+    """Counter increments since the previous sample, a counter wrap is handled with the modulus
+
+    Counter is expected to wrap at most once between the samples, with the 64-bit
+    counters it can't happen at any realistic polling interval.
+    :param list values:
+    :param list previous_values:
+    :param list positions: see align_rows
+    :param int modulus: COUNTER32_MODULUS or COUNTER64_MODULUS
+    :rtype: list
+    """
+    return [None if position is None or value is None or previous_values[position] is None
+            else (value - previous_values[position]) % modulus
+            for value, position in zip(values, positions)]
+
+
+def compute_rates(deltas, interval):
+    """
+
+    :param list deltas:
+    :param float interval: seconds between the samples
+    :return: increments per second
+    :rtype: list
+    """
+    return [None if delta is None else round(delta / interval, RATE_PRECISION) for delta in deltas]
+
+
+def sum_groups(values, groups):
+    """Sum values of the rows of every group
+
+    :param list values:
+    :param list[list[int]] groups: row positions of each group
+    :return: sum for each group, None if no row of the group has a value
+    :rtype: list
+    """
+    sums = []
+
+    for positions in groups:
+        group_values = [values[position] for position in positions if values[position] is not None]
+        sums.append(sum(group_values) if group_values else None)
+
+    return sums
+
+
+def get_shared_rows(groups):
+    """Rows that belong to more than one group, their counters are added to the sums of all of them
+
+    :param list[list[int]] groups: row positions of each group
+    :return: positions of the shared rows of each group
+    :rtype: list[list[int]]
+    """
+    groups_count = {}
+
+    for positions in groups:
+        for position in set(positions):
+            groups_count[position] = groups_count.get(position, 0) + 1
+
+    return [[position for position in positions if groups_count[position] > 1] for positions in groups]
+
+
+def diff_samples(previous, current, moduli):
+    """Deltas and rates of all counters of the sample
+
+    There are no deltas if there is no previous sample or the device was rebooted in
+    between (sysUpTime went backwards), the current sample becomes the baseline.
+    :param CounterSample previous:
+    :param CounterSample current:
+    :param dict moduli: {counter name: COUNTER32_MODULUS or COUNTER64_MODULUS}
+    :return: interval in seconds, {counter name: deltas}, {counter name: rates} or None, None, None
+    :rtype: tuple
+    """
+    if previous is None or current.up_time <= previous.up_time:
+        return None, None, None
+
+    interval = (current.up_time - previous.up_time) / 100.0
+    positions = align_rows(previous.keys, current.keys)
+    deltas = OrderedDict()
+    rates = OrderedDict()
+
+    for name, values in current.columns.items():
+        previous_values = previous.columns.get(name)
+        if previous_values is None:
+            continue
+
+        deltas[name] = compute_deltas(values, previous_values, positions, moduli[name])
+        rates[name] = compute_rates(deltas[name], interval)
+
+    return interval, deltas, rates
+
+
+class CounterSampleStore(object):
+    """Keeps the last counter sample for each resource"""
+
+    def __init__(self, max_size=256, ttl=None):
+        """
+
+        :param int max_size:
+        :param float ttl: sample time to live in seconds, None means no expiration
+        """
+        self._cache = TtlLruCache(max_size=max_size, ttl=ttl)
+
+    def get(self, key):
+        """
+
+        :param key:
+        :rtype: CounterSample
+        """
+        return self._cache.get(key)
+
+    def set(self, key, sample):
+        """
+
+        :param key:
+        :param CounterSample sample:
+        :return:
+        """
+        self._cache.set(key, sample)
@@ -1,30 +1,104 @@
-from cloudshell.cgs.snmp.handler import CgsSnmpHandler
-from cloudshell.cgs.cli.handler import CgsCliHandler
-from cloudshell.cgs.runners.configuration import CgsConfigurationRunner
-from cloudshell.cgs.runners.firmware import CgsFirmwareRunner
-from cloudshell.cgs.runners.state import CgsStateRunner
+import json
+import os
+import re
+import tempfile
+from xml.etree import ElementTree
+
 from cloudshell.core.context.error_handling_context import ErrorHandlingContext
+from cloudshell.core.logger.qs_logger import get_qs_logger
 from cloudshell.devices.driver_helper import get_api
 from cloudshell.devices.driver_helper import get_cli
 from cloudshell.devices.driver_helper import get_logger_with_thread_id
 from cloudshell.devices.driver_helper import parse_custom_commands
 from cloudshell.devices.standards.load_balancing.configuration_attributes_structure import \
     create_load_balancing_resource_from_context
-from cloudshell.devices.runners.run_command_runner import RunCommandRunner
-from cloudshell.shell.core.driver_utils import GlobalLock
 from cloudshell.shell.core.resource_driver_interface import ResourceDriverInterface
 
-from cgs.load_balancing.runners.autoload import CgsLoadBalancerAutoloadRunner
-
-
-class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
+from cgs.load_balancing.autoload.state import AutoloadStateStore
+from cgs.load_balancing.capture.session import CaptureMode
+from cgs.load_balancing.capture.session import REPLAYED_MARKER
+from cgs.load_balancing.capture.session import captured_command
+from cgs.load_balancing.capture.session import get_current_capture
+from cgs.load_balancing.capture.session import mark_replayed_logs
+from cgs.load_balancing.cli.session_pool import CliSessionPool
+from cgs.load_balancing.cli.session_pool import CliSessionWarmPool
+from cgs.load_balancing.helpers.async_logging import AsyncLogHandlers
+from cgs.load_balancing.helpers.locks import OperationClass
+from cgs.load_balancing.helpers.locks import OperationLockManager
+from cgs.load_balancing.helpers.cache import TtlLruCache
+from cgs.load_balancing.helpers.concurrency import AdaptiveConcurrencyLimits
+from cgs.load_balancing.helpers.concurrency import format_concurrency_stats
+from cgs.load_balancing.helpers.jobs import Job
+from cgs.load_balancing.helpers.jobs import JobManager
+from cgs.load_balancing.helpers.resource_attributes import get_attribute_value
+from cgs.load_balancing.helpers.resource_attributes import get_bool_attribute
+from cgs.load_balancing.helpers.resource_attributes import get_context_attribute_value
+from cgs.load_balancing.helpers.resource_attributes import get_int_attribute
+from cgs.load_balancing.helpers.resource_context import ResourceContext
+from cgs.load_balancing.helpers.resource_context import ResourceContextCache
+from cgs.load_balancing.helpers.snapshot_store import SnapshotStore
+from cgs.load_balancing.helpers.tracing import NULL_SPAN
+from cgs.load_balancing.helpers.tracing import command_trace
+from cgs.load_balancing.helpers.tracing import trace_span
+from cgs.load_balancing.helpers.tracing import traced_command
+from cgs.load_balancing.snmp.session_cache import SnmpSessionCache
+from cgs.load_balancing.statistics.counters import CounterSampleStore
+
+
+class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface):
     SUPPORTED_OS = [r"COS"]
     SHELL_NAME = "CGS COS Loadbalancer Shell 2G"
+    CONTEXT_CACHE_SIZE = 64
+    CONTEXT_CACHE_TTL = 600
+    WARM_CLI_SESSIONS_ATTRIBUTE = "Warm CLI Sessions"
+    CLI_KEEPALIVE_INTERVAL = 60
+    HEALTH_CHECK_MODE_ATTRIBUTE = "Health Check Mode"
+    SNMP_HEALTH_CHECK_MODE = "snmp"
+    HEALTH_CHECK_CACHE_TTL = 30
+    SNAPSHOT_STORE_PATH_ATTRIBUTE = "Snapshot Store Path"
+    COMMAND_TRACING_ATTRIBUTE = "Command Tracing"
+    TRACE_OUTPUT_PATH_ATTRIBUTE = "Trace Output Path"
+    DISABLED_COMMAND_TRACING = "disabled"
+    FILE_COMMAND_TRACING = "file"
+    FLEET_AUTOLOAD_WORKERS = 16
+    FLEET_AUTOLOAD_SUBNET_WORKERS = 4
+    FLEET_AUTOLOAD_SUBNET_PREFIX_LENGTH = 24
+    AUTOLOAD_CACHE_TTL_ATTRIBUTE = "Autoload Cache TTL"
+    AUTOLOAD_CACHE_PATH_ATTRIBUTE = "Autoload Cache Path"
+    AUTOLOAD_CACHE_SIZE = 64
+    DRIVER_METADATA_FILE = "drivermetadata.xml"
+    CAPTURE_MODE_ATTRIBUTE = "Capture Mode"
+    CAPTURE_PATH_ATTRIBUTE = "Capture Path"
+    REPLAY_TIMING_ATTRIBUTE = "Replay Timing"
+    RECORDED_REPLAY_TIMING = "recorded"
+    ADAPTIVE_CONCURRENCY_ATTRIBUTE = "Adaptive Concurrency"
+    ADAPTIVE_CONCURRENCY_FLOOR_ATTRIBUTE = "Adaptive Concurrency Floor"
+    ASYNC_LOGGING_ATTRIBUTE = "Async Logging"
+    LOG_QUEUE_SIZE_ATTRIBUTE = "Log Queue Size"
+    LOG_PAYLOAD_MAX_LENGTH_ATTRIBUTE = "Log Payload Max Length"
+    LOG_PAYLOAD_PATH_ATTRIBUTE = "Log Payload Path"
+    LOG_QUEUE_SIZE = 10000
+    LOG_PAYLOAD_MAX_LENGTH = 10000
+    FIRMWARE_ROLLOUT_CANARY_SIZE = 1
+    FIRMWARE_ROLLOUT_BATCH_SIZE = 8
+    FIRMWARE_ROLLOUT_FAILURE_THRESHOLD = 0.1
 
     def __init__(self):
         """ctor must be without arguments, it is created with reflection at run time"""
         super(CgsCosLoadbalancerShell2GDriver, self).__init__()
         self._cli = None
+        self._cli_warm_pool = None
+        self._context_cache = ResourceContextCache(max_size=self.CONTEXT_CACHE_SIZE, ttl=self.CONTEXT_CACHE_TTL)
+        self._autoload_state_store = AutoloadStateStore()
+        self._operation_locks = OperationLockManager()
+        self._concurrency_limits = AdaptiveConcurrencyLimits()
+        self._async_log_handlers = AsyncLogHandlers()
+        self._health_check_cache = TtlLruCache(max_size=self.CONTEXT_CACHE_SIZE, ttl=self.HEALTH_CHECK_CACHE_TTL)
+        self._autoload_caches = {}
+        self._firmware_jobs = JobManager()
+        self._statistics_samples = CounterSampleStore()
+        self._snmp_sessions = SnmpSessionCache(max_size=self.CONTEXT_CACHE_SIZE)
+        self._shell_version = None
 
     def initialize(self, context):
         """Initialize the driver session, this function is called everytime a new instance of the driver is created
@@ -36,45 +110,462 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
                                                                       supported_os=self.SUPPORTED_OS,
                                                                       context=context)
 
+        # pool is sized by the ceiling, the adaptive limit is enforced on the session checkout
         session_pool_size = int(resource_config.sessions_concurrency_limit)
-        self._cli = get_cli(session_pool_size)
+
+        if get_bool_attribute(resource_config, self.WARM_CLI_SESSIONS_ATTRIBUTE):
+            from cloudshell.cgs.cli.handler import CgsCliHandler
+            from cloudshell.cli.cli import CLI
+
+            session_pool = CliSessionPool(max_pool_size=session_pool_size)
+            self._cli = CLI(session_pool=session_pool)
+
+            logger = get_qs_logger(log_group=context.resource.name, log_file_prefix=context.resource.name)
+            cli_handler = CgsCliHandler(cli=self._cli,
+                                        resource_config=resource_config,
+                                        logger=logger,
+                                        api=get_api(context))
+
+            self._cli_warm_pool = CliSessionWarmPool(session_pool=session_pool,
+                                                     cli_handler=cli_handler,
+                                                     size=session_pool_size,
+                                                     logger=logger,
+                                                     keepalive_interval=self.CLI_KEEPALIVE_INTERVAL)
+            self._cli_warm_pool.start()
+        else:
+            self._cli = get_cli(session_pool_size)
 
         return 'Finished initializing'
 
-    @GlobalLock.lock
-    def get_inventory(self, context):
-        """Return device structure with all standard attributes
+    @property
+    def context_cache_stats(self):
+        """Hit/miss counters of the per-resource context cache
 
-        :param ResourceCommandContext context: ResourceCommandContext object with all Resource Attributes inside
-        :return: response
-        :rtype: str
+        :rtype: dict
         """
-        logger = get_logger_with_thread_id(context)
-        logger.info('Autoload command started')
+        return self._context_cache.stats
 
-        with ErrorHandlingContext(logger):
+    def _create_resource_context(self, context, fingerprint):
+        """
+
+        :param ResourceCommandContext context:
+        :param str fingerprint:
+        :rtype: ResourceContext
+        """
+        with trace_span("get_api"):
             api = get_api(context)
+
+        with trace_span("resource_config"):
             resource_config = create_load_balancing_resource_from_context(shell_name=self.SHELL_NAME,
                                                                           supported_os=self.SUPPORTED_OS,
                                                                           context=context)
 
-            cli_handler = CgsCliHandler(cli=self._cli,
-                                        resource_config=resource_config,
-                                        logger=logger,
-                                        api=api)
+        return ResourceContext(api=api, resource_config=resource_config, fingerprint=fingerprint)
+
+    def _get_resource_context(self, context, logger):
+        """Get API session and resource config from the cache, build them only on a miss
+
+        :param ResourceCommandContext context:
+        :param logging.Logger logger:
+        :rtype: ResourceContext
+        """
+        resource_context = self._context_cache.get(context, self._create_resource_context)
+        logger.debug('Resource context cache stats: {}'.format(self._context_cache.stats))
+        return resource_context
+
+    def _get_logger(self, context):
+        """Command logger, its records are written in the background if the async logging is enabled for the resource
+
+        :param ResourceCommandContext context:
+        :rtype: logging.Logger
+        """
+        logger = get_logger_with_thread_id(context)
+        mark_replayed_logs(logger)
+        async_logging = get_context_attribute_value(context, self.SHELL_NAME, self.ASYNC_LOGGING_ATTRIBUTE, "False")
+
+        if str(async_logging).lower() != "true":
+            self._async_log_handlers.uninstall(logger)
+            return logger
+
+        payload_path = get_context_attribute_value(context, self.SHELL_NAME, self.LOG_PAYLOAD_PATH_ATTRIBUTE)
+        if payload_path:
+            payload_path = os.path.join(payload_path, re.sub(r"[^\w.-]", "_", context.resource.name))
+
+        self._async_log_handlers.install(
+            logger=logger,
+            queue_size=self._get_context_int_attribute(context, self.LOG_QUEUE_SIZE_ATTRIBUTE, self.LOG_QUEUE_SIZE),
+            payload_max_length=self._get_context_int_attribute(context, self.LOG_PAYLOAD_MAX_LENGTH_ATTRIBUTE,
+                                                               self.LOG_PAYLOAD_MAX_LENGTH),
+            payload_path=payload_path)
+
+        return logger
+
+    def _get_context_int_attribute(self, context, attribute_name, default):
+        """
+
+        :param ResourceCommandContext context:
+        :param str attribute_name:
+        :param int default:
+        :rtype: int
+        """
+        try:
+            return int(get_context_attribute_value(context, self.SHELL_NAME, attribute_name, default))
+        except (TypeError, ValueError):
+            return default
+
+    def _trace_command(self, context, command_name):
+        """Trace phases of the command if tracing is enabled for the resource
+
+        :param ResourceCommandContext context:
+        :param str command_name:
+        :return: context manager that records the command trace
+        """
+        tracing_mode = get_context_attribute_value(context, self.SHELL_NAME, self.COMMAND_TRACING_ATTRIBUTE,
+                                                   self.DISABLED_COMMAND_TRACING)
+
+        if tracing_mode.lower() == self.DISABLED_COMMAND_TRACING:
+            return NULL_SPAN
+
+        output_path = None
+        if tracing_mode.lower() == self.FILE_COMMAND_TRACING:
+            output_path = get_context_attribute_value(context, self.SHELL_NAME, self.TRACE_OUTPUT_PATH_ATTRIBUTE,
+                                                      os.path.join(tempfile.gettempdir(), self.SHELL_NAME, "traces"))
+
+        return command_trace(command_name=command_name,
+                             resource_name=context.resource.name,
+                             logger=self._get_logger(context),
+                             output_path=output_path)
+
+    def _create_capture_session(self, context, command_name):
+        """Record or replay CLI and SNMP traffic of the command if the capture is enabled for the resource
+
+        :param ResourceCommandContext context:
+        :param str command_name:
+        :return: capture session or None if the capture is off
+        """
+        capture_mode = get_context_attribute_value(context, self.SHELL_NAME, self.CAPTURE_MODE_ATTRIBUTE,
+                                                   CaptureMode.OFF).lower()
+
+        if capture_mode == CaptureMode.OFF:
+            return None
+
+        from cgs.load_balancing.capture.session import RecordCaptureSession
+        from cgs.load_balancing.capture.session import ReplayCaptureSession
+        from cgs.load_balancing.capture.transcript import find_transcript
+        from cgs.load_balancing.capture.transcript import get_transcript_path
+
+        capture_path = get_context_attribute_value(context, self.SHELL_NAME, self.CAPTURE_PATH_ATTRIBUTE,
+                                                   os.path.join(tempfile.gettempdir(), self.SHELL_NAME, "captures"))
+        logger = self._get_logger(context)
+
+        if capture_mode == CaptureMode.RECORD:
+            capture_session = RecordCaptureSession(
+                transcript_path=get_transcript_path(capture_path, context.resource.name, command_name),
+                header={"resource_name": context.resource.name,
+                        "command": command_name,
+                        "shell_version": self.shell_version})
+            logger.info("Recording CLI and SNMP traffic to {}".format(capture_session.transcript_path))
+
+        elif capture_mode == CaptureMode.REPLAY:
+            replay_timing = get_context_attribute_value(context, self.SHELL_NAME, self.REPLAY_TIMING_ATTRIBUTE, "")
+            capture_session = ReplayCaptureSession(
+                transcript_path=find_transcript(capture_path, context.resource.name, command_name),
+                realtime=replay_timing.lower() == self.RECORDED_REPLAY_TIMING)
+            logger.info("{} Replaying CLI and SNMP traffic from {}, the device is not contacted".format(
+                REPLAYED_MARKER, capture_session.transcript_path))
+
+        else:
+            raise Exception(self.__class__.__name__, "Unsupported {} '{}'".format(self.CAPTURE_MODE_ATTRIBUTE,
+                                                                                  capture_mode))
+
+        return capture_session
+
+    def _lock_operation(self, context, operation_class, limited=True):
+        """Lock resource for the operation, operations that don't conflict run concurrently
+
+        Enter it inside ErrorHandlingContext, the resource context is read when the lock is created.
+        Operations that use CLI sessions count against the sessions limit, so they wait for
+        a session here, with the logged wait time, and not in the CLI session pool.
+        :param ResourceCommandContext context:
+        :param str operation_class: one of the OperationClass values
+        :param bool limited: whether the operation counts against the sessions limit,
+            False for the operations that don't use CLI sessions
+        :return: context manager that holds the lock
+        """
+        logger = self._get_logger(context)
+        resource_config = self._get_resource_context(context, logger).resource_config
+        concurrency_limit = self._get_concurrency_limit(resource_config)
+
+        if concurrency_limit is not None:
+            logger.info("Adaptive concurrency of {}: {}".format(resource_config.name,
+                                                                format_concurrency_stats(concurrency_limit.stats)))
+
+        return self._operation_locks.lock(resource_name=resource_config.name,
+                                          operation_class=operation_class,
+                                          limit=self._get_sessions_limit(resource_config),
+                                          logger=logger,
+                                          limited=limited)
+
+    def _get_concurrency_limit(self, resource_config):
+        """
+
+        :param resource_config:
+        :return: adaptive concurrency limit of the resource or None if the adaptive concurrency is disabled
+        :rtype: cgs.load_balancing.helpers.concurrency.AdaptiveConcurrencyLimit
+        """
+        if not get_bool_attribute(resource_config, self.ADAPTIVE_CONCURRENCY_ATTRIBUTE):
+            return None
+
+        resource_name = resource_config.name
+
+        return self._concurrency_limits.get_limit(
+            resource_name=resource_name,
+            floor=get_int_attribute(resource_config, self.ADAPTIVE_CONCURRENCY_FLOOR_ATTRIBUTE, 1),
+            ceiling=int(resource_config.sessions_concurrency_limit),
+            on_change=lambda limit: self._operation_locks.get_lock(resource_name, limit))
+
+    def _get_sessions_limit(self, resource_config):
+        """Number of operations and CLI sessions that can be used on the resource at the same time
+
+        :param resource_config:
+        :return: adaptive limit or the Sessions Concurrency Limit if the adaptive concurrency is disabled
+        :rtype: int
+        """
+        concurrency_limit = self._get_concurrency_limit(resource_config)
+        if concurrency_limit is None:
+            return int(resource_config.sessions_concurrency_limit)
+
+        return concurrency_limit.limit
+
+    def _get_configuration_runner(self, resource_context, logger):
+        """
+
+        :param ResourceContext resource_context:
+        :param logging.Logger logger:
+        :rtype: CgsLoadBalancerConfigurationRunner
+        """
+        from cgs.load_balancing.runners.configuration import CgsLoadBalancerConfigurationRunner
+
+        resource_config = resource_context.resource_config
+        snapshot_store_path = get_attribute_value(resource_config,
+                                                  self.SNAPSHOT_STORE_PATH_ATTRIBUTE,
+                                                  os.path.join(tempfile.gettempdir(), self.SHELL_NAME, "snapshots"))
+
+        return CgsLoadBalancerConfigurationRunner(cli_handler=self._get_cli_handler(resource_context, logger),
+                                                  logger=logger,
+                                                  resource_config=resource_config,
+                                                  api=resource_context.api,
+                                                  snapshot_store=SnapshotStore(snapshot_store_path))
+
+    def _get_device_cli_handler(self, resource_context, logger):
+        """
+
+        :param ResourceContext resource_context:
+        :param logging.Logger logger:
+        :rtype: CgsCliHandler
+        """
+        from cloudshell.cgs.cli.handler import CgsCliHandler
+
+        return resource_context.get_handler("cli", logger, lambda: CgsCliHandler(
+            cli=self._cli,
+            resource_config=resource_context.resource_config,
+            logger=logger,
+            api=resource_context.api))
+
+    def _get_cli_handler(self, resource_context, logger):
+        """CLI handler of the command, its traffic is recorded or replayed if the command is captured
+
+        Command latencies are reported to the adaptive concurrency limit if it is enabled,
+        CLI sessions are then checked out within the current limit.
+
+        :param ResourceContext resource_context:
+        :param logging.Logger logger:
+        :rtype: CgsCliHandler
+        """
+        cli_handler = self._get_device_cli_handler(resource_context, logger)
+        concurrency_limit = self._get_concurrency_limit(resource_context.resource_config)
+        capture_session = get_current_capture()
+
+        if concurrency_limit is not None:
+            from cgs.load_balancing.cli.latency import LatencyMeasuringCliHandler
+
+            cli_handler = LatencyMeasuringCliHandler(cli_handler=cli_handler,
+                                                     concurrency_limit=concurrency_limit,
+                                                     resource_name=resource_context.resource_config.name,
+                                                     logger=logger)
+
+        if capture_session is None:
+            return cli_handler
+
+        return capture_session.wrap_cli_handler(cli_handler)
+
+    def _get_snmp_handler(self, resource_context, logger):
+        """
+
+        :param ResourceContext resource_context:
+        :param logging.Logger logger:
+        :rtype: cgs.load_balancing.snmp.handler.CgsLoadBalancerSnmpHandler
+        """
+        from cgs.load_balancing.snmp.handler import CgsLoadBalancerSnmpHandler
 
-            snmp_handler = CgsSnmpHandler(resource_config, logger, api, cli_handler)
+        cli_handler = self._get_device_cli_handler(resource_context, logger)
+
+        snmp_handler = resource_context.get_handler("snmp", logger, lambda: CgsLoadBalancerSnmpHandler(
+            resource_context.resource_config,
+            logger,
+            resource_context.api,
+            cli_handler,
+            self._snmp_sessions))
+        capture_session = get_current_capture()
+
+        if capture_session is None:
+            return snmp_handler
+
+        return capture_session.wrap_snmp_handler(snmp_handler)
+
+    def _get_snmp_session_factory(self, resource_context, logger):
+        """Factory of the additional SNMP sessions, see SnmpSessionFactory
+
+        :param ResourceContext resource_context:
+        :param logging.Logger logger:
+        :rtype: cgs.load_balancing.snmp.session.SnmpSessionFactory
+        """
+        from cgs.load_balancing.snmp.session import SnmpSessionFactory
+
+        snmp_session_factory = SnmpSessionFactory(resource_config=resource_context.resource_config,
+                                                  api=resource_context.api,
+                                                  logger=logger)
+        capture_session = get_current_capture()
+
+        if capture_session is None:
+            return snmp_session_factory
+
+        return capture_session.wrap_snmp_session_factory(snmp_session_factory)
+
+    @property
+    def shell_version(self):
+        """Driver version from the drivermetadata.xml file
+
+        :rtype: str
+        """
+        if self._shell_version is None:
+            metadata_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.DRIVER_METADATA_FILE)
+            try:
+                self._shell_version = ElementTree.parse(metadata_path).getroot().get("Version", "")
+            except (IOError, OSError, ElementTree.ParseError):
+                self._shell_version = ""
+
+        return self._shell_version
+
+    def _get_autoload_cache(self, resource_config):
+        """
+
+        :param resource_config:
+        :return: Autoload cache or None if it is disabled for the resource
+        :rtype: AutoloadDetailsCache
+        """
+        ttl = get_int_attribute(resource_config, self.AUTOLOAD_CACHE_TTL_ATTRIBUTE, 0)
+        if ttl <= 0:
+            return None
+
+        cache_path = get_attribute_value(resource_config,
+                                         self.AUTOLOAD_CACHE_PATH_ATTRIBUTE,
+                                         os.path.join(tempfile.gettempdir(), self.SHELL_NAME, "autoload_cache"))
+
+        cache_key = (cache_path, ttl)
+        if cache_key not in self._autoload_caches:
+            from cgs.load_balancing.autoload.cache import AutoloadDetailsCache
+
+            self._autoload_caches[cache_key] = AutoloadDetailsCache(max_size=self.AUTOLOAD_CACHE_SIZE,
+                                                                    ttl=ttl,
+                                                                    cache_path=cache_path)
+
+        return self._autoload_caches[cache_key]
+
+    @traced_command
+    @captured_command
+    def get_inventory(self, context, force=False):
+        """Return device structure with all standard attributes
+
+        :param ResourceCommandContext context: ResourceCommandContext object with all Resource Attributes inside
+        :param bool force: discover the whole device, ignore the cached result and the incremental Autoload state
+        :return: response
+        :rtype: str
+        """
+        from cgs.load_balancing.runners.autoload import CgsLoadBalancerAutoloadRunner
+
+        logger = self._get_logger(context)
+        logger.info('Autoload command started')
+
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.DISCOVERY):
+            resource_context = self._get_resource_context(context, logger)
+            resource_config = resource_context.resource_config
+            snmp_handler = self._get_snmp_handler(resource_context, logger)
+            snmp_session_factory = self._get_snmp_session_factory(resource_context, logger)
 
             autoload_operations = CgsLoadBalancerAutoloadRunner(logger=logger,
                                                                 resource_config=resource_config,
-                                                                snmp_handler=snmp_handler)
+                                                                snmp_handler=snmp_handler,
+                                                                autoload_state_store=self._autoload_state_store,
+                                                                force_full=force,
+                                                                snmp_session_factory=snmp_session_factory,
+                                                                autoload_cache=self._get_autoload_cache(resource_config),
+                                                                shell_version=self.shell_version)
 
             response = autoload_operations.discover()
             logger.info('Autoload command completed')
 
             return response
 
-    @GlobalLock.lock
+    def discover_fleet(self, contexts, max_workers=None, max_per_subnet=None):
+        """Discover many resources concurrently, python API for the bulk onboarding scripts
+
+        Each resource is discovered with get_inventory, so the resource operation locks
+        and the incremental Autoload state are used the same way as for a single resource.
+        Use get_fleet_summary from cgs.load_balancing.runners.fleet_autoload to get timings of the results.
+        :param list[ResourceCommandContext] contexts: contexts of the resources to discover
+        :param int max_workers: max number of discoveries running at the same time
+        :param int max_per_subnet: max number of discoveries running at the same time in one /24 subnet
+        :return: generator of FleetDiscoveryResult, yielded as soon as each resource is discovered
+        """
+        from cgs.load_balancing.runners.fleet_autoload import CgsLoadBalancerFleetAutoloadRunner
+
+        logger = get_qs_logger(log_group=self.SHELL_NAME, log_file_prefix="fleet_autoload")
+
+        fleet_autoload_operations = CgsLoadBalancerFleetAutoloadRunner(
+            discover=self.get_inventory,
+            logger=logger,
+            max_workers=max_workers or self.FLEET_AUTOLOAD_WORKERS,
+            max_per_subnet=max_per_subnet or self.FLEET_AUTOLOAD_SUBNET_WORKERS,
+            subnet_prefix_length=self.FLEET_AUTOLOAD_SUBNET_PREFIX_LENGTH)
+
+        return fleet_autoload_operations.discover(contexts)
+
+    @traced_command
+    def clear_autoload_cache(self, context):
+        """Remove cached Autoload results of the resource, the next Autoload discovers the whole device
+
+        :param ResourceCommandContext context: ResourceCommandContext object with all Resource Attributes inside
+        :rtype: str
+        """
+        logger = self._get_logger(context)
+        logger.info('Clear Autoload Cache command started')
+
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.DISCOVERY):
+            resource_config = self._get_resource_context(context, logger).resource_config
+            self._autoload_state_store.invalidate((resource_config.name, resource_config.address))
+
+            autoload_cache = self._get_autoload_cache(resource_config)
+            if autoload_cache is None:
+                return "Autoload cache is disabled for the resource"
+
+            autoload_cache.clear(resource_config.name)
+            logger.info('Clear Autoload Cache command ended')
+
+            return "Autoload cache is cleared"
+
+    @traced_command
+    @captured_command
     def restore(self, context, cancellation_context, path, configuration_type, restore_method, vrf_management_name):
         """Restores a configuration file
 
@@ -85,28 +576,18 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
         :param str configuration_type: Specify whether the file should update the startup or running config.
         :param str vrf_management_name: Optional. Virtual routing and Forwarding management name
         """
-        logger = get_logger_with_thread_id(context)
+        logger = self._get_logger(context)
         logger.info('Restore command started')
 
-        with ErrorHandlingContext(logger):
-            api = get_api(context)
-            resource_config = create_load_balancing_resource_from_context(shell_name=self.SHELL_NAME,
-                                                                          supported_os=self.SUPPORTED_OS,
-                                                                          context=context)
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.CONFIG):
+            resource_context = self._get_resource_context(context, logger)
+            resource_config = resource_context.resource_config
 
             configuration_type = configuration_type or "running"
             restore_method = restore_method or "override"
             vrf_management_name = vrf_management_name or resource_config.vrf_management_name
 
-            cli_handler = CgsCliHandler(cli=self._cli,
-                                        resource_config=resource_config,
-                                        logger=logger,
-                                        api=api)
-
-            configuration_operations = CgsConfigurationRunner(cli_handler=cli_handler,
-                                                              logger=logger,
-                                                              resource_config=resource_config,
-                                                              api=api)
+            configuration_operations = self._get_configuration_runner(resource_context, logger)
 
             configuration_operations.restore(path=path,
                                              restore_method=restore_method,
@@ -115,6 +596,8 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
 
             logger.info("Restore command ended")
 
+    @traced_command
+    @captured_command
     def save(self, context, cancellation_context, folder_path, configuration_type, vrf_management_name):
         """Creates a configuration file and saves it to the provided destination
 
@@ -126,26 +609,16 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
         :return The configuration file name.
         :rtype: str
         """
-        logger = get_logger_with_thread_id(context)
+        logger = self._get_logger(context)
         logger.info('Save command started')
 
-        with ErrorHandlingContext(logger):
-            api = get_api(context)
-            resource_config = create_load_balancing_resource_from_context(shell_name=self.SHELL_NAME,
-                                                                          supported_os=self.SUPPORTED_OS,
-                                                                          context=context)
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.READ_ONLY):
+            resource_context = self._get_resource_context(context, logger)
+            resource_config = resource_context.resource_config
             configuration_type = configuration_type or "running"
             vrf_management_name = vrf_management_name or resource_config.vrf_management_name
 
-            cli_handler = CgsCliHandler(cli=self._cli,
-                                        resource_config=resource_config,
-                                        logger=logger,
-                                        api=api)
-
-            configuration_operations = CgsConfigurationRunner(cli_handler=cli_handler,
-                                                              logger=logger,
-                                                              resource_config=resource_config,
-                                                              api=api)
+            configuration_operations = self._get_configuration_runner(resource_context, logger)
 
             response = configuration_operations.save(folder_path=folder_path, configuration_type=configuration_type,
                                                      vrf_management_name=vrf_management_name)
@@ -153,34 +626,213 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
             logger.info('Save command ended with response: {}'.format(response))
             return response
 
-    @GlobalLock.lock
+    @traced_command
+    def save_if_changed(self, context, cancellation_context, folder_path, configuration_type, compress):
+        """Saves configuration only if it was changed since the last save to the same destination
+
+        :param ResourceCommandContext context: The context object for the command with resource and reservation info
+        :param CancellationContext cancellation_context: Object to signal a request for cancellation. Must be enabled in drivermetadata.xml as well
+        :param str folder_path: The path to the folder in which the configuration file will be saved.
+        :param str configuration_type: Specify whether the file should update the startup or running config.
+        :param str compress: "True" to gzip the configuration file, supported for FTP destinations
+        :return: JSON with path, hash and size of the saved configuration
+        :rtype: str
+        """
+        logger = self._get_logger(context)
+        logger.info('Save If Changed command started')
+
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.READ_ONLY):
+            resource_context = self._get_resource_context(context, logger)
+            resource_config = resource_context.resource_config
+
+            configuration_operations = self._get_configuration_runner(resource_context, logger)
+
+            response = configuration_operations.save_if_changed(
+                folder_path=folder_path,
+                configuration_type=configuration_type or "running",
+                compress=str(compress).lower() == "true",
+                vrf_management_name=resource_config.vrf_management_name)
+
+            logger.info('Save If Changed command ended with response: {}'.format(response))
+            return json.dumps(response)
+
+    def _get_firmware_runner(self, resource_context, logger):
+        """
+
+        :param ResourceContext resource_context:
+        :param logging.Logger logger:
+        :rtype: CgsLoadBalancerFirmwareRunner
+        """
+        from cgs.load_balancing.runners.firmware import CgsLoadBalancerFirmwareRunner
+
+        return CgsLoadBalancerFirmwareRunner(cli_handler=self._get_cli_handler(resource_context, logger),
+                                             logger=logger)
+
+    @traced_command
     def load_firmware(self, context, cancellation_context, path, vrf_management_name):
         """Upload and updates firmware on the resource
 
+        Runs the same firmware job as load_firmware_async in the command thread. Cancellation of
+        the command is checked when the resource lock is acquired and before the firmware load starts.
         :param ResourceCommandContext context: The context object for the command with resource and reservation info
+        :param CancellationContext cancellation_context: Object to signal a request for cancellation
         :param str path: path to tftp server where firmware file is stored
         :param str vrf_management_name: Optional. Virtual routing and Forwarding management name
         """
-        logger = get_logger_with_thread_id(context)
+        logger = self._get_logger(context)
         logger.info('Load firmware command started')
 
         with ErrorHandlingContext(logger):
-            api = get_api(context)
-            resource_config = create_load_balancing_resource_from_context(shell_name=self.SHELL_NAME,
-                                                                          supported_os=self.SUPPORTED_OS,
-                                                                          context=context)
+            job = Job(resource_name=context.resource.name,
+                      name="load_firmware",
+                      cancellation_context=cancellation_context)
+            response = job.run(lambda job: self._run_firmware_job(context, path, vrf_management_name, job))
+            logger.info('Load firmware command ended with response: {}'.format(response))
 
-            vrf_management_name = vrf_management_name or resource_config.vrf_management_name
+    def _run_firmware_job(self, context, path, vrf_management_name, job):
+        """Load firmware in the background thread of the job
 
-            cli_handler = CgsCliHandler(cli=self._cli,
-                                        resource_config=resource_config,
-                                        logger=logger,
-                                        api=api)
+        :param ResourceCommandContext context:
+        :param str path:
+        :param str vrf_management_name:
+        :param cgs.load_balancing.helpers.jobs.Job job:
+        :rtype: str
+        """
+        logger = self._get_logger(context)
 
-            firmware_operations = CgsFirmwareRunner(cli_handler=cli_handler, logger=logger)
-            response = firmware_operations.load_firmware(path=path, vrf_management_name=vrf_management_name)
-            logger.info('Load firmware command ended with response: {}'.format(response))
+        with self._lock_operation(context, OperationClass.FIRMWARE):
+            job.check_cancelled()
+            resource_context = self._get_resource_context(context, logger)
+            firmware_operations = self._get_firmware_runner(resource_context, logger)
+
+            return firmware_operations.load_firmware_staged(
+                path=path,
+                vrf_management_name=vrf_management_name or resource_context.resource_config.vrf_management_name,
+                job=job)
+
+    @traced_command
+    def load_firmware_async(self, context, cancellation_context, path, vrf_management_name):
+        """Start firmware load in the background and return the job ID right away
+
+        Use get_firmware_job_status to get the job progress and cancel_firmware_job to cancel it.
+        :param ResourceCommandContext context: The context object for the command with resource and reservation info
+        :param CancellationContext cancellation_context: Object to signal a request for cancellation
+        :param str path: path to tftp server where firmware file is stored
+        :param str vrf_management_name: Optional. Virtual routing and Forwarding management name
+        :return: job ID
+        :rtype: str
+        """
+        logger = self._get_logger(context)
+
+        with ErrorHandlingContext(logger):
+            job = self._firmware_jobs.submit(
+                resource_name=context.resource.name,
+                name="load_firmware",
+                func=lambda job: self._run_firmware_job(context, path, vrf_management_name, job),
+                logger=logger)
+
+            logger.info('Load firmware job {} started'.format(job.id))
+            return job.id
+
+    def _get_firmware_job(self, context, job_id):
+        """
+
+        :param ResourceCommandContext context:
+        :param str job_id:
+        :rtype: cgs.load_balancing.helpers.jobs.Job
+        """
+        job = self._firmware_jobs.get(job_id)
+        if job is None or job.resource_name != context.resource.name:
+            raise Exception(self.__class__.__name__,
+                            "Firmware job {} of the resource {} is not found".format(job_id, context.resource.name))
+
+        return job
+
+    def get_firmware_job_status(self, context, job_id):
+        """Get status, stage and progress of the firmware job
+
+        :param ResourceCommandContext context: The context object for the command with resource and reservation info
+        :param str job_id: job ID returned by load_firmware_async, status of all jobs of the resource if empty
+        :return: job status JSON
+        :rtype: str
+        """
+        logger = self._get_logger(context)
+
+        with ErrorHandlingContext(logger):
+            if not job_id:
+                return json.dumps([job.to_dict() for job in self._firmware_jobs.get_jobs(context.resource.name)])
+
+            return json.dumps(self._get_firmware_job(context, job_id).to_dict())
+
+    def cancel_firmware_job(self, context, job_id):
+        """Cancel the firmware job, it stops unless the firmware load has already started
+
+        :param ResourceCommandContext context: The context object for the command with resource and reservation info
+        :param str job_id: job ID returned by load_firmware_async
+        :return: job status JSON
+        :rtype: str
+        """
+        logger = self._get_logger(context)
 
+        with ErrorHandlingContext(logger):
+            job = self._get_firmware_job(context, job_id)
+            job.cancel()
+            logger.info('Cancellation of the firmware job {} is requested at the stage {}'.format(job_id, job.stage))
+
+            return json.dumps(job.to_dict())
+
+    def rollout_firmware(self, contexts, path, checksum=None, vrf_management_name="", canary_size=None,
+                         batch_size=None, failure_threshold=None, image_cache_path=None, image_mirror_url=None):
+        """Load firmware on many resources in waves, python API for the fleet upgrade scripts
+
+        If the mirror URL is set, the image is fetched once into the local image cache and
+        verified before the first device is touched, devices transfer it from the mirror URL
+        (a TFTP/FTP/HTTP server that serves the cache folder). Otherwise devices transfer
+        the image from the original path, the checksum requires the mirror URL as the
+        original image can't be verified for every device. Each resource is upgraded with
+        the same firmware job as load_firmware_async, under the resource operation lock.
+        Use get_rollout_summary from cgs.load_balancing.runners.fleet_firmware to summarize the results.
+        :param list[ResourceCommandContext] contexts: contexts of the resources in the rollout order
+        :param str path: URL of the firmware image
+        :param str checksum: expected checksum of the image, "sha256:<hex>", "md5:<hex>" or the plain hex digest
+        :param str vrf_management_name: Optional. Virtual routing and Forwarding management name
+        :param int canary_size: number of resources in the first wave
+        :param int batch_size: number of resources upgraded in parallel in the next waves
+        :param float failure_threshold: share of the failed resources (0..1) that stops the rollout
+        :param str image_cache_path: folder of the local image cache
+        :param str image_mirror_url: URL of the image cache folder for the devices, e.g. tftp://10.1.1.1/firmware
+        :return: generator of FirmwareRolloutResult, yielded as soon as each resource is finished
+        """
+        from cgs.load_balancing.helpers.image_cache import FirmwareImageCache
+        from cgs.load_balancing.runners.fleet_firmware import CgsLoadBalancerFirmwareRolloutRunner
+
+        logger = get_qs_logger(log_group=self.SHELL_NAME, log_file_prefix="firmware_rollout")
+
+        if checksum and not image_mirror_url:
+            raise Exception(self.__class__.__name__,
+                            "Firmware image checksum requires the image mirror URL, otherwise devices "
+                            "transfer the unverified image {}".format(path))
+
+        if image_mirror_url:
+            image_cache = FirmwareImageCache(
+                cache_path=image_cache_path or os.path.join(tempfile.gettempdir(), self.SHELL_NAME, "firmware_images"),
+                mirror_url=image_mirror_url)
+            image_cache.get_image(path, checksum=checksum, logger=logger)
+            path = image_cache.get_device_url(path)
+
+        logger.info("Firmware rollout uses the image {}".format(path))
+
+        firmware_rollout_operations = CgsLoadBalancerFirmwareRolloutRunner(
+            load_firmware=lambda context, job: self._run_firmware_job(context, path, vrf_management_name, job),
+            logger=logger,
+            canary_size=self.FIRMWARE_ROLLOUT_CANARY_SIZE if canary_size is None else canary_size,
+            batch_size=batch_size or self.FIRMWARE_ROLLOUT_BATCH_SIZE,
+            failure_threshold=(self.FIRMWARE_ROLLOUT_FAILURE_THRESHOLD if failure_threshold is None
+                               else failure_threshold))
+
+        return firmware_rollout_operations.rollout(contexts)
+
+    @traced_command
     def run_custom_command(self, context, cancellation_context, custom_command):
         """Executes a custom command on the device
 
@@ -190,19 +842,14 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
         :return: the command result text
         :rtype: str
         """
-        logger = get_logger_with_thread_id(context)
-        logger.info('Run Custom command started')
+        from cloudshell.devices.runners.run_command_runner import RunCommandRunner
 
-        with ErrorHandlingContext(logger):
-            api = get_api(context)
-            resource_config = create_load_balancing_resource_from_context(shell_name=self.SHELL_NAME,
-                                                                          supported_os=self.SUPPORTED_OS,
-                                                                          context=context)
+        logger = self._get_logger(context)
+        logger.info('Run Custom command started')
 
-            cli_handler = CgsCliHandler(cli=self._cli,
-                                        resource_config=resource_config,
-                                        logger=logger,
-                                        api=api)
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.READ_ONLY):
+            resource_context = self._get_resource_context(context, logger)
+            cli_handler = self._get_cli_handler(resource_context, logger)
 
             send_command_operations = RunCommandRunner(logger=logger,
                                                        cli_handler=cli_handler)
@@ -212,6 +859,7 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
 
             return response
 
+    @traced_command
     def run_custom_config_command(self, context, cancellation_context, custom_command):
         """Executes a custom command on the device in configuration mode
 
@@ -221,19 +869,14 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
         :return: the command result text
         :rtype: str
         """
-        logger = get_logger_with_thread_id(context)
-        logger.info('Run Custom Config command started')
+        from cloudshell.devices.runners.run_command_runner import RunCommandRunner
 
-        with ErrorHandlingContext(logger):
-            api = get_api(context)
-            resource_config = create_load_balancing_resource_from_context(shell_name=self.SHELL_NAME,
-                                                                          supported_os=self.SUPPORTED_OS,
-                                                                          context=context)
+        logger = self._get_logger(context)
+        logger.info('Run Custom Config command started')
 
-            cli_handler = CgsCliHandler(cli=self._cli,
-                                        resource_config=resource_config,
-                                        logger=logger,
-                                        api=api)
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.CONFIG):
+            resource_context = self._get_resource_context(context, logger)
+            cli_handler = self._get_cli_handler(resource_context, logger)
 
             send_command_operations = RunCommandRunner(logger=logger,
                                                        cli_handler=cli_handler)
@@ -245,6 +888,51 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
 
             return response
 
+    @traced_command
+    def run_custom_command_batch(self, context, cancellation_context, custom_commands, config_mode, parallel):
+        """Executes a list of commands on the device and returns structured result of each command
+
+        :param ResourceCommandContext context: The context object for the command with resource and reservation info
+        :param CancellationContext cancellation_context: Object to signal a request for cancellation. Must be enabled in drivermetadata.xml as well
+        :param str custom_commands: JSON list of commands or commands separated with ";"
+        :param str config_mode: "True" to run commands in the configuration mode
+        :param str parallel: "True" to spread read-only commands across several CLI sessions
+        :return: JSON with output, duration and status of each command
+        :rtype: str
+        """
+        from cgs.load_balancing.runners.run_command import CgsLoadBalancerRunCommandRunner
+
+        logger = self._get_logger(context)
+        logger.info('Run Custom command batch started')
+
+        config_mode = str(config_mode).lower() == "true"
+        parallel = str(parallel).lower() == "true"
+        operation_class = OperationClass.CONFIG if config_mode else OperationClass.READ_ONLY
+
+        with ErrorHandlingContext(logger), self._lock_operation(context, operation_class):
+            resource_context = self._get_resource_context(context, logger)
+            cli_handler = self._get_cli_handler(resource_context, logger)
+
+            if custom_commands.strip().startswith("["):
+                commands = json.loads(custom_commands)
+            else:
+                commands = parse_custom_commands(custom_commands)
+
+            send_command_operations = CgsLoadBalancerRunCommandRunner(
+                cli_handler=cli_handler,
+                logger=logger,
+                max_sessions=self._get_sessions_limit(resource_context.resource_config))
+
+            response = send_command_operations.run_custom_command_batch(commands=commands,
+                                                                        config_mode=config_mode,
+                                                                        parallel=parallel)
+
+            logger.info('Run Custom command batch ended, {} of {} commands failed in {}s'.format(
+                response["failed"], len(commands), response["duration"]))
+
+            return json.dumps(response)
+
+    @traced_command
     def shutdown(self, context, cancellation_context):
         """Sends a graceful shutdown to the device
 
@@ -253,6 +941,7 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
         """
         pass
 
+    @traced_command
     def orchestration_save(self, context, cancellation_context, mode, custom_params):
         """Saves the Shell state and returns a description of the saved artifacts and information
 
@@ -265,31 +954,19 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
         :return: SavedResults serialized as JSON
         :rtype: OrchestrationSaveResult
         """
+        logger = self._get_logger(context)
+        logger.info('Orchestration save command started')
 
-        # See below an example implementation, here we use jsonpickle for serialization,
-        # to use this sample, you'll need to add jsonpickle to your requirements.txt file
-        # The JSON schema is defined at: https://github.com/QualiSystems/sandbox_orchestration_standard/blob/master/save%20%26%20restore/saved_artifact_info.schema.json
-        # You can find more information and examples examples in the spec document at https://github.com/QualiSystems/sandbox_orchestration_standard/blob/master/save%20%26%20restore/save%20%26%20restore%20standard.md
-        '''
-        # By convention, all dates should be UTC
-        created_date = datetime.datetime.utcnow()
-        # This can be any unique identifier which can later be used to retrieve the artifact
-        # such as filepath etc.
-        # By convention, all dates should be UTC
-        created_date = datetime.datetime.utcnow()
-        # This can be any unique identifier which can later be used to retrieve the artifact
-        # such as filepath etc.
-        identifier = created_date.strftime('%y_%m_%d %H_%M_%S_%f')
-        orchestration_saved_artifact = OrchestrationSavedArtifact('REPLACE_WITH_ARTIFACT_TYPE', identifier)
-        saved_artifacts_info = OrchestrationSavedArtifactInfo(
-            resource_name="some_resource",
-            created_date=created_date,
-            restore_rules=OrchestrationRestoreRules(requires_same_resource=True),
-            saved_artifact=orchestration_saved_artifact)
-        return OrchestrationSaveResult(saved_artifacts_info)
-        '''
-        pass
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.READ_ONLY):
+            resource_context = self._get_resource_context(context, logger)
+            configuration_operations = self._get_configuration_runner(resource_context, logger)
+
+            response = configuration_operations.orchestration_save(mode=mode, custom_params=custom_params)
+            logger.info('Orchestration save command ended with response: {}'.format(response))
 
+            return response
+
+    @traced_command
     def orchestration_restore(self, context, cancellation_context, saved_artifact_info, custom_params):
         """Restores a saved artifact previously saved by this Shell driver using the orchestration_save function
 
@@ -299,8 +976,19 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
         :param str custom_params: Set of custom parameters for the restore operation
         :return: None
         """
-        pass
+        logger = self._get_logger(context)
+        logger.info('Orchestration restore command started')
+
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.CONFIG):
+            resource_context = self._get_resource_context(context, logger)
+            configuration_operations = self._get_configuration_runner(resource_context, logger)
+
+            configuration_operations.orchestration_restore(saved_artifact_info=saved_artifact_info,
+                                                           custom_params=custom_params)
+            logger.info('Orchestration restore command ended')
 
+    @traced_command
+    @captured_command
     def health_check(self, context):
         """Performs device health check
 
@@ -308,36 +996,96 @@ class CgsCosLoadbalancerShell2GDriver(ResourceDriverInterface, GlobalLock):
         :return: Success or Error message
         :rtype: str
         """
-        logger = get_logger_with_thread_id(context)
+        logger = self._get_logger(context)
         logger.info('Health Check command started')
 
         with ErrorHandlingContext(logger):
-            api = get_api(context)
+            resource_context = self._get_resource_context(context, logger)
+            api = resource_context.api
+            resource_config = resource_context.resource_config
 
-            resource_config = create_load_balancing_resource_from_context(shell_name=self.SHELL_NAME,
-                                                                          supported_os=self.SUPPORTED_OS,
-                                                                          context=context)
+            cli_handler = self._get_cli_handler(resource_context, logger)
 
-            cli_handler = CgsCliHandler(cli=self._cli,
-                                        resource_config=resource_config,
-                                        logger=logger,
-                                        api=api)
+            health_check_mode = get_attribute_value(resource_config, self.HEALTH_CHECK_MODE_ATTRIBUTE, "")
+
+            if health_check_mode.lower() != self.SNMP_HEALTH_CHECK_MODE:
+                from cloudshell.cgs.runners.state import CgsStateRunner
+
+                state_operations = CgsStateRunner(logger=logger,
+                                                  api=api,
+                                                  resource_config=resource_config,
+                                                  cli_handler=cli_handler)
 
-            state_operations = CgsStateRunner(logger=logger,
-                                              api=api,
-                                              resource_config=resource_config,
-                                              cli_handler=cli_handler)
+                result = state_operations.health_check()
+                logger.info('Health Check command ended with result: {}'.format(result))
 
-            result = state_operations.health_check()
+                return result
+
+            # captured health check always talks to the device (or the transcript)
+            captured = get_current_capture() is not None
+
+            result = None if captured else self._health_check_cache.get(resource_config.name)
+            if result is not None:
+                logger.info('Health Check command ended with cached result: {}'.format(result))
+                return result
+
+            from cgs.load_balancing.runners.state import CgsLoadBalancerStateRunner
+
+            state_operations = CgsLoadBalancerStateRunner(logger=logger,
+                                                          api=api,
+                                                          resource_config=resource_config,
+                                                          cli_handler=cli_handler)
+
+            result = state_operations.snmp_health_check(self._get_snmp_handler(resource_context, logger))
+            if not captured and state_operations.is_passed(result):
+                self._health_check_cache.set(resource_config.name, result)
             logger.info('Health Check command ended with result: {}'.format(result))
 
             return result
 
+    @traced_command
+    def get_statistics(self, context):
+        """Collects interface and LB group traffic counters with deltas and rates since the previous call
+
+        :param ResourceCommandContext context: ResourceCommandContext object with all Resource Attributes inside
+        :return: compact JSON with the counters, deltas and rates
+        :rtype: str
+        """
+        from cgs.load_balancing.runners.autoload import CgsLoadBalancerAutoloadRunner
+        from cgs.load_balancing.runners.statistics import CgsLoadBalancerStatisticsRunner
+
+        logger = self._get_logger(context)
+        logger.info('Get Statistics command started')
+
+        # counters are read over SNMP, the command doesn't take a CLI session
+        with ErrorHandlingContext(logger), self._lock_operation(context, OperationClass.READ_ONLY, limited=False):
+            resource_context = self._get_resource_context(context, logger)
+            resource_config = resource_context.resource_config
+
+            statistics_operations = CgsLoadBalancerStatisticsRunner(
+                snmp_handler=self._get_snmp_handler(resource_context, logger),
+                logger=logger,
+                resource_name=resource_config.name,
+                sample_store=self._statistics_samples,
+                bulk_max_repetitions=get_int_attribute(resource_config,
+                                                       CgsLoadBalancerAutoloadRunner.BULK_MAX_REPETITIONS_ATTRIBUTE))
+
+            response = statistics_operations.get_statistics()
+            logger.info('Get Statistics command ended')
+
+            return json.dumps(response, separators=(",", ":"))
+
     def cleanup(self):
         """Destroy the driver session, this function is called everytime a driver instance is destroyed
         This is a good place to close any open sessions, finish writing to log files
         """
-        pass
+        if self._cli_warm_pool is not None:
+            self._cli_warm_pool.stop()
+
+        self._firmware_jobs.cancel_all()
+        self._context_cache.clear()
+        self._snmp_sessions.clear()
+        self._async_log_handlers.close_all()
 
 
 if __name__ == "__main__":
@@ -434,6 +1182,38 @@ if __name__ == "__main__":
         return driver.health_check(context)
 
 
+    def save_if_changed(driver, context, folder_path, configuration_type="running", compress="False"):
+        """
+        :param driver:
+        :param context:
+        :param folder_path:
+        :param configuration_type:
+        :param compress:
+        :return:
+        """
+        return driver.save_if_changed(context=context,
+                                      cancellation_context=None,
+                                      folder_path=folder_path,
+                                      configuration_type=configuration_type,
+                                      compress=compress)
+
+
+    def get_statistics(driver, context):
+        """
+        :param driver:
+        :return:
+        """
+        return driver.get_statistics(context)
+
+
+    def clear_autoload_cache(driver, context):
+        """
+        :param driver:
+        :return:
+        """
+        return driver.clear_autoload_cache(context)
+
+
     def shutdown(driver, context):
         """
         :param driver:
@@ -463,6 +1243,20 @@ if __name__ == "__main__":
                                                 custom_command=custom_command)
 
 
+    def run_custom_command_batch(driver, context, custom_commands, config_mode="False", parallel="False"):
+        """
+        :param driver:
+        :param context:
+        :param custom_commands:
+        :param config_mode:
+        :param parallel:
+        :return:
+        """
+        return driver.run_custom_command_batch(context=context, cancellation_context=None,
+                                               custom_commands=custom_commands, config_mode=config_mode,
+                                               parallel=parallel)
+
+
     def save(driver, context, folder_path, configuration_type, vrf_management_name=""):
         """
         :param driver:
@@ -510,6 +1304,31 @@ if __name__ == "__main__":
                                     path=path,
                                     vrf_management_name=vrf_management_name)
 
+
+    def load_firmware_async(driver, context, path, vrf_management_name=""):
+        """
+        :param driver:
+        :param context:
+        :param path:
+        :param vrf_management_name:
+        :return:
+        """
+        return driver.load_firmware_async(context=context,
+                                          cancellation_context=None,
+                                          path=path,
+                                          vrf_management_name=vrf_management_name)
+
+
+    def get_firmware_job_status(driver, context, job_id=""):
+        """
+        :param driver:
+        :param context:
+        :param job_id:
+        :return:
+        """
+        return driver.get_firmware_job_status(context=context, job_id=job_id)
+
+
     context = prepare_context(address="192.168.42.201")
     # context = prepare_context(address="192.168.85.14")
     dr = get_driver(context)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the driver commands against the simulated COS load balancer
+
+Runs get_inventory, save, restore (Diff) and health_check for every device size
+and writes wall time, SNMP PDU and CLI command counts as JSON, so results of
+different shell versions can be compared with --baseline.
+
+Requires the shell dependencies (cloudshell-cgs, cloudshell-networking-devices)
+and pysnmp. The driver always polls SNMP on UDP port 161, so by default the agent
+binds this port, which needs root/administrator rights; use --snmp-port together
+with a port redirect from 161 otherwise. The NPB-LB MIB is taken from the
+cloudshell-cgs package or from the CGS_MIBS_PATH folder.
+
+Usage: python -m tests.benchmarks.bench_driver [--sizes 10,1000,10000] [--baseline bench_output.txt]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(ROOT_PATH, "src"))
+
+from tests.simulator.cli_server import ScriptedCliServer  # noqa: E402
+from tests.simulator.device import CosDeviceModel  # noqa: E402
+from tests.simulator.snmp_agent import SnmpAgentSimulator  # noqa: E402
+
+DEFAULT_SIZES = [10, 1000, 10000]
+DEFAULT_OUTPUT = os.path.join(ROOT_PATH, "bench_output.txt")
+USER = "admin"
+PASSWORD = "admin"
+COMMUNITY = "public"
+
+
+def get_shell_version():
+    """
+
+    :rtype: str
+    """
+    with open(os.path.join(ROOT_PATH, "src", "drivermetadata.xml")) as metadata_file:
+        metadata = metadata_file.read()
+
+    start = metadata.index('Version="') + len('Version="')
+    return metadata[start:metadata.index('"', start)]
+
+
+def prepare_context(shell_name, address, cli_port):
+    """Command context of the simulated resource, the same as the one in driver.py __main__ block
+
+    :param str shell_name:
+    :param str address:
+    :param int cli_port:
+    :rtype: ResourceCommandContext
+    """
+    from cloudshell.shell.core.driver_context import ReservationContextDetails
+    from cloudshell.shell.core.driver_context import ResourceCommandContext
+    from cloudshell.shell.core.driver_context import ResourceContextDetails
+
+    context = ResourceCommandContext(*(None,) * 4)
+    context.resource = ResourceContextDetails(*(None,) * 13)
+    context.resource.name = "COS Simulator"
+    context.resource.fullname = "COS Simulator"
+    context.resource.address = address
+    context.resource.family = "CS_LoadBalancer"
+    context.reservation = ReservationContextDetails(*(None,) * 7)
+    context.reservation.reservation_id = "bench"
+    context.connectivity = mock.MagicMock()
+    context.connectivity.server_address = "127.0.0.1"
+    context.resource.attributes = {}
+
+    for attr, value in [("User", USER),
+                        ("Password", PASSWORD),
+                        ("Enable Password", PASSWORD),
+                        ("Sessions Concurrency Limit", 1),
+                        ("CLI Connection Type", "Telnet"),
+                        ("CLI TCP Port", cli_port),
+                        ("Backup Location", ""),
+                        ("Backup Type", "File System"),
+                        ("SNMP Version", "v2c"),
+                        ("SNMP Read Community", COMMUNITY),
+                        ("Enable SNMP", "False"),
+                        ("Disable SNMP", "False")]:
+        context.resource.attributes["{}.{}".format(shell_name, attr)] = value
+
+    return context
+
+
+def run_command(name, func, snmp_agent, cli_server):
+    """
+
+    :param str name:
+    :param func: callable without arguments
+    :param SnmpAgentSimulator snmp_agent:
+    :param ScriptedCliServer cli_server:
+    :rtype: dict
+    """
+    snmp_agent.reset_counters()
+    cli_server.reset_counters()
+    error = None
+
+    start_time = time.time()
+    try:
+        func()
+    except Exception as e:
+        error = str(e)
+
+    return {"command": name,
+            "wall_time": round(time.time() - start_time, 4),
+            "snmp_pdus": snmp_agent.total_pdu_count,
+            "snmp_pdu_types": dict(snmp_agent.pdu_counts),
+            "cli_commands": cli_server.commands_count,
+            "cli_sessions": cli_server.sessions_count,
+            "error": error}
+
+
+def run_size(lb_groups_count, args):
+    """Benchmark all commands on the device with the given number of LB groups
+
+    :param int lb_groups_count:
+    :param argparse.Namespace args:
+    :rtype: list[dict]
+    """
+    import driver
+
+    model = CosDeviceModel(lb_groups_count=lb_groups_count, ports_count=args.ports)
+    work_path = tempfile.mkdtemp()
+    results = []
+
+    try:
+        snmp_agent = SnmpAgentSimulator(model, address=args.address, port=args.snmp_port, community=COMMUNITY)
+        cli_server = ScriptedCliServer(model, address=args.address, user=USER, password=PASSWORD)
+
+        with snmp_agent, cli_server, mock.patch("driver.get_api") as get_api:
+            get_api.return_value.DecryptPassword = lambda value: mock.MagicMock(Value=value)
+
+            context = prepare_context(driver.CgsCosLoadbalancerShell2GDriver.SHELL_NAME, args.address,
+                                      cli_server.port)
+            shell_driver = driver.CgsCosLoadbalancerShell2GDriver()
+            shell_driver.initialize(context)
+
+            target_config_path = os.path.join(work_path, "target-config")
+            with open(target_config_path, "w") as target_config_file:
+                target_config_file.write(model.running_config.replace("algorithm hash", "algorithm round-robin", 10))
+
+            commands = [("get_inventory", lambda: shell_driver.get_inventory(context)),
+                        ("save", lambda: shell_driver.save(context, None, work_path, "running", "")),
+                        ("restore", lambda: shell_driver.restore(context, None, target_config_path, "running",
+                                                                 "Diff", "")),
+                        ("health_check", lambda: shell_driver.health_check(context))]
+
+            for name, func in commands:
+                for iteration in range(args.iterations):
+                    result = run_command(name, func, snmp_agent, cli_server)
+                    result.update({"lb_groups": lb_groups_count, "iteration": iteration})
+                    results.append(result)
+                    print("{lb_groups:>6} LB groups {command:<14} {wall_time:>8.3f}s {snmp_pdus:>6} PDUs "
+                          "{cli_commands:>5} CLI commands {error}".format(**dict(result,
+                                                                                 error=result["error"] or "")))
+
+            shell_driver.cleanup()
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+    return results
+
+
+def compare(results, baseline_results):
+    """Print wall time and PDU count ratios to the baseline
+
+    :param list[dict] results:
+    :param list[dict] baseline_results:
+    :return:
+    """
+    def _best(items):
+        best = {}
+        for item in items:
+            key = (item["lb_groups"], item["command"])
+            if key not in best or item["wall_time"] < best[key]["wall_time"]:
+                best[key] = item
+        return best
+
+    current = _best(results)
+    baseline = _best(baseline_results)
+
+    print("\nComparison with the baseline (best of iterations):")
+    for key in sorted(set(current) & set(baseline)):
+        print("{:>6} LB groups {:<14} wall time x{:.2f}, PDUs {} -> {}".format(
+            key[0], key[1],
+            current[key]["wall_time"] / max(baseline[key]["wall_time"], 1e-6),
+            baseline[key]["snmp_pdus"],
+            current[key]["snmp_pdus"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma separated numbers of LB groups")
+    parser.add_argument("--ports", type=int, default=48, help="number of ports of the simulated device")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--snmp-port", type=int, default=161)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON results file")
+    parser.add_argument("--baseline", help="JSON results file of the previous run to compare with")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes.split(","):
+        results.extend(run_size(int(size), args))
+
+    with open(args.output, "w") as output_file:
+        json.dump({"shell_version": get_shell_version(),
+                   "python_version": sys.version.split()[0],
+                   "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "results": results}, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            compare(results, json.load(baseline_file)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the driver cold start
+
+Every measurement runs in a new Python process: `import driver`, `initialize()`
+and the imports done on the first run of the command. Dependencies of the commands
+are loaded on first use, so non-Autoload commands shouldn't pay for the SNMP and
+Autoload modules. Results are written as JSON, so results of different shell
+versions can be compared with --baseline.
+
+Requires the shell dependencies (cloudshell-cgs, cloudshell-networking-devices).
+
+Usage: python -m tests.benchmarks.bench_startup [--runs 10] [--baseline bench_startup_output.txt]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SRC_PATH = os.path.join(ROOT_PATH, "src")
+DEFAULT_OUTPUT = os.path.join(ROOT_PATH, "bench_startup_output.txt")
+
+# modules imported by the driver on the first run of the command
+COMMAND_IMPORTS = {
+    "health_check": ["cloudshell.cgs.cli.handler",
+                     "cloudshell.cgs.runners.state"],
+    "run_custom_command": ["cloudshell.cgs.cli.handler",
+                           "cloudshell.devices.runners.run_command_runner"],
+    "save": ["cloudshell.cgs.cli.handler",
+             "cgs.load_balancing.runners.configuration"],
+    "get_inventory": ["cloudshell.cgs.cli.handler",
+                      "cloudshell.cgs.snmp.handler",
+                      "cgs.load_balancing.runners.autoload",
+                      "cgs.load_balancing.snmp.handler",
+                      "cgs.load_balancing.snmp.session"],
+}
+
+MEASURE_SCRIPT = """
+import json
+import sys
+import time
+
+start_time = time.time()
+import driver
+import_time = time.time() - start_time
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from cloudshell.shell.core.driver_context import InitCommandContext
+from cloudshell.shell.core.driver_context import ResourceContextDetails
+
+# the same context as in bench_driver, it is not imported to keep the simulator modules out of the measurement
+context = InitCommandContext(*(None,) * 2)
+context.resource = ResourceContextDetails(*(None,) * 13)
+context.resource.name = "COS Simulator"
+context.resource.fullname = "COS Simulator"
+context.resource.address = "127.0.0.1"
+context.resource.family = "CS_LoadBalancer"
+context.resource.attributes = dict(
+    ("{{}}.{{}}".format(driver.CgsCosLoadbalancerShell2GDriver.SHELL_NAME, name), value)
+    for name, value in [("User", "admin"), ("Password", "admin"), ("Sessions Concurrency Limit", 1),
+                        ("CLI Connection Type", "Telnet"), ("SNMP Version", "v2c")])
+
+start_time = time.time()
+with mock.patch("driver.get_api"):
+    driver.CgsCosLoadbalancerShell2GDriver().initialize(context)
+initialize_time = time.time() - start_time
+
+modules_count = len(sys.modules)
+start_time = time.time()
+for module in {modules!r}:
+    __import__(module)
+command_import_time = time.time() - start_time
+
+print(json.dumps({{"import": import_time,
+                  "initialize": initialize_time,
+                  "command_import": command_import_time,
+                  "total": import_time + initialize_time + command_import_time,
+                  "startup_modules": modules_count,
+                  "command_modules": len(sys.modules) - modules_count}}))
+"""
+
+
+def measure(command, python):
+    """Measure cold start of the command in a new process
+
+    :param str command: one of the COMMAND_IMPORTS keys
+    :param str python: Python interpreter
+    :rtype: dict
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([SRC_PATH, os.environ.get("PYTHONPATH", "")]))
+    script = MEASURE_SCRIPT.format(modules=COMMAND_IMPORTS[command])
+    output = subprocess.check_output([python, "-c", script], env=env, cwd=SRC_PATH)
+
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def summarize(command, runs):
+    """
+
+    :param str command:
+    :param list[dict] runs:
+    :return: median of each measurement
+    :rtype: dict
+    """
+    result = {"command": command, "runs": len(runs)}
+
+    for key in runs[0]:
+        values = sorted(run[key] for run in runs)
+        result[key] = round(values[len(values) // 2], 4)
+
+    return result
+
+
+def compare(results, baseline_results):
+    """Print total cold start time ratios to the baseline
+
+    :param list[dict] results:
+    :param list[dict] baseline_results:
+    :return:
+    """
+    baseline = dict((item["command"], item) for item in baseline_results)
+
+    print("\nComparison with the baseline (median of runs):")
+    for item in results:
+        if item["command"] in baseline:
+            print("{:<20} total x{:.2f} ({:.3f}s -> {:.3f}s), import x{:.2f}".format(
+                item["command"],
+                item["total"] / max(baseline[item["command"]]["total"], 1e-6),
+                baseline[item["command"]]["total"],
+                item["total"],
+                item["import"] / max(baseline[item["command"]]["import"], 1e-6)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="number of processes per command")
+    parser.add_argument("--commands", default=",".join(sorted(COMMAND_IMPORTS)),
+                        help="comma separated commands")
+    parser.add_argument("--python", default=sys.executable, help="Python interpreter of the execution server")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON results file")
+    parser.add_argument("--baseline", help="JSON results file of the previous run to compare with")
+    args = parser.parse_args(argv)
+
+    results = []
+    for command in args.commands.split(","):
+        result = summarize(command, [measure(command, args.python) for _ in range(args.runs)])
+        results.append(result)
+        print("{command:<20} import {import:.3f}s initialize {initialize:.3f}s first command imports "
+              "{command_import:.3f}s total {total:.3f}s, {startup_modules} + {command_modules} modules".format(
+                  **result))
+
+    with open(args.output, "w") as output_file:
+        json.dump({"python_version": sys.version.split()[0],
+                   "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "results": results}, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            compare(results, json.load(baseline_file)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scripted Telnet CLI endpoint of the simulated COS load balancer
+"""
+
+import re
+import threading
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+TELNET_IAC = 255
+TELNET_SB = 250
+TELNET_SE = 240
+TELNET_OPTION_COMMANDS = (251, 252, 253, 254)
+
+
+def strip_telnet_commands(data):
+    """Remove Telnet negotiation sequences, the simulator doesn't negotiate any options
+
+    :param bytearray data:
+    :rtype: bytearray
+    """
+    result = bytearray()
+    i = 0
+
+    while i < len(data):
+        byte = data[i]
+        if byte != TELNET_IAC:
+            result.append(byte)
+            i += 1
+        elif i + 1 < len(data) and data[i + 1] in TELNET_OPTION_COMMANDS:
+            i += 3
+        elif i + 1 < len(data) and data[i + 1] == TELNET_SB:
+            end = data.find(bytearray([TELNET_IAC, TELNET_SE]), i)
+            i = len(data) if end == -1 else end + 2
+        else:
+            i += 2
+
+    return result
+
+
+class CliSessionHandler(socketserver.StreamRequestHandler):
+    USER_MODE = "user"
+    ENABLE_MODE = "enable"
+    CONFIG_MODE = "config"
+
+    def _send(self, text):
+        self.wfile.write(text.replace("\n", "\r\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def _read_line(self):
+        """
+
+        :return: line without the line ending or None if the client disconnected
+        :rtype: str
+        """
+        line = self.rfile.readline()
+        if not line:
+            return None
+
+        return strip_telnet_commands(bytearray(line)).decode("utf-8", "replace").strip("\r\n\x00")
+
+    @property
+    def prompt(self):
+        hostname = self.server.model.hostname
+        return {self.USER_MODE: "{}>".format(hostname),
+                self.ENABLE_MODE: "{}#".format(hostname),
+                self.CONFIG_MODE: "{}(config)#".format(hostname)}[self.mode]
+
+    def _login(self):
+        self._send("Username: ")
+        user = self._read_line()
+        self._send("Password: ")
+        password = self._read_line()
+
+        if (user or "").strip() != self.server.user or (password or "").strip() != self.server.password:
+            self._send("\nLogin incorrect\n")
+            return False
+
+        return True
+
+    def handle(self):
+        self.mode = self.USER_MODE
+        self.config_block = None
+        self.server.sessions_count += 1
+
+        if not self._login():
+            return
+
+        self._send("\n" + self.prompt + " ")
+
+        while True:
+            command = self._read_line()
+            if command is None:
+                break
+
+            command = command.strip()
+            output = self.server.handle_command(self, command)
+            if output is False:
+                break
+
+            self._send(command + "\n")
+            if output:
+                self._send(output + "\n")
+            self._send(self.prompt + " ")
+
+    def set_mode(self, mode):
+        self.mode = mode
+
+
+class ScriptedCliServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Telnet server that answers CLI commands from the device model
+
+    Every session goes through the Username/Password login, then supports the
+    user (>), enable (#) and config ((config)#) modes. Unknown commands return
+    empty output, so commands of the upstream flows (SNMP enable, copy) succeed.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, model, address="127.0.0.1", port=0, user="admin", password="admin"):
+        """
+
+        :param tests.simulator.device.CosDeviceModel model:
+        :param str address:
+        :param int port: 0 to bind a free port
+        :param str user:
+        :param str password:
+        """
+        socketserver.TCPServer.__init__(self, (address, port), CliSessionHandler)
+        self.model = model
+        self.user = user
+        self.password = password
+        self.sessions_count = 0
+        self.commands_count = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def reset_counters(self):
+        self.sessions_count = 0
+        self.commands_count = 0
+
+    def handle_command(self, session, command):
+        """
+
+        :param CliSessionHandler session:
+        :param str command:
+        :return: command output or False to close the session
+        """
+        if not command:
+            return ""
+
+        with self._lock:
+            self.commands_count += 1
+
+            if re.match(r"^(logout|quit)$", command):
+                return False
+
+            if session.mode == CliSessionHandler.USER_MODE:
+                if re.match(r"^en(able)?$", command):
+                    session.set_mode(CliSessionHandler.ENABLE_MODE)
+                    return ""
+                if command == "exit":
+                    return False
+
+            elif session.mode == CliSessionHandler.ENABLE_MODE:
+                if re.match(r"^conf(igure)?(\s+t(erminal)?)?$", command):
+                    session.set_mode(CliSessionHandler.CONFIG_MODE)
+                    return ""
+                if re.match(r"^disable$", command):
+                    session.set_mode(CliSessionHandler.USER_MODE)
+                    return ""
+                if command == "exit":
+                    return False
+
+            elif session.mode == CliSessionHandler.CONFIG_MODE:
+                if command == "exit" and session.config_block:
+                    session.config_block = None
+                    return ""
+                if command in ("end", "exit"):
+                    session.config_block = None
+                    session.set_mode(CliSessionHandler.ENABLE_MODE)
+                    return ""
+                if not command.startswith(("show ", "do ")):
+                    self.model.apply_config_command(command, session.config_block)
+                    if session.config_block is None and re.match(self.model.CONFIG_BLOCK_PATTERN, command):
+                        session.config_block = command
+                    return ""
+
+            return self.model.get_cli_response(re.sub(r"^do\s+", "", command)) or ""
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="ScriptedCliServer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join(5)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
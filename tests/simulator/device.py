@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+Model of the simulated COS load balancer: MIB objects served by the SNMP agent and CLI responses
+"""
+
+import re
+
+SYSTEM_OID = (1, 3, 6, 1, 2, 1, 1)
+IF_ENTRY_OID = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+IF_X_ENTRY_OID = (1, 3, 6, 1, 2, 1, 31, 1, 1, 1)
+IF_TABLE_LAST_CHANGE_OID = (1, 3, 6, 1, 2, 1, 31, 1, 5, 0)
+ENT_PHYSICAL_ENTRY_OID = (1, 3, 6, 1, 2, 1, 47, 1, 1, 1, 1)
+ENT_LAST_CHANGE_TIME_OID = (1, 3, 6, 1, 2, 1, 47, 1, 4, 1, 0)
+
+SYSTEM_COLUMNS = {"sysDescr": 1, "sysObjectID": 2, "sysUpTime": 3, "sysContact": 4, "sysName": 5, "sysLocation": 6}
+IF_COLUMNS = {"ifIndex": 1, "ifDescr": 2, "ifType": 3, "ifMtu": 4, "ifSpeed": 5, "ifPhysAddress": 6,
+              "ifAdminStatus": 7, "ifOperStatus": 8}
+IF_X_COLUMNS = {"ifName": 1, "ifHighSpeed": 15, "ifAlias": 18}
+ENT_PHYSICAL_COLUMNS = {"entPhysicalDescr": 2, "entPhysicalContainedIn": 4, "entPhysicalClass": 5,
+                        "entPhysicalParentRelPos": 6, "entPhysicalName": 7, "entPhysicalSoftwareRev": 10,
+                        "entPhysicalSerialNum": 11, "entPhysicalMfgName": 12, "entPhysicalModelName": 13}
+LB_GROUP_COLUMNS = ["lbGroupName", "lbGroupOutputs", "lbGroupAlgo"]
+
+ENT_PHYSICAL_CLASS_CHASSIS = 3
+ENT_PHYSICAL_CLASS_PORT = 10
+
+
+class CosDeviceModel(object):
+    """Simulated device with the configurable number of LB groups and ports
+
+    MIB objects are described as (name, oid, value type, value) where the value type
+    is one of "integer", "octets", "oid", "timeticks", "gauge" or "mib" for the columns
+    of the NPB-LB MIB that are typed with the column syntax.
+    """
+
+    CONFIG_BLOCK_PATTERN = r"^(interface|lb-group)\s"
+
+    def __init__(self, lb_groups_count=10, ports_count=48, hostname="cos-sim", up_time=360000):
+        """
+
+        :param int lb_groups_count:
+        :param int ports_count:
+        :param str hostname:
+        :param int up_time: sysUpTime in hundredths of a second
+        """
+        self.lb_groups_count = lb_groups_count
+        self.ports_count = ports_count
+        self.hostname = hostname
+        self.up_time = up_time
+        self.config_lines = self._build_config_lines()
+
+    def get_lb_group_name(self, group_id):
+        return "group-{}".format(group_id)
+
+    def get_lb_group_outputs(self, group_id):
+        outputs_count = min(4, self.ports_count)
+        return ",".join("1/{}".format((group_id + i - 1) % self.ports_count + 1) for i in range(outputs_count))
+
+    def get_system_objects(self):
+        """
+
+        :rtype: list[tuple]
+        """
+        values = {"sysDescr": ("octets", "CGS COS NPB-II load balancer, version 2.6.1"),
+                  "sysObjectID": ("oid", (1, 3, 6, 1, 4, 1, 99999, 1, 1)),
+                  "sysUpTime": ("timeticks", self.up_time),
+                  "sysContact": ("octets", "lab@example.com"),
+                  "sysName": ("octets", self.hostname),
+                  "sysLocation": ("octets", "Simulator")}
+
+        return [(name, SYSTEM_OID + (column, 0)) + values[name] for name, column in SYSTEM_COLUMNS.items()]
+
+    def get_port_objects(self):
+        """IF-MIB and ENTITY-MIB objects of the chassis and its ports
+
+        :rtype: list[tuple]
+        """
+        objects = [("ifTableLastChange", IF_TABLE_LAST_CHANGE_OID, "timeticks", 100),
+                   ("entLastChangeTime", ENT_LAST_CHANGE_TIME_OID, "timeticks", 100)]
+
+        chassis = {"entPhysicalDescr": ("octets", "COS chassis"),
+                   "entPhysicalContainedIn": ("integer", 0),
+                   "entPhysicalClass": ("integer", ENT_PHYSICAL_CLASS_CHASSIS),
+                   "entPhysicalParentRelPos": ("integer", -1),
+                   "entPhysicalName": ("octets", "Chassis 1"),
+                   "entPhysicalSoftwareRev": ("octets", "2.6.1"),
+                   "entPhysicalSerialNum": ("octets", "SIM000001"),
+                   "entPhysicalMfgName": ("octets", "CGS"),
+                   "entPhysicalModelName": ("octets", "NPB-II")}
+
+        for name, (value_type, value) in chassis.items():
+            objects.append((name, ENT_PHYSICAL_ENTRY_OID + (ENT_PHYSICAL_COLUMNS[name], 1), value_type, value))
+
+        for port_id in range(1, self.ports_count + 1):
+            port_name = "1/{}".format(port_id)
+            entity_index = 1000 + port_id
+            port = {"ifIndex": ("integer", port_id),
+                    "ifDescr": ("octets", port_name),
+                    "ifType": ("integer", 6),
+                    "ifMtu": ("integer", 9216),
+                    "ifSpeed": ("gauge", 4294967295),
+                    "ifPhysAddress": ("octets", "\x00\x1b\x21\x00\x00" + chr(port_id % 256)),
+                    "ifAdminStatus": ("integer", 1),
+                    "ifOperStatus": ("integer", 1)}
+
+            for name, (value_type, value) in port.items():
+                objects.append((name, IF_ENTRY_OID + (IF_COLUMNS[name], port_id), value_type, value))
+
+            for name, value_type, value in [("ifName", "octets", port_name),
+                                            ("ifHighSpeed", "gauge", 10000),
+                                            ("ifAlias", "octets", "")]:
+                objects.append((name, IF_X_ENTRY_OID + (IF_X_COLUMNS[name], port_id), value_type, value))
+
+            entity = {"entPhysicalDescr": ("octets", "10G port {}".format(port_name)),
+                      "entPhysicalContainedIn": ("integer", 1),
+                      "entPhysicalClass": ("integer", ENT_PHYSICAL_CLASS_PORT),
+                      "entPhysicalParentRelPos": ("integer", port_id),
+                      "entPhysicalName": ("octets", port_name),
+                      "entPhysicalSoftwareRev": ("octets", ""),
+                      "entPhysicalSerialNum": ("octets", ""),
+                      "entPhysicalMfgName": ("octets", "CGS"),
+                      "entPhysicalModelName": ("octets", "SFP+")}
+
+            for name, (value_type, value) in entity.items():
+                objects.append((name, ENT_PHYSICAL_ENTRY_OID + (ENT_PHYSICAL_COLUMNS[name], entity_index),
+                                value_type, value))
+
+        return objects
+
+    def get_lb_group_objects(self, column_oids):
+        """NPB-LB lbGroupTable objects
+
+        :param dict column_oids: {column name: column OID tuple}, resolved from the NPB-LB MIB
+        :rtype: list[tuple]
+        """
+        objects = []
+
+        for group_id in range(1, self.lb_groups_count + 1):
+            values = {"lbGroupName": self.get_lb_group_name(group_id),
+                      "lbGroupOutputs": self.get_lb_group_outputs(group_id),
+                      "lbGroupAlgo": None}
+
+            for name in LB_GROUP_COLUMNS:
+                objects.append((name, tuple(column_oids[name]) + (group_id,), "mib", values[name]))
+
+        return objects
+
+    def _build_config_lines(self):
+        lines = ["! COS configuration", "hostname {}".format(self.hostname)]
+
+        for port_id in range(1, self.ports_count + 1):
+            lines.extend(["interface 1/{}".format(port_id), " no shutdown", " mtu 9216"])
+
+        for group_id in range(1, self.lb_groups_count + 1):
+            lines.append("lb-group {}".format(self.get_lb_group_name(group_id)))
+            lines.extend(" output {}".format(port) for port in self.get_lb_group_outputs(group_id).split(","))
+            lines.append(" algorithm hash")
+
+        lines.append("snmp-server community public ro")
+        return lines
+
+    @property
+    def running_config(self):
+        return "\n".join(self.config_lines)
+
+    def get_cli_response(self, command):
+        """Output of the show and file transfer commands
+
+        :param str command:
+        :return: command output or None if the command is not known
+        :rtype: str
+        """
+        if re.match(r"^show\s+(running|startup)-config", command):
+            return self.running_config
+
+        if re.match(r"^show\s+version", command):
+            return "COS version 2.6.1\nUptime: {} seconds".format(self.up_time // 100)
+
+        if re.match(r"^(copy|upload|download)\s+", command):
+            return "Copy completed successfully."
+
+        return None
+
+    def _get_block_range(self, header):
+        """
+
+        :param str header: top-level line of the block
+        :return: indexes of the header and of the line after the last sub-line or None if there is no such block
+        :rtype: tuple
+        """
+        if header not in self.config_lines:
+            return None
+
+        start = self.config_lines.index(header)
+        end = start + 1
+        while end < len(self.config_lines) and self.config_lines[end].startswith(" "):
+            end += 1
+
+        return start, end
+
+    def apply_config_command(self, command, block=None):
+        """Apply the config mode command to the running configuration
+
+        :param str command:
+        :param str block: header of the block the command is sent in, e.g. "lb-group group-1"
+        :return:
+        """
+        negated = command.startswith("no ")
+        line = command[3:] if negated else command
+
+        if block is None:
+            block_range = self._get_block_range(line)
+            if negated and block_range is not None:
+                del self.config_lines[block_range[0]:block_range[1]]
+            elif not negated and block_range is None:
+                self.config_lines.append(line)
+            return
+
+        if self._get_block_range(block) is None:
+            self.config_lines.append(block)
+
+        start, end = self._get_block_range(block)
+        sub_line = " " + line
+        block_lines = self.config_lines[start + 1:end]
+
+        if negated and sub_line in block_lines:
+            del self.config_lines[start + 1 + block_lines.index(sub_line)]
+        elif not negated and sub_line not in block_lines:
+            self.config_lines.insert(end, sub_line)
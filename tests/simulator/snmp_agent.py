@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+"""
+SNMP agent of the simulated COS load balancer, serves GET, GETNEXT and GETBULK requests
+"""
+
+import bisect
+import os
+import threading
+
+from pysnmp.carrier.asyncore.dgram import udp
+from pysnmp.entity import config
+from pysnmp.entity import engine
+from pysnmp.entity.rfc3413 import cmdrsp
+from pysnmp.entity.rfc3413 import context
+from pysnmp.proto import rfc1902
+from pysnmp.proto import rfc1905
+from pysnmp.smi import builder
+
+from tests.simulator.device import LB_GROUP_COLUMNS
+
+NPB_LB_MIB = "NPB-LB"
+MIBS_PATH_ENV = "CGS_MIBS_PATH"
+
+VALUE_TYPES = {"integer": rfc1902.Integer32,
+               "octets": rfc1902.OctetString,
+               "oid": rfc1902.ObjectName,
+               "timeticks": rfc1902.TimeTicks,
+               "gauge": rfc1902.Gauge32}
+
+
+class MibNotFoundError(Exception):
+    pass
+
+
+def find_mibs_path():
+    """Find folder with the compiled NPB-LB MIB
+
+    The MIB is a part of the cloudshell-cgs package, the folder can be set explicitly
+    with the CGS_MIBS_PATH environment variable.
+    :rtype: str
+    """
+    mibs_path = os.environ.get(MIBS_PATH_ENV)
+    if mibs_path:
+        return mibs_path
+
+    try:
+        import cloudshell.cgs
+    except ImportError:
+        raise MibNotFoundError("cloudshell-cgs is not installed, set {} to the folder with {}.py".format(
+            MIBS_PATH_ENV, NPB_LB_MIB))
+
+    for package_path in cloudshell.cgs.__path__:
+        for root, _, files in os.walk(package_path):
+            if "{}.py".format(NPB_LB_MIB) in files:
+                return root
+
+    raise MibNotFoundError("{}.py is not found in the cloudshell-cgs package".format(NPB_LB_MIB))
+
+
+def load_lb_group_columns(mibs_path):
+    """
+
+    :param str mibs_path:
+    :return: {column name: MibTableColumn}
+    :rtype: dict
+    """
+    mib_builder = builder.MibBuilder()
+    mib_builder.addMibSources(builder.DirMibSource(mibs_path))
+    columns = mib_builder.importSymbols(NPB_LB_MIB, *LB_GROUP_COLUMNS)
+
+    return dict(zip(LB_GROUP_COLUMNS, columns))
+
+
+class SimulatorMibInstrumController(object):
+    """Serve the sorted list of MIB objects, it replaces the pysnmp MIB instrumentation"""
+
+    def __init__(self, objects):
+        """
+
+        :param list[tuple] objects: (oid, value) pairs
+        """
+        objects = sorted(objects)
+        self._oids = [oid for oid, _ in objects]
+        self._values = [value for _, value in objects]
+        self._index = dict((oid, i) for i, oid in enumerate(self._oids))
+
+    def _respond(self, var_binds, kwargs):
+        # newer pysnmp versions pass the callback instead of using the return value
+        cb_fun = kwargs.get("cbFun")
+        if cb_fun is not None:
+            cb_fun(var_binds, **kwargs)
+            return None
+
+        return var_binds
+
+    def readVars(self, varBinds, acInfo=(None, None), **kwargs):
+        result = []
+        for oid, _ in varBinds:
+            index = self._index.get(tuple(oid))
+            if index is None:
+                result.append((oid, rfc1905.noSuchInstance))
+            else:
+                result.append((oid, self._values[index]))
+
+        return self._respond(result, kwargs)
+
+    def readNextVars(self, varBinds, acInfo=(None, None), **kwargs):
+        result = []
+        for oid, _ in varBinds:
+            index = bisect.bisect_right(self._oids, tuple(oid))
+            if index >= len(self._oids):
+                result.append((oid, rfc1905.endOfMibView))
+            else:
+                result.append((rfc1902.ObjectName(self._oids[index]), self._values[index]))
+
+        return self._respond(result, kwargs)
+
+    def writeVars(self, varBinds, acInfo=(None, None), **kwargs):
+        return self._respond([(oid, rfc1905.noSuchInstance) for oid, _ in varBinds], kwargs)
+
+
+class SnmpAgentSimulator(object):
+    """SNMP v1/v2c agent that serves the device model in the background thread"""
+
+    def __init__(self, model, address="127.0.0.1", port=161, community="public", mibs_path=None):
+        """
+
+        :param tests.simulator.device.CosDeviceModel model:
+        :param str address:
+        :param int port: 0 to bind a free port
+        :param str community: read community
+        :param str mibs_path: folder with the compiled NPB-LB MIB
+        """
+        self.model = model
+        self.address = address
+        self.port = port
+        self.community = community
+        self.mibs_path = mibs_path
+        self.pdu_counts = {}
+        self._snmp_engine = None
+        self._thread = None
+
+    @property
+    def total_pdu_count(self):
+        return sum(self.pdu_counts.values())
+
+    def reset_counters(self):
+        self.pdu_counts = {}
+
+    def _build_objects(self):
+        """
+
+        :rtype: list[tuple]
+        """
+        lb_group_columns = load_lb_group_columns(self.mibs_path or find_mibs_path())
+        objects = self.model.get_system_objects() + self.model.get_port_objects()
+        objects += self.model.get_lb_group_objects(dict((name, column.name)
+                                                        for name, column in lb_group_columns.items()))
+        result = []
+
+        for name, oid, value_type, value in objects:
+            if value_type == "mib":
+                syntax = lb_group_columns[name].syntax
+                if value is None:
+                    named_values = getattr(syntax, "namedValues", None)
+                    value = 1
+                    if named_values:
+                        # old pyasn1 iterates (name, value) pairs, new one iterates names
+                        first_value = list(named_values)[0]
+                        value = first_value[1] if isinstance(first_value, tuple) else named_values[first_value]
+                value = syntax.clone(value)
+            else:
+                value = VALUE_TYPES[value_type](value)
+
+            result.append((tuple(oid), value))
+
+        return result
+
+    def _on_request(self, snmp_engine, execpoint, variables, cb_ctx):
+        pdu_type = variables["pdu"].__class__.__name__
+        self.pdu_counts[pdu_type] = self.pdu_counts.get(pdu_type, 0) + 1
+
+    def start(self):
+        """Bind the UDP port and start serving requests
+
+        :return:
+        """
+        instrum_controller = SimulatorMibInstrumController(self._build_objects())
+
+        self._snmp_engine = engine.SnmpEngine()
+        transport = udp.UdpTransport().openServerMode((self.address, self.port))
+        self.port = transport.socket.getsockname()[1]
+
+        config.addTransport(self._snmp_engine, udp.domainName, transport)
+        config.addV1System(self._snmp_engine, "simulator-area", self.community)
+        config.addVacmUser(self._snmp_engine, 1, "simulator-area", "noAuthNoPriv", (1, 3, 6), ())
+        config.addVacmUser(self._snmp_engine, 2, "simulator-area", "noAuthNoPriv", (1, 3, 6), ())
+
+        snmp_context = context.SnmpContext(self._snmp_engine)
+        snmp_context.unregisterContextName(rfc1902.OctetString(""))
+        snmp_context.registerContextName(rfc1902.OctetString(""), instrum_controller)
+
+        cmdrsp.GetCommandResponder(self._snmp_engine, snmp_context)
+        cmdrsp.NextCommandResponder(self._snmp_engine, snmp_context)
+        cmdrsp.BulkCommandResponder(self._snmp_engine, snmp_context)
+
+        self._snmp_engine.observer.registerObserver(self._on_request, "rfc3412.receiveMessage:request")
+        self._snmp_engine.transportDispatcher.jobStarted(1)
+
+        self._thread = threading.Thread(target=self._snmp_engine.transportDispatcher.runDispatcher,
+                                        name="SnmpAgentSimulator")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+
+        :return:
+        """
+        if self._snmp_engine is None:
+            return
+
+        self._snmp_engine.transportDispatcher.jobFinished(1)
+        self._thread.join(5)
+        self._snmp_engine.transportDispatcher.closeDispatcher()
+        self._snmp_engine = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `AsyncLogHandler`
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from cgs.load_balancing.helpers.async_logging import AsyncLogHandler
+from cgs.load_balancing.helpers.async_logging import AsyncLogHandlers
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, blocker=None):
+        super(ListHandler, self).__init__()
+        self.messages = []
+        self.blocker = blocker
+
+    def emit(self, record):
+        if self.blocker is not None:
+            self.blocker.wait()
+        self.messages.append(record.getMessage())
+
+
+class TestAsyncLogHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.target_handler = ListHandler()
+        self.logger = logging.getLogger("test_async_logging.{}".format(id(self)))
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def _create_handler(self, **kwargs):
+        handler = AsyncLogHandler([self.target_handler], **kwargs)
+        self.addCleanup(handler.close)
+        self.logger.addHandler(handler)
+        return handler
+
+    def test_records_are_written(self):
+        handler = self._create_handler()
+        self.logger.info("Save command ended with response: %s", "lb-1.cfg")
+        handler.flush()
+
+        self.assertEqual(self.target_handler.messages, ["Save command ended with response: lb-1.cfg"])
+
+    def test_dropped_records_are_reported(self):
+        blocker = threading.Event()
+        self.target_handler.blocker = blocker
+        handler = self._create_handler(queue_size=2)
+
+        for number in range(10):
+            self.logger.info("record %s", number)
+        blocker.set()
+        handler.flush()
+        self.logger.info("after")
+        handler.flush()
+
+        self.assertGreater(handler.stats["dropped"], 0)
+        self.assertIn("{} log records were dropped, the log queue is full".format(handler.stats["dropped"]),
+                      self.target_handler.messages)
+        self.assertEqual(self.target_handler.messages[-1], "after")
+
+    def test_payload_is_truncated(self):
+        handler = self._create_handler(payload_max_length=5)
+        self.logger.info("0123456789")
+        handler.flush()
+
+        self.assertEqual(self.target_handler.messages, ["01234... [truncated 5 of 10 chars]"])
+
+    def test_payload_is_written_to_file(self):
+        payload_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, payload_path)
+        handler = self._create_handler(payload_max_length=5, payload_path=payload_path)
+        self.logger.info("0123456789")
+        handler.flush()
+
+        file_name, = os.listdir(payload_path)
+        with open(os.path.join(payload_path, file_name)) as payload_file:
+            self.assertEqual(payload_file.read(), "0123456789")
+        self.assertIn(file_name, self.target_handler.messages[0])
+
+    def test_payload_is_truncated_before_queued(self):
+        payload_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, payload_path)
+        blocker = threading.Event()
+        self.target_handler.blocker = blocker
+        handler = self._create_handler(payload_max_length=5, payload_path=payload_path, payload_queue_size=15)
+
+        self.logger.info("0123456789")
+        self.logger.info("abcdefghij")
+        # the background thread is blocked by the first record, the second one waits in the queue truncated
+        self.assertEqual(list(handler._queue.queue)[-1].msg, "abcde... [truncated 5 of 10 chars]")
+        self.assertEqual(handler.stats["queued_payload_size"], 10)
+        blocker.set()
+        handler.flush()
+
+        self.assertEqual(len(os.listdir(payload_path)), 1)
+        self.assertIn("01234... [10 chars, full text in", self.target_handler.messages[0])
+        self.assertEqual(self.target_handler.messages[1], "abcde... [truncated 5 of 10 chars]")
+        self.assertEqual(handler.stats["queued_payload_size"], 0)
+
+    def test_install_and_uninstall(self):
+        async_log_handlers = AsyncLogHandlers()
+        self.addCleanup(async_log_handlers.close_all)
+        self.logger.addHandler(self.target_handler)
+
+        async_log_handlers.install(self.logger, queue_size=10, payload_max_length=0, payload_path=None)
+        async_handler, = self.logger.handlers
+        # handler added again, e.g. by get_logger_with_thread_id
+        self.logger.addHandler(self.target_handler)
+        async_log_handlers.install(self.logger, queue_size=10, payload_max_length=0, payload_path=None)
+        self.assertEqual(self.logger.handlers, [async_handler])
+
+        self.logger.info("message")
+        async_log_handlers.uninstall(self.logger)
+        self.assertEqual(self.logger.handlers, [self.target_handler])
+        self.assertEqual(self.target_handler.messages, ["message"])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `AutoloadDetailsCache`
+"""
+
+import json
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from cgs.load_balancing.autoload.cache import AutoloadDetailsCache
+from cgs.load_balancing.autoload.cache import get_autoload_details_data
+from cgs.load_balancing.autoload.cache import get_device_fingerprint
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Object(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeSnmpService(object):
+    LB_GROUP_NAME_OID = (1, 3, 6, 1, 4, 1, 99999, 1, 1, 2)
+
+    def __init__(self, values, lb_groups=None):
+        """
+
+        :param dict values: scalar values by name
+        :param dict lb_groups: {group index: name}
+        """
+        self.values = values
+        self.lb_groups = lb_groups or {}
+        self.requests = []
+
+    def get_property(self, mib, name, index):
+        self.requests.append((mib, name, index))
+        return self.values[name]
+
+    def resolve_column_oid(self, mib, column):
+        return self.LB_GROUP_NAME_OID
+
+    def get_bulk_rows(self, oids, max_repetitions):
+        self.requests.append(("GETBULK", oids, max_repetitions))
+        rows = [[(self.LB_GROUP_NAME_OID + (index,), name)] for index, name in sorted(self.lb_groups.items())]
+        # next column of the table follows the last row
+        rows.append([(self.LB_GROUP_NAME_OID[:-1] + (3, 1), "2")])
+        return rows[:max_repetitions]
+
+
+class TestDeviceFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        self.snmp_service = FakeSnmpService({"sysUpTime": 10000,
+                                             "sysDescr": "COS 2.6.1",
+                                             "ifTableLastChange": 500,
+                                             "entLastChangeTime": 400,
+                                             "ifNumber": 48},
+                                            lb_groups={1: "web", 2: "db"})
+
+    def test_fingerprint_uses_scalar_requests(self):
+        fingerprint = get_device_fingerprint(self.snmp_service, timer=lambda: 1100.0)
+
+        self.assertEqual(fingerprint, (1000, "COS 2.6.1", 500, 400, 48, 2, ("1", "web"), ("2", "db")))
+        self.assertEqual(len(self.snmp_service.requests), 6)
+        self.assertTrue(all(index == 0 for _, _, index in self.snmp_service.requests[:5]))
+        self.assertEqual(self.snmp_service.requests[5][0], "GETBULK")
+
+    def test_fingerprint_changes_with_ports(self):
+        fingerprint = get_device_fingerprint(self.snmp_service, timer=lambda: 1100.0)
+
+        self.snmp_service.values.update(ifTableLastChange=600, ifNumber=52)
+        self.assertNotEqual(fingerprint, get_device_fingerprint(self.snmp_service, timer=lambda: 1100.0))
+
+    def test_fingerprint_changes_with_lb_groups(self):
+        fingerprint = get_device_fingerprint(self.snmp_service, timer=lambda: 1100.0)
+
+        self.snmp_service.lb_groups[3] = "app"
+        added_fingerprint = get_device_fingerprint(self.snmp_service, timer=lambda: 1100.0)
+        self.assertNotEqual(fingerprint, added_fingerprint)
+
+        self.snmp_service.lb_groups[3] = "api"
+        self.assertNotEqual(added_fingerprint, get_device_fingerprint(self.snmp_service, timer=lambda: 1100.0))
+
+        del self.snmp_service.lb_groups[3]
+        self.assertEqual(fingerprint, get_device_fingerprint(self.snmp_service, timer=lambda: 1100.0))
+
+    def test_fingerprint_without_lb_groups(self):
+        self.snmp_service.lb_groups = {}
+
+        self.assertEqual(get_device_fingerprint(self.snmp_service, timer=lambda: 1100.0)[5:], (0,))
+
+
+class TestAutoloadDetailsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+        self.timer = FakeTimer()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_path, ignore_errors=True)
+
+    def _create_cache(self, max_size=4, ttl=60):
+        return AutoloadDetailsCache(max_size=max_size, ttl=ttl, cache_path=self.cache_path, timer=self.timer)
+
+    def test_key_depends_on_fingerprint(self):
+        key = AutoloadDetailsCache.get_key("lb-1", "10.0.0.1", "1.0.0", (100, "COS", 2, "abc"))
+
+        self.assertEqual(key, AutoloadDetailsCache.get_key("lb-1", "10.0.0.1", "1.0.0", (100, "COS", 2, "abc")))
+        self.assertNotEqual(key, AutoloadDetailsCache.get_key("lb-1", "10.0.0.1", "1.0.0", (100, "COS", 3, "abd")))
+        self.assertNotEqual(key, AutoloadDetailsCache.get_key("lb-1", "10.0.0.1", "1.0.1", (100, "COS", 2, "abc")))
+
+    def test_disk_cache_survives_restart(self):
+        key = AutoloadDetailsCache.get_key("lb-1", "10.0.0.1")
+        self._create_cache().set(key, {"resources": ["port 1"]})
+
+        cache = self._create_cache()
+        self.assertEqual(cache.get(key), {"resources": ["port 1"]})
+        self.assertEqual(cache.stats["size"], 1)
+
+    def test_ttl(self):
+        key = AutoloadDetailsCache.get_key("lb-1", "10.0.0.1")
+        self._create_cache().set(key, "details")
+
+        self.timer.now += 61
+        cache = self._create_cache()
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(os.listdir(self.cache_path), [])
+
+    def test_eviction_and_clear(self):
+        cache = self._create_cache(max_size=2)
+        keys = [AutoloadDetailsCache.get_key("lb-{}".format(i), "10.0.0.{}".format(i)) for i in range(3)]
+
+        for i, key in enumerate(keys):
+            cache.set(key, i)
+            os.utime(os.path.join(self.cache_path, key + cache.FILE_EXTENSION), (i, i))
+
+        self.assertEqual(len(os.listdir(self.cache_path)), 2)
+        self.assertIsNone(self._create_cache().get(keys[0]))
+
+        cache.clear("lb-1")
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[2]), 2)
+
+        cache.clear()
+        self.assertIsNone(self._create_cache().get(keys[2]))
+
+    def test_disk_entries_are_json(self):
+        details = _Object(resources=[_Object(model="Generic Port", name="Port 1", relative_address="CH1/P1",
+                                             unique_identifier="123")],
+                          attributes=[_Object(relative_address="CH1/P1", attribute_name="MAC Address",
+                                              attribute_value="00:11:22:33:44:55")])
+        key = AutoloadDetailsCache.get_key("lb-1", "10.0.0.1")
+        self._create_cache().set(key, get_autoload_details_data(details))
+
+        with open(os.path.join(self.cache_path, key + AutoloadDetailsCache.FILE_EXTENSION)) as cache_file:
+            value = json.load(cache_file)["value"]
+
+        self.assertEqual(value["resources"], [["Generic Port", "Port 1", "CH1/P1", "123"]])
+        self.assertEqual(value["attributes"], [["CH1/P1", "MAC Address", "00:11:22:33:44:55"]])
+        self.assertEqual(self._create_cache().get(key), value)
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "POSIX permissions are required")
+    def test_cache_folder_permissions(self):
+        cache_path = os.path.join(self.cache_path, "autoload_cache")
+        cache = AutoloadDetailsCache(max_size=4, ttl=60, cache_path=cache_path, timer=self.timer)
+        key = AutoloadDetailsCache.get_key("lb-1", "10.0.0.1")
+        cache.set(key, "details")
+
+        self.assertFalse(os.stat(cache_path).st_mode & (stat.S_IRWXG | stat.S_IRWXO))
+        file_mode = os.stat(os.path.join(cache_path, key + cache.FILE_EXTENSION)).st_mode
+        self.assertFalse(file_mode & (stat.S_IRWXG | stat.S_IRWXO))
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "POSIX permissions are required")
+    def test_world_writable_folder_is_not_used(self):
+        key = AutoloadDetailsCache.get_key("lb-1", "10.0.0.1")
+        self._create_cache().set(key, "details")
+        os.chmod(self.cache_path, 0o777)
+
+        self.assertIsNone(self._create_cache().get(key))
+        self._create_cache().set(AutoloadDetailsCache.get_key("lb-2", "10.0.0.2"), "details")
+        self.assertEqual(len(os.listdir(self.cache_path)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
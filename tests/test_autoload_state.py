@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `AutoloadState` and the incremental LB group table walk
+"""
+
+import bisect
+import logging
+import unittest
+
+from cgs.load_balancing.autoload.state import AutoloadState
+
+try:
+    from cgs.load_balancing.autoload.snmp import CgsLoadBalancerSNMPAutoload
+except ImportError:
+    CgsLoadBalancerSNMPAutoload = None
+
+LB_GROUP_ENTRY_OID = (1, 3, 6, 1, 4, 1, 99999, 2, 1, 1)
+
+
+class TestAutoloadState(unittest.TestCase):
+    LAST_CHANGE_KEYS = ["ifTableLastChange", "entLastChangeTime"]
+
+    def setUp(self):
+        self.state = AutoloadState(change_probe={"sysUpTime": 100,
+                                                 "ifTableLastChange": "10",
+                                                 "entLastChangeTime": "5"},
+                                   base_resources=[],
+                                   server_farms={})
+
+    def _is_base_unchanged(self, **change_probe):
+        probe = {"sysUpTime": 200, "ifTableLastChange": "10", "entLastChangeTime": "5"}
+        probe.update(change_probe)
+        return self.state.is_base_unchanged(probe, "sysUpTime", self.LAST_CHANGE_KEYS)
+
+    def test_base_unchanged(self):
+        self.assertTrue(self._is_base_unchanged())
+
+    def test_device_rebooted(self):
+        self.assertFalse(self._is_base_unchanged(sysUpTime=50))
+
+    def test_ports_changed(self):
+        self.assertFalse(self._is_base_unchanged(ifTableLastChange="150"))
+
+    def test_change_indicator_not_supported(self):
+        self.state.change_probe["entLastChangeTime"] = ""
+        self.assertFalse(self._is_base_unchanged(entLastChangeTime=""))
+
+    def test_same_uptime(self):
+        self.assertTrue(self.state.is_same_uptime({"sysUpTime": 200}, "sysUpTime"))
+        self.assertFalse(self.state.is_same_uptime({"sysUpTime": 50}, "sysUpTime"))
+        self.assertFalse(self.state.is_same_uptime({}, "sysUpTime"))
+
+
+class FakeSnmpService(object):
+    """LB group table served with GETBULK and GET requests, requested columns and rows are recorded"""
+
+    COLUMNS = {"lbGroupName": 2, "lbGroupOutputs": 3, "lbGroupAlgo": 4}
+
+    def __init__(self, lb_groups):
+        """
+
+        :param dict lb_groups: {group index: (name, outputs, algorithm)}
+        """
+        self.objects = sorted((LB_GROUP_ENTRY_OID + (column_id, index), values[position])
+                              for index, values in lb_groups.items()
+                              for position, column_id in enumerate(sorted(self.COLUMNS.values())))
+        self.oids = [oid for oid, _ in self.objects]
+        self.walked_columns = set()
+        self.read_rows = []
+
+    def resolve_column_oid(self, mib, column):
+        self.walked_columns.add(column)
+        return LB_GROUP_ENTRY_OID + (self.COLUMNS[column],)
+
+    def get_bulk_rows(self, oids, max_repetitions):
+        positions = [bisect.bisect_right(self.oids, tuple(oid)) for oid in oids]
+
+        return [[self.objects[position + repetition] if position + repetition < len(self.objects)
+                 else (tuple(oids[column_id]), None)
+                 for column_id, position in enumerate(positions)]
+                for repetition in range(max_repetitions)]
+
+    def get_table_field(self, *oids):
+        """
+
+        :param oids: (MIB, column, index sub IDs...) of one row
+        """
+        index = tuple(int(sub_id) for sub_id in oids[0][2:])
+        self.read_rows.append(".".join(str(sub_id) for sub_id in index))
+        values = dict(self.objects)
+
+        return {oid[1]: values[LB_GROUP_ENTRY_OID + (self.COLUMNS[oid[1]],) + index] for oid in oids}
+
+
+@unittest.skipIf(CgsLoadBalancerSNMPAutoload is None, "cloudshell-cgs is not installed")
+class TestIncrementalLbGroups(unittest.TestCase):
+
+    def _create_autoload(self, snmp_service):
+        return CgsLoadBalancerSNMPAutoload(snmp_handler=snmp_service,
+                                           shell_name="CGS COS LoadBalancer Shell 2G",
+                                           shell_type="CS_LoadBalancer",
+                                           resource_name="lb",
+                                           logger=logging.getLogger(__name__),
+                                           bulk_max_repetitions=10)
+
+    def test_only_changed_rows_are_read(self):
+        snmp_service = FakeSnmpService({1: ("g1", "1/1", "hash"),
+                                        2: ("g2-renamed", "1/2", "hash"),
+                                        4: ("g4", "1/4", "hash")})
+        previous_farms = {"1": (("g1", "1/1,1/5", "hash"), None),
+                          "2": (("g2", "1/2", "hash"), None),
+                          "3": (("g3", "1/3", "hash"), None)}
+
+        lb_groups = list(self._create_autoload(snmp_service)._iter_lb_groups(previous_farms=previous_farms))
+
+        self.assertEqual([tuple(lb_group) for lb_group in lb_groups],
+                         [("1", "g1", "1/1,1/5", "hash"),
+                          ("2", "g2-renamed", "1/2", "hash"),
+                          ("4", "g4", "1/4", "hash")])
+        self.assertEqual(snmp_service.walked_columns, {"lbGroupName"})
+        self.assertEqual(snmp_service.read_rows, ["2", "4"])
+
+    def test_whole_table_is_read_without_previous_state(self):
+        snmp_service = FakeSnmpService({1: ("g1", "1/1", "hash")})
+
+        lb_groups = list(self._create_autoload(snmp_service)._iter_lb_groups())
+
+        self.assertEqual([tuple(lb_group) for lb_group in lb_groups], [("1", "g1", "1/1", "hash")])
+        self.assertEqual(snmp_service.walked_columns, {"lbGroupName", "lbGroupOutputs", "lbGroupAlgo"})
+        self.assertEqual(snmp_service.read_rows, [])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
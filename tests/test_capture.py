@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `RecordCaptureSession` and `ReplayCaptureSession`
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from cgs.load_balancing.capture.session import CaptureMode
+from cgs.load_balancing.capture.session import RecordCaptureSession
+from cgs.load_balancing.capture.session import ReplayCaptureSession
+from cgs.load_balancing.capture.session import captured_command
+from cgs.load_balancing.capture.session import get_current_capture
+from cgs.load_balancing.capture.session import mark_replayed_logs
+from cgs.load_balancing.capture.transcript import TranscriptReader
+from cgs.load_balancing.capture.transcript import find_transcript
+from cgs.load_balancing.capture.transcript import get_transcript_path
+
+
+class FakeCliService(object):
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def send_command(self, command, **kwargs):
+        if command not in self.outputs:
+            raise Exception("FakeCliService", "Unknown command {}".format(command))
+        return self.outputs[command]
+
+
+class FakeCliHandler(object):
+    enable_mode = "enable mode"
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    @contextmanager
+    def get_cli_service(self, command_mode):
+        yield FakeCliService(self.outputs)
+
+
+class FakeSnmpService(object):
+    def get_property(self, mib, name, index):
+        return "{}::{}.{}".format(mib, name, index)
+
+    def get_table(self, mib, table):
+        return OrderedDict([(2, {"suffix": "2", "name": "b"}), (1, {"suffix": "1", "name": "a"})])
+
+
+class FakeSnmpHandler(object):
+    @contextmanager
+    def get_snmp_service(self):
+        yield FakeSnmpService()
+
+
+class ListLogHandler(logging.Handler):
+    def __init__(self):
+        super(ListLogHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class FakeDriver(object):
+    def __init__(self, capture_path, capture_mode, logger):
+        self.capture_path = capture_path
+        self.capture_mode = capture_mode
+        self.logger = logger
+
+    def _create_capture_session(self, context, command_name):
+        if self.capture_mode == CaptureMode.RECORD:
+            return RecordCaptureSession(get_transcript_path(self.capture_path, context, command_name))
+        return ReplayCaptureSession(find_transcript(self.capture_path, context, command_name))
+
+    @captured_command
+    def save(self, context):
+        self.logger.info("Save command started")
+        cli_handler = get_current_capture().wrap_cli_handler(FakeCliHandler({"copy running-config lb-1200": "done"}))
+        with cli_handler.get_cli_service(cli_handler.enable_mode) as cli_service:
+            cli_service.send_command("copy running-config lb-1200")
+        return "lb-1200"
+
+    @captured_command
+    def restore(self, context):
+        cli_handler = get_current_capture().wrap_cli_handler(FakeCliHandler({"copy lb-1200 running-config": "done"}))
+        with cli_handler.get_cli_service(cli_handler.enable_mode) as cli_service:
+            cli_service.send_command("copy lb-1200 running-config")
+
+
+class TestCaptureSession(unittest.TestCase):
+
+    def setUp(self):
+        self.capture_path = tempfile.mkdtemp()
+        self.transcript_path = get_transcript_path(self.capture_path, "lb 1", "save")
+
+    def tearDown(self):
+        shutil.rmtree(self.capture_path)
+
+    def _record(self):
+        capture_session = RecordCaptureSession(self.transcript_path, header={"command": "save"})
+        cli_handler = capture_session.wrap_cli_handler(FakeCliHandler({"show version": "COS 1.0",
+                                                                       "copy running-config lb-1200": "done"}))
+        snmp_handler = capture_session.wrap_snmp_handler(FakeSnmpHandler())
+
+        with cli_handler.get_cli_service(cli_handler.enable_mode) as cli_service:
+            cli_service.send_command("show version")
+            cli_service.send_command("copy running-config lb-1200")
+            self.assertRaises(Exception, cli_service.send_command, "reload")
+
+        with snmp_handler.get_snmp_service() as snmp_service:
+            snmp_service.get_property("SNMPv2-MIB", "sysDescr", 0)
+            snmp_service.get_table("NPB-LB", "lbGroupTable")
+
+        capture_session.close()
+
+    def test_replay(self):
+        self._record()
+        capture_session = ReplayCaptureSession(find_transcript(self.capture_path, "lb 1", "save"))
+        cli_handler = capture_session.wrap_cli_handler(None)
+        snmp_handler = capture_session.wrap_snmp_handler(None)
+
+        with cli_handler.get_cli_service(cli_handler.enable_mode) as cli_service:
+            self.assertEqual(cli_service.send_command("show version"), "COS 1.0")
+            # the file name with another timestamp is served by the fuzzy match
+            self.assertEqual(cli_service.send_command("copy running-config lb-1300"), "done")
+            self.assertRaises(Exception, cli_service.send_command, "reload")
+            self.assertRaises(Exception, cli_service.send_command, "show running-config")
+
+        with snmp_handler.get_snmp_service() as snmp_service:
+            self.assertEqual(snmp_service.get_property("SNMPv2-MIB", "sysDescr", 0), "SNMPv2-MIB::sysDescr.0")
+            # SNMP requests are never served by the fuzzy match
+            self.assertRaises(Exception, snmp_service.get_property, "SNMPv2-MIB", "sysDescr", 1)
+            self.assertEqual(list(snmp_service.get_table("NPB-LB", "lbGroupTable").items()),
+                             [(2, {"suffix": "2", "name": "b"}), (1, {"suffix": "1", "name": "a"})])
+
+        capture_session.close()
+
+    def test_unclosed_transcript_is_indexed(self):
+        self._record()
+
+        with open(self.transcript_path, "rb") as transcript_file:
+            lines = transcript_file.readlines()
+        with open(self.transcript_path, "wb") as transcript_file:
+            transcript_file.writelines(lines[:-2])
+
+        transcript_reader = TranscriptReader(self.transcript_path)
+        self.assertEqual(transcript_reader.header["command"], "save")
+        self.assertEqual(transcript_reader.requests_count, 5)
+        transcript_reader.close()
+
+    def test_replayed_commands_are_marked(self):
+        logger = logging.getLogger("test_capture.replay")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        log_handler = ListLogHandler()
+        logger.addHandler(log_handler)
+        self.addCleanup(logger.removeHandler, log_handler)
+        mark_replayed_logs(logger)
+        mark_replayed_logs(logger)
+
+        driver = FakeDriver(self.capture_path, CaptureMode.RECORD, logger)
+        self.assertEqual(driver.save("lb 1"), "lb-1200")
+        self.assertIsNone(driver.restore("lb 1"))
+
+        driver.capture_mode = CaptureMode.REPLAY
+        self.assertEqual(driver.save("lb 1"), "[replayed] lb-1200")
+        self.assertIn("[replayed] restore command is served from the transcript", driver.restore("lb 1"))
+        logger.info("Save command ended")
+
+        self.assertEqual(log_handler.messages, ["Save command started",
+                                                "[replayed] Save command started",
+                                                "Save command ended"])
+
+    def test_missing_transcript(self):
+        self.assertRaises(Exception, find_transcript, self.capture_path, "lb 1", "restore")
+        self.assertFalse(os.listdir(self.capture_path))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
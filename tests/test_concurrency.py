@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `AdaptiveConcurrencyLimit` and `LatencyMeasuringCliHandler`
+"""
+
+import logging
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+
+from cgs.load_balancing.cli.latency import LatencyMeasuringCliHandler
+from cgs.load_balancing.helpers.concurrency import AdaptiveConcurrencyLimit
+from cgs.load_balancing.helpers.concurrency import AdaptiveConcurrencyLimits
+from cgs.load_balancing.helpers.concurrency import get_percentile
+
+
+class TestAdaptiveConcurrencyLimit(unittest.TestCase):
+
+    def setUp(self):
+        self.changes = []
+        self.concurrency_limit = AdaptiveConcurrencyLimit(floor=1, ceiling=4, on_change=self.changes.append,
+                                                          window_size=5)
+
+    def _record_window(self, latency, errors=0):
+        for position in range(5):
+            self.concurrency_limit.record(latency, error=position < errors)
+
+    def test_percentile(self):
+        values = list(range(1, 11))
+        self.assertEqual(get_percentile(values, 0.5), 5)
+        self.assertEqual(get_percentile(values, 0.9), 9)
+        self.assertEqual(get_percentile(values, 0.99), 10)
+        self.assertIsNone(get_percentile([], 0.5))
+
+    def test_additive_increase_up_to_ceiling(self):
+        for _ in range(5):
+            self._record_window(0.1)
+
+        self.assertEqual(self.concurrency_limit.limit, 4)
+        self.assertEqual(self.changes, [2, 3, 4])
+
+    def test_multiplicative_decrease_on_latency(self):
+        for _ in range(3):
+            self._record_window(0.1)
+        self._record_window(1.0)
+
+        self.assertEqual(self.concurrency_limit.limit, 2)
+
+    def test_decrease_once_per_window_on_errors(self):
+        for _ in range(3):
+            self._record_window(0.1)
+        self._record_window(0.1, errors=3)
+
+        self.assertEqual(self.concurrency_limit.limit, 2)
+        self.assertEqual(self.concurrency_limit.stats["errors"], 3)
+
+        self._record_window(0.1, errors=5)
+        self._record_window(0.1, errors=1)
+        self.assertEqual(self.concurrency_limit.limit, 1)
+
+    def test_stats(self):
+        self._record_window(0.1)
+        stats = self.concurrency_limit.stats
+
+        self.assertEqual((stats["limit"], stats["floor"], stats["ceiling"], stats["sessions"]), (2, 1, 4, 0))
+        self.assertEqual((stats["p50"], stats["p99"], stats["commands"]), (0.1, 0.1, 5))
+
+    def test_limit_recreated_on_range_change(self):
+        concurrency_limits = AdaptiveConcurrencyLimits()
+        concurrency_limit = concurrency_limits.get_limit("lb", 1, 4)
+
+        self.assertIs(concurrency_limits.get_limit("lb", 1, 4), concurrency_limit)
+        self.assertEqual(concurrency_limits.get_limit("lb", 2, 8).floor, 2)
+
+    def test_session_slot_is_not_taken_twice_by_thread(self):
+        with self.concurrency_limit.session_slot():
+            with self.concurrency_limit.session_slot() as wait_time:
+                self.assertEqual(wait_time, 0.0)
+                self.assertEqual(self.concurrency_limit.sessions_count, 1)
+
+        self.assertEqual(self.concurrency_limit.sessions_count, 0)
+
+
+class FakeCliService(object):
+    def __init__(self, cli_handler):
+        self.cli_handler = cli_handler
+
+    def send_command(self, command, *args, **kwargs):
+        self.cli_handler.release.wait(5)
+        return "{} output".format(command)
+
+
+class FakeCliHandler(object):
+    enable_mode = "enable"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.active_sessions = 0
+        self.max_active_sessions = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def get_cli_service(self, command_mode):
+        with self._lock:
+            self.active_sessions += 1
+            self.max_active_sessions = max(self.max_active_sessions, self.active_sessions)
+        try:
+            yield FakeCliService(self)
+        finally:
+            with self._lock:
+                self.active_sessions -= 1
+
+
+class TestLatencyMeasuringCliHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.concurrency_limit = AdaptiveConcurrencyLimit(floor=1, ceiling=4, window_size=5)
+        for _ in range(15):
+            self.concurrency_limit.record(0.1)
+        self.assertEqual(self.concurrency_limit.limit, 4)
+
+        self.device_cli_handler = FakeCliHandler()
+        self.cli_handler = LatencyMeasuringCliHandler(cli_handler=self.device_cli_handler,
+                                                      concurrency_limit=self.concurrency_limit,
+                                                      resource_name="lb",
+                                                      logger=logging.getLogger(__name__))
+
+    def _run_custom_commands(self, count):
+        """Send commands in the separate threads the way concurrent run_custom_command calls do"""
+        threads = []
+
+        def _run_custom_command():
+            with self.cli_handler.get_cli_service(self.cli_handler.enable_mode) as cli_service:
+                cli_service.send_command("show version")
+
+        for _ in range(count):
+            thread = threading.Thread(target=_run_custom_command)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        return threads
+
+    def _wait_for_sessions(self, count):
+        deadline = time.time() + 1
+        while self.device_cli_handler.active_sessions < count and time.time() < deadline:
+            time.sleep(0.01)
+
+        return self.device_cli_handler.active_sessions
+
+    def test_sessions_limited_by_adaptive_limit(self):
+        threads = self._run_custom_commands(6)
+
+        self.assertEqual(self._wait_for_sessions(4), 4)
+        time.sleep(0.1)
+        self.assertEqual(self.device_cli_handler.max_active_sessions, 4)
+
+        self.device_cli_handler.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.concurrency_limit.sessions_count, 0)
+
+    def test_sessions_throttled_when_limit_shrinks(self):
+        first_threads = self._run_custom_commands(4)
+        self.assertEqual(self._wait_for_sessions(4), 4)
+
+        # session error of another command halves the limit
+        self.concurrency_limit.record(5.0, error=True)
+        self.assertEqual(self.concurrency_limit.limit, 2)
+
+        self.device_cli_handler.release.set()
+        for thread in first_threads:
+            thread.join(5)
+
+        self.device_cli_handler.release.clear()
+        self.device_cli_handler.max_active_sessions = 0
+        threads = self._run_custom_commands(4)
+
+        self.assertEqual(self._wait_for_sessions(2), 2)
+        time.sleep(0.1)
+        self.assertEqual(self.device_cli_handler.max_active_sessions, 2)
+
+        self.device_cli_handler.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.concurrency_limit.sessions_count, 0)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
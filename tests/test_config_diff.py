@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `build_diff_commands`
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import contextmanager
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cgs.load_balancing.helpers.config_diff import build_diff_commands
+from cgs.load_balancing.helpers.config_diff import configs_match
+from cgs.load_balancing.helpers.config_diff import parse_config
+from cgs.load_balancing.helpers.snapshot_store import SnapshotStore
+
+try:
+    from cloudshell.cgs.runners.configuration import CgsConfigurationRunner
+    from cgs.load_balancing.runners.configuration import CgsLoadBalancerConfigurationRunner
+except ImportError:
+    CgsLoadBalancerConfigurationRunner = None
+
+RUNNING_CONFIG = """! generated 10:00:00
+hostname lb-1
+lb-group web
+ port 1
+ port 2
+lb-group old
+ port 5
+snmp-server community public
+"""
+
+
+class TestBuildDiffCommands(unittest.TestCase):
+
+    def test_same_config(self):
+        self.assertEqual(build_diff_commands(RUNNING_CONFIG, RUNNING_CONFIG.replace("10:00", "11:00")), [])
+
+    def test_changed_config(self):
+        target_config = """hostname lb-2
+lb-group web
+ port 1
+ port 3
+snmp-server community public
+lb-group api
+ port 7
+"""
+        self.assertEqual(build_diff_commands(RUNNING_CONFIG, target_config),
+                         ["no hostname lb-1",
+                          "no lb-group old",
+                          "hostname lb-2",
+                          "lb-group web", "no port 2", "port 3", "exit",
+                          "lb-group api", "port 7", "exit"])
+
+    def test_nested_blocks(self):
+        running_config = """interface 1/1
+ shutdown
+ filter in
+  rule 10 permit
+  rule 20 deny
+lb-group web
+ port 1
+"""
+        target_config = """interface 1/1
+ shutdown
+ filter in
+  rule 10 permit
+  rule 30 deny
+lb-group web
+ port 1
+lb-group api
+ filter out
+  rule 5 permit
+ port 7
+"""
+        self.assertEqual(build_diff_commands(running_config, target_config),
+                         ["interface 1/1", "filter in", "no rule 20 deny", "rule 30 deny", "exit", "exit",
+                          "lb-group api", "filter out", "rule 5 permit", "exit", "port 7", "exit"])
+
+    def test_order_and_duplicates_are_kept(self):
+        running_config = "access-list acl-1\n permit 10.0.0.1\n deny any\n"
+        target_config = "access-list acl-1\n deny any\n permit 10.0.0.1\n permit 10.0.0.1\n"
+
+        self.assertEqual(parse_config(target_config),
+                         [("access-list acl-1", [("deny any", []), ("permit 10.0.0.1", []),
+                                                 ("permit 10.0.0.1", [])])])
+        self.assertEqual(build_diff_commands(running_config, target_config),
+                         ["access-list acl-1", "no deny any", "deny any", "permit 10.0.0.1", "exit"])
+
+    def test_configs_match(self):
+        self.assertTrue(configs_match(RUNNING_CONFIG, RUNNING_CONFIG.replace(" port", "   port")))
+        self.assertFalse(configs_match(RUNNING_CONFIG, RUNNING_CONFIG.replace(" port 2\n", "")))
+        self.assertFalse(configs_match("a\n b\n", "a\nb\n"))
+
+
+class FakeCliService(object):
+    def __init__(self, cli_handler):
+        self.cli_handler = cli_handler
+
+    def send_command(self, command, *args, **kwargs):
+        if command.startswith("show "):
+            return self.cli_handler.configs.pop(0)
+
+        if command == self.cli_handler.failing_command:
+            raise Exception("Invalid command: {}".format(command))
+
+        self.cli_handler.commands.append(command)
+        return ""
+
+
+class FakeCliHandler(object):
+    enable_mode = "enable"
+    config_mode = "config"
+
+    def __init__(self, configs, failing_command=None):
+        """
+
+        :param list[str] configs: running configurations returned by the subsequent show commands
+        :param str failing_command:
+        """
+        self.configs = configs
+        self.failing_command = failing_command
+        self.commands = []
+
+    @contextmanager
+    def get_cli_service(self, command_mode):
+        yield FakeCliService(self)
+
+
+@unittest.skipIf(CgsLoadBalancerConfigurationRunner is None, "cloudshell-cgs is not installed")
+class TestDiffRestore(unittest.TestCase):
+    TARGET_CONFIG = RUNNING_CONFIG.replace(" port 2\n", " port 3\n")
+
+    def _restore(self, cli_handler):
+        """Run the diff restore, the override restore of CgsConfigurationRunner is replaced with a mock
+
+        :return: mock of the override restore
+        """
+        runner = CgsLoadBalancerConfigurationRunner(cli_handler=cli_handler,
+                                                    logger=logging.getLogger("test_config_diff"),
+                                                    resource_config=mock.MagicMock(),
+                                                    api=mock.MagicMock())
+
+        with mock.patch.object(CgsConfigurationRunner, "restore") as override_restore, \
+                mock.patch.object(runner, "get_path", side_effect=lambda path: path, create=True), \
+                mock.patch.object(runner, "_read_configuration_file", return_value=self.TARGET_CONFIG):
+            runner.restore("ftp://10.0.0.1/lb-running", "running", "diff")
+
+        return override_restore
+
+    def test_diff_applied_and_verified(self):
+        cli_handler = FakeCliHandler([RUNNING_CONFIG, self.TARGET_CONFIG])
+
+        self.assertFalse(self._restore(cli_handler).called)
+        self.assertEqual(cli_handler.commands, ["lb-group web", "no port 2", "port 3", "exit"])
+
+    def test_mismatch_falls_back_to_override(self):
+        cli_handler = FakeCliHandler([RUNNING_CONFIG, RUNNING_CONFIG])
+
+        override_restore = self._restore(cli_handler)
+        self.assertEqual(override_restore.call_args[1]["restore_method"], "override")
+
+    def test_failed_command_falls_back_to_override(self):
+        cli_handler = FakeCliHandler([RUNNING_CONFIG], failing_command="port 3")
+
+        override_restore = self._restore(cli_handler)
+        self.assertEqual(override_restore.call_args[1]["restore_method"], "override")
+        self.assertEqual(cli_handler.commands, ["lb-group web", "no port 2"])
+
+
+@unittest.skipIf(CgsLoadBalancerConfigurationRunner is None, "cloudshell-cgs is not installed")
+class TestOrchestration(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.snapshot_store = SnapshotStore(self.root_path)
+        self.saved_artifacts = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def _create_runner(self, cli_handler):
+        resource_config = mock.MagicMock()
+        resource_config.name = "lb-1"
+        runner = CgsLoadBalancerConfigurationRunner(cli_handler=cli_handler,
+                                                    logger=logging.getLogger("test_config_diff"),
+                                                    resource_config=resource_config,
+                                                    api=mock.MagicMock(),
+                                                    snapshot_store=self.snapshot_store)
+        runner.get_path = lambda path: path or "ftp://10.0.0.1/backup"
+        runner.save = self._save
+        return runner
+
+    def _save(self, folder_path, configuration_type, vrf_management_name, return_artifact):
+        self.saved_artifacts.append(folder_path)
+        return mock.MagicMock(artifact_type="ftp", identifier="{}/lb-1-{}".format(folder_path,
+                                                                                 len(self.saved_artifacts)))
+
+    def _orchestration_save(self, runner, mode, folder_path):
+        return runner.orchestration_save(mode=mode, custom_params=json.dumps(
+            {"custom_params": {"folder_path": folder_path}}))
+
+    def test_save_skipped_per_destination_and_mode(self):
+        runner = self._create_runner(FakeCliHandler([RUNNING_CONFIG] * 4))
+
+        self._orchestration_save(runner, "shallow", "")
+        self._orchestration_save(runner, "shallow", "")
+        self._orchestration_save(runner, "deep", "")
+        self._orchestration_save(runner, "shallow", "ftp://10.0.0.2/backup")
+
+        self.assertEqual(self.saved_artifacts, ["ftp://10.0.0.1/backup", "ftp://10.0.0.1/backup",
+                                                "ftp://10.0.0.2/backup"])
+
+    def test_restore_from_local_snapshot(self):
+        target_config = RUNNING_CONFIG.replace(" port 2\n", " port 3\n")
+        saved_artifact_info = self._orchestration_save(self._create_runner(FakeCliHandler([target_config])),
+                                                       "shallow", "")
+        # configuration is read to check whether it already matches, before and after the diff
+        cli_handler = FakeCliHandler([RUNNING_CONFIG, RUNNING_CONFIG, target_config])
+        runner = self._create_runner(cli_handler)
+
+        with mock.patch.object(CgsConfigurationRunner, "restore", side_effect=Exception("File not found")):
+            runner.orchestration_restore(saved_artifact_info)
+
+        self.assertEqual(cli_handler.commands, ["lb-group web", "no port 2", "port 3", "exit"])
+
+    def test_restore_fails_without_local_snapshot(self):
+        saved_artifact_info = self._orchestration_save(self._create_runner(FakeCliHandler([RUNNING_CONFIG])),
+                                                       "shallow", "")
+        shutil.rmtree(os.path.join(self.root_path, SnapshotStore.SNAPSHOTS_DIR))
+        runner = self._create_runner(FakeCliHandler([RUNNING_CONFIG.replace(" port 2\n", "")]))
+
+        with mock.patch.object(CgsConfigurationRunner, "restore", side_effect=Exception("File not found")):
+            with self.assertRaises(Exception):
+                runner.orchestration_restore(saved_artifact_info)
+
+    def _get_saved_artifact_info(self, resource_name, identifier):
+        return json.dumps({"saved_artifacts_info": {"resource_name": resource_name,
+                                                    "restore_rules": {"requires_same_resource": True},
+                                                    "saved_artifact": {"artifact_type": "ftp",
+                                                                       "identifier": identifier}}})
+
+    def test_restore_startup_artifact(self):
+        runner = self._create_runner(FakeCliHandler([]))
+        saved_artifact_info = self._get_saved_artifact_info("LB-1", "//10.0.0.1/backup/lb-1-startup-161020")
+
+        with mock.patch.object(runner, "restore") as restore:
+            runner.orchestration_restore(saved_artifact_info, json.dumps(
+                {"custom_params": {"configuration_type": "running"}}))
+
+        restore.assert_called_once_with(path="ftp://10.0.0.1/backup/lb-1-startup-161020",
+                                        configuration_type="startup",
+                                        restore_method="override",
+                                        vrf_management_name=runner.resource_config.vrf_management_name)
+
+    def test_restore_artifact_of_other_resource(self):
+        runner = self._create_runner(FakeCliHandler([]))
+        saved_artifact_info = self._get_saved_artifact_info("lb-2", "//10.0.0.1/backup/lb-2-running-161020")
+
+        with mock.patch.object(runner, "restore") as restore:
+            with self.assertRaises(Exception):
+                runner.orchestration_restore(saved_artifact_info)
+
+        self.assertFalse(restore.called)
+
+
+@unittest.skipIf(CgsLoadBalancerConfigurationRunner is None, "cloudshell-cgs is not installed")
+class TestSaveIfChanged(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        resource_config = mock.MagicMock()
+        resource_config.name = "lb-1"
+        self.runner = CgsLoadBalancerConfigurationRunner(cli_handler=FakeCliHandler([RUNNING_CONFIG] * 2),
+                                                         logger=logging.getLogger("test_config_diff"),
+                                                         resource_config=resource_config,
+                                                         api=mock.MagicMock(),
+                                                         snapshot_store=SnapshotStore(self.root_path))
+        self.runner.get_path = lambda path: path
+        self.runner.save = mock.MagicMock(return_value="lb-1-running")
+        self.runner._upload_ftp_file = mock.MagicMock(return_value=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def test_local_destinations_are_saved_by_device(self):
+        for folder_path in ("/flash/backup", "file:///flash/backup"):
+            response = self.runner.save_if_changed(folder_path, compress=True)
+            self.assertEqual(response["path"], "{}/lb-1-running".format(folder_path))
+            self.assertFalse(response["compressed"])
+
+        self.assertEqual(self.runner.save.call_count, 2)
+        self.assertFalse(self.runner._upload_ftp_file.called)
+        self.assertFalse(os.path.exists("/flash/backup"))
+
+    def test_ftp_destination_is_streamed_and_skipped(self):
+        self.assertFalse(self.runner.save_if_changed("ftp://10.0.0.1/backup", compress=True)["skipped"])
+        self.assertTrue(self.runner.save_if_changed("ftp://10.0.0.1/backup", compress=True)["skipped"])
+
+        self.assertEqual(self.runner._upload_ftp_file.call_count, 1)
+        self.assertFalse(self.runner.save.called)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `CgsLoadBalancerFirmwareRunner`
+"""
+
+import logging
+import unittest
+from contextlib import contextmanager
+
+from cgs.load_balancing.helpers.jobs import Job
+from cgs.load_balancing.helpers.jobs import JobCancelledError
+
+try:
+    from cgs.load_balancing.runners.firmware import CgsLoadBalancerFirmwareRunner
+except ImportError:
+    CgsLoadBalancerFirmwareRunner = None
+
+
+class CancellationContext(object):
+    is_cancelled = False
+
+
+class FakeCliService(object):
+    def __init__(self, cli_handler):
+        self.cli_handler = cli_handler
+
+    def send_command(self, command, *args, **kwargs):
+        self.cli_handler.commands.append(command)
+        return "COS version 2.6.1\nUptime 0 days"
+
+
+class FakeCliHandler(object):
+    enable_mode = "enable"
+
+    def __init__(self, unavailable_sessions=0):
+        self.unavailable_sessions = unavailable_sessions
+        self.commands = []
+        self.sessions = 0
+
+    @contextmanager
+    def get_cli_service(self, command_mode):
+        self.sessions += 1
+        if self.sessions <= self.unavailable_sessions:
+            raise Exception("Connection refused")
+
+        yield FakeCliService(self)
+
+
+if CgsLoadBalancerFirmwareRunner is not None:
+    class FakeFirmwareRunner(CgsLoadBalancerFirmwareRunner):
+        """Runner with the inherited firmware load flow replaced by a record in the fake CLI"""
+
+        def __init__(self, cli_handler, job, **kwargs):
+            self.cli_handler = cli_handler
+            self.job = job
+            self.stages = []
+            self.sleeps = []
+            super(FakeFirmwareRunner, self).__init__(cli_handler=cli_handler,
+                                                     logger=logging.getLogger("test_firmware"),
+                                                     sleep=self.sleeps.append,
+                                                     **kwargs)
+
+        def load_firmware(self, path, vrf_management_name=None):
+            self.stages.append(self.job.stage)
+            self.cli_handler.commands.append("load_firmware_flow {} {}".format(path, vrf_management_name))
+            return "Firmware loaded"
+
+
+@unittest.skipIf(CgsLoadBalancerFirmwareRunner is None, "cloudshell-cgs is not installed")
+class TestFirmwareRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.job = Job(resource_name="lb-1", name="load_firmware")
+
+    def _create_runner(self, cli_handler, **kwargs):
+        return FakeFirmwareRunner(cli_handler=cli_handler, job=self.job, **kwargs)
+
+    def test_stages(self):
+        cli_handler = FakeCliHandler()
+        runner = self._create_runner(cli_handler)
+
+        result = self.job.run(lambda job: runner.load_firmware_staged("tftp://10.1.1.1/both.tim", "mgmt", job))
+
+        self.assertEqual(runner.stages, [CgsLoadBalancerFirmwareRunner.STAGE_LOAD])
+        self.assertEqual(self.job.stage, CgsLoadBalancerFirmwareRunner.STAGE_VERIFY)
+        self.assertEqual(cli_handler.commands, ["load_firmware_flow tftp://10.1.1.1/both.tim mgmt",
+                                                CgsLoadBalancerFirmwareRunner.VERSION_COMMAND])
+        self.assertIn("COS version 2.6.1", result)
+
+    def test_cancelled_before_load(self):
+        cli_handler = FakeCliHandler()
+        runner = self._create_runner(cli_handler)
+        self.job.cancel()
+
+        with self.assertRaises(JobCancelledError):
+            self.job.run(lambda job: runner.load_firmware_staged("tftp://10.1.1.1/both.tim", "", job))
+
+        self.assertEqual(cli_handler.commands, [])
+
+    def test_cancelled_by_command_before_load(self):
+        cancellation_context = CancellationContext()
+        self.job = Job(resource_name="lb-1", name="load_firmware", cancellation_context=cancellation_context)
+        cli_handler = FakeCliHandler()
+        runner = self._create_runner(cli_handler)
+        cancellation_context.is_cancelled = True
+
+        with self.assertRaises(JobCancelledError):
+            self.job.run(lambda job: runner.load_firmware_staged("tftp://10.1.1.1/both.tim", "", job))
+
+        self.assertEqual(cli_handler.commands, [])
+
+    def test_device_polled_until_available(self):
+        cli_handler = FakeCliHandler(unavailable_sessions=2)
+        runner = self._create_runner(cli_handler, verify_timeout=100, verify_poll_interval=10)
+
+        self.job.run(lambda job: runner.load_firmware_staged("tftp://10.1.1.1/both.tim", "", job))
+
+        self.assertEqual(self.job.progress["attempts"], 3)
+        self.assertEqual(runner.sleeps, [10, 10])
+
+    def test_device_not_available(self):
+        cli_handler = FakeCliHandler(unavailable_sessions=100)
+        runner = self._create_runner(cli_handler, verify_timeout=30, verify_poll_interval=10)
+
+        with self.assertRaises(Exception):
+            self.job.run(lambda job: runner.load_firmware_staged("tftp://10.1.1.1/both.tim", "", job))
+
+        self.assertEqual(self.job.progress["attempts"], 4)
+        self.assertEqual(runner.sleeps, [10, 10, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `CgsLoadBalancerFleetAutoloadRunner`
+"""
+
+import logging
+import threading
+import time
+import unittest
+
+from cgs.load_balancing.runners.fleet_autoload import CgsLoadBalancerFleetAutoloadRunner
+from cgs.load_balancing.runners.fleet_autoload import get_fleet_summary
+from cgs.load_balancing.runners.fleet_autoload import get_subnet_key
+
+
+class FakeResource(object):
+    def __init__(self, name, address):
+        self.name = name
+        self.address = address
+
+
+class FakeContext(object):
+    def __init__(self, name, address):
+        self.resource = FakeResource(name, address)
+
+
+class TestFleetAutoloadRunner(unittest.TestCase):
+
+    def test_get_subnet_key(self):
+        self.assertEqual(get_subnet_key("10.1.2.3", 24), "10.1.2.0/24")
+        self.assertEqual(get_subnet_key("10.1.2.3", 16), "10.1.0.0/16")
+        self.assertEqual(get_subnet_key("lb-1.lab", 24), "lb-1.lab")
+
+    def test_concurrency_limits_and_failures(self):
+        lock = threading.Lock()
+        running = {"total": 0, "max_total": 0, "10.0.0.0/24": 0, "max_subnet": 0}
+
+        def discover(context):
+            subnet = get_subnet_key(context.resource.address, 24)
+            with lock:
+                running["total"] += 1
+                running["max_total"] = max(running["max_total"], running["total"])
+                if subnet == "10.0.0.0/24":
+                    running[subnet] += 1
+                    running["max_subnet"] = max(running["max_subnet"], running[subnet])
+
+            time.sleep(0.02)
+
+            with lock:
+                running["total"] -= 1
+                if subnet == "10.0.0.0/24":
+                    running[subnet] -= 1
+
+            if context.resource.name == "lb-3":
+                raise Exception("SNMP timeout")
+
+            return context.resource.name
+
+        contexts = [FakeContext("lb-{}".format(i), "10.0.{}.{}".format(i % 3, i)) for i in range(12)]
+        runner = CgsLoadBalancerFleetAutoloadRunner(discover, logging.getLogger(__name__),
+                                                    max_workers=4, max_per_subnet=2)
+
+        results = list(runner.discover(contexts))
+
+        self.assertEqual(len(results), 12)
+        self.assertLessEqual(running["max_total"], 4)
+        self.assertLessEqual(running["max_subnet"], 2)
+
+        summary = get_fleet_summary(results)
+        self.assertEqual(summary["succeeded"], 11)
+        self.assertEqual(summary["failed"], ["lb-3"])
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `CgsLoadBalancerFirmwareRolloutRunner` and `FirmwareImageCache`
+"""
+
+import hashlib
+import io
+import logging
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+from cgs.load_balancing.helpers.image_cache import FirmwareImageCache
+from cgs.load_balancing.helpers.image_cache import TftpResponse
+from cgs.load_balancing.helpers.image_cache import open_image_url
+from cgs.load_balancing.helpers.image_cache import parse_checksum
+from cgs.load_balancing.runners.fleet_firmware import CgsLoadBalancerFirmwareRolloutRunner
+from cgs.load_balancing.runners.fleet_firmware import RolloutStatus
+from cgs.load_balancing.runners.fleet_firmware import get_rollout_summary
+from cgs.load_balancing.runners.fleet_firmware import get_rollout_waves
+
+IMAGE = b"COS firmware image" * 1000
+
+
+class FakeResource(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeContext(object):
+    def __init__(self, name):
+        self.resource = FakeResource(name)
+
+
+class FakeTftpServer(object):
+    """Serves one file over TFTP, the first DATA packet is sent twice to emulate a retransmission"""
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+        self.acks = []
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.settimeout(5)
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        packet, client_address = self._socket.recvfrom(1024)
+        file_name = packet[2:].split(b"\0")[0].decode("utf-8")
+        self.requests.append(file_name)
+
+        transfer_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        transfer_socket.settimeout(5)
+
+        try:
+            if file_name not in self.files:
+                transfer_socket.sendto(struct.pack("!HH", 5, 1) + b"File not found\0", client_address)
+                return
+
+            data = self.files[file_name]
+            blocks = [data[i:i + 512] for i in range(0, len(data) + 1, 512)]
+
+            for block, block_data in enumerate(blocks, 1):
+                packet = struct.pack("!HH", 3, block) + block_data
+                transfer_socket.sendto(packet, client_address)
+                if block == 1:
+                    transfer_socket.sendto(packet, client_address)
+                    self.acks.append(struct.unpack("!HH", transfer_socket.recvfrom(4)[0])[1])
+                self.acks.append(struct.unpack("!HH", transfer_socket.recvfrom(4)[0])[1])
+        finally:
+            transfer_socket.close()
+            self._socket.close()
+
+    def join(self):
+        self._thread.join(5)
+
+
+class TestFirmwareRolloutRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.contexts = [FakeContext("lb-{}".format(i)) for i in range(10)]
+
+    def test_get_rollout_waves(self):
+        waves = get_rollout_waves(range(10), canary_size=1, batch_size=4)
+        self.assertEqual(waves, [[0], [1, 2, 3, 4], [5, 6, 7, 8], [9]])
+        self.assertEqual(get_rollout_waves(range(3), canary_size=0, batch_size=2), [[0, 1], [2]])
+        self.assertEqual(get_rollout_waves([], canary_size=1, batch_size=2), [])
+
+    def test_waves_run_in_parallel_and_in_order(self):
+        lock = threading.Lock()
+        running = {"count": 0, "max": 0}
+        started = []
+
+        def load_firmware(context, job):
+            with lock:
+                started.append(context.resource.name)
+                running["count"] += 1
+                running["max"] = max(running["max"], running["count"])
+            time.sleep(0.02)
+            with lock:
+                running["count"] -= 1
+            return "loaded"
+
+        runner = CgsLoadBalancerFirmwareRolloutRunner(load_firmware, logging.getLogger(__name__),
+                                                      canary_size=1, batch_size=3)
+        results = list(runner.rollout(self.contexts))
+
+        self.assertEqual(started[0], "lb-0")
+        self.assertEqual(running["max"], 3)
+        self.assertEqual([result.wave for result in results], sorted(result.wave for result in results))
+        self.assertEqual(len(get_rollout_summary(results)[RolloutStatus.SUCCEEDED]), 10)
+
+    def test_rollout_stops_on_failure_threshold(self):
+        def load_firmware(context, job):
+            if context.resource.name in ("lb-1", "lb-2"):
+                raise Exception("Failed to transfer the firmware image")
+            # cancellation point before the install stage
+            time.sleep(0.05)
+            job.check_cancelled()
+            return "loaded"
+
+        runner = CgsLoadBalancerFirmwareRolloutRunner(load_firmware, logging.getLogger(__name__),
+                                                      canary_size=1, batch_size=4, failure_threshold=0.2)
+        summary = get_rollout_summary(list(runner.rollout(self.contexts)))
+
+        self.assertEqual(summary[RolloutStatus.SUCCEEDED], ["lb-0"])
+        self.assertEqual(summary[RolloutStatus.FAILED], ["lb-1", "lb-2"])
+        self.assertEqual(summary[RolloutStatus.CANCELLED], ["lb-3", "lb-4"])
+        self.assertEqual(len(summary[RolloutStatus.SKIPPED]), 5)
+
+    def test_failed_canary_stops_rollout(self):
+        def load_firmware(context, job):
+            raise Exception("Device is not available after the reboot")
+
+        runner = CgsLoadBalancerFirmwareRolloutRunner(load_firmware, logging.getLogger(__name__),
+                                                      canary_size=1, batch_size=4, failure_threshold=0.5)
+        summary = get_rollout_summary(list(runner.rollout(self.contexts)))
+
+        self.assertEqual(summary[RolloutStatus.FAILED], ["lb-0"])
+        self.assertEqual(len(summary[RolloutStatus.SKIPPED]), 9)
+
+
+class TestFirmwareImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_path)
+        self.downloads = []
+        self.image_cache = FirmwareImageCache(self.cache_path, mirror_url="tftp://10.1.1.1/firmware/",
+                                              open_url=self._open_url)
+
+    def _open_url(self, url, timeout):
+        self.downloads.append(url)
+        return io.BytesIO(IMAGE)
+
+    def test_parse_checksum(self):
+        self.assertEqual(parse_checksum("MD5:ABCD"), ("md5", "abcd"))
+        self.assertEqual(parse_checksum("a" * 64), ("sha256", "a" * 64))
+        self.assertRaises(ValueError, parse_checksum, "abcd")
+
+    def test_image_is_fetched_once(self):
+        url = "ftp://10.2.2.2/images/NPB-II-x86-2.6.1.bin.tar"
+        checksum = "sha256:" + hashlib.sha256(IMAGE).hexdigest()
+
+        path = self.image_cache.get_image(url, checksum)
+        self.assertEqual(self.image_cache.get_image(url, "md5:" + hashlib.md5(IMAGE).hexdigest()), path)
+        self.assertEqual(self.downloads, [url])
+
+        with open(path, "rb") as image_file:
+            self.assertEqual(image_file.read(), IMAGE)
+        self.assertEqual(self.image_cache.get_device_url(url),
+                         "tftp://10.1.1.1/firmware/{}".format(self.image_cache.get_relative_path(url)))
+
+    def test_corrupted_image_is_fetched_again(self):
+        url = "http://10.2.2.2/images/both.tim"
+        path = self.image_cache.get_image(url)
+
+        with open(path, "ab") as image_file:
+            image_file.write(b"garbage")
+
+        self.image_cache.get_image(url)
+        self.assertEqual(self.downloads, [url, url])
+
+    def test_checksum_mismatch(self):
+        url = "http://10.2.2.2/images/both.tim"
+
+        self.assertRaises(Exception, self.image_cache.get_image, url, "md5:" + "0" * 32)
+        self.assertEqual(os.listdir(os.path.dirname(os.path.join(
+            self.cache_path, *self.image_cache.get_relative_path(url).split("/")))), [])
+
+    def test_tftp_image(self):
+        tftp_server = FakeTftpServer({"images/both.tim": IMAGE})
+        url = "tftp://127.0.0.1:{}/images/both.tim".format(tftp_server.port)
+        image_cache = FirmwareImageCache(self.cache_path)
+
+        path = image_cache.get_image(url, "sha256:" + hashlib.sha256(IMAGE).hexdigest())
+        tftp_server.join()
+
+        with open(path, "rb") as image_file:
+            self.assertEqual(image_file.read(), IMAGE)
+        self.assertEqual(tftp_server.requests, ["images/both.tim"])
+        self.assertEqual(tftp_server.acks[:3], [1, 1, 2])
+        self.assertEqual(len(tftp_server.acks), len(IMAGE) // 512 + 2)
+
+    def test_tftp_error(self):
+        tftp_server = FakeTftpServer({})
+        response = TftpResponse("tftp://127.0.0.1:{}/missing.tim".format(tftp_server.port), timeout=5)
+
+        try:
+            self.assertRaises(IOError, response.read, 1024)
+        finally:
+            response.close()
+            tftp_server.join()
+
+    def test_unsupported_scheme(self):
+        self.assertRaises(ValueError, open_image_url, "scp://10.2.2.2/images/both.tim", 10)
+        self.assertRaises(ValueError, FirmwareImageCache(self.cache_path).get_image, "scp://10.2.2.2/both.tim")
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `JobManager`
+"""
+
+import logging
+import threading
+import time
+import unittest
+
+from cgs.load_balancing.helpers.jobs import Job
+from cgs.load_balancing.helpers.jobs import JobCancelledError
+from cgs.load_balancing.helpers.jobs import JobManager
+from cgs.load_balancing.helpers.jobs import JobStatus
+
+
+class CancellationContext(object):
+    is_cancelled = False
+
+
+class TestJobManager(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("test_jobs")
+        self.manager = JobManager()
+
+    def _wait(self, job):
+        for _ in range(500):
+            if job.is_finished:
+                return
+            time.sleep(0.01)
+
+        self.fail("Job {} is not finished".format(job.id))
+
+    def test_progress_and_result(self):
+        event = threading.Event()
+
+        def func(job):
+            job.set_stage("transfer", transferred_bytes=None)
+            event.wait(5)
+            job.update_progress(transferred_bytes=1024)
+            return "done"
+
+        job = self.manager.submit("lb", "load_firmware", func, self.logger)
+        time.sleep(0.05)
+        status = job.to_dict()
+        self.assertEqual((status["status"], status["stage"]), (JobStatus.RUNNING, "transfer"))
+
+        event.set()
+        self._wait(job)
+        status = self.manager.get(job.id).to_dict()
+        self.assertEqual(status["status"], JobStatus.COMPLETED)
+        self.assertEqual(status["progress"]["transferred_bytes"], 1024)
+        self.assertEqual(status["result"], "done")
+        self.assertEqual(self.manager.get_jobs("other"), [])
+
+    def test_cancel(self):
+        event = threading.Event()
+
+        def func(job):
+            job.set_stage("transfer")
+            event.wait(5)
+            job.check_cancelled()
+            job.set_stage("install")
+
+        job = self.manager.submit("lb", "load_firmware", func, self.logger)
+        job.cancel()
+        event.set()
+        self._wait(job)
+
+        self.assertEqual(job.status, JobStatus.CANCELLED)
+        self.assertEqual(job.stage, "transfer")
+
+    def test_cancellation_context_and_failure(self):
+        cancellation_context = CancellationContext()
+        job = Job("lb", "load_firmware", cancellation_context=cancellation_context)
+        cancellation_context.is_cancelled = True
+
+        self.assertRaises(JobCancelledError, job.run, lambda job: job.check_cancelled())
+        self.assertEqual(job.status, JobStatus.CANCELLED)
+
+        def fail(job):
+            raise Exception("transfer failed")
+
+        job = Job("lb", "load_firmware")
+        self.assertRaises(Exception, job.run, fail)
+        self.assertEqual((job.status, job.error), (JobStatus.FAILED, "transfer failed"))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
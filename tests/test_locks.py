@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `ResourceOperationLock`
+"""
+
+import threading
+import time
+import unittest
+
+from cgs.load_balancing.helpers.locks import OperationClass
+from cgs.load_balancing.helpers.locks import ResourceOperationLock
+
+
+class TestResourceOperationLock(unittest.TestCase):
+
+    def _acquire_in_thread(self, lock, operation_class):
+        acquired = threading.Event()
+
+        def _acquire():
+            lock.acquire(operation_class)
+            acquired.set()
+
+        thread = threading.Thread(target=_acquire)
+        thread.daemon = True
+        thread.start()
+        return acquired
+
+    def test_non_conflicting_operations_run_concurrently(self):
+        lock = ResourceOperationLock(limit=2)
+        lock.acquire(OperationClass.DISCOVERY)
+
+        self.assertTrue(self._acquire_in_thread(lock, OperationClass.READ_ONLY).wait(1))
+
+    def test_conflicting_operation_waits(self):
+        lock = ResourceOperationLock(limit=2)
+        lock.acquire(OperationClass.FIRMWARE)
+        acquired = self._acquire_in_thread(lock, OperationClass.DISCOVERY)
+
+        self.assertFalse(acquired.wait(0.1))
+        lock.release(OperationClass.FIRMWARE)
+        self.assertTrue(acquired.wait(1))
+
+    def test_limit(self):
+        lock = ResourceOperationLock(limit=1)
+        lock.acquire(OperationClass.DISCOVERY)
+        acquired = self._acquire_in_thread(lock, OperationClass.DISCOVERY)
+
+        self.assertFalse(acquired.wait(0.1))
+        lock.set_limit(2)
+        self.assertTrue(acquired.wait(1))
+
+    def test_read_only_operations_are_limited(self):
+        lock = ResourceOperationLock(limit=1)
+        lock.acquire(OperationClass.READ_ONLY)
+        acquired = self._acquire_in_thread(lock, OperationClass.READ_ONLY)
+
+        self.assertFalse(acquired.wait(0.1))
+        lock.release(OperationClass.READ_ONLY)
+        self.assertTrue(acquired.wait(1))
+
+    def test_unlimited_operations(self):
+        lock = ResourceOperationLock(limit=1)
+        lock.acquire(OperationClass.READ_ONLY, limited=False)
+        lock.acquire(OperationClass.READ_ONLY, limited=False)
+        self.assertEqual(lock.running_count, 0)
+
+        self.assertTrue(self._acquire_in_thread(lock, OperationClass.DISCOVERY).wait(1))
+        self.assertFalse(self._acquire_in_thread(lock, OperationClass.CONFIG).wait(0.1))
+
+    def test_read_only_operation_waits_for_config(self):
+        lock = ResourceOperationLock(limit=2)
+        lock.acquire(OperationClass.CONFIG)
+        acquired = self._acquire_in_thread(lock, OperationClass.READ_ONLY)
+
+        self.assertFalse(acquired.wait(0.1))
+        lock.release(OperationClass.CONFIG)
+        self.assertTrue(acquired.wait(1))
+
+    def test_read_only_operation_waits_for_firmware(self):
+        lock = ResourceOperationLock(limit=2)
+        lock.acquire(OperationClass.FIRMWARE)
+        acquired = self._acquire_in_thread(lock, OperationClass.READ_ONLY)
+
+        self.assertFalse(acquired.wait(0.1))
+        lock.release(OperationClass.FIRMWARE)
+        self.assertTrue(acquired.wait(1))
+
+    def test_waiting_operation_is_not_overtaken(self):
+        lock = ResourceOperationLock(limit=3)
+        lock.acquire(OperationClass.DISCOVERY)
+        firmware_acquired = self._acquire_in_thread(lock, OperationClass.FIRMWARE)
+        time.sleep(0.05)
+        discovery_acquired = self._acquire_in_thread(lock, OperationClass.DISCOVERY)
+
+        self.assertFalse(discovery_acquired.wait(0.1))
+        lock.release(OperationClass.DISCOVERY)
+        self.assertTrue(firmware_acquired.wait(1))
+        self.assertFalse(discovery_acquired.wait(0.1))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
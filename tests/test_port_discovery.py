@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `IndexedPortDiscovery`
+"""
+
+import bisect
+import binascii
+import logging
+import unittest
+from collections import defaultdict
+
+from cgs.load_balancing.autoload.ports import IndexedPortDiscovery
+from cgs.load_balancing.autoload.ports import get_relative_addresses
+from cgs.load_balancing.autoload.ports import get_resource_differences
+from cgs.load_balancing.autoload.ports import get_resource_tree
+from tests.simulator import device
+
+try:
+    from cloudshell.snmp.quali_snmp import QualiSnmp
+    from cloudshell.snmp.snmp_parameters import SNMPV2Parameters
+
+    from cgs.load_balancing.autoload.ports import PortDiscoveryMode
+    from cgs.load_balancing.autoload.snmp import CgsLoadBalancerSNMPAutoload
+    from tests.simulator.snmp_agent import MibNotFoundError
+    from tests.simulator.snmp_agent import SnmpAgentSimulator
+    from tests.simulator.snmp_agent import find_mibs_path
+except ImportError:
+    CgsLoadBalancerSNMPAutoload = None
+
+ENT_ALIAS_MAPPING_IDENTIFIER_OID = (1, 3, 6, 1, 2, 1, 47, 1, 3, 2, 1, 2)
+# (relative address, name, unique ID) of the chassis and ports of CosDeviceModel(ports_count=4) expected from
+# both port discoveries for the resource "lb", TestPortDiscoveryModes checks them against the standard
+# discovery of AbstractCgsSNMPAutoload when cloudshell-cgs is installed
+STANDARD_AUTOLOAD_RESOURCES = [("CH1", "Chassis 1", "lb.chassis.1"),
+                               ("CH1/P1", "1-1", "lb.port.1001"),
+                               ("CH1/P2", "1-2", "lb.port.1002"),
+                               ("CH1/P3", "1-3", "lb.port.1003"),
+                               ("CH1/P4", "1-4", "lb.port.1004")]
+
+
+class FakeResource(object):
+    """Keeps sub resources the same way as the autoload structure resources of cloudshell-networking-devices"""
+
+    RELATIVE_PATH_TEMPLATE = ""
+
+    def __init__(self, shell_name, name, unique_id):
+        self.name = name
+        self.unique_id = unique_id
+        self.attributes = {}
+        self.resources = {}
+
+    def __setattr__(self, name, value):
+        if name not in ("name", "unique_id", "attributes", "resources"):
+            self.attributes[name] = value
+        super(FakeResource, self).__setattr__(name, value)
+
+    def add_sub_resource(self, relative_id, sub_resource):
+        self.resources.setdefault(sub_resource.RELATIVE_PATH_TEMPLATE, defaultdict(list))[relative_id].append(
+            sub_resource)
+
+
+class FakeChassis(FakeResource):
+    RELATIVE_PATH_TEMPLATE = "CH"
+
+
+class FakePort(FakeResource):
+    RELATIVE_PATH_TEMPLATE = "P"
+
+
+class FakeSnmpService(object):
+    """Serves the MIB objects of the simulated device like the capture replay SNMP service"""
+
+    def __init__(self, objects):
+        self.objects = sorted(objects)
+        self.oids = [oid for oid, _ in self.objects]
+        self.column_oids = {"entAliasMappingIdentifier": ENT_ALIAS_MAPPING_IDENTIFIER_OID}
+
+        for columns, entry_oid in [(device.IF_COLUMNS, device.IF_ENTRY_OID),
+                                   (device.IF_X_COLUMNS, device.IF_X_ENTRY_OID),
+                                   (device.ENT_PHYSICAL_COLUMNS, device.ENT_PHYSICAL_ENTRY_OID)]:
+            for name, column in columns.items():
+                self.column_oids[name] = entry_oid + (column,)
+
+    def resolve_column_oid(self, mib, column):
+        return self.column_oids[column]
+
+    def get_bulk_rows(self, oids, max_repetitions):
+        positions = [bisect.bisect_right(self.oids, tuple(oid)) for oid in oids]
+
+        return [[self.objects[position + repetition] if position + repetition < len(self.objects)
+                 else (tuple(oids[column_id]), None)
+                 for column_id, position in enumerate(positions)]
+                for repetition in range(max_repetitions)]
+
+
+def get_device_objects(model):
+    objects = []
+
+    for name, oid, value_type, value in model.get_port_objects():
+        if name == "ifPhysAddress":
+            value = "0x" + binascii.hexlify(value.encode("latin-1")).decode("ascii")
+        objects.append((oid, str(value)))
+
+    return objects
+
+
+class TestIndexedPortDiscovery(unittest.TestCase):
+
+    def _discover(self, objects):
+        port_discovery = IndexedPortDiscovery(FakeSnmpService(objects), logging.getLogger(__name__),
+                                              resource_name="lb", shell_name="Shell",
+                                              chassis_model_class=FakeChassis, port_model_class=FakePort,
+                                              bulk_max_repetitions=10)
+        return port_discovery.discover()
+
+    def test_ports_mapped_by_name(self):
+        resources = self._discover(get_device_objects(device.CosDeviceModel(ports_count=48)))
+
+        (relative_id, chassis), = resources
+        self.assertEqual(relative_id, "1")
+        self.assertEqual(chassis.attributes, {"model": "NPB-II", "serial_number": "SIM000001"})
+        self.assertEqual(len(chassis.resources["P"]), 48)
+
+        port, = chassis.resources["P"]["2"]
+        self.assertEqual((port.name, port.unique_id), ("1-2", "lb.port.1002"))
+        self.assertEqual(port.attributes["mac_address"], "00:1B:21:00:00:02")
+        self.assertEqual(port.attributes["bandwidth"], "10000")
+
+    def test_ports_mapped_by_alias_mapping(self):
+        objects = get_device_objects(device.CosDeviceModel(ports_count=2))
+        # entity names don't match the interface names, entAliasMappingTable maps them
+        objects = [(oid, "port-{}".format(oid[-1]) if oid[:-1] == device.ENT_PHYSICAL_ENTRY_OID + (7,) else value)
+                   for oid, value in objects]
+        objects += [(ENT_ALIAS_MAPPING_IDENTIFIER_OID + (1001, 0), "IF-MIB::ifIndex.2"),
+                    (ENT_ALIAS_MAPPING_IDENTIFIER_OID + (1002, 0), "IF-MIB::ifIndex.1")]
+
+        chassis = self._discover(objects)[0][1]
+
+        self.assertEqual(chassis.resources["P"]["1"][0].name, "1-2")
+        self.assertEqual(chassis.resources["P"]["2"][0].name, "1-1")
+
+    def test_resource_differences(self):
+        expected = self._discover(get_device_objects(device.CosDeviceModel(ports_count=4)))
+        actual = self._discover(get_device_objects(device.CosDeviceModel(ports_count=4)))
+        self.assertEqual(get_resource_differences(expected, actual), [])
+
+        actual[0][1].resources["P"]["4"][0].mtu = "1500"
+        del actual[0][1].resources["P"]["3"]
+        differences = get_resource_differences(expected, actual)
+
+        self.assertEqual(len(differences), 2)
+        self.assertTrue(differences[0].startswith("CH1/P3: missing"))
+        self.assertTrue(differences[1].startswith("CH1/P4: expected"))
+
+    def test_same_resources_as_standard_discovery(self):
+        resources = self._discover(get_device_objects(device.CosDeviceModel(ports_count=4)))
+
+        self.assertEqual(sorted((path, name, unique_id)
+                                for path, (_, name, unique_id, _) in get_resource_tree(resources).items()),
+                         STANDARD_AUTOLOAD_RESOURCES)
+
+    def test_relative_addresses_without_ids(self):
+        self.assertEqual(get_relative_addresses({"P": {"": ["a"], "3": ["b", "c"], "-1": ["d"]}}),
+                         [("P4", "a"), ("P3", "b"), ("P5", "c"), ("P6", "d")])
+        self.assertEqual(get_relative_addresses({"P": {"": ["a"]}}), [("P1", "a")])
+
+    def test_relative_addresses_of_duplicates(self):
+        resources = self._discover(get_device_objects(device.CosDeviceModel(ports_count=2)))
+        chassis = resources[0][1]
+        resources.append(("1", FakeChassis("Shell", "Chassis 2", "lb.chassis.2")))
+        chassis.add_sub_resource("2", FakePort("Shell", "1-3", "lb.port.1003"))
+
+        differences = get_resource_differences([], resources)
+
+        self.assertEqual([difference.split(":")[0] for difference in differences],
+                         ["CH1", "CH1/P1", "CH1/P2", "CH1/P3", "CH2"])
+
+
+@unittest.skipIf(CgsLoadBalancerSNMPAutoload is None, "cloudshell-cgs is not installed")
+class TestPortDiscoveryModes(unittest.TestCase):
+    """Standard and indexed discoveries of the same simulated device must give the same Autoload details"""
+
+    def setUp(self):
+        try:
+            self.mibs_path = find_mibs_path()
+        except MibNotFoundError as e:
+            self.skipTest(str(e))
+
+    def _discover(self, snmp_agent, port_discovery_mode):
+        logger = logging.getLogger(__name__)
+        snmp_service = QualiSnmp(SNMPV2Parameters(ip="127.0.0.1", snmp_community="public", port=snmp_agent.port),
+                                 logger)
+        snmp_service.update_mib_sources(self.mibs_path)
+        snmp_autoload = CgsLoadBalancerSNMPAutoload(snmp_handler=snmp_service,
+                                                    shell_name="CGS COS LoadBalancer Shell 2G",
+                                                    shell_type="CS_LoadBalancer",
+                                                    resource_name="lb",
+                                                    logger=logger,
+                                                    bulk_max_repetitions=10,
+                                                    port_discovery_mode=port_discovery_mode)
+        details = snmp_autoload.discover(["COS"])
+
+        resources = sorted((resource.model, resource.name, resource.relative_address, resource.unique_identifier)
+                           for resource in details.resources)
+        attributes = sorted((attribute.relative_address, attribute.attribute_name, attribute.attribute_value)
+                            for attribute in details.attributes)
+        return resources, attributes
+
+    def test_same_autoload_details(self):
+        with SnmpAgentSimulator(device.CosDeviceModel(ports_count=4), port=0) as snmp_agent:
+            standard_resources, standard_attributes = self._discover(snmp_agent, PortDiscoveryMode.STANDARD)
+            indexed_resources, indexed_attributes = self._discover(snmp_agent, PortDiscoveryMode.INDEXED)
+
+        self.assertEqual(sorted((relative_address, name, unique_id)
+                                for _, name, relative_address, unique_id in standard_resources
+                                if relative_address.startswith("CH")),
+                         STANDARD_AUTOLOAD_RESOURCES)
+        self.assertEqual(indexed_resources, standard_resources)
+        self.assertEqual(indexed_attributes, standard_attributes)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
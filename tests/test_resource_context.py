@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `ResourceContextCache`
+"""
+
+import unittest
+
+from cgs.load_balancing.helpers.cache import TtlLruCache
+from cgs.load_balancing.helpers.resource_context import ResourceContext
+from cgs.load_balancing.helpers.resource_context import ResourceContextCache
+
+
+class _Object(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _create_context(name="lb", attributes=None, admin_auth_token="token"):
+    return _Object(resource=_Object(name=name,
+                                    address="192.168.1.1",
+                                    family="CS_LoadBalancer",
+                                    fullname=name,
+                                    attributes=attributes or {"Shell.User": "admin"}),
+                   reservation=_Object(reservation_id="id", domain="Global"),
+                   connectivity=_Object(server_address="localhost", admin_auth_token=admin_auth_token))
+
+
+class TestTtlLruCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [0]
+        self.cache = TtlLruCache(max_size=2, ttl=10, timer=lambda: self.now[0])
+
+    def test_lru_eviction(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.stats["evictions"], 1)
+
+    def test_ttl_expiration(self):
+        self.cache.set("a", 1)
+        self.now[0] = 11
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats["misses"], 1)
+
+
+class TestResourceContextCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResourceContextCache(max_size=2, ttl=60)
+        self.created = []
+
+    def _factory(self, context, fingerprint):
+        self.created.append(context)
+        return ResourceContext(api=None, resource_config=None, fingerprint=fingerprint)
+
+    def test_cache_hit(self):
+        first = self.cache.get(_create_context(), self._factory)
+        second = self.cache.get(_create_context(), self._factory)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(self.cache.stats["hits"], 1)
+
+    def test_invalidate_on_attributes_change(self):
+        first = self.cache.get(_create_context(), self._factory)
+        second = self.cache.get(_create_context(attributes={"Shell.User": "root"}), self._factory)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(self.cache.stats["invalidations"], 1)
+
+    def test_invalidate_on_token_change(self):
+        first = self.cache.get(_create_context(), self._factory)
+        second = self.cache.get(_create_context(admin_auth_token="new token"), self._factory)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(self.cache.stats["invalidations"], 1)
+        self.assertNotIn("new token", second.fingerprint)
+
+    def test_handlers_cached_per_logger(self):
+        resource_context = self.cache.get(_create_context(), self._factory)
+        logger = _Object(name="thread-1")
+
+        handler = resource_context.get_handler("cli", logger, object)
+
+        self.assertIs(resource_context.get_handler("cli", logger, object), handler)
+        self.assertIsNot(resource_context.get_handler("cli", _Object(name="thread-2"), object), handler)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `CliSessionWarmPool`
+"""
+
+import logging
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+try:
+    from cgs.load_balancing.cli.session_pool import CliSessionPool
+    from cgs.load_balancing.cli.session_pool import CliSessionWarmPool
+except ImportError:
+    CliSessionPool = None
+
+
+class FakeSession(object):
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.probes = 0
+        self.disconnected = False
+        self.new_session = False
+
+    def probe_for_prompt(self, expected_string, logger):
+        self.probes += 1
+        if not self.alive:
+            raise Exception("Session is closed")
+
+    def disconnect(self):
+        self.disconnected = True
+
+
+class FakeSessionManager(object):
+    def __init__(self):
+        self.sessions = []
+
+    def existing_sessions_count(self):
+        return len(self.sessions)
+
+    def remove_session(self, session, logger):
+        self.sessions.remove(session)
+
+
+@unittest.skipIf(CliSessionPool is None, "cloudshell-cli is not installed")
+class TestCliSessionWarmPool(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("test_session_pool")
+        self.session_manager = FakeSessionManager()
+        self.session_pool = CliSessionPool(session_manager=self.session_manager, max_pool_size=3)
+        self.cli_handler = mock.MagicMock()
+        self.warm_pool = CliSessionWarmPool(session_pool=self.session_pool,
+                                            cli_handler=self.cli_handler,
+                                            size=3,
+                                            logger=self.logger)
+
+    def _add_session(self, session, idle=True):
+        self.session_manager.sessions.append(session)
+        if idle:
+            self.session_pool.return_session(session, self.logger)
+        return session
+
+    def test_keepalive_skips_sessions_in_use(self):
+        idle_sessions = [self._add_session(FakeSession()), self._add_session(FakeSession())]
+        session_in_use = self._add_session(FakeSession(), idle=False)
+
+        with mock.patch.object(CliSessionWarmPool, "_get_prompt", return_value="#"):
+            self.warm_pool._keepalive()
+
+        self.assertEqual([session.probes for session in idle_sessions], [1, 1])
+        self.assertEqual(session_in_use.probes, 0)
+        self.assertFalse(self.cli_handler.get_cli_service.called)
+        self.assertEqual({self.session_pool.get_idle_session(), self.session_pool.get_idle_session()},
+                         set(idle_sessions))
+        self.assertIsNone(self.session_pool.get_idle_session())
+
+    def test_dead_session_is_replaced(self):
+        self._add_session(FakeSession())
+        dead_session = self._add_session(FakeSession(alive=False))
+        self._add_session(FakeSession(), idle=False)
+
+        with mock.patch.object(CliSessionWarmPool, "_get_prompt", return_value="#"):
+            self.warm_pool._keepalive()
+
+        self.assertTrue(dead_session.disconnected)
+        self.assertNotIn(dead_session, self.session_manager.sessions)
+        self.assertEqual(self.cli_handler.get_cli_service.call_count, 1)
+
+    def test_stop_closes_only_idle_sessions(self):
+        idle_session = self._add_session(FakeSession())
+        session_in_use = self._add_session(FakeSession(), idle=False)
+
+        self.warm_pool.stop()
+
+        self.assertTrue(idle_session.disconnected)
+        self.assertFalse(session_in_use.disconnected)
+        self.assertEqual(self.session_manager.sessions, [session_in_use])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the COS device simulator
+"""
+
+import socket
+import unittest
+
+from tests.simulator.cli_server import ScriptedCliServer
+from tests.simulator.device import CosDeviceModel
+
+try:
+    from tests.simulator.snmp_agent import MibNotFoundError
+    from tests.simulator.snmp_agent import SnmpAgentSimulator
+    from tests.simulator.snmp_agent import find_mibs_path
+except ImportError:
+    SnmpAgentSimulator = None
+
+
+class CliClient(object):
+    def __init__(self, port):
+        self._socket = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self._buffer = b""
+
+    def read_until(self, expected):
+        while expected not in self._buffer:
+            self._buffer += self._socket.recv(4096)
+
+        data, self._buffer = self._buffer.split(expected, 1)
+        return (data + expected).decode("utf-8")
+
+    def send(self, command, expected):
+        self._socket.sendall(command.encode("utf-8") + b"\r\n")
+        return self.read_until(expected.encode("utf-8"))
+
+    def close(self):
+        self._socket.close()
+
+
+class TestCosDeviceModel(unittest.TestCase):
+
+    def test_mib_objects(self):
+        model = CosDeviceModel(lb_groups_count=3, ports_count=4)
+        lb_group_objects = model.get_lb_group_objects({"lbGroupName": (1, 2, 2),
+                                                       "lbGroupOutputs": (1, 2, 3),
+                                                       "lbGroupAlgo": (1, 2, 4)})
+
+        self.assertEqual(len(lb_group_objects), 9)
+        self.assertEqual(lb_group_objects[1], ("lbGroupOutputs", (1, 2, 3, 1), "mib", "1/1,1/2,1/3,1/4"))
+        self.assertEqual(len(set(oid for _, oid, _, _ in model.get_port_objects())), 2 + 9 + 4 * 20)
+
+    def test_config_commands(self):
+        model = CosDeviceModel(lb_groups_count=2, ports_count=2)
+
+        model.apply_config_command("no output 1/2", "lb-group group-1")
+        model.apply_config_command("output 1/9", "lb-group group-1")
+        model.apply_config_command("no lb-group group-2")
+
+        self.assertIn("lb-group group-1\n output 1/1\n algorithm hash\n output 1/9\nsnmp", model.running_config)
+        self.assertNotIn("group-2", model.running_config)
+
+
+class TestScriptedCliServer(unittest.TestCase):
+
+    def test_session(self):
+        model = CosDeviceModel(lb_groups_count=2, ports_count=2)
+
+        with ScriptedCliServer(model) as cli_server:
+            client = CliClient(cli_server.port)
+            try:
+                client.read_until(b"Username: ")
+                client.send("admin", "Password: ")
+                client.send("admin", "cos-sim> ")
+                client.send("enable", "cos-sim# ")
+                output = client.send("show running-config", "cos-sim# ")
+                client.send("configure terminal", "(config)# ")
+                client.send("lb-group group-3", "(config)# ")
+                client.send("exit", "(config)# ")
+                client.send("end", "cos-sim# ")
+            finally:
+                client.close()
+
+        self.assertIn("lb-group group-2", output)
+        self.assertIn("lb-group group-3", model.running_config)
+        self.assertEqual(cli_server.sessions_count, 1)
+        self.assertEqual(cli_server.commands_count, 6)
+
+
+@unittest.skipIf(SnmpAgentSimulator is None, "pysnmp is not installed")
+class TestSnmpAgentSimulator(unittest.TestCase):
+
+    def test_get(self):
+        try:
+            find_mibs_path()
+        except MibNotFoundError as e:
+            self.skipTest(str(e))
+
+        from pysnmp.hlapi import CommunityData, ContextData, ObjectIdentity, ObjectType, SnmpEngine, \
+            UdpTransportTarget, getCmd
+
+        with SnmpAgentSimulator(CosDeviceModel(), port=0) as snmp_agent:
+            error_indication, _, _, var_binds = next(getCmd(SnmpEngine(),
+                                                            CommunityData("public"),
+                                                            UdpTransportTarget(("127.0.0.1", snmp_agent.port)),
+                                                            ContextData(),
+                                                            ObjectType(ObjectIdentity("1.3.6.1.2.1.1.5.0"))))
+
+        self.assertIsNone(error_indication)
+        self.assertEqual(str(var_binds[0][1]), "cos-sim")
+        self.assertEqual(snmp_agent.pdu_counts, {"GetRequestPDU": 1})
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `SnapshotStore`
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cgs.load_balancing.helpers.snapshot_store import SnapshotStore
+
+
+def _create_config(groups_count, changed_group=None):
+    lines = ["! Last configuration change at 10:15:02"]
+    for group_id in range(groups_count):
+        name = "changed" if group_id == changed_group else "group-{}".format(group_id)
+        lines.extend(["lb-group {}".format(group_id),
+                      " name {}".format(name),
+                      " outputs 1/{}-1/{}".format(group_id, group_id + 4),
+                      " algorithm round-robin"])
+    return "\n".join(lines)
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.store = SnapshotStore(self.root_path)
+        self.artifact = {"artifact_type": "ftp", "identifier": "//server/lb-running"}
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def _count_objects(self):
+        return sum(len(files) for _, _, files in os.walk(os.path.join(self.root_path, SnapshotStore.OBJECTS_DIR)))
+
+    def test_put_and_read(self):
+        config = _create_config(10)
+        snapshot = self.store.put("lb", "running", config, self.artifact)
+
+        self.assertEqual(self.store.read(snapshot["id"]), config)
+        self.assertEqual(self.store.get_latest("lb", "Running")["id"], snapshot["id"])
+        self.assertIsNone(self.store.get_latest("lb", "startup"))
+
+    def test_latest_per_destination_and_mode(self):
+        config = _create_config(3)
+        snapshot = self.store.put("lb", "running", config, self.artifact, destination="/backup", mode="Shallow")
+
+        self.assertEqual(self.store.get_latest("lb", "running", "/backup", "shallow")["id"], snapshot["id"])
+        self.assertIsNone(self.store.get_latest("lb", "running", "ftp://10.0.0.1/backup", "shallow"))
+        self.assertIsNone(self.store.get_latest("lb", "running", "/backup", "deep"))
+
+    def test_similar_configs_share_chunks(self):
+        self.store.put("lb", "running", _create_config(500), self.artifact)
+        objects_count = self._count_objects()
+        snapshot = self.store.put("lb", "running", _create_config(500, changed_group=250), self.artifact)
+
+        self.assertGreater(len(snapshot["chunks"]), 2)
+        self.assertLessEqual(snapshot["new_chunks"], 2)
+        self.assertEqual(self._count_objects(), objects_count + snapshot["new_chunks"])
+
+    def test_config_hash_ignores_timestamps(self):
+        config = _create_config(3)
+
+        self.assertEqual(SnapshotStore.get_config_hash(config),
+                         SnapshotStore.get_config_hash(config.replace("10:15:02", "11:00:00")))
+        self.assertNotEqual(SnapshotStore.get_config_hash(config),
+                            SnapshotStore.get_config_hash(_create_config(3, changed_group=1)))
+
+    def test_last_save(self):
+        record = {"path": "/backup/lb-running-010126-101502", "config_hash": "abc", "size": 10}
+        self.store.set_last_save("lb", "Running", "/backup", record)
+
+        self.assertEqual(self.store.get_last_save("lb", "running", "/backup"), record)
+        self.assertIsNone(self.store.get_last_save("lb", "running", "ftp://10.0.0.1/backup"))
+        self.assertIsNone(self.store.get_last_save("lb", "startup", "/backup"))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
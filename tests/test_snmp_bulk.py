@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `SnmpBulkTableReader`
+"""
+
+import bisect
+import logging
+import unittest
+
+from cgs.load_balancing.snmp.bulk import SnmpBulkTableReader
+
+try:
+    import pysnmp
+except ImportError:
+    pysnmp = None
+
+COLUMN_OIDS = {"lbGroupName": (1, 9, 2), "lbGroupAlgo": (1, 9, 4)}
+
+
+class Value(object):
+    def __init__(self, value):
+        self.value = value
+
+    def prettyPrint(self):
+        return self.value
+
+
+class FakeCmdGen(object):
+    """GETBULK over the sorted list of OIDs"""
+
+    def __init__(self, objects):
+        self.objects = sorted(objects)
+        self.oids = [oid for oid, _ in self.objects]
+
+    def bulkCmd(self, security, target, non_repeaters, max_repetitions, *oids, **kwargs):
+        var_bind_table = []
+        positions = [bisect.bisect_right(self.oids, oid) for oid in oids]
+
+        for repetition in range(max_repetitions):
+            if all(position + repetition >= len(self.objects) for position in positions):
+                break
+            var_bind_table.append([self.objects[min(position + repetition, len(self.objects) - 1)]
+                                   for position in positions])
+
+        return None, 0, 0, var_bind_table
+
+
+class FakeSnmpService(object):
+    security = None
+    target = None
+
+    def __init__(self, objects):
+        self.cmd_gen = FakeCmdGen(objects)
+
+
+@unittest.skipIf(pysnmp is None, "pysnmp is not installed")
+class TestSnmpBulkTableReader(unittest.TestCase):
+
+    def _create_reader(self, objects):
+        reader = SnmpBulkTableReader(FakeSnmpService(objects), logging.getLogger(__name__), max_repetitions=3)
+        reader._resolve_column_oid = lambda mib, column: COLUMN_OIDS[column]
+        return reader
+
+    def test_rows_are_streamed(self):
+        objects = [((1, 9, 2, i), Value("group-{}".format(i))) for i in range(1, 11)]
+        # the algo column has a gap at the row 4
+        objects += [((1, 9, 4, i), Value("hash")) for i in range(1, 11) if i != 4]
+        objects += [((1, 9, 5, 1), Value("next table"))]
+        reader = self._create_reader(objects)
+
+        rows = reader.iter_table_rows("NPB-LB", ["lbGroupName", "lbGroupAlgo"])
+        first_row = next(rows)
+        pdu_count_after_first_row = reader.pdu_count
+        rows = [first_row] + list(rows)
+
+        self.assertEqual(pdu_count_after_first_row, 1)
+        self.assertEqual([suffix for suffix, _ in rows], [str(i) for i in range(1, 11)])
+        self.assertEqual(rows[3], ("4", ["group-4", None]))
+        self.assertEqual(rows[9], ("10", ["group-10", "hash"]))
+
+    def test_get_table_columns(self):
+        reader = self._create_reader([((1, 9, 2, 7), Value("group-7")), ((1, 9, 4, 7), Value("hash"))])
+
+        table = reader.get_table_columns("NPB-LB", ["lbGroupName", "lbGroupAlgo"])
+
+        self.assertEqual(list(table.values()), [{"suffix": "7", "lbGroupName": "group-7", "lbGroupAlgo": "hash"}])
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `SnmpSessionCache`
+"""
+
+import unittest
+
+from cgs.load_balancing.snmp.session_cache import SnmpSessionCache
+from cgs.load_balancing.snmp.session_cache import get_snmp_credentials_key
+
+
+class _Object(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class TestSnmpSessionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [0]
+        self.cache = SnmpSessionCache(max_idle_sessions=1, enabled_ttl=60, timer=lambda: self.now[0])
+        self.parameters_created = []
+
+    def _get_entry(self, key="key"):
+        return self.cache.get_entry("lb", key, lambda: self.parameters_created.append(key) or key)
+
+    def test_credentials_key(self):
+        resource_config = _Object(address="192.168.1.1", snmp_version="v3", snmp_v3_user="user",
+                                  snmp_v3_password="encrypted")
+        key = get_snmp_credentials_key(resource_config)
+
+        self.assertEqual(key, get_snmp_credentials_key(resource_config))
+        resource_config.snmp_v3_password = "changed"
+        self.assertNotEqual(key, get_snmp_credentials_key(resource_config))
+
+    def test_entry_replaced_on_credentials_change(self):
+        entry = self._get_entry()
+        self.assertIs(entry, self._get_entry())
+        self.assertIsNot(entry, self._get_entry("new key"))
+        self.assertEqual(self.parameters_created, ["key", "new key"])
+
+    def test_sessions_reused(self):
+        entry = self._get_entry()
+        first = self.cache.acquire(entry, lambda parameters: object())
+        second = self.cache.acquire(entry, lambda parameters: object())
+        self.assertIsNot(first, second)
+
+        self.cache.release(entry, first)
+        self.cache.release(entry, second)
+        self.assertIs(self.cache.acquire(entry, lambda parameters: object()), first)
+        self.assertEqual(self.cache.stats["created_sessions"], 2)
+        self.assertEqual(self.cache.stats["reused_sessions"], 1)
+
+    def test_snmp_enabled_expires(self):
+        entry = self._get_entry()
+        self.assertFalse(self.cache.is_snmp_enabled(entry))
+
+        self.cache.set_snmp_enabled(entry, True)
+        self.assertTrue(self.cache.is_snmp_enabled(entry))
+        self.now[0] = 61
+        self.assertFalse(self.cache.is_snmp_enabled(entry))
+
+        self.cache.set_snmp_enabled(entry, True)
+        self.cache.set_snmp_enabled(entry, False)
+        self.assertFalse(self.cache.is_snmp_enabled(entry))
+
+    def _acquire_enabled(self, entry, reachable=True):
+        """Acquire a session with a factory that fails while SNMP is disabled on the device"""
+        device = {"snmp_enabled": False, "enable_flows": 0}
+
+        def enable_snmp():
+            device["snmp_enabled"] = True
+            device["enable_flows"] += 1
+
+        def session_factory(parameters):
+            if not device["snmp_enabled"]:
+                raise Exception("No SNMP response received before timeout")
+            return object()
+
+        session, enable_skipped = self.cache.acquire_enabled(entry=entry,
+                                                             session_factory=session_factory,
+                                                             enable_snmp=enable_snmp,
+                                                             is_reachable=lambda session: reachable)
+        return session, enable_skipped, device["enable_flows"]
+
+    def test_enable_flow_runs_before_session_is_created(self):
+        entry = self._get_entry()
+        session, enable_skipped, enable_flows = self._acquire_enabled(entry)
+
+        self.assertIsNotNone(session)
+        self.assertFalse(enable_skipped)
+        self.assertEqual(enable_flows, 1)
+        self.assertTrue(self.cache.is_snmp_enabled(entry))
+
+    def test_enable_flow_skipped_for_reachable_idle_session(self):
+        entry = self._get_entry()
+        idle_session = object()
+        self.cache.release(entry, idle_session)
+        self.cache.set_snmp_enabled(entry, True)
+
+        session, enable_skipped, enable_flows = self._acquire_enabled(entry)
+        self.assertIs(session, idle_session)
+        self.assertTrue(enable_skipped)
+        self.assertEqual(enable_flows, 0)
+
+    def test_enable_flow_runs_for_expired_or_unreachable_idle_session(self):
+        entry = self._get_entry()
+        self.cache.release(entry, object())
+
+        _, enable_skipped, enable_flows = self._acquire_enabled(entry)
+        self.assertFalse(enable_skipped)
+        self.assertEqual(enable_flows, 1)
+
+        unreachable_session = object()
+        self.cache.release(entry, unreachable_session)
+        session, enable_skipped, enable_flows = self._acquire_enabled(entry, reachable=False)
+        self.assertIsNot(session, unreachable_session)
+        self.assertFalse(enable_skipped)
+        self.assertEqual(enable_flows, 1)
+
+    def test_failed_enable_flow_resets_state(self):
+        entry = self._get_entry()
+        self.cache.set_snmp_enabled(entry, True)
+        self.now[0] = 61
+
+        def enable_snmp():
+            raise Exception("enable SNMP failed")
+
+        with self.assertRaises(Exception):
+            self.cache.acquire_enabled(entry, lambda parameters: object(), enable_snmp, lambda session: True)
+
+        self.assertFalse(self.cache.is_snmp_enabled(entry))
+        self.assertEqual(self.cache.stats["created_sessions"], 0)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `cgs.load_balancing.statistics.counters`
+"""
+
+import unittest
+from collections import OrderedDict
+
+from cgs.load_balancing.statistics.counters import COUNTER32_MODULUS
+from cgs.load_balancing.statistics.counters import COUNTER64_MODULUS
+from cgs.load_balancing.statistics.counters import CounterSample
+from cgs.load_balancing.statistics.counters import diff_samples
+from cgs.load_balancing.statistics.counters import get_shared_rows
+from cgs.load_balancing.statistics.counters import sum_groups
+
+MODULI = {"ifHCOutOctets": COUNTER64_MODULUS, "ifOutErrors": COUNTER32_MODULUS}
+
+
+def _create_sample(up_time, keys, octets, errors):
+    return CounterSample(up_time=up_time, keys=keys,
+                         columns=OrderedDict([("ifHCOutOctets", octets), ("ifOutErrors", errors)]))
+
+
+class TestCounters(unittest.TestCase):
+
+    def test_deltas_rates_and_wraps(self):
+        previous = _create_sample(1000, ["1/1", "1/2", "1/3"],
+                                  [100, COUNTER64_MODULUS - 50, None], [COUNTER32_MODULUS - 1, 5, 0])
+        current = _create_sample(2000, ["1/2", "1/1", "1/3", "1/4"], [50, 1100, 10, 7], [5, 9, 0, 1])
+
+        interval, deltas, rates = diff_samples(previous, current, MODULI)
+
+        self.assertEqual(interval, 10.0)
+        self.assertEqual(deltas["ifHCOutOctets"], [100, 1000, None, None])
+        self.assertEqual(deltas["ifOutErrors"], [0, 10, 0, None])
+        self.assertEqual(rates["ifHCOutOctets"], [10.0, 100.0, None, None])
+
+    def test_reboot_resets_baseline(self):
+        previous = _create_sample(5000, ["1/1"], [100], [0])
+        current = _create_sample(100, ["1/1"], [10], [0])
+
+        self.assertEqual(diff_samples(previous, current, MODULI), (None, None, None))
+        self.assertEqual(diff_samples(None, current, MODULI), (None, None, None))
+
+    def test_sum_groups(self):
+        self.assertEqual(sum_groups([1, 2, None, 4], [[0, 1], [2], [1, 2, 3], []]), [3, None, 6, None])
+
+    def test_get_shared_rows(self):
+        self.assertEqual(get_shared_rows([[0, 1], [2], [1, 2, 3], []]), [[1], [2], [1, 2], []])
+        self.assertEqual(get_shared_rows([[0, 0], [1]]), [[], []])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
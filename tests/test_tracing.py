@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for `command_trace`
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from contextlib import contextmanager
+
+from cgs.load_balancing.helpers import tracing
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("test_tracing")
+        self.logger.setLevel(logging.INFO)
+        self.handler = ListHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def test_disabled(self):
+        self.assertIs(tracing.trace_span("phase"), tracing.NULL_SPAN)
+        tracing.trace_count("snmp_pdus")
+
+        func = lambda: None
+        self.assertIs(tracing.bind_span(func), func)
+
+    def test_nested_spans(self):
+        @contextmanager
+        def service():
+            yield "session"
+
+        with tracing.command_trace("get_inventory", "lb-1", self.logger):
+            with tracing.trace_context_manager(service(), "snmp_enable", "snmp_disable") as session:
+                self.assertEqual(session, "session")
+                with tracing.trace_span("lb_groups"):
+                    tracing.trace_count("snmp_pdus", 3)
+
+                thread = threading.Thread(target=tracing.bind_span(lambda: tracing.trace_count("snmp_pdus")))
+                thread.start()
+                thread.join()
+
+        self.assertIsNone(tracing.get_current_span())
+
+        trace = json.loads(self.handler.messages[-1].split(": ", 1)[1])
+        self.assertEqual(trace["totals"], {"snmp_pdus": 4})
+        self.assertEqual([span["name"] for span in trace["span"]["children"]],
+                         ["snmp_enable", "lb_groups", "snmp_disable"])
+
+    def test_trace_file(self):
+        output_path = tempfile.mkdtemp()
+        try:
+            with tracing.command_trace("save", "lb/1", self.logger, output_path):
+                pass
+
+            trace_files = os.listdir(output_path)
+            self.assertEqual(len(trace_files), 1)
+            self.assertTrue(trace_files[0].startswith("lb_1_save_"))
+        finally:
+            shutil.rmtree(output_path)